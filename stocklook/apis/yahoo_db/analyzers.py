@@ -1,4 +1,5 @@
 from stocklook.apis.yahoo_db.database import engine, StockDatabase
+from stocklook.utils.aggregate import last_rows
 import pandas as pd
 from collections import Counter, defaultdict
 import enum
@@ -40,8 +41,13 @@ class StockAnalyzer:
             return ZekeRating.buy
 
 
-def analyze_stocks(score_path, data_path, df=None):
-    if df is None:
+def analyze_stocks(score_path, data_path, df=None, chunksize=None):
+    if df is None and chunksize:
+        # Only the newest quote of each symbol is kept between chunks.
+        chunks = pd.read_sql("SELECT * FROM quotes", engine,
+                             parse_dates=['date_inserted'], chunksize=chunksize)
+        df = last_rows(chunks, 'symbol', ['date_last_traded', 'date_inserted'])
+    elif df is None:
         df = pd.read_sql("SELECT * FROM quotes ORDER BY date_inserted DESC", engine, parse_dates=['date_inserted'])
     df.sort_values(['date_last_traded', 'date_inserted'], ascending=[False, False], inplace=True)
     df.drop_duplicates('symbol', inplace=True)
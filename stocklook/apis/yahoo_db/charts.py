@@ -4,6 +4,7 @@ from datetime import datetime
 import pandas.io.data as web
 import os
 from stocklook.apis.yahoo_db.database import StockDatabase, Stock
+from stocklook.utils.downsample import bucket_ohlc
 
 DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data')
 CHARTS_DIR = os.path.join(DATA_DIR, 'charts')
@@ -18,11 +19,14 @@ START_DATE = [2016, 10, 1]
 END_DATE = [2017, 3, 22]
 
 
-def create_plotly_candlestick(symbol, start_date, end_date, filename=None):
+def create_plotly_candlestick(symbol, start_date, end_date, filename=None, max_points=1000):
     if filename is None:
         filename = os.path.join(CHARTS_DIR, '{}-{}-{}.html'.format(
             symbol, start_date.date(), end_date.date()))
     df = web.DataReader(symbol, 'yahoo', start_date, end_date)
+    if max_points:
+        # Long ranges are combined into max_points candles.
+        df = bucket_ohlc(df, max_points, columns=('Open', 'High', 'Low', 'Close', 'Volume'))
     fig = FF.create_candlestick(df.Open, df.High, df.Low, df.Close, dates=df.index)
     plotly.offline.plot(fig, filename=filename)
     return filename
@@ -32,6 +32,7 @@ import logging
 from stocklook.crypto.bitmex.auth import APIKeyAuthWithExpires
 from stocklook.crypto.bitmex.utils import constants, errors
 from stocklook.crypto.bitmex.ws.ws_thread import BitMEXWebsocket
+from stocklook.utils.api import DEFAULT_RETRY_POLICY
 from stocklook.utils.security import Credentials
 from stocklook.config import BITMEX_KEY, BITMEX_SECRET
 
@@ -44,7 +45,8 @@ class BitMEX(object):
                                                    BITMEX_SECRET: 'apiSecret',
                                                })
     def __init__(self, base_url=None, symbol=None, apiKey=None, apiSecret=None,
-                 orderIDPrefix='mm_bitmex_', shouldWSAuth=True, postOnly=False, timeout=7):
+                 orderIDPrefix='mm_bitmex_', shouldWSAuth=True, postOnly=False, timeout=7,
+                 retry_policy=None):
         """Init connector."""
         self.logger = logging.getLogger('root')
         self.base_url = base_url
@@ -59,7 +61,9 @@ class BitMEX(object):
         if len(orderIDPrefix) > 13:
             raise ValueError("settings.ORDERID_PREFIX must be at most 13 characters long!")
         self.orderIDPrefix = orderIDPrefix
-        self.retries = 0  # initialize counter
+        if retry_policy is None:
+            retry_policy = DEFAULT_RETRY_POLICY
+        self.retry_policy = retry_policy
 
         # Prepare HTTPS session
         self.session = requests.Session()
@@ -258,12 +262,13 @@ class BitMEX(object):
         if not verb:
             verb = 'POST' if postdict else 'GET'
 
-        # By default don't retry POST or PUT. Retrying GET/DELETE is okay because they are idempotent.
-        # In the future we could allow retrying PUT, so long as 'leavesQty' is not used (not idempotent),
-        # or you could change the clOrdID (set {"clOrdID": "new", "origClOrdID": "old"}) so that an amend
-        # can't erroneously be applied twice.
+        # By default don't retry POST or PUT unless every order carries a clOrdID.
+        # Retrying GET/DELETE is okay because they are idempotent.
+        # A duplicate clOrdID is recovered below by fetching the existing order(s),
+        # so an order can't erroneously be placed twice.
+        policy = self.retry_policy
         if max_retries is None:
-            max_retries = 0 if verb in ['POST', 'PUT'] else 3
+            max_retries = policy.max_attempts - 1 if policy.allows_retry(verb, postdict) else 0
 
         # Auth: API Key/Secret
         auth = APIKeyAuthWithExpires(self.apiKey, self.apiSecret)
@@ -274,117 +279,136 @@ class BitMEX(object):
             else:
                 exit(1)
 
-        def retry():
-            self.retries += 1
-            if self.retries > max_retries:
+        started = time.time()
+        attempt = 0
+
+        def retry_delay():
+            # Returns seconds to sleep before the next attempt
+            # or raises when the retry budget is spent.
+            delay = None
+            if attempt <= max_retries:
+                delay = policy.next_delay(attempt, started)
+            if delay is None:
+                policy.record(attempt, started, failed=True)
                 raise Exception("Max retries on %s (%s) hit, raising." % (path, json.dumps(postdict or '')))
-            return self._curl_bitmex(path, query, postdict, timeout, verb, rethrow_errors, max_retries)
-
-        # Make the request
-        response = None
-        try:
-            self.logger.info("sending req to %s: %s" % (url, json.dumps(postdict or query or '')))
-            req = requests.Request(verb, url, json=postdict, auth=auth, params=query)
-            prepped = self.session.prepare_request(req)
-            response = self.session.send(prepped, timeout=timeout)
-            # Make non-200s throw
-            response.raise_for_status()
-
-        except requests.exceptions.HTTPError as e:
-            if response is None:
-                raise e
+            return delay
+
+        while True:
+            attempt += 1
+
+            # Make the request
+            response = None
+            try:
+                self.logger.info("sending req to %s: %s" % (url, json.dumps(postdict or query or '')))
+                req = requests.Request(verb, url, json=postdict, auth=auth, params=query)
+                prepped = self.session.prepare_request(req)
+                response = self.session.send(prepped, timeout=timeout)
+                # Make non-200s throw
+                response.raise_for_status()
+
+            except requests.exceptions.HTTPError as e:
+                if response is None:
+                    raise e
+
+                # 401 - Auth error. This is fatal.
+                if response.status_code == 401:
+                    self.logger.error("API Key or Secret incorrect, please check and restart.")
+                    self.logger.error("Error: " + response.text)
+                    if postdict:
+                        self.logger.error(postdict)
+                    # Always exit, even if rethrow_errors, because this is fatal
+                    exit(1)
+
+                # 404, can be thrown if order canceled or does not exist.
+                elif response.status_code == 404:
+                    if verb == 'DELETE':
+                        self.logger.error("Order not found: %s" % postdict['orderID'])
+                        return
+                    self.logger.error("Unable to contact the BitMEX API (404). " +
+                                      "Request: %s \n %s" % (url, json.dumps(postdict)))
+                    exit_or_throw(e)
+
+                # 429, ratelimit; cancel orders & wait until X-Ratelimit-Reset
+                elif response.status_code == 429:
+                    self.logger.error("Ratelimited on current request. Sleeping, then trying again. Try fewer " +
+                                      "order pairs or contact support@bitmex.com to raise your limits. " +
+                                      "Request: %s \n %s" % (url, json.dumps(postdict)))
+
+                    # Figure out how long we need to wait.
+                    ratelimit_reset = response.headers['X-Ratelimit-Reset']
+                    to_sleep = int(ratelimit_reset) - int(time.time())
+                    reset_str = datetime.datetime.fromtimestamp(int(ratelimit_reset)).strftime('%X')
+
+                    # Fail before cancelling orders if we won't be able to retry.
+                    retry_delay()
+                    if time.time() + max(to_sleep, 0) - started > policy.deadline:
+                        policy.record(attempt, started, failed=True)
+                        raise Exception("Ratelimit on %s resets at %s, past the retry deadline "
+                                        "of %ss, raising." % (path, reset_str, policy.deadline))
+
+                    # We're ratelimited, and we may be waiting for a long time. Cancel orders.
+                    self.logger.warning("Canceling all known orders in the meantime.")
+                    self.cancel([o['orderID'] for o in self.open_orders()])
+
+                    self.logger.error("Your ratelimit will reset at %s. Sleeping for %d seconds." % (reset_str, to_sleep))
+                    time.sleep(max(to_sleep, 0))
+
+                    # Retry the request.
+                    continue
+
+                # 503 - BitMEX temporary downtime, likely due to a deploy. Try again
+                elif response.status_code == 503:
+                    self.logger.warning("Unable to contact the BitMEX API (503), retrying. " +
+                                        "Request: %s \n %s" % (url, json.dumps(postdict)))
+                    time.sleep(retry_delay())
+                    continue
+
+                elif response.status_code == 400:
+                    error = response.json()['error']
+                    message = error['message'].lower() if error else ''
+
+                    # Duplicate clOrdID: that's fine, probably a deploy, go get the order(s) and return it
+                    if 'duplicate clordid' in message:
+                        orders = postdict['orders'] if 'orders' in postdict else postdict
+
+                        IDs = json.dumps({'clOrdID': [order['clOrdID'] for order in orders]})
+                        orderResults = self._curl_bitmex('/order', query={'filter': IDs}, verb='GET')
+
+                        for i, order in enumerate(orderResults):
+                            if (
+                                    order['orderQty'] != abs(postdict['orderQty']) or
+                                    order['side'] != ('Buy' if postdict['orderQty'] > 0 else 'Sell') or
+                                    order['price'] != postdict['price'] or
+                                    order['symbol'] != postdict['symbol']):
+                                raise Exception('Attempted to recover from duplicate clOrdID, but order returned from API ' +
+                                                'did not match POST.\nPOST data: %s\nReturned order: %s' % (
+                                                    json.dumps(orders[i]), json.dumps(order)))
+                        # All good
+                        return orderResults
+
+                    elif 'insufficient available balance' in message:
+                        self.logger.error('Account out of funds. The message: %s' % error['message'])
+                        exit_or_throw(Exception('Insufficient Funds'))
+
+
+                # If we haven't returned or re-raised yet, we get here.
+                self.logger.error("Unhandled Error: %s: %s" % (e, response.text))
+                self.logger.error("Endpoint was: %s %s: %s" % (verb, path, json.dumps(postdict)))
+                exit_or_throw(e)
 
-            # 401 - Auth error. This is fatal.
-            if response.status_code == 401:
-                self.logger.error("API Key or Secret incorrect, please check and restart.")
-                self.logger.error("Error: " + response.text)
-                if postdict:
-                    self.logger.error(postdict)
-                # Always exit, even if rethrow_errors, because this is fatal
-                exit(1)
+            except requests.exceptions.Timeout as e:
+                # Timeout, re-run this request
+                self.logger.warning("Timed out on request: %s (%s), retrying..." % (path, json.dumps(postdict or '')))
+                time.sleep(retry_delay())
+                continue
 
-            # 404, can be thrown if order canceled or does not exist.
-            elif response.status_code == 404:
-                if verb == 'DELETE':
-                    self.logger.error("Order not found: %s" % postdict['orderID'])
-                    return
-                self.logger.error("Unable to contact the BitMEX API (404). " +
-                                  "Request: %s \n %s" % (url, json.dumps(postdict)))
-                exit_or_throw(e)
+            except requests.exceptions.ConnectionError as e:
+                self.logger.warning("Unable to contact the BitMEX API (%s). Please check the URL. Retrying. " +
+                                    "Request: %s %s \n %s" % (e, url, json.dumps(postdict)))
+                time.sleep(retry_delay())
+                continue
 
-            # 429, ratelimit; cancel orders & wait until X-Ratelimit-Reset
-            elif response.status_code == 429:
-                self.logger.error("Ratelimited on current request. Sleeping, then trying again. Try fewer " +
-                                  "order pairs or contact support@bitmex.com to raise your limits. " +
-                                  "Request: %s \n %s" % (url, json.dumps(postdict)))
-
-                # Figure out how long we need to wait.
-                ratelimit_reset = response.headers['X-Ratelimit-Reset']
-                to_sleep = int(ratelimit_reset) - int(time.time())
-                reset_str = datetime.datetime.fromtimestamp(int(ratelimit_reset)).strftime('%X')
-
-                # We're ratelimited, and we may be waiting for a long time. Cancel orders.
-                self.logger.warning("Canceling all known orders in the meantime.")
-                self.cancel([o['orderID'] for o in self.open_orders()])
-
-                self.logger.error("Your ratelimit will reset at %s. Sleeping for %d seconds." % (reset_str, to_sleep))
-                time.sleep(to_sleep)
-
-                # Retry the request.
-                return retry()
-
-            # 503 - BitMEX temporary downtime, likely due to a deploy. Try again
-            elif response.status_code == 503:
-                self.logger.warning("Unable to contact the BitMEX API (503), retrying. " +
-                                    "Request: %s \n %s" % (url, json.dumps(postdict)))
-                time.sleep(3)
-                return retry()
-
-            elif response.status_code == 400:
-                error = response.json()['error']
-                message = error['message'].lower() if error else ''
-
-                # Duplicate clOrdID: that's fine, probably a deploy, go get the order(s) and return it
-                if 'duplicate clordid' in message:
-                    orders = postdict['orders'] if 'orders' in postdict else postdict
-
-                    IDs = json.dumps({'clOrdID': [order['clOrdID'] for order in orders]})
-                    orderResults = self._curl_bitmex('/order', query={'filter': IDs}, verb='GET')
-
-                    for i, order in enumerate(orderResults):
-                        if (
-                                order['orderQty'] != abs(postdict['orderQty']) or
-                                order['side'] != ('Buy' if postdict['orderQty'] > 0 else 'Sell') or
-                                order['price'] != postdict['price'] or
-                                order['symbol'] != postdict['symbol']):
-                            raise Exception('Attempted to recover from duplicate clOrdID, but order returned from API ' +
-                                            'did not match POST.\nPOST data: %s\nReturned order: %s' % (
-                                                json.dumps(orders[i]), json.dumps(order)))
-                    # All good
-                    return orderResults
-
-                elif 'insufficient available balance' in message:
-                    self.logger.error('Account out of funds. The message: %s' % error['message'])
-                    exit_or_throw(Exception('Insufficient Funds'))
-
-
-            # If we haven't returned or re-raised yet, we get here.
-            self.logger.error("Unhandled Error: %s: %s" % (e, response.text))
-            self.logger.error("Endpoint was: %s %s: %s" % (verb, path, json.dumps(postdict)))
-            exit_or_throw(e)
-
-        except requests.exceptions.Timeout as e:
-            # Timeout, re-run this request
-            self.logger.warning("Timed out on request: %s (%s), retrying..." % (path, json.dumps(postdict or '')))
-            return retry()
-
-        except requests.exceptions.ConnectionError as e:
-            self.logger.warning("Unable to contact the BitMEX API (%s). Please check the URL. Retrying. " +
-                                "Request: %s %s \n %s" % (e, url, json.dumps(postdict)))
-            time.sleep(1)
-            return retry()
-
-        # Reset retry counter on success
-        self.retries = 0
+            policy.record(attempt, started)
+            break
 
         return response.json()
@@ -21,9 +21,13 @@ LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
+import time
+import logging
 import pytest
+import requests
 from time import sleep
 from stocklook.crypto.bitmex.api import BitMEX
+from stocklook.utils.api import RetryPolicy
 
 
 
@@ -38,4 +42,38 @@ def test_api_connection():
 def test_or_stmt():
     v = None
     x = v or 2
-    print(x)
\ No newline at end of file
+    print(x)
+
+
+class _RatelimitedSession:
+    def __init__(self, reset):
+        self.reset = reset
+        self.sent = 0
+
+    def prepare_request(self, req):
+        return req
+
+    def send(self, req, timeout=None):
+        self.sent += 1
+        res = requests.Response()
+        res.status_code = 429
+        res.headers['X-Ratelimit-Reset'] = str(self.reset)
+        return res
+
+
+def test_ratelimit_past_deadline_raises(monkeypatch):
+    api = BitMEX.__new__(BitMEX)
+    api.base_url = 'http://test'
+    api.apiKey = api.apiSecret = 'x'
+    monkeypatch.setattr(api, 'logger', logging.getLogger(__name__), raising=False)
+    api.retry_policy = RetryPolicy(max_attempts=3, deadline=5, base_delay=0, max_delay=0)
+    api.session = _RatelimitedSession(int(time.time()) + 120)
+    api.timeout = 1
+    api.ws = type('WS', (), {'exit': lambda self: None})()
+
+    t0 = time.time()
+    with pytest.raises(Exception, match='deadline'):
+        api._curl_bitmex('/instrument', verb='GET', rethrow_errors=True)
+    assert time.time() - t0 < 2
+    assert api.session.sent == 1
+    assert api.retry_policy.stats()['failures'] == 1
@@ -48,6 +48,7 @@ from time import sleep
 from datetime import datetime
 from threading import Thread
 from stocklook.config import config, DATA_DIRECTORY
+from stocklook.utils.aggregate import ChunkedAggregator
 from stocklook.utils.database import (db_map_dict_to_alchemy_object,
                                       db_get_python_dtypes,
                                       db_describe_dict)
@@ -261,17 +262,26 @@ class CoinMCDatabase:
             table_obj = SQLCoinMCSnapshot
         return session.query(func.max(table_obj.last_updated)).first()
 
-    def get_snapshots_frame(self, coin_symbols=None):
+    def get_snapshots_frame(self, coin_symbols=None, chunksize=None):
         """
         Returns a pandas.DataFrame of SQLCoinMCSnapshot table data
         :param coin_symbols: (list, default None)
             An optional list of coin symbols to filter.
-        :return:
+        :param chunksize: (int, default None)
+            Returns an iterator of DataFrames with up to
+            chunksize rows each instead of a single DataFrame.
+        :return: (pandas.DataFrame, generator)
         """
         df = pd.read_sql("SELECT * FROM {}".format(
                           SQLCoinMCSnapshot.__tablename__),
                          self.engine,
-                         coerce_float=False, )
+                         coerce_float=False,
+                         chunksize=chunksize)
+        if chunksize:
+            if coin_symbols:
+                return (c.loc[c['symbol'].isin(coin_symbols), :] for c in df)
+            return df
+
         if coin_symbols:
             return df.loc[df['symbol'].isin(coin_symbols), :]
 
@@ -320,7 +330,7 @@ class CoinMCSyncThread(Thread):
             sleep(self.interval)
 
 
-def coinmc_report_on_snaps(df, to_path):
+def coinmc_report_on_snaps(df, to_path, max_workers=None):
     """
     Generates a report from coins stored in the database.
     The report contains the following:
@@ -338,11 +348,15 @@ def coinmc_report_on_snaps(df, to_path):
         _diff: newest - oldest value
         _pct_diff: percent change of _diff
 
-    :param df:
+    :param df: (pandas.DataFrame, iterable)
+        SQLCoinMCSnapshot data or an iterable of DataFrame chunks
+        (CoinMCDatabase.get_snapshots_frame(chunksize=...)) which
+        are aggregated without holding the whole table in memory.
     :param to_path:
+    :param max_workers: (int, default None)
+        Processes aggregating chunks in parallel.
     :return:
     """
-    coins, stats = list(), list()
     T = SQLCoinMCSnapshot
     m_cap = T.market_cap_usd.name
     rank = T.rank.name
@@ -350,42 +364,30 @@ def coinmc_report_on_snaps(df, to_path):
     symbol = T.symbol.name
     last_updated = T.last_updated.name
     stats_cols = [m_cap, rank, price]
-    df.sort_values(
-        [last_updated],
-        ascending=[True],
-        inplace=True)
-
-    # Make individual DataFrames for each coin
-    for s in df[symbol].unique():
-        coins.append(
-            df.loc[df[symbol].isin([s]), :])
 
-    # Reporting dataframe columns
-    stats_labels = [symbol, 'days']
-    [stats_labels.extend(
-        ['{}_first'.format(c),
-         '{}_last'.format(c),
-         '{}_diff'.format(c),
-         '{}_pct_diff'.format(c)])
-     for c in stats_cols]
+    # First (oldest) and last (newest) values of each coin.
+    aggs = dict()
+    for c in [last_updated] + stats_cols:
+        aggs[c + '_first'] = (c, 'first')
+        aggs[c + '_last'] = (c, 'last')
+    chunks = [df] if isinstance(df, pd.DataFrame) else df
+    agg = ChunkedAggregator(aggs, by=symbol, order_by=last_updated,
+                            max_workers=max_workers).run(chunks)
 
     # Calculate differences on each coin
-    for coin in coins:
-        first = coin.iloc[0]
-        last = coin.iloc[-1]
-        secs = last[last_updated] - first[last_updated]
-        days = round(secs/60/60/24, 2)
-        row = [first[symbol], days]
-
-        for c in stats_cols:
-            diff = round(last[c] - first[c],4)
-            pct_change = round(diff/first[c], 4)
-            row.extend((first[c], last[c], diff, pct_change))
-        stats.append(row)
+    secs = agg[last_updated + '_last'] - agg[last_updated + '_first']
+    df_stats = pd.DataFrame({symbol: agg[symbol],
+                             'days': (secs/60/60/24).round(2)})
+    for c in stats_cols:
+        first = agg[c + '_first']
+        last = agg[c + '_last']
+        diff = (last - first).round(4)
+        df_stats['{}_first'.format(c)] = first
+        df_stats['{}_last'.format(c)] = last
+        df_stats['{}_diff'.format(c)] = diff
+        df_stats['{}_pct_diff'.format(c)] = (diff/first).round(4)
 
     # Compose & export calculated stats
-    df_stats = pd.DataFrame(
-        data=stats, columns=stats_labels)
     df_stats.sort_values(
         [rank + '_diff'],
         ascending=[True],
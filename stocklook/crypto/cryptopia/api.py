@@ -12,6 +12,7 @@ import hashlib
 import base64
 import requests
 from stocklook.config import CRYPTOPIA_KEY, CRYPTOPIA_SECRET
+from stocklook.utils.api import DEFAULT_RETRY_POLICY
 from stocklook.utils.security import Credentials
 
 
@@ -81,7 +82,8 @@ class Cryptopia:
             url = "https://www.cryptopia.co.nz/Api/" + feature_requested + "/" + \
                   ('/'.join(i for i in get_parameters.values()
                            ) if get_parameters is not None else "")
-            req = requests.get(url, params=get_parameters)
+            req = DEFAULT_RETRY_POLICY.call(
+                lambda: requests.get(url, params=get_parameters), method='get')
             if req.status_code != 200:
                 try:
                     req.raise_for_status()
@@ -24,15 +24,19 @@ SOFTWARE.
 
 import pandas as pd
 import logging as lg
+from copy import deepcopy
 from warnings import warn
 import hmac, hashlib, time, requests, base64, json
 from requests.auth import AuthBase
 from stocklook.utils import rate_limited
 from stocklook.utils.api import call_api
+from stocklook.utils.cache import GLOBAL_RESPONSE_CACHE
 from stocklook.utils.security import Credentials
 from stocklook.config import config, GDAX_SECRET, GDAX_KEY, GDAX_PASSPHRASE
-from stocklook.utils.timetools import timestamp_to_iso8601, timestamp_from_utc, timeout_check
+from stocklook.utils.timetools import (timestamp_to_iso8601, timestamp_from_utc,
+                                       timestamp_to_utc_int, timeout_check)
 from .account import GdaxAccount
+from .candles import GdaxCandleCache
 from .product import GdaxProduct, GdaxProducts
 
 logger = lg.getLogger(__name__)
@@ -125,7 +129,17 @@ class Gdax:
             GDAX_PASSPHRASE: 'api_passphrase'
         })
 
-    def __init__(self, key=None, secret=None, passphrase=None, wallet_auth=None, coinbase_client=None):
+    # endpoint: seconds public responses are cached
+    CACHE_TTLS = {
+        'ticker': 1,
+        'stats': 30,
+        'products': 60*60,
+        'candles': 30,
+        'book': 1,
+    }
+
+    def __init__(self, key=None, secret=None, passphrase=None, wallet_auth=None, coinbase_client=None,
+                 cache=None):
         """
         The main interface to the Gdax Private API. Most of the API data
         gets broken down into other objects like GdaxAccount, GdaxProduct, GdaxDatabase,
@@ -153,6 +167,12 @@ class Gdax:
             None defaults to a gdax.api.CoinbaseExchangeAuth object.
         :param coinbase_client: (stocklook.crypto.coinbase_api.CoinbaseClient)
             An optionally pre-configured CoinbaseClient.
+
+        :param cache: (stocklook.utils.cache.ResponseCache, default None)
+            Caches public market data (ticker, stats, products, candles, level 1 book).
+            None defaults to stocklook.utils.cache.GLOBAL_RESPONSE_CACHE which
+            is shared by all Gdax objects. Gdax.CACHE_TTLS are registered
+            on the cache for any endpoint it doesn't already have a ttl for.
         """
         self.api_key = key
         self.api_secret = secret
@@ -173,6 +193,16 @@ class Gdax:
         self._coinbase_accounts = None
         self._db = None
 
+        if cache is None:
+            cache = GLOBAL_RESPONSE_CACHE
+        for endpoint, ttl in self.CACHE_TTLS.items():
+            cache.ttl_map.setdefault(endpoint, ttl)
+        self.cache = cache
+
+        # Replace with GdaxCandleCache(gdax, path=some_dir)
+        # to persist candles between sessions.
+        self.candle_cache = GdaxCandleCache(self)
+
         if not all([key, secret, passphrase]):
             self._set_credentials()
 
@@ -447,6 +477,26 @@ class Gdax:
         })
         return gdax_call_api(self.base_url + url_extension, **kwargs)
 
+    def get_cached(self, endpoint, url_extension, params=None):
+        """
+        Makes a GET request through Gdax.cache returning the response JSON.
+        Only use for idempotent public endpoints.
+        Error responses ({'message': ...}) aren't cached and a copy is
+        returned so callers can't alter the cached response.
+
+        :param endpoint: (str)
+            A key in Gdax.CACHE_TTLS (or the cache's ttl_map).
+        :param url_extension: (str)
+        :param params: (dict, default None)
+        :return:
+        """
+        p = tuple(sorted(params.items())) if params else None
+        key = (self.base_url, url_extension, p)
+        res = self.cache.get_or_call(
+            endpoint, key, lambda: self.get(url_extension, params=params).json(),
+            cacheable=lambda r: not (isinstance(r, dict) and 'message' in r))
+        return deepcopy(res)
+
     def get_current_user(self):
         """
         Returns dictionary of user information.
@@ -577,6 +627,8 @@ class Gdax:
         """
         ext = 'products/{}/book'.format(product)
         params = dict(level=level)
+        if level == 1:
+            return self.get_cached('book', ext, params=params)
         return self.get(ext, params=params).json()
 
     def get_ticker(self, product):
@@ -595,7 +647,7 @@ class Gdax:
         :return:
         """
         ext = 'products/{}/ticker'.format(product)
-        return self.get(ext).json()
+        return self.get_cached('ticker', ext)
 
     def get_trades(self, product):
         """
@@ -619,11 +671,15 @@ class Gdax:
         ext = 'products/{}/trades'.format(product)
         return self.get(ext).json()
 
-    def get_candles(self, product, start, end, granularity=60, convert_dates=False, to_frame=False):
+    def get_candles(self, product, start, end, granularity=60, convert_dates=False, to_frame=False,
+                    cache=True):
         """
         Historic rates for a product.
         Rates are returned in grouped buckets based on requested granularity.
 
+        Ranges with more buckets than the API returns per request
+        are split into pages that are requested concurrently and stitched together.
+
         PARAMETERS
         Param	         Description
         start	         Start time in ISO 8601
@@ -636,6 +692,11 @@ class Gdax:
         Historical rates should not be polled frequently.
         If you need real-time information, use the trade and book endpoints along with the websocket feed.
 
+        :param cache: (bool, default True)
+            True serves buckets from Gdax.candle_cache, only requesting
+            buckets newer than the cached tail (or older than the cached head).
+            False requests the whole range.
+
         :return:
         Each bucket is an array of the following information:
         time               bucket start time
@@ -647,6 +708,43 @@ class Gdax:
         """
         self._validate_product(product)
 
+        if cache:
+            res = self.candle_cache.get(product, start, end, granularity)
+        else:
+            res = self.candle_cache.request(product,
+                                            timestamp_to_utc_int(start),
+                                            timestamp_to_utc_int(end),
+                                            granularity)
+
+        if convert_dates:
+            # Don't alter the cached rows.
+            res = [list(row) for row in res]
+            for row in res:
+                row[0] = timestamp_from_utc(row[0])
+
+        if to_frame:
+            columns = ['time', 'low', 'high', 'open', 'close', 'volume']
+            res = pd.DataFrame(columns=columns, data=res, index=range(len(res)))
+
+        return res
+
+    def request_candles(self, product, start, end, granularity=60):
+        """
+        Makes a single request to the candles endpoint.
+        Most users should call Gdax.get_candles instead.
+
+        :param product: (str)
+        :param start: (int, datetime, str) UTC int or ISO 8601
+        :param end: (int, datetime, str) UTC int or ISO 8601
+        :param granularity: (int)
+        :return: (list) of [time, low, high, open, close, volume]
+        """
+        if isinstance(start, (int, float)):
+            start = timestamp_from_utc(start)
+
+        if isinstance(end, (int, float)):
+            end = timestamp_from_utc(end)
+
         if not isinstance(start, str):
             start = timestamp_to_iso8601(start)
 
@@ -658,17 +756,7 @@ class Gdax:
                       end=end,
                       granularity=granularity)
 
-        res = self.get(ext, params=params).json()
-
-        if convert_dates:
-            for row in res:
-                row[0] = timestamp_from_utc(row[0])
-
-        if to_frame:
-            columns = ['time', 'low', 'high', 'open', 'close', 'volume']
-            res = pd.DataFrame(columns=columns, data=res, index=range(len(res)))
-
-        return res
+        return self.get_cached('candles', ext, params=params)
 
     def get_24hr_stats(self, product):
         """
@@ -683,7 +771,23 @@ class Gdax:
         """
         self._validate_product(product)
         ext = 'products/{}/stats'.format(product)
-        return self.get(ext).json()
+        return self.get_cached('stats', ext)
+
+    def get_products(self):
+        """
+        Returns a list of dictionaries describing
+        each product available for trading.
+        [{
+            "id": "BTC-USD",
+            "base_currency": "BTC",
+            "quote_currency": "USD",
+            "base_min_size": "0.01",
+            "base_max_size": "10000.00",
+            "quote_increment": "0.01"
+        }]
+        :return:
+        """
+        return self.get_cached('products', 'products')
 
     def get_position(self):
         """
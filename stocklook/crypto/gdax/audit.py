@@ -0,0 +1,333 @@
+"""
+MIT License
+
+Copyright (c) 2017 Zeke Barge
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import numpy as np
+import logging as lg
+from datetime import datetime
+from sqlalchemy import and_, or_, select, func, literal, union_all
+from stocklook.utils.database import db_bulk_upsert, db_supports_window_functions
+from .tables import (GdaxSQLFeedEntry, GdaxSQLOrderChange,
+                     GdaxAuditWatermark, GdaxSequenceGap)
+
+logger = lg.getLogger(__name__)
+
+
+def find_sequence_anomalies(seqs, prev=None):
+    """
+    Finds missing ranges and duplicates in sorted sequences.
+
+    :param seqs: (numpy.ndarray, list)
+        Sequences sorted ascending.
+    :param prev: (int, default None)
+        The sequence before seqs[0] (ie the last one of the
+        previous chunk) so gaps/duplicates across chunks are found.
+    :return: (tuple)
+        ([(start, end), ...] missing ranges both inclusive,
+         numpy.ndarray of duplicated sequences, one entry per extra row)
+    """
+    seqs = np.asarray(seqs, dtype=np.int64)
+    if prev is not None:
+        seqs = np.concatenate(([prev], seqs))
+    if seqs.size < 2:
+        return [], np.empty(0, dtype=np.int64)
+
+    d = np.diff(seqs)
+    gap = d > 1
+    starts = seqs[:-1][gap] + 1
+    ends = seqs[1:][gap] - 1
+    dups = seqs[1:][d == 0]
+    return list(zip(starts.tolist(), ends.tolist())), dups
+
+
+class GdaxSequenceAuditor:
+    """
+    Verifies the stored sequence stream of the feed tables is complete.
+
+    The full channel's sequence stream is split across tables
+    (ie 'change' messages go to gdax_changes and the rest to gdax_feed)
+    so the union of every table's (product_id, sequence) is audited as one stream.
+
+    Each product's rows are scanned in (sequence, row key) order starting
+    at a watermark saved by the previous audit, so a nightly audit only
+    examines new rows. Scanning is done either:
+        - by the database with LEAD() OVER (...), returning only
+          the anomalies, or
+        - in keyset-paginated chunks diffed with NumPy.
+    Memory is bounded by :param chunksize plus the anomalies found.
+
+    Missing ranges are saved to gdax_sequence_gaps and rechecked on
+    every audit so gaps filled later (ie by a spool replay) are closed.
+
+    .. note::
+        Message types that aren't stored at all (ie 'activate')
+        are reported as missing sequences.
+    """
+    def __init__(self, db, sql_tables=(GdaxSQLFeedEntry, GdaxSQLOrderChange),
+                 chunksize=100000, use_sql=None):
+        """
+        :param db: (stocklook.crypto.gdax.db.GdaxDatabase)
+            Rows are read through GdaxDatabase.read_engine and
+            watermarks/gaps written through GdaxDatabase.engine.
+        :param sql_tables: (list, default (GdaxSQLFeedEntry, GdaxSQLOrderChange))
+            declarative_base objects (or a single one) with product_id and
+            sequence columns that together hold a gapless channel (ie 'full').
+        :param chunksize: (int, default 100000)
+            Rows per chunk when scanning with NumPy.
+        :param use_sql: (bool, default None)
+            None uses window functions when the database supports them.
+        """
+        if use_sql is None:
+            use_sql = db_supports_window_functions(db.read_engine)
+        if not isinstance(sql_tables, (list, tuple)):
+            sql_tables = [sql_tables]
+        self.db = db
+        self.tables = [t.__table__ for t in sql_tables]
+        self.chunksize = chunksize
+        self.use_sql = use_sql
+
+    @property
+    def name(self):
+        return '+'.join(t.name for t in self.tables)
+
+    def _rows(self, product):
+        """
+        Returns a subquery of (sequence, row_id) over every table for a product.
+        row_id is the table's primary key interleaved with the
+        table's position so it is unique across tables.
+        """
+        n = len(self.tables)
+        parts = list()
+        for i, t in enumerate(self.tables):
+            pk = list(t.primary_key.columns)[0]
+            row_id = pk * n + i if n > 1 else pk
+            parts.append(select([t.c.sequence.label('sequence'), row_id.label('row_id')])
+                         .where(and_(t.c.product_id == product, t.c.sequence.isnot(None))))
+        if n == 1:
+            return parts[0].alias('u')
+        return union_all(*parts).alias('u')
+
+    def get_products(self):
+        products = set()
+        with self.db.read_engine.connect() as conn:
+            for t in self.tables:
+                rows = conn.execute(select([t.c.product_id]).distinct()
+                                    .where(t.c.product_id.isnot(None))).fetchall()
+                products.update(r[0] for r in rows)
+        return sorted(products)
+
+    def get_watermark(self, product):
+        """
+        :return: (tuple) (sequence, row_id) or (None, None)
+        """
+        w = GdaxAuditWatermark.__table__
+        qry = select([w.c.sequence, w.c.row_id]).where(and_(
+            w.c.table_name == self.name, w.c.product_id == product))
+        with self.db.engine.connect() as conn:
+            row = conn.execute(qry).fetchone()
+        return (row[0], row[1]) if row else (None, None)
+
+    def get_open_gaps(self, product):
+        g = GdaxSequenceGap.__table__
+        qry = select([g.c.start_sequence, g.c.end_sequence]).where(and_(
+            g.c.table_name == self.name, g.c.product_id == product))\
+            .order_by(g.c.start_sequence)
+        with self.db.engine.connect() as conn:
+            return [(r[0], r[1]) for r in conn.execute(qry)]
+
+    @staticmethod
+    def _after(u, seq, row_id):
+        return or_(u.c.sequence > seq,
+                   and_(u.c.sequence == seq, u.c.row_id > row_id))
+
+    def scan_chunks(self, product, after=None, until=None):
+        """
+        Diffs sequences chunk by chunk with NumPy.
+
+        :param after: (tuple, default None)
+            (sequence, row_id) to start after.
+        :param until: (int, default None)
+            Last sequence (inclusive) to scan.
+        :return: (tuple)
+            (missing ranges, {sequence: extra rows}, rows scanned, (sequence, row_id) of the last row)
+        """
+        u = self._rows(product)
+        seq_col = u.c.sequence
+        missing, dups = list(), dict()
+        prev = after[0] if after else None
+        last = after
+        count = 0
+
+        with self.db.read_engine.connect() as conn:
+            while True:
+                crit = list()
+                if last is not None:
+                    crit.append(self._after(u, *last))
+                if until is not None:
+                    crit.append(seq_col <= until)
+                qry = select([seq_col, u.c.row_id])
+                if crit:
+                    qry = qry.where(and_(*crit))
+                qry = qry.order_by(seq_col, u.c.row_id).limit(self.chunksize)
+                rows = conn.execute(qry).fetchall()
+                if not rows:
+                    break
+                arr = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+                gaps, dup = find_sequence_anomalies(arr, prev)
+                missing.extend(gaps)
+                for s in dup.tolist():
+                    dups[s] = dups.get(s, 0) + 1
+                count += len(rows)
+                prev = int(arr[-1])
+                last = (prev, rows[-1][1])
+                if len(rows) < self.chunksize:
+                    break
+
+        return missing, dups, count, last
+
+    def scan_sql(self, product, after=None):
+        """
+        Lets the database compare each sequence to the next
+        one with LEAD() and return only the anomalies.
+        Same return value as GdaxSequenceAuditor.scan_chunks.
+        """
+        u = self._rows(product)
+        seq_col = u.c.sequence
+        crit = self._after(u, *after) if after is not None else literal(True)
+
+        nxt = func.lead(seq_col).over(order_by=(seq_col, u.c.row_id)).label('next_sequence')
+        sub = select([seq_col.label('sequence'), nxt]).where(crit).alias('s')
+        qry = select([sub.c.sequence, sub.c.next_sequence])\
+            .where(sub.c.next_sequence - sub.c.sequence != 1)\
+            .order_by(sub.c.sequence)
+        first_qry = select([func.min(seq_col), func.count()]).where(crit)
+        last_qry = select([seq_col, u.c.row_id]).where(crit)\
+            .order_by(seq_col.desc(), u.c.row_id.desc()).limit(1)
+
+        missing, dups = list(), dict()
+        with self.db.read_engine.connect() as conn:
+            first, count = conn.execute(first_qry).fetchone()
+            if first is None:
+                return missing, dups, 0, after
+            if after is not None:
+                # The watermark row may have been deleted (retention)
+                # so the boundary is checked against its sequence.
+                missing, dup = find_sequence_anomalies([first], after[0])
+                for s in dup.tolist():
+                    dups[s] = dups.get(s, 0) + 1
+            for s, n in conn.execute(qry):
+                if n == s:
+                    dups[n] = dups.get(n, 0) + 1
+                else:
+                    missing.append((s + 1, n - 1))
+            last = conn.execute(last_qry).fetchone()
+
+        return missing, dups, count, (last[0], last[1])
+
+    def recheck_gaps(self, product):
+        """
+        Rescans every open gap of a product, replacing
+        it with whatever part of it is still missing.
+        :return: (list) the open gaps.
+        """
+        still = list()
+        for a, b in self.get_open_gaps(product):
+            missing, _, _, last = self.scan_chunks(product, after=(a - 1, -1), until=b)
+            last_seq = last[0] if last else a - 1
+            if last_seq < b:
+                missing.append((last_seq + 1, b))
+            still.extend(missing)
+        self.save_gaps(product, still, replace=True)
+        return still
+
+    def save_gaps(self, product, gaps, replace=False):
+        g = GdaxSequenceGap.__table__
+        with self.db.engine.begin() as conn:
+            if replace:
+                conn.execute(g.delete().where(and_(g.c.table_name == self.name,
+                                                   g.c.product_id == product)))
+            if gaps:
+                conn.execute(g.insert(), [{'table_name': self.name, 'product_id': product,
+                                           'start_sequence': a, 'end_sequence': b,
+                                           'date_found': datetime.now()}
+                                          for a, b in gaps])
+
+    def save_watermark(self, product, last, rows):
+        w = GdaxAuditWatermark.__table__
+        db_bulk_upsert(self.db.engine, w,
+                       [{'table_name': self.name, 'product_id': product,
+                         'sequence': last[0], 'row_id': last[1],
+                         'rows_checked': rows, 'date_updated': datetime.now()}],
+                       ['table_name', 'product_id'], update=True)
+
+    def audit_product(self, product, full=False):
+        """
+        Audits a product's rows added since the watermark.
+
+        :param product: (str)
+        :param full: (bool, default False)
+            True ignores the watermark and open gaps and rescans every row.
+        :return: (dict)
+            {'product_id', 'rows', 'from_sequence', 'to_sequence',
+             'missing': [(start, end), ...], 'missing_count',
+             'duplicates': {sequence: extra rows}, 'open_gaps': [(start, end), ...]}
+        """
+        if full:
+            after = None
+            self.save_gaps(product, [], replace=True)
+        else:
+            after = self.get_watermark(product)
+            if after[0] is None:
+                after = None
+            self.recheck_gaps(product)
+
+        if self.use_sql:
+            missing, dups, rows, last = self.scan_sql(product, after)
+        else:
+            missing, dups, rows, last = self.scan_chunks(product, after)
+
+        self.save_gaps(product, missing)
+        if last is not None:
+            self.save_watermark(product, last, rows)
+
+        report = {'product_id': product,
+                  'rows': rows,
+                  'from_sequence': after[0] if after else None,
+                  'to_sequence': last[0] if last else None,
+                  'missing': missing,
+                  'missing_count': sum(b - a + 1 for a, b in missing),
+                  'duplicates': dups,
+                  'open_gaps': self.get_open_gaps(product)}
+        if missing or dups:
+            logger.warning("{} {}: {} missing sequences in {} ranges, {} duplicates.".format(
+                self.name, product, report['missing_count'], len(missing),
+                sum(dups.values())))
+        return report
+
+    def audit(self, products=None, full=False):
+        """
+        Audits every product (or :param products).
+        :return: (dict) {product_id: report}
+        """
+        if products is None:
+            products = self.get_products()
+        return {p: self.audit_product(p, full=full) for p in products}
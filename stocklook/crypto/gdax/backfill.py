@@ -0,0 +1,470 @@
+"""
+MIT License
+
+Copyright (c) 2017 Zeke Barge
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import os
+import json
+import numpy as np
+import logging as lg
+from time import time
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from stocklook.utils.database import db_bulk_upsert
+from stocklook.utils.timetools import timestamp_from_utc, timestamp_to_utc_int
+
+logger = lg.getLogger(__name__)
+
+
+def get_missing_ranges(existing_times, start, end, granularity):
+    """
+    Compares the bucket times expected between start and end
+    against existing bucket times returning ranges of missing buckets.
+
+    :param existing_times: (iterable of int)
+        UTC bucket times already stored.
+    :param start: (int)
+        UTC start time, rounded down to the granularity.
+    :param end: (int)
+        UTC end time (exclusive).
+    :param granularity: (int)
+        Bucket size in seconds.
+    :return: (list)
+        [(start, end), (start, end)] UTC bucket times, both inclusive.
+    """
+    start = int(start) - int(start) % granularity
+    expected = np.arange(start, int(end), granularity, dtype=np.int64)
+    if not expected.size:
+        return []
+
+    existing = np.fromiter(existing_times, dtype=np.int64)
+    missing = expected[~np.isin(expected, existing)]
+    if not missing.size:
+        return []
+
+    # Split wherever consecutive missing buckets are more than one bucket apart.
+    breaks = np.flatnonzero(np.diff(missing) != granularity)
+    starts = np.concatenate(([missing[0]], missing[breaks + 1]))
+    ends = np.concatenate((missing[breaks], [missing[-1]]))
+    return [(int(s), int(e)) for s, e in zip(starts, ends)]
+
+
+def get_edge_ranges(first, last, granularity, start=None, end=None):
+    """
+    Returns the missing ranges before the first and after
+    the last stored bucket within start and end.
+
+    :param first: (int, None)
+        The first stored UTC bucket time, None when nothing is stored.
+    :param last: (int, None)
+        The last stored UTC bucket time.
+    :param start: (int, default None)
+        UTC start time, rounded down to the granularity.
+    :param end: (int, default None)
+        UTC end time (exclusive).
+    :return: (list)
+        [(start, end), (start, end)] UTC bucket times, both inclusive.
+    """
+    if start is not None:
+        start = int(start) - int(start) % granularity
+    if end is not None:
+        end = int(end) - 1
+        end -= end % granularity
+
+    if first is None:
+        if start is None or end is None or start > end:
+            return []
+        return [(start, end)]
+
+    ranges = list()
+    if start is not None and start < first:
+        ranges.append((start, int(first) - granularity))
+    if end is not None and int(last) + granularity <= end:
+        ranges.append((int(last) + granularity, end))
+    return ranges
+
+
+def get_gap_ranges(times, granularity, start=None, end=None):
+    """
+    Finds missing bucket ranges from stored bucket times alone:
+    consecutive times more than one bucket apart mark a gap.
+    Unlike get_missing_ranges no array of expected buckets is built
+    so the cost only depends on the number of stored rows.
+
+    :param times: (iterable of int)
+        UTC bucket times already stored (any order, duplicates allowed).
+    :param granularity: (int)
+        Bucket size in seconds.
+    :param start: (int, default None)
+        UTC start time. None starts at the first stored bucket.
+    :param end: (int, default None)
+        UTC end time (exclusive). None ends at the last stored bucket.
+    :return: (list)
+        [(start, end), (start, end)] UTC bucket times, both inclusive.
+    """
+    # Duplicates give diffs of 0 so a plain sort is enough.
+    t = np.sort(np.asarray(times, dtype=np.int64))
+    if start is not None:
+        t = t[t >= int(start) - int(start) % granularity]
+    if end is not None:
+        t = t[t < int(end)]
+
+    if not t.size:
+        return get_edge_ranges(None, None, granularity, start, end)
+
+    idx = np.flatnonzero(np.diff(t) > granularity)
+    gaps = list(zip((t[idx] + granularity).tolist(),
+                    (t[idx + 1] - granularity).tolist()))
+
+    edges = get_edge_ranges(t[0], t[-1], granularity, start, end)
+    leading = [r for r in edges if r[1] < t[0]]
+    trailing = [r for r in edges if r[0] > t[-1]]
+    return leading + gaps + trailing
+
+
+def split_ranges(ranges, granularity, max_buckets):
+    """
+    Splits (start, end) ranges into windows that
+    contain no more than :param max_buckets buckets each.
+    :return: (list)
+        [(start, end), (start, end)] UTC times, both inclusive.
+    """
+    span = granularity * max_buckets
+    windows = list()
+    for start, end in ranges:
+        while start <= end:
+            w_end = min(end, start + span - granularity)
+            windows.append((start, w_end))
+            start = w_end + granularity
+    return windows
+
+
+def subtract_ranges(ranges, exclude, granularity):
+    """
+    Removes the buckets of :param exclude from :param ranges.
+
+    :param ranges: (list)
+        [(start, end), (start, end)] UTC bucket times, both inclusive.
+    :param exclude: (list)
+        [(start, end), (start, end)] UTC bucket times, both inclusive.
+    :return: (list)
+        [(start, end), (start, end)] UTC bucket times, both inclusive.
+    """
+    exclude = sorted(exclude)
+    out = list()
+    for start, end in ranges:
+        for ex_start, ex_end in exclude:
+            if ex_end < start or ex_start > end:
+                continue
+            if ex_start > start:
+                out.append((start, ex_start - granularity))
+            start = max(start, ex_end + granularity)
+            if start > end:
+                break
+        if start <= end:
+            out.append((start, end))
+    return out
+
+
+class OHLCBucketIndex:
+    """
+    A sorted NumPy array of the UTC bucket times stored for one
+    product and granularity. Membership and "what's missing" checks
+    run in memory (binary search/array diffs) so callers don't
+    need a database round trip per window.
+
+    Example:
+        idx = OHLCBucketIndex(300, stored_times)
+        df = df.loc[~idx.contains(df['time'].values), :]
+        idx.add(df['time'].values)
+    """
+    def __init__(self, granularity, times=None):
+        self.granularity = granularity
+        self.times = np.empty(0, dtype=np.int64)
+        self._lock = Lock()
+        if times is not None:
+            self.load(times)
+
+    def __len__(self):
+        return self.times.size
+
+    def load(self, times):
+        """
+        Replaces the index with :param times (any order, duplicates allowed).
+        """
+        t = np.sort(np.asarray(times, dtype=np.int64))
+        if t.size:
+            t = t[np.concatenate(([True], np.diff(t) != 0))]
+        with self._lock:
+            self.times = t
+
+    def contains(self, times):
+        """
+        :param times: (iterable of int)
+        :return: (numpy.ndarray) boolean mask, True where the time is stored.
+        """
+        q = np.asarray(times, dtype=np.int64)
+        t = self.times
+        if not t.size or not q.size:
+            return np.zeros(q.shape, dtype=bool)
+        pos = np.searchsorted(t, q).clip(0, t.size - 1)
+        return t[pos] == q
+
+    def add(self, times):
+        """
+        Inserts :param times keeping the array sorted and unique.
+        :return: (int) the number of new buckets.
+        """
+        new = np.sort(np.asarray(times, dtype=np.int64))
+        with self._lock:
+            new = new[~self.contains(new)]
+            if new.size:
+                new = new[np.concatenate(([True], np.diff(new) != 0))]
+                pos = np.searchsorted(self.times, new)
+                self.times = np.insert(self.times, pos, new)
+        return int(new.size)
+
+    def missing_ranges(self, start=None, end=None):
+        """
+        See get_gap_ranges.
+        :return: (list)
+            [(start, end), (start, end)] UTC bucket times, both inclusive.
+        """
+        return get_gap_ranges(self.times, self.granularity, start, end)
+
+
+class GdaxOHLCBackfiller:
+    """
+    Fills missing OHLC buckets for a GdaxOHLCViewer.
+
+    1) Uses the viewer's OHLCBucketIndex (loaded with one query).
+    2) Splits missing ranges into windows the candles endpoint can return in one call.
+    3) Fetches windows concurrently (the Gdax rate limit is shared by all threads).
+    4) Drops buckets that already exist and inserts the rest in bulk.
+    5) Records each finished window in a checkpoint file so an
+       interrupted run skips them when restarted. The checkpoint is
+       stamped with the pair, granularity and range it was made for and
+       ignored when they don't match.
+    6) Remembers windows the API returned no candles for (no trades)
+       so later runs don't request them again.
+
+    Example:
+        v = GdaxOHLCViewer('ETH-USD')
+        b = GdaxOHLCBackfiller(v)
+        b.run(now_minus(months=6), now())
+    """
+    # The candles endpoint returns at most this many buckets per request.
+    MAX_BUCKETS = 300
+
+    def __init__(self, viewer, max_workers=3, checkpoint_path=None):
+        """
+        :param viewer: (stocklook.crypto.gdax.db.GdaxOHLCViewer)
+            A viewer with a pair set.
+
+        :param max_workers: (int, default 3)
+            The number of threads requesting candles at once.
+
+        :param checkpoint_path: (str, default None)
+            None defaults to gdax_backfill_<pair>_<granularity>.json
+            in the stocklook.config.config['DATA_DIRECTORY'] folder.
+        """
+        if viewer.pair is None:
+            raise ValueError("GdaxOHLCViewer.set_pair must be called before backfilling.")
+
+        if checkpoint_path is None:
+            from stocklook.config import config, DATA_DIRECTORY
+            n = 'gdax_backfill_{}_{}.json'.format(viewer.pair, viewer.GRANULARITY)
+            checkpoint_path = os.path.join(config[DATA_DIRECTORY], n)
+
+        self.viewer = viewer
+        self.max_workers = max_workers
+        self.checkpoint_path = checkpoint_path
+        self.granularity = viewer.GRANULARITY
+        self._done = set()
+        self._empty = list()
+        self._lock = Lock()
+
+    @property
+    def existing(self):
+        """
+        The viewer's OHLCBucketIndex of stored bucket times.
+        """
+        return self.viewer.bucket_index
+
+    def load_checkpoint(self, start=None, end=None):
+        """
+        Loads finished (start, end) windows from the checkpoint
+        file into GdaxOHLCBackfiller._done and empty windows
+        into GdaxOHLCBackfiller._empty.
+
+        :param start: (int, default None)
+        :param end: (int, default None)
+            The range being backfilled. Only finished windows overlapping
+            it are loaded so a resumed run whose end moved on (ie it
+            defaults to now) still skips them.
+        """
+        self._done = set()
+        self._empty = list()
+        try:
+            with open(self.checkpoint_path, 'r') as fh:
+                data = json.load(fh)
+        except (IOError, ValueError):
+            return self._done
+
+        if data.get('pair') != self.viewer.pair \
+                or data.get('granularity') != self.granularity:
+            logger.warning("Ignoring checkpoint {} made for {} {}.".format(
+                self.checkpoint_path, data.get('pair'), data.get('granularity')))
+            return self._done
+
+        self._empty = [tuple(w) for w in data.get('empty', list())]
+        for w in data.get('done', list()):
+            if not isinstance(w, list):
+                # Window start times only, from an older checkpoint.
+                continue
+            if (start is None or w[1] >= start) and (end is None or w[0] <= end):
+                self._done.add(tuple(w))
+        return self._done
+
+    def save_checkpoint(self):
+        data = dict(pair=self.viewer.pair,
+                    granularity=self.granularity,
+                    done=sorted(self._done),
+                    empty=sorted(self._empty))
+        tmp = self.checkpoint_path + '.tmp'
+        with open(tmp, 'w') as fh:
+            json.dump(data, fh)
+        os.replace(tmp, self.checkpoint_path)
+
+    def clear_checkpoint(self, keep_empty=False):
+        """
+        Forgets finished windows, removing the checkpoint file
+        unless :param keep_empty and empty windows are recorded.
+        """
+        self._done = set()
+        if keep_empty and self._empty:
+            return self.save_checkpoint()
+        self._empty = list()
+        if os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+    def get_windows(self, start, end):
+        """
+        Returns windows covering buckets missing between start and end
+        less any windows already finished or known to be empty
+        according to the checkpoint.
+        """
+        start = timestamp_to_utc_int(start)
+        end = timestamp_to_utc_int(end)
+        ranges = self.existing.missing_ranges(start, end)
+        ranges = subtract_ranges(ranges, self._empty + list(self._done),
+                                 self.granularity)
+        return split_ranges(ranges, self.granularity, self.MAX_BUCKETS)
+
+    def fetch(self, window):
+        """
+        Requests candles for a (start, end) window.
+        :return: (list) of [time, low, high, open, close, volume]
+        """
+        start, end = window
+        return self.viewer.gdax.get_candles(self.viewer.pair,
+                                            timestamp_from_utc(start),
+                                            timestamp_from_utc(end),
+                                            self.granularity,
+                                            cache=False)
+
+    def insert(self, candles):
+        """
+        Inserts candles missing from GdaxOHLCBackfiller.existing
+        returning the number of rows inserted.
+        """
+        obj = self.viewer.obj
+        stock_id = self.viewer.stock_id
+        rows = dict()
+        for t, low, high, op, close, volume in candles:
+            rows[int(t)] = {'stock_id': stock_id, 'time': int(t),
+                            'low': low, 'high': high, 'open': op,
+                            'close': close, 'volume': volume}
+        if not rows:
+            return 0
+
+        times = np.fromiter(rows.keys(), dtype=np.int64)
+        new = times[~self.existing.contains(times)]
+        if not new.size:
+            return 0
+
+        # Another writer may have stored some of these buckets since
+        # the index was loaded: let the database skip them.
+        db_bulk_upsert(self.viewer.db._engine, obj.__table__,
+                       [rows[t] for t in new.tolist()],
+                       [obj.stock_id.name, obj.time.name])
+        self.viewer.on_buckets_added(new)
+        return int(new.size)
+
+    def run(self, start, end, resume=True):
+        """
+        Backfills buckets missing between start and end.
+
+        :param start: (int, datetime, str)
+        :param end: (int, datetime, str)
+        :param resume: (bool, default True)
+            True skips windows recorded in the checkpoint file.
+            False starts over.
+        :return: (int) the number of rows inserted.
+        """
+        start = timestamp_to_utc_int(start)
+        end = timestamp_to_utc_int(end)
+        if resume:
+            self.load_checkpoint(start, end)
+        else:
+            self.clear_checkpoint()
+
+        windows = self.get_windows(start, end)
+        logger.info("{}: backfilling {} windows with "
+                    "{} workers.".format(self.viewer.pair, len(windows), self.max_workers))
+        total, failed, t0 = 0, 0, time()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {pool.submit(self.fetch, w): w for w in windows}
+            for f in as_completed(futures):
+                w = futures[f]
+                try:
+                    candles = f.result()
+                except Exception as e:
+                    # Leave it out of the checkpoint so it's retried next run.
+                    logger.error("{}: failed window {}: {}".format(self.viewer.pair, w, e))
+                    failed += 1
+                    continue
+
+                total += self.insert(candles)
+                with self._lock:
+                    self._done.add(tuple(w))
+                    # Windows ending before the current bucket never get candles later.
+                    if not candles and w[1] + self.granularity * 2 <= time():
+                        self._empty.append(w)
+                    self.save_checkpoint()
+
+        if not failed:
+            self.clear_checkpoint(keep_empty=True)
+
+        logger.info("{}: backfill added {} records in "
+                    "{:.1f}s.".format(self.viewer.pair, total, time() - t0))
+        return total
@@ -0,0 +1,410 @@
+"""
+MIT License
+
+Copyright (c) 2017 Zeke Barge
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import json
+import zlib
+import logging as lg
+from datetime import datetime, timedelta
+from pandas import Timestamp, concat
+from sqlalchemy import and_, select
+from stocklook.utils.database import db_read_frame
+from .tables import GdaxSQLFeedEntry, GdaxSQLOrderChange, GdaxBookCheckpoint
+
+logger = lg.getLogger(__name__)
+
+# Columns of gdax_feed/gdax_changes needed to apply messages to a book.
+BOOK_FEED_COLUMNS = ('sequence', 'time', 'type', 'order_id', 'side', 'price',
+                     'size', 'remaining_size', 'maker_order_id')
+BOOK_CHANGE_COLUMNS = ('sequence', 'time', 'type', 'order_id', 'side', 'price', 'new_size')
+
+
+def _num(value):
+    """
+    Returns a float or None for missing values (None/NaN/'').
+    """
+    if value is None or value == '':
+        return None
+    value = float(value)
+    return None if value != value else value
+
+
+def pack_book(product_id, sequence, orders):
+    """
+    Serializes a level 3 book into zlib compressed JSON columns.
+    Shared by book checkpoints in the database (GdaxBookState)
+    and on disk (stocklook.crypto.gdax.feeds.book_feed.GdaxBookFeed).
+
+    :param product_id: (str)
+    :param sequence: (int)
+    :param orders: (iterable)
+        (order_id, side, price, size) tuples in time priority order.
+    :return: (bytes)
+    """
+    ids, sides, prices, sizes = list(), list(), list(), list()
+    for order_id, side, price, size in orders:
+        ids.append(order_id)
+        sides.append('b' if side == 'buy' else 's')
+        prices.append(price)
+        sizes.append(size)
+    d = {'product_id': product_id,
+         'sequence': sequence,
+         'ids': ids,
+         'sides': ''.join(sides),
+         'prices': prices,
+         'sizes': sizes}
+    return zlib.compress(json.dumps(d, separators=(',', ':')).encode('utf-8'))
+
+
+def unpack_book(data):
+    """
+    Reverses pack_book.
+    :return: (tuple)
+        (product_id, sequence, [(order_id, side, price, size), ...])
+    """
+    d = json.loads(zlib.decompress(data).decode('utf-8'))
+    orders = [(i, 'buy' if s == 'b' else 'sell', p, z)
+              for i, s, p, z in zip(d['ids'], d['sides'], d['prices'], d['sizes'])]
+    return d['product_id'], d['sequence'], orders
+
+
+class GdaxBookState:
+    """
+    Level 3 order book state for one product built from a REST
+    snapshot and full channel messages (open/done/match/change).
+
+    Orders are kept in one dict keyed by order id. Dicts keep insertion
+    order so sorting by price (a stable sort) preserves time priority
+    within a price level. Applying a message is O(1) which is what
+    replaying hours of feed needs. Sorting only happens when
+    the book is read with GdaxBookState.get_current_book.
+    """
+    def __init__(self, product_id=None, sequence=-1):
+        self.product_id = product_id
+        self.sequence = sequence
+        # order_id: [side, price, size]
+        self.orders = dict()
+        self.missing = 0
+
+    def __len__(self):
+        return len(self.orders)
+
+    def load_snapshot(self, res):
+        """
+        Loads a level 3 book as returned by Gdax.get_book(product, level=3):
+            {'sequence': 3, 'bids': [[price, size, order_id], ...], 'asks': [...]}
+        """
+        self.orders = dict()
+        for side, key in (('buy', 'bids'), ('sell', 'asks')):
+            for price, size, order_id in res[key]:
+                self.orders[order_id] = [side, float(price), float(size)]
+        self.sequence = int(res['sequence'])
+        self.missing = 0
+
+    def apply(self, msg):
+        """
+        Applies a full channel message.
+        Messages at or below GdaxBookState.sequence are ignored,
+        skipped sequences are added to GdaxBookState.missing.
+
+        :param msg: (dict)
+        :return: (bool) True if the message was newer than the book.
+        """
+        sequence = int(msg['sequence'])
+        if sequence <= self.sequence:
+            return False
+        if self.sequence >= 0 and sequence > self.sequence + 1:
+            self.missing += sequence - self.sequence - 1
+
+        msg_type = msg['type']
+        if msg_type == 'open':
+            self.add(msg)
+        elif msg_type == 'done':
+            self.orders.pop(msg.get('order_id', None), None)
+        elif msg_type == 'match':
+            self.match(msg)
+        elif msg_type == 'change':
+            self.change(msg)
+
+        self.sequence = sequence
+        return True
+
+    def add(self, msg):
+        price = _num(msg.get('price', None))
+        size = _num(msg.get('remaining_size', None))
+        if size is None:
+            size = _num(msg.get('size', None))
+        order_id = msg.get('order_id', None) or msg.get('id', None)
+        if price is None or size is None or not order_id:
+            return
+        self.orders[order_id] = [msg['side'], price, size]
+
+    def match(self, msg):
+        order = self.orders.get(msg.get('maker_order_id', None), None)
+        size = _num(msg.get('size', None))
+        if order is None or size is None:
+            return
+        order[2] -= size
+        if order[2] <= 1e-12:
+            del self.orders[msg['maker_order_id']]
+
+    def change(self, msg):
+        order = self.orders.get(msg.get('order_id', None), None)
+        new_size = _num(msg.get('new_size', None))
+        if order is not None and new_size is not None:
+            order[2] = new_size
+
+    def get_current_book(self):
+        """
+        :return: (dict)
+            {'sequence': int,
+             'bids': [[price, size, order_id], ...] best (highest) first,
+             'asks': [[price, size, order_id], ...] best (lowest) first}
+        """
+        bids, asks = list(), list()
+        for order_id, (side, price, size) in self.orders.items():
+            (bids if side == 'buy' else asks).append([price, size, order_id])
+        bids.sort(key=lambda o: -o[0])
+        asks.sort(key=lambda o: o[0])
+        return {'sequence': self.sequence, 'bids': bids, 'asks': asks}
+
+    def get_bid(self):
+        return max((o[1] for o in self.orders.values() if o[0] == 'buy'), default=None)
+
+    def get_ask(self):
+        return min((o[1] for o in self.orders.values() if o[0] == 'sell'), default=None)
+
+    def to_bytes(self):
+        """
+        Serializes the book with pack_book.
+        """
+        orders = ((i, v[0], v[1], v[2]) for i, v in self.orders.items())
+        return pack_book(self.product_id, self.sequence, orders)
+
+    @classmethod
+    def from_bytes(cls, data):
+        product_id, sequence, orders = unpack_book(data)
+        book = cls(product_id, sequence)
+        book.orders = {i: [side, p, z] for i, side, p, z in orders}
+        return book
+
+
+class GdaxBookHistory:
+    """
+    Rebuilds the order book of a product at any point in time
+    from gdax_feed/gdax_changes and periodic checkpoints.
+
+    Checkpoints are sequence-stamped compressed books stored in
+    gdax_book_checkpoints. The first one comes from the REST level 3
+    book (GdaxBookHistory.snapshot_from_rest) while the feed is recording,
+    later ones are rolled forward from it by GdaxBookHistory.update_checkpoints
+    every :param checkpoint_interval of feed time. Rebuilding the book at
+    a time then only replays the messages after the nearest earlier checkpoint.
+
+    Usage:
+        hist = GdaxBookHistory(db, 'BTC-USD')
+        hist.snapshot_from_rest()     # Once, while GdaxDatabaseFeed runs.
+        hist.update_checkpoints()     # Periodically (ie every few minutes).
+        book = hist.book_at(datetime(2017, 9, 2, 14, 3, 7))
+        book.get_current_book()
+    """
+    def __init__(self, db, product_id, checkpoint_interval=timedelta(minutes=10),
+                 chunksize=50000):
+        """
+        :param db: (stocklook.crypto.gdax.db.GdaxDatabase)
+        :param product_id: (str)
+        :param checkpoint_interval: (datetime.timedelta, default 10 minutes)
+            Feed time between checkpoints, bounds how many
+            messages a GdaxBookHistory.book_at call replays.
+        :param chunksize: (int, default 50000)
+            Feed rows read per query while replaying.
+        """
+        self.db = db
+        self.product_id = product_id
+        self.checkpoint_interval = checkpoint_interval
+        self.chunksize = chunksize
+
+    def save_checkpoint(self, book, time, complete=True):
+        t = GdaxBookCheckpoint.__table__
+        with self.db.engine.begin() as conn:
+            conn.execute(t.insert(), {'product_id': self.product_id,
+                                      'sequence': book.sequence,
+                                      'time': time,
+                                      'orders': len(book),
+                                      'complete': complete,
+                                      'data': book.to_bytes()})
+
+    def load_checkpoint(self, before=None):
+        """
+        Loads the newest checkpoint at or before :param before.
+
+        :param before: (datetime, default None)
+            None loads the newest checkpoint.
+        :return: (tuple)
+            (GdaxBookState, time, complete) or (None, None, None)
+        """
+        t = GdaxBookCheckpoint.__table__
+        crit = [t.c.product_id == self.product_id]
+        if before is not None:
+            crit.append(t.c.time <= before)
+        qry = select([t.c.data, t.c.time, t.c.complete]).where(and_(*crit))\
+            .order_by(t.c.time.desc(), t.c.sequence.desc()).limit(1)
+        with self.db.read_engine.connect() as conn:
+            row = conn.execute(qry).fetchone()
+        if row is None:
+            return None, None, None
+        return GdaxBookState.from_bytes(row[0]), row[1], bool(row[2])
+
+    def snapshot_from_rest(self, gdax=None, time=None):
+        """
+        Saves the current REST level 3 book as a checkpoint.
+        The feed must be recording while this runs so the
+        messages after the snapshot's sequence are stored.
+
+        :param gdax: (stocklook.crypto.gdax.api.Gdax, default GdaxDatabase.gdax)
+        :param time: (datetime, default now)
+        :return: (GdaxBookState)
+        """
+        if gdax is None:
+            gdax = self.db.gdax
+        if time is None:
+            time = datetime.now()
+        book = GdaxBookState(self.product_id)
+        book.load_snapshot(gdax.get_book(self.product_id, level=3))
+        self.save_checkpoint(book, time)
+        return book
+
+    def read_messages(self, after_sequence):
+        """
+        Reads the next chunk of feed + change messages after a sequence.
+        :return: (pandas.DataFrame) sorted by sequence.
+        """
+        f = GdaxSQLFeedEntry.__table__
+        c = GdaxSQLOrderChange.__table__
+        engine = self.db.read_engine
+
+        qry = select([f.c[n] for n in BOOK_FEED_COLUMNS]).where(and_(
+            f.c.product_id == self.product_id,
+            f.c.sequence > after_sequence)).order_by(f.c.sequence).limit(self.chunksize)
+        feed = db_read_frame(engine, qry)
+
+        crit = [c.c.product_id == self.product_id, c.c.sequence > after_sequence]
+        if len(feed.index) == self.chunksize:
+            # More feed rows follow, only take changes up to this chunk's end.
+            crit.append(c.c.sequence <= int(feed['sequence'].iloc[-1]))
+        qry = select([c.c[n] for n in BOOK_CHANGE_COLUMNS]).where(and_(*crit))\
+            .order_by(c.c.sequence)
+        changes = db_read_frame(engine, qry)
+
+        if changes.empty:
+            return feed
+        if feed.empty:
+            return changes
+        df = concat([feed, changes], ignore_index=True)
+        return df.sort_values('sequence', kind='stable').reset_index(drop=True)
+
+    def replay(self, book, until=None, on_message=None):
+        """
+        Applies stored messages to :param book until the
+        first message later than :param until.
+
+        :param book: (GdaxBookState)
+        :param until: (datetime, default None)
+            None replays every stored message.
+        :param on_message: (callable, default None)
+            on_message(book, time) after each message,
+            returning True stops the replay.
+        :return: (tuple) (messages applied, time of the last message)
+        """
+        applied = 0
+        last_time = None
+        until = Timestamp(until) if until is not None else None
+
+        while True:
+            df = self.read_messages(book.sequence)
+            if df.empty:
+                break
+            for msg in df.to_dict('records'):
+                t = msg['time']
+                if until is not None and t is not None and t == t and t > until:
+                    return applied, last_time
+                book.apply(msg)
+                applied += 1
+                last_time = t
+                if on_message is not None and on_message(book, t):
+                    return applied, last_time
+            if len(df.index) < self.chunksize:
+                break
+
+        return applied, last_time
+
+    def book_at(self, when):
+        """
+        Rebuilds the order book as of :param when.
+
+        :param when: (datetime) naive local time (like gdax_feed.time).
+        :return: (GdaxBookState)
+            With .time (of the last message applied),
+            .replayed (messages applied since the checkpoint)
+            and .complete (False if sequences were missing).
+        :raises LookupError: when there's no checkpoint before :param when.
+        """
+        book, cp_time, complete = self.load_checkpoint(before=when)
+        if book is None:
+            raise LookupError("No {} book checkpoint at or before {}, see "
+                              "GdaxBookHistory.snapshot_from_rest.".format(self.product_id, when))
+        applied, last_time = self.replay(book, until=when)
+        book.time = last_time if last_time is not None else cp_time
+        book.replayed = applied
+        book.complete = complete and book.missing == 0
+        return book
+
+    def update_checkpoints(self, until=None):
+        """
+        Rolls the newest checkpoint forward through the stored feed,
+        saving a checkpoint every GdaxBookHistory.checkpoint_interval
+        of feed time.
+
+        :param until: (datetime, default None)
+            Stop at this time, None goes through every stored message.
+        :return: (int) checkpoints written.
+        """
+        book, cp_time, complete = self.load_checkpoint()
+        if book is None:
+            return 0
+        state = {'next': Timestamp(cp_time) + self.checkpoint_interval,
+                 'written': 0, 'complete': complete}
+
+        def on_message(b, t):
+            if t is not None and t == t and t >= state['next']:
+                state['complete'] = state['complete'] and b.missing == 0
+                self.save_checkpoint(b, Timestamp(t).to_pydatetime(), state['complete'])
+                b.missing = 0
+                state['written'] += 1
+                state['next'] = Timestamp(t) + self.checkpoint_interval
+            return False
+
+        self.replay(book, until=until, on_message=on_message)
+        if state['written']:
+            logger.info("Wrote {} {} book checkpoints.".format(state['written'],
+                                                               self.product_id))
+        return state['written']
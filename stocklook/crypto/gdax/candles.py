@@ -0,0 +1,263 @@
+"""
+MIT License
+
+Copyright (c) 2017 Zeke Barge
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import os
+import json
+import time
+import logging as lg
+from threading import Lock
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from stocklook.utils.timetools import timestamp_to_utc_int
+from .backfill import split_ranges
+
+logger = lg.getLogger(__name__)
+
+# The candles endpoint returns at most this many buckets per request.
+GDAX_MAX_CANDLES = 300
+
+
+def page_candles(request_func, start, end, granularity, max_workers=3):
+    """
+    Requests candles between start and end in as many pages as needed,
+    returning the stitched rows newest first with duplicate buckets removed.
+
+    :param request_func: (callable)
+        Called like request_func(start, end) with UTC ints.
+        Should return a list of [time, low, high, open, close, volume]
+    :param start: (int) UTC time.
+    :param end: (int) UTC time.
+    :param granularity: (int) bucket size in seconds.
+    :param max_workers: (int, default 3)
+        The number of pages requested at once.
+    :return: (list)
+    """
+    windows = split_ranges([(start, end)], granularity, GDAX_MAX_CANDLES)
+    if len(windows) == 1:
+        pages = [request_func(*windows[0])]
+    else:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            pages = list(pool.map(lambda w: request_func(*w), windows))
+
+    rows = dict()
+    for page in pages:
+        for row in page:
+            rows[int(row[0])] = row
+    return [rows[t] for t in sorted(rows, reverse=True)]
+
+
+class GdaxCandleCache:
+    """
+    Keeps candles per (product, granularity) in memory so that
+    refreshing a chart only requests buckets newer than the cached tail
+    (the last cached bucket is always re-requested as it may
+    have been incomplete).
+
+    Candles can optionally be persisted to JSON files in a directory
+    and are loaded from there the first time a key is used.
+
+    Memory is bounded by :param max_size (keys, least recently used
+    are evicted) and :param max_rows (the oldest candles of a key
+    are dropped).
+
+    Example:
+        c = GdaxCandleCache(gdax)
+        rows = c.get('ETH-USD', now_minus(days=7), now(), 60*5)
+    """
+    def __init__(self, gdax, path=None, max_workers=3, max_size=32, max_rows=100000):
+        """
+        :param gdax: (stocklook.crypto.gdax.api.Gdax)
+
+        :param path: (str, default None)
+            A directory to persist candles within.
+            None keeps candles in memory only.
+
+        :param max_workers: (int, default 3)
+            The number of pages requested at once.
+
+        :param max_size: (int, default 32)
+            The most (product, granularity) keys kept in memory.
+            Evicted keys are reloaded from :param path when set.
+
+        :param max_rows: (int, default 100000)
+            The most candles kept per key, None is unbounded.
+        """
+        self.gdax = gdax
+        self.path = path
+        self.max_workers = max_workers
+        self.max_size = max_size
+        self.max_rows = max_rows
+        self._data = OrderedDict()   # (product, granularity): {time: row}
+        self._spans = dict()  # (product, granularity): [start, end] UTC times requested
+        self._locks = dict()
+        self._lock = Lock()
+
+    def _get_lock(self, key):
+        with self._lock:
+            lock = self._locks.get(key, None)
+            if lock is None:
+                lock = self._locks[key] = Lock()
+            return lock
+
+    def get_file_path(self, product, granularity):
+        n = 'gdax_candles_{}_{}.json'.format(product, granularity)
+        return os.path.join(self.path, n)
+
+    def load(self, product, granularity):
+        key = (product, granularity)
+        self._store(key, dict(), None)
+        if not self.path:
+            return
+        try:
+            with open(self.get_file_path(product, granularity), 'r') as fh:
+                d = json.load(fh)
+        except (IOError, ValueError):
+            return
+        self._store(key, {int(r[0]): r for r in d['rows']}, d['span'])
+
+    def _store(self, key, data, span):
+        """
+        Stores a key as the most recently used one,
+        evicting the least recently used past GdaxCandleCache.max_size.
+        """
+        with self._lock:
+            self._data[key] = data
+            self._data.move_to_end(key)
+            if span is None:
+                self._spans.pop(key, None)
+            else:
+                self._spans[key] = span
+            while len(self._data) > self.max_size:
+                old, _ = self._data.popitem(last=False)
+                self._spans.pop(old, None)
+
+    def _trim(self, data, span):
+        """
+        Drops the oldest candles past GdaxCandleCache.max_rows
+        moving the start of the cached span up to match.
+        """
+        if self.max_rows is None or len(data) <= self.max_rows:
+            return span
+        times = sorted(data)
+        for t in times[:-self.max_rows]:
+            del data[t]
+        return [max(span[0], times[-self.max_rows]), span[1]]
+
+    def save(self, product, granularity):
+        if not self.path:
+            return
+        key = (product, granularity)
+        with self._lock:
+            data = self._data.get(key, None)
+            span = self._spans.get(key, None)
+        if data is None or span is None:
+            return
+        d = dict(span=span, rows=[data[t] for t in sorted(data)])
+        fp = self.get_file_path(product, granularity)
+        with open(fp + '.tmp', 'w') as fh:
+            json.dump(d, fh)
+        os.replace(fp + '.tmp', fp)
+
+    def request(self, product, start, end, granularity):
+        """
+        Requests candles from the API (paged) without caching them.
+        """
+        def func(s, e):
+            return self.gdax.request_candles(product, s, e, granularity)
+        return page_candles(func, start, end, granularity,
+                            max_workers=self.max_workers)
+
+    def get(self, product, start, end, granularity):
+        """
+        Returns candles between start and end (newest first),
+        only requesting the buckets that aren't cached yet.
+
+        :param product: (str)
+        :param start: (int, datetime, str)
+        :param end: (int, datetime, str)
+        :param granularity: (int)
+        :return: (list) of [time, low, high, open, close, volume]
+        """
+        start = timestamp_to_utc_int(start)
+        end = timestamp_to_utc_int(end)
+        key = (product, granularity)
+
+        with self._get_lock(key):
+            with self._lock:
+                data = self._data.get(key, None)
+                span = self._spans.get(key, None)
+            if data is None:
+                self.load(product, granularity)
+                with self._lock:
+                    data = self._data[key]
+                    span = self._spans.get(key, None)
+            # Nothing exists past the current time.
+            now = int(time.time())
+            fetch_end = min(end, now)
+
+            ranges = list()
+            if start > fetch_end:
+                pass
+            elif span is None:
+                ranges.append((start, fetch_end))
+                span = [start, fetch_end]
+            else:
+                span = list(span)
+                if start < span[0]:
+                    ranges.append((start, span[0]))
+                    span[0] = start
+                # The last cached bucket is only requested again
+                # while it's the current (still changing) bucket.
+                tail = span[1] - span[1] % granularity
+                if span[1] + granularity <= now:
+                    tail += granularity
+                if fetch_end >= tail:
+                    ranges.append((tail, fetch_end))
+                    span[1] = max(span[1], fetch_end)
+
+            for s, e in ranges:
+                if s > e:
+                    continue
+                for row in self.request(product, s, e, granularity):
+                    data[int(row[0])] = row
+
+            rows = [data[t] for t in sorted(data, reverse=True)
+                    if start <= t <= end]
+            if span is not None:
+                span = self._trim(data, span)
+            self._store(key, data, span)
+            if ranges:
+                self.save(product, granularity)
+            return rows
+
+    def clear(self, product=None, granularity=None):
+        """
+        Empties the in-memory cache (all of it, a product's
+        granularities or just one product/granularity).
+        """
+        with self._lock:
+            for key in list(self._data):
+                if product is None or (key[0] == product and (
+                        granularity is None or key[1] == granularity)):
+                    self._data.pop(key, None)
+                    self._spans.pop(key, None)
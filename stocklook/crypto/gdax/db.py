@@ -24,11 +24,22 @@ SOFTWARE.
 import pandas as pd
 import logging as lg
 from queue import Queue
+from threading import Thread
 from .product import GdaxProducts
-from sqlalchemy import and_, or_, func
+from stocklook.utils.cache import ResponseCache
+from sqlalchemy import and_, or_, func, select
 from sqlalchemy.orm import scoped_session
-from sqlalchemy.exc import IntegrityError
-from stocklook.utils.database import DatabaseLoadingThread
+from stocklook.utils.database import (DatabaseLoadingThread,
+                                      SQLiteWriter,
+                                      db_is_sqlite_file,
+                                      db_set_sqlite_pragmas,
+                                      db_create_sqlite_engine,
+                                      db_create_engine,
+                                      db_pool_metrics,
+                                      db_supports_window_functions,
+                                      db_read_frame,
+                                      db_frame_to_params,
+                                      db_bulk_upsert)
 from .tables import (GdaxSQLQuote,
                      GdaxSQLProduct,
                      GdaxSQLTickerFeedEntry,
@@ -37,6 +48,7 @@ from stocklook.utils.timetools import (timestamp_to_local,
                                        timestamp_to_utc_int,
                                        now_local)
 from pandas import (DataFrame,
+                    concat,
                     DatetimeIndex,
                     infer_freq,
                     DateOffset,
@@ -47,13 +59,39 @@ logger = lg.getLogger(__name__)
 
 
 class GdaxDatabase:
-    def __init__(self, gdax=None, base=None, engine=None, session_maker=None):
+    def __init__(self, gdax=None, base=None, engine=None, session_maker=None,
+                 high_throughput=False, pool_kwargs=None, read_engine=None):
+        """
+        :param gdax: (stocklook.crypto.gdax.api.Gdax, default None)
+        :param base: (declarative_base, default GdaxBase)
+        :param engine: (sqlalchemy.engine.Engine, default None)
+            None uses GDAX_FEED_URL_KWARGS or falls back to SQLite.
+        :param session_maker: (sqlalchemy.orm.sessionmaker, default None)
+        :param high_throughput: (bool, default False)
+            On SQLite: enables WAL and SQLITE_HIGH_THROUGHPUT_PRAGMAS,
+            reads use a separate read-only engine and loaders hand their
+            batches to a single SQLiteWriter thread.
+            Ignored on other databases.
+        :param pool_kwargs: (dict, default None)
+            Connection pool options for MySQL/Postgres engines
+            (pool_size, max_overflow, pool_timeout, pool_recycle, pool_pre_ping)
+            overriding config['GDAX_FEED_POOL_KWARGS'] and DEFAULT_POOL_KWARGS.
+        :param read_engine: (sqlalchemy.engine.Engine, str, default None)
+            An engine or URL (ie a read replica) for read-heavy queries.
+            None uses config['GDAX_READ_URL_KWARGS'] when set, otherwise a
+            second pool on the main database (MySQL/Postgres) so long reads
+            can't starve the loaders of connections.
+        """
         if gdax is None:
             from . import Gdax
             gdax = Gdax()
         self.gdax = gdax
+        self.high_throughput = high_throughput
+        self.pool_kwargs = pool_kwargs
         self._base = None
         self._engine = None
+        self._read_engine = read_engine
+        self._writer = None
         self._session_maker = None
         self._stock_ids = dict()
         self.setup(base, engine, session_maker)
@@ -69,9 +107,43 @@ class GdaxDatabase:
     def get_stock_id(self, pair):
         return self.stock_ids[pair]
 
+    @property
+    def engine(self):
+        return self._engine
+
+    @property
+    def read_engine(self):
+        """
+        The engine read-only queries should use, a separate read-only
+        engine in SQLite high throughput mode otherwise GdaxDatabase.engine.
+        """
+        if self._read_engine is None:
+            return self._engine
+        return self._read_engine
+
+    def get_writer(self):
+        """
+        Returns the (started) SQLiteWriter shared by all loaders
+        in high throughput mode on a SQLite file, otherwise None.
+        :return:
+        """
+        if self._writer is None and self.high_throughput \
+                and db_is_sqlite_file(self._engine):
+            self._writer = SQLiteWriter(self._engine)
+            self._writer.start()
+        return self._writer
+
+    def flush_writer(self):
+        """
+        Blocks until everything submitted to the SQLiteWriter is committed.
+        """
+        if self._writer is not None:
+            self._writer.flush()
+
     def get_loading_thread(self, obj, queue=None, commit_interval=10, raise_on_error=True, **kwargs):
         if queue is None:
             queue = Queue()
+        kwargs.setdefault('writer', self.get_writer())
         return DatabaseLoadingThread(self._session_maker,
                                      queue,
                                      obj,
@@ -79,6 +151,61 @@ class GdaxDatabase:
                                      commit_interval=commit_interval,
                                      **kwargs)
 
+    def get_url(self, url_kwargs):
+        """
+        Builds a sqlalchemy URL from a GDAX_FEED_URL_KWARGS style dictionary,
+        asking for (and storing) the password when it isn't configured.
+
+        :param url_kwargs: (dict)
+        :return: (sqlalchemy.engine.url.URL, None)
+            None when :param url_kwargs: is empty or has no drivername.
+        """
+        from ...utils.security import Credentials
+        from ...config import config
+        from sqlalchemy.engine.url import URL
+        url_kwargs = url_kwargs.copy()
+        # Popping off a copy
+        d = url_kwargs.pop('drivername', '')
+        if not url_kwargs or not d:
+            return None
+
+        if d.startswith('mysql') \
+                or d.startswith('postgres') \
+                or d.startswith('sqlite'):
+            pw = url_kwargs.get('password', None)
+
+            if not pw and not d.startswith('sqlite'):
+                # Make the user input the password securely.
+                # if it's not stored in the KeyRing
+                user = url_kwargs['username']
+                c = Credentials(data=config, allow_input=True)
+                svc_name = '{}_{}'.format(c.GDAX_DB, d)
+                pw = c.get(svc_name, username=user, api=False)
+                url_kwargs['password'] = pw
+
+            return URL(d, **url_kwargs)
+
+        # Don't feel like supporting databases other
+        # than mysql, pgsql, sqlite...other dbs are lame anyways.
+        raise NotImplementedError("Unsupported drivername: "
+                                  "{}".format(d))
+
+    def pool_metrics(self):
+        """
+        Connection pool counters for the write and read engines
+        (checkouts, in use, wait times, timeouts, ...).
+        See stocklook.utils.database.PoolMetrics
+
+        :return: (dict)
+            {'write': dict, 'read': dict}
+        """
+        d = {'write': db_pool_metrics(self._engine).snapshot()}
+        if self.read_engine is not self._engine:
+            d['read'] = db_pool_metrics(self.read_engine).snapshot()
+        else:
+            d['read'] = d['write']
+        return d
+
     def setup(self, base=None, engine=None, session_maker=None):
         """
         Configures SQLAlchemy connection.
@@ -97,39 +224,16 @@ class GdaxDatabase:
             from .tables import GdaxBase
             base = GdaxBase
 
+        from ...config import config
+        pool_kwargs = config.get('GDAX_FEED_POOL_KWARGS', dict()).copy()
+        if self.pool_kwargs:
+            pool_kwargs.update(self.pool_kwargs)
+
         if engine is None:
-            from sqlalchemy import create_engine
-            from ...config import config
-            from ...utils.security import Credentials
-            from sqlalchemy.engine.url import URL
             # Look for a postgres or mysql database first
-            url_kwargs = config.get('GDAX_FEED_URL_KWARGS', dict()).copy()
-            # Popping off a copy
-            d = url_kwargs.pop('drivername', '')
-            if url_kwargs and d:
-
-                if d.startswith('mysql') \
-                        or d.startswith('postgres') \
-                        or d.startswith('sqlite'):
-                    pw = url_kwargs.get('password', None)
-
-                    if not pw and not d.startswith('sqlite'):
-                        # Make the user input the password securely.
-                        # if it's not stored in the KeyRing
-                        user = url_kwargs['username']
-                        c = Credentials(data=config, allow_input=True)
-                        svc_name = '{}_{}'.format(c.GDAX_DB, d)
-                        pw = c.get(svc_name, username=user, api=False)
-                        url_kwargs['password'] = pw
-
-                    url = URL(d, **url_kwargs)
-                    engine = create_engine(url)
-
-                else:
-                    # Don't feel like supporting databases other
-                    # than mysql, pgsql, sqlite...other dbs are lame anyways.
-                    raise NotImplementedError("Unsupported drivername: "
-                                              "{}".format(d))
+            url = self.get_url(config.get('GDAX_FEED_URL_KWARGS', dict()))
+            if url is not None:
+                engine = db_create_engine(url, pool_kwargs=pool_kwargs)
             else:
                 # Go for a sqlite engine as a backup.
                 try:
@@ -145,7 +249,28 @@ class GdaxDatabase:
                 if not db_path.startswith(pfx):
                     db_path = pfx + db_path
 
-                engine = create_engine(db_path)
+                engine = db_create_engine(db_path, pool_kwargs=pool_kwargs)
+        db_pool_metrics(engine)
+
+        read_engine = self._read_engine
+        if read_engine is None:
+            url = self.get_url(config.get('GDAX_READ_URL_KWARGS', dict()))
+            if url is not None:
+                read_engine = db_create_engine(url, pool_kwargs=pool_kwargs)
+            elif engine.dialect.name != 'sqlite':
+                read_engine = db_create_engine(engine.url, pool_kwargs=pool_kwargs)
+        elif not hasattr(read_engine, 'dialect'):
+            read_engine = db_create_engine(read_engine, pool_kwargs=pool_kwargs)
+
+        if self.high_throughput and db_is_sqlite_file(engine):
+            db_set_sqlite_pragmas(engine)
+            if read_engine is None:
+                read_engine = db_create_sqlite_engine(engine.url.database,
+                                                      read_only=True)
+
+        if read_engine is not None:
+            db_pool_metrics(read_engine)
+        self._read_engine = read_engine
 
         if session_maker is None:
             from sqlalchemy.orm import sessionmaker
@@ -170,6 +295,84 @@ class GdaxDatabase:
     def get_session(self):
         return self._session_maker()
 
+    def migrate(self, chunksize=50000):
+        """
+        Upgrades an existing database to the current table definitions
+        (typed time columns and composite indexes).
+        See stocklook.crypto.gdax.migrations.migrate_gdax_database
+
+        :param chunksize: (int, default 50000)
+            Rows copied per batch when a table is rebuilt.
+        :return: (dict)
+        """
+        from .migrations import migrate_gdax_database
+        return migrate_gdax_database(self._engine,
+                                     chunksize=chunksize,
+                                     base=self._base)
+
+    def export(self, sql_table, path, fmt='csv', resume=True, **kwargs):
+        """
+        Streams a table to compressed CSV or Parquet in chunks
+        using the read engine, resuming an interrupted export by default.
+        See stocklook.crypto.gdax.export.GdaxTableExporter
+
+        :param sql_table: (declarative_base object)
+        :param path: (str)
+        :param fmt: (str, default 'csv')
+            'csv' or 'parquet'
+        :param resume: (bool, default True)
+        :param kwargs: products, start, end, columns, chunksize, compression
+        :return: (dict) the export report.
+        """
+        from .export import GdaxTableExporter
+        exp = GdaxTableExporter(self.read_engine, sql_table, path, fmt=fmt, **kwargs)
+        return exp.run(resume=resume)
+
+    def audit_sequences(self, products=None, full=False, **kwargs):
+        """
+        Checks the stored full channel sequences (the union of
+        gdax_feed and gdax_changes) for missing ranges and
+        duplicates, only examining rows added since the last audit.
+        See stocklook.crypto.gdax.audit.GdaxSequenceAuditor
+
+        :param products: (list, default None)
+            None audits every stored product.
+        :param full: (bool, default False)
+            True rescans every row.
+        :param kwargs: sql_tables, chunksize, use_sql
+        :return: (dict) {product_id: report}
+        """
+        from .audit import GdaxSequenceAuditor
+        return GdaxSequenceAuditor(self, **kwargs).audit(products, full=full)
+
+    def get_book_history(self, product_id, **kwargs):
+        """
+        Returns an object that rebuilds the order book of a product
+        at any stored time from checkpoints and the gdax_feed/gdax_changes tables.
+        See stocklook.crypto.gdax.book_history.GdaxBookHistory
+
+        :param product_id: (str)
+        :param kwargs: checkpoint_interval, chunksize
+        :return: (GdaxBookHistory)
+        """
+        from .book_history import GdaxBookHistory
+        return GdaxBookHistory(self, product_id, **kwargs)
+
+    def get_retention_job(self, policies=None, archive_dir=None, **kwargs):
+        """
+        Returns a (not started) background job that archives, compacts
+        and deletes expired rows from the feed tables.
+        See stocklook.crypto.gdax.retention.GdaxRetentionJob
+
+        :param policies: (list, default None)
+            RetentionPolicy objects, None uses DEFAULT_RETENTION_POLICIES.
+        :param archive_dir: (str, default None)
+        :return: (GdaxRetentionJob)
+        """
+        from .retention import GdaxRetentionJob
+        return GdaxRetentionJob(self, policies=policies,
+                                archive_dir=archive_dir, **kwargs)
+
     def load_stocks(self, session):
         qry = session.query(GdaxSQLProduct)
         res = qry.all()
@@ -267,19 +470,70 @@ class GdaxDatabase:
         session.add(q)
         return q
 
-    def get_quotes(self, stock_id):
-        int(stock_id)
-        from pandas import read_sql
+    def get_quotes(self, stock_id, from_date=None, to_date=None,
+                   columns=None, chunksize=None):
+        """
+        Returns quotes for a stock from the GdaxSQLQuote.__tablename__.
+
+        :param stock_id: (int, str)
+            The stock id or the product name (ie 'BTC-USD').
+        :param from_date: (datetime, default None)
+        :param to_date: (datetime, default None)
+        :param columns: (list, default None)
+            Column names to select, None selects all columns.
+        :param chunksize: (int, default None)
+            Returns an iterator of DataFrames with up to
+            chunksize rows each instead of a single DataFrame.
+        :return: (pandas.DataFrame, generator)
+        """
+        try:
+            stock_id = int(stock_id)
+        except (ValueError, TypeError):
+            stock_id = self.get_stock_id(stock_id)
+
+        t = GdaxSQLQuote
+        crit = [t.stock_id == stock_id]
+        if from_date is not None:
+            crit.append(t.quote_date >= from_date)
+        if to_date is not None:
+            crit.append(t.quote_date <= to_date)
+
+        return self.read_frame(t, and_(*crit), columns=columns,
+                               order_by=t.quote_date, chunksize=chunksize)
+
+    def read_frame(self, sql_table, where=None, columns=None,
+                   order_by=None, chunksize=None, bind=None):
+        """
+        Reads rows from a table with a Core select straight into
+        typed DataFrame columns, skipping ORM object construction.
+
+        :param sql_table: (declarative_base object)
+        :param where: (sqlalchemy.sql.ClauseElement, default None)
+        :param columns: (list, default None)
+            Column names to select, None selects all columns.
+        :param order_by: (Column, default None)
+        :param chunksize: (int, default None)
+            Returns an iterator of DataFrames with up to
+            chunksize rows each instead of a single DataFrame.
+        :param bind: (Engine, Connection, default None)
+            Defaults to GdaxDatabase.read_engine.
+        :return: (pandas.DataFrame, generator)
+        """
+        tbl = sql_table.__table__
+        if columns is None:
+            cols = list(tbl.columns)
+        else:
+            cols = [tbl.c[c] for c in columns]
 
-        tbl = GdaxSQLQuote.__tablename__
-        sql = "SELECT * FROM {}" \
-              "WHERE {}={}".format(tbl,
-                                   GdaxSQLQuote.stock_id.name,
-                                   stock_id)
-        parse_dates = [GdaxSQLQuote.date_added.name,
-                       GdaxSQLQuote.quote_date.name]
+        qry = select(cols)
+        if where is not None:
+            qry = qry.where(where)
+        if order_by is not None:
+            qry = qry.order_by(order_by)
+        if bind is None:
+            bind = self.read_engine
 
-        return read_sql(sql, self._engine, parse_dates=parse_dates)
+        return db_read_frame(bind, qry, chunksize=chunksize)
 
     def to_frame(self, query_set, cols):
 
@@ -290,7 +544,8 @@ class GdaxDatabase:
                          columns=cols,
                          index=range(len(data)))
 
-    def get_prices(self, session, from_date, to_date, products):
+    def get_prices(self, session, from_date, to_date, products,
+                   columns=None, chunksize=None):
         """
         Returns price data available between from_date and to_date
         from the GdaxSQLTickerFeedEntry.__tablename__.
@@ -298,38 +553,89 @@ class GdaxDatabase:
         This method would be useful if you're maintaining this table
         in the database by subscribing to the 'ticker' websocket channel.
 
-        :param session:
+        :param session: (sqlalchemy.orm.Session, default None)
+            Reads inside the session's transaction when provided.
         :param from_date:
         :param to_date:
         :param products:
-        :return:
+        :param columns: (list, default None)
+            Column names to select, None selects
+            best_ask, best_bid, last_size, side, time, product_id, price.
+        :param chunksize: (int, default None)
+            Returns an iterator of DataFrames with up to
+            chunksize rows each instead of a single DataFrame.
+        :return: (pandas.DataFrame, generator)
         """
         t = GdaxSQLTickerFeedEntry
         crit = and_(t.time >= from_date,
                     t.time <= to_date,
                     t.product_id.in_(products))
 
-        res = session.query(t).filter(crit).all()
-
-        cols = [t.best_ask.name,
-                t.best_bid.name,
-                t.last_size.name,
-                t.side.name,
-                t.time.name,
-                t.product_id.name,
-                t.price.name]
+        if columns is None:
+            columns = [t.best_ask.name,
+                       t.best_bid.name,
+                       t.last_size.name,
+                       t.side.name,
+                       t.time.name,
+                       t.product_id.name,
+                       t.price.name]
+
+        bind = None if session is None else session.connection()
+        return self.read_frame(t, crit, columns=columns, order_by=t.time,
+                               chunksize=chunksize, bind=bind)
+
+    def aggregate_prices(self, from_date, to_date, products, freq='1min',
+                         chunksize=100000, max_workers=None):
+        """
+        Returns OHLC bars and volume of the gdax_ticks prices
+        between from_date and to_date, aggregated chunk by chunk so
+        the range isn't limited by memory.
+        See stocklook.utils.aggregate.ChunkedAggregator
 
-        return self.to_frame(res, cols)
+        :param from_date:
+        :param to_date:
+        :param products: (list)
+        :param freq: (str, default '1min') pandas frequency of the bars.
+        :param chunksize: (int, default 100000) rows read per chunk.
+        :param max_workers: (int, default None)
+            Processes aggregating chunks in parallel.
+        :return: (pandas.DataFrame)
+            product_id, time, open, high, low, close, volume, ticks
+        """
+        from stocklook.utils.aggregate import ChunkedAggregator, ohlc_aggs
+        t = GdaxSQLTickerFeedEntry
+        aggs = dict(ohlc_aggs(t.price.name),
+                    volume=(t.last_size.name, 'sum'),
+                    ticks=(t.price.name, 'count'))
+        agg = ChunkedAggregator(aggs, by=t.product_id.name, freq=freq,
+                                time_column=t.time.name, max_workers=max_workers)
+        columns = [t.time.name, t.product_id.name, t.price.name, t.last_size.name]
+        return agg.run(self.get_prices(None, from_date, to_date, products,
+                                       columns=columns, chunksize=chunksize))
 
 
 class GdaxOHLCViewer:
     FREQ = '5T'
     GRANULARITY = 60*5
     MAX_SPAN = 1
+    CHART_POINTS = 1000
+    CHART_TTL = 300
 
-    def __init__(self, pair=None, db=None, obj=None):
+    def __init__(self, pair=None, db=None, obj=None, rollups=None):
+        """
+        :param pair: (str, default None)
+            The product to view ie 'BTC-USD'.
+        :param db: (GdaxDatabase, default None)
+        :param obj: (declarative_base object, default GdaxOHLC5)
+            The OHLC table.
+        :param rollups: (bool, default None)
+            True maintains the 15m/1h/4h/1d/1w rollup tables as bars load.
+            None enables them when obj is GdaxOHLC5.
+        """
         if db is None:
             db = GdaxDatabase()
+        if rollups is None:
+            rollups = obj is None or obj is GdaxOHLC5
         if obj is None:
             obj = GdaxOHLC5
         self.pair = None
@@ -337,12 +643,74 @@ class GdaxOHLCViewer:
         self.db = db
         self.gdax = db.gdax
         self._loading_threads = list()
+        self._bucket_index = None
         self.obj = obj
         self.span_secs = self.MAX_SPAN * 24 * 60 * 60
+        self.rollups = None
+        if rollups:
+            from .rollups import GdaxOHLCRollups
+            self.rollups = GdaxOHLCRollups(self)
+        self.chart_cache = ResponseCache(default_ttl=self.CHART_TTL, max_size=256)
         if pair is not None:
             self.set_pair(pair)
 
-    def load_df(self, df, thread=True, raise_on_error=True):
+    @property
+    def bucket_index(self):
+        """
+        An OHLCBucketIndex of the bucket times stored for the current pair.
+        Loaded with one query on first use and kept
+        current by GdaxOHLCViewer.load_df and the backfiller.
+        """
+        if self._bucket_index is None:
+            self._bucket_index = self.load_bucket_index()
+        return self._bucket_index
+
+    def load_bucket_index(self):
+        """
+        Reads stored bucket times for the current pair
+        (served by the (stock_id, time) unique index).
+        Call again to pick up rows written by other processes.
+        Reads through GdaxDatabase.engine so backfilled rows aren't
+        reported missing while a read replica catches up.
+        """
+        from .backfill import OHLCBucketIndex
+        o = self.obj
+        qry = select([o.time]).where(o.stock_id == self.stock_id)
+        with self.db.engine.connect() as conn:
+            times = [r[0] for r in conn.execute(qry) if r[0] is not None]
+        self._bucket_index = OHLCBucketIndex(self.GRANULARITY, times)
+        return self._bucket_index
+
+    def on_buckets_added(self, times):
+        """
+        Called after OHLC records are written with their bucket times.
+        Updates the bucket index (when loaded) and the rollup tables.
+        """
+        if self._bucket_index is not None:
+            self._bucket_index.add(times)
+        if self.rollups is not None:
+            self.rollups.update(times)
+        self.chart_cache.invalidate('chart')
+
+    def load_df(self, df, thread=True, raise_on_error=True, update=False):
+        """
+        Bulk loads OHLC records from a DataFrame.
+        Rows that already exist for (stock_id, time) are skipped
+        (or overwritten when :param update is True) by the database itself,
+        see stocklook.utils.database.db_bulk_upsert.
+
+        :param df: (pandas.DataFrame)
+            Must contain every column of GdaxOHLCViewer.obj except the id.
+        :param thread: (bool, default True)
+            True loads the data on a thread stored in
+            GdaxOHLCViewer._loading_threads.
+        :param raise_on_error: (bool, default True)
+            False logs database errors instead of raising them.
+        :param update: (bool, default False)
+            True overwrites existing buckets with the new values.
+        :return: (int, Thread)
+            The number of rows written, or the thread when threaded.
+        """
         id_label = self.obj.stock_id.name
         if id_label not in df.columns or df[id_label].dropna().index.size != df.index.size:
             df.loc[:, id_label] = self.stock_id
@@ -357,69 +725,40 @@ class GdaxOHLCViewer:
         logger.info("time column data type: {}".format(dtype))
         if 'int' not in dtype and 'float' not in dtype:
             logger.debug("Converting time to UTC")
-            logger.info(df[t].head(5))
             df.loc[:, t] = df.loc[:, t].apply(timestamp_to_utc_int).astype(int)
-            logger.info(df[t].head(5))
         else:
             logger.debug("Confirmed UTC time dtype: {}".format(dtype))
 
-        # load database (thread vs non-thread)
-        if thread is True:
-            t = self.db.get_loading_thread(self.obj,
-                                           queue=None,
-                                           commit_interval=df.index.size)
-            t.start()
-            q = t.queue
-            for idx, rec in df.iterrows():
-                q.put(rec)
-            q.put(t.STOP_SIGNAL)
-            self._loading_threads.append(t)
-        else:
-            session = self.db.get_session()
-            cols = [c.name for c in self.obj.__table__.columns]
-            recs = list()
-
-            for idx, rec in df.iterrows():
-                o = self.obj()
-                [setattr(o, k, str(v))
-                 for k, v in rec.items()
-                 if k in cols]
-                recs.append(o)
+        rows = db_frame_to_params(df, self.obj.__table__)
+        keys = [id_label, t]
 
+        def load():
             try:
-                # Attempt to load all at once
-                session.add_all(recs)
-                session.commit()
-
-            except (IntegrityError, Exception) as e:
-                session.rollback()
-                # Attempt individual load
-                # Since adding all at once didn't work.
-                e = str(e).upper()
-                if raise_on_error or 'UNIQUE' not in e:
-                    logger.error(e.lower())
+                count = db_bulk_upsert(self.db._engine, self.obj.__table__,
+                                       rows, keys, update=update)
+                self.on_buckets_added([r[t] for r in rows])
+            except Exception as e:
+                logger.error("Error loading {} OHLC "
+                             "records: {}".format(len(rows), e))
+                if raise_on_error:
                     raise
-                logger.error("Attempting individual insert/commits"
-                             "as a solution to: {}".format(e))
-                errs = 0
-                for rec in recs:
-                    try:
-                        session.add(rec)
-                        session.commit()
-                    except:
-                        session.rollback()
-                        errs += 1
-                c = len(recs)
-                logger.info("{}/{} records successfully "
-                            "imported.".format(c - errs/c))
-            else:
-                session.close()
+                return 0
+            logger.info("{}/{} OHLC records written for "
+                        "{}.".format(count, len(rows), self.pair))
+            return count
 
-            session.close()
+        if thread is True:
+            th = Thread(target=load)
+            th.start()
+            self._loading_threads.append(th)
+            return th
+
+        return load()
 
     def set_pair(self, pair):
         self.stock_id = self.db.get_stock_id(pair)
         self.pair = pair
+        self._bucket_index = None
 
     def get_missing_columns(self, df_cols):
         cols = [c.name for c in self.obj.__table__.columns]
@@ -438,59 +777,26 @@ class GdaxOHLCViewer:
             return None, None
 
     def slice_frame(self, df):
+        """
+        Drops rows from :param df whose bucket time is
+        already stored, using GdaxOHLCViewer.bucket_index.
+        """
         if df.empty:
             return df
 
         t = self.obj.time.name
-        t_ser = df[t]
-        min_t, max_t = t_ser.min(), t_ser.max()
-
-        try:
-            min_t + 3
-        except:
-            raise ValueError("Expected integer (UTC) min/max "
-                             "time to slice data, not {}".format(type(min_t)))
+        times = pd.to_numeric(df[t], errors='coerce')
+        if times.isnull().any():
+            raise ValueError("Expected integer (UTC) "
+                             "time to slice data, not {}".format(df[t].dtype))
 
-        bump = self.GRANULARITY
         osize = df.index.size
-        kwargs = {'time': t,
-                  'id_label': self.obj.stock_id.name,
-                  'id': self.stock_id,
-                  'table': self.obj.__tablename__,
-                  'start': min_t + bump,
-                  'end': max_t + bump,
-                  }
-        sql = "select {time} " \
-              "from {table} " \
-              "where {id_label} = {id} " \
-              "and {time} between {start} and {end};".format(**kwargs)
-
-        s = self.read_sql(sql, convert_dates=False)
-
-        if not s.empty:
-            if s[t].dtype != df[t].dtype:
-                t_temp = '__{}'.format(t)
-                logger.debug("Using temp column '{}' "
-                             "to slice data.".format(t_temp))
-                for frame in (df, s):
-                    frame.loc[t_temp, :] = pd.to_numeric(frame.loc[:, t],
-                                                         errors='coerce',
-                                                         downcast='integer').astype(int)
-                label = t_temp
-            else:
-                t_temp = None
-                label = t
-
-            df = df.loc[~df[label].isin(s[label]), :]
-
-            if t_temp:
-                df.drop([t_temp], axis=1, errors='raise', inplace=True)
-
-            diff = df.index.size - osize
-            if diff > 0:
-                logger.debug("slice_frame: Removed {} records from "
-                             "data, was {}.".format(osize, diff))
+        df = df.loc[~self.bucket_index.contains(times.values), :]
 
+        diff = osize - df.index.size
+        if diff > 0:
+            logger.debug("slice_frame: Removed {} records from "
+                         "data, was {}.".format(diff, osize))
         return df
 
     def request_ohlc(self, start, end, convert_dates=False):
@@ -507,7 +813,7 @@ class GdaxOHLCViewer:
 
     def read_sql(self, sql, convert_dates=False, **kwargs):
         kwargs['coerce_float'] = kwargs.get('coerce_float', False)
-        df = read_sql(sql, self.db._engine, **kwargs)
+        df = read_sql(sql, self.db.read_engine, **kwargs)
 
         if not df.empty:
             t = self.obj.time.name
@@ -520,83 +826,186 @@ class GdaxOHLCViewer:
 
         return df
 
+    def read_ohlc(self, start=None, end=None, columns=None, chunksize=None, bind=None):
+        """
+        Reads stored OHLC records for the current pair ordered by time.
+
+        :param start: (int, datetime, default None)
+            Inclusive start time (UTC int or anything timestamp_to_utc_int accepts).
+        :param end: (int, datetime, default None)
+            Inclusive end time.
+        :param columns: (list, default None)
+            Column names to select, None selects all columns.
+        :param chunksize: (int, default None)
+            Returns an iterator of DataFrames with up to
+            chunksize rows each instead of a single DataFrame.
+        :param bind: (sqlalchemy.engine.Engine, default None)
+            Defaults to GdaxDatabase.read_engine. Pass GdaxDatabase.engine
+            to read rows just written (a read replica may lag behind).
+        :return: (pandas.DataFrame, generator)
+        """
+        o = self.obj
+        crit = [o.stock_id == self.stock_id]
+        if start is not None:
+            crit.append(o.time >= timestamp_to_utc_int(start))
+        if end is not None:
+            crit.append(o.time <= timestamp_to_utc_int(end))
+        return self.db.read_frame(o, and_(*crit), columns=columns,
+                                  order_by=o.time, chunksize=chunksize, bind=bind)
+
+    def get_chart_granularity(self, start, end, points=None):
+        """
+        Returns the coarsest stored bar size (5 minute bars or a
+        rollup table) that still has :param points bars between start and end.
+        Reading it bounds the rows read by the number of points rather
+        than the length of the range.
+        """
+        if points is None:
+            points = self.CHART_POINTS
+        span = timestamp_to_utc_int(end) - timestamp_to_utc_int(start)
+        best = self.GRANULARITY
+        if self.rollups is not None:
+            for table in self.rollups.tables:
+                if not table.OFFSET and span // table.GRANULARITY >= points:
+                    best = max(best, table.GRANULARITY)
+        return best
+
+    def read_chart(self, start, end, points=None, method='lttb', column='close'):
+        """
+        Returns at most :param points OHLC rows between start and end
+        that keep the shape of the chart, for plotting long ranges.
+        Results are cached per (pair, range, points, method, column)
+        until new bars load or GdaxOHLCViewer.CHART_TTL seconds pass.
+
+        :param start: (int, datetime)
+        :param end: (int, datetime)
+        :param points: (int, default GdaxOHLCViewer.CHART_POINTS)
+        :param method: (str, default 'lttb')
+            lttb: Largest-Triangle-Three-Buckets on :param column for line charts.
+            minmax: The low and high :param column row of each bucket.
+            ohlc: Consecutive bars combined into :param points candles.
+        :param column: (str, default 'close')
+        :return: (pandas.DataFrame)
+            time, open, high, low, close, volume
+        """
+        if points is None:
+            points = self.CHART_POINTS
+        start = timestamp_to_utc_int(start)
+        end = timestamp_to_utc_int(end)
+        key = (self.pair, start, end, points, method, column)
+
+        def read():
+            from stocklook.utils.downsample import downsample_frame, bucket_ohlc
+            g = self.get_chart_granularity(start, end, points)
+            if g == self.GRANULARITY or self.rollups is None:
+                df = self.read_ohlc(start, end, columns=['time', 'open', 'high',
+                                                         'low', 'close', 'volume'])
+            else:
+                df = self.rollups.read(start, end, g)
+            if method == 'ohlc':
+                df = bucket_ohlc(df, points)
+            else:
+                df = downsample_frame(df, points, x='time', y=column, method=method)
+            return df.reset_index(drop=True)
+
+        return self.chart_cache.get_or_call('chart', key, read)
+
+    def supports_window_functions(self):
+        """
+        True when the database can run LEAD() OVER (...):
+        SQLite 3.25+, MySQL 8+, MariaDB 10.2+ and Postgres.
+        """
+        return db_supports_window_functions(self.db._engine)
+
+    def get_gap_ranges(self, start=None, end=None, use_sql=None):
+        """
+        Returns missing OHLC bucket ranges for the current pair.
+
+        With window function support the database compares each
+        bucket to the next one (LEAD) and only returns the gaps.
+        Otherwise gaps are found with array diffs over
+        GdaxOHLCViewer.bucket_index. Both scale linearly
+        with the number of stored rows.
+
+        :param start: (int, datetime, default None)
+            None starts at the first stored bucket.
+        :param end: (int, datetime, default None)
+            Exclusive end. None ends at the last stored bucket.
+        :param use_sql: (bool, default None)
+            None uses SQL when the dialect supports window functions
+            and the bucket index isn't loaded yet.
+        :return: (list)
+            [(start, end), (start, end)] UTC bucket times, both inclusive.
+        """
+        from .backfill import get_edge_ranges
+        g = self.GRANULARITY
+        if start is not None:
+            start = timestamp_to_utc_int(start)
+        if end is not None:
+            end = timestamp_to_utc_int(end)
+        if use_sql is None:
+            use_sql = self._bucket_index is None \
+                      and self.supports_window_functions()
+
+        if not use_sql:
+            return self.bucket_index.missing_ranges(start, end)
+
+        o = self.obj
+        crit = [o.stock_id == self.stock_id]
+        if start is not None:
+            crit.append(o.time >= start - start % g)
+        if end is not None:
+            crit.append(o.time < end)
+        crit = and_(*crit)
+
+        nxt = func.lead(o.time).over(order_by=o.time).label('next_time')
+        sub = select([o.time, nxt]).where(crit).alias('t')
+        qry = select([sub.c.time, sub.c.next_time])\
+            .where(sub.c.next_time - sub.c.time > g)\
+            .order_by(sub.c.time)
+        bounds = select([func.min(o.time), func.max(o.time)]).where(crit)
+
+        # Backfills act on this, so read from the primary rather than a replica.
+        with self.db.engine.connect() as conn:
+            rows = conn.execute(qry).fetchall()
+            first, last = conn.execute(bounds).fetchone()
+
+        gaps = [(int(t) + g, int(n) - g) for t, n in rows]
+        if first is None:
+            return get_edge_ranges(None, None, g, start, end)
+        edges = get_edge_ranges(first, last, g, start, end)
+        return [r for r in edges if r[1] < first] + gaps + \
+               [r for r in edges if r[0] > last]
+
     def get_time_gaps(self, df=None, time_label=None):
         """
         Analyzes the time columns identifying gaps in the data.
         A list is returned of gaps in data.
             list([start, end], [start, end])
+        Where start is the first missing bucket and
+        end is the next stored bucket (local times).
         :param df:
         :param time_label:
         :return:
         """
+        from .backfill import get_gap_ranges
         if time_label is None:
             time_label = self.obj.time.name
-        if df is None:
-
-            kwargs = {'table': self.obj.__tablename__,
-                      'id_label': self.obj.stock_id.name,
-                      'id': self.stock_id,
-                      'time': time_label}
-            sql = "select {time}, {id_label} from {table} " \
-                  "where {id_label} = {id}".format(**kwargs)
-            df = self.read_sql(sql, convert_dates=True)
-
-            logger.info(df[time_label].head(10))
-
-        # Sort by times old to new
-        df.sort_values(time_label, ascending=True, inplace=True)
-        df.reset_index(drop=True, inplace=True)
-        logger.info(df[time_label].head(10).tolist())
 
-        gaps = []
-        last_time = None
-        bump = DateOffset(seconds=self.GRANULARITY)
-        n = now_local()
+        if df is None:
+            ranges = self.get_gap_ranges()
+        else:
+            times = df[time_label].dropna()
+            dtype = str(times.dtype)
+            if 'int' not in dtype and 'float' not in dtype:
+                times = times.apply(timestamp_to_utc_int)
+            ranges = get_gap_ranges(times.values, self.GRANULARITY)
 
-        def maybe_extend_gaps(start, end):
-            # Determines whether to extend an
-            # existing gap or add a new list
-            try:
-                last_start, last_end = gaps[-1]
-            except IndexError:
-                gaps.append([start, end])
-                return
-
-            if start == last_end:
-                # Swap end date in existing list
-                gaps[-1][1] = end
-                logger.info("Extending existing gap: "
-                            "{} {}".format(last_start, end))
-            else:
-                # Add new gap
-                gaps.append([start, end])
-                logger.info("Adding new gap: "
-                            "{} {}".format(start, end))
-
-        # Run through all of the data
-        # looking for gaps
-        for idx, row in df.iterrows():
-            t = row[time_label]
-            if last_time is None:
-                last_time = t
-            else:
-                expect = last_time + bump
-                if expect > n:
-                    logger.info("Got out of range time {} on "
-                                "index {}/{}.".format(t, idx,
-                                                      df.index.size))
-                    break
-                elif t > expect:
-                    # Got time greater than expected
-                    maybe_extend_gaps(expect, t)
-                    last_time = t
-                elif t < expect:
-                    # Got time less than expected
-                    maybe_extend_gaps(t, expect)
-                    last_time = expect
-                else:
-                    # Got expected time.
-                    last_time = t
+        bump = self.GRANULARITY
+        gaps = [[Timestamp(timestamp_to_local(s)),
+                 Timestamp(timestamp_to_local(e + bump))]
+                for s, e in ranges]
+        logger.info("{} gaps found for {}.".format(len(gaps), self.pair))
         return gaps
 
     def sync_time_gaps(self, gaps=None):
@@ -612,10 +1021,11 @@ class GdaxOHLCViewer:
         for start, end in gaps:
             _, max = self.get_time_bump(start, end, bump_start=False)
             if max < end:
-                df = DataFrame()
+                frames = list()
                 while max < end:
-                    df = df.append(self.request_ohlc(start, max))
+                    frames.append(self.request_ohlc(start, max))
                     start, max = self.get_time_bump(start, end)
+                df = concat(frames, ignore_index=True)
             else:
                 df = self.request_ohlc(start, end)
 
@@ -700,6 +1110,33 @@ class GdaxOHLCViewer:
         logger.info("OHLC sync complete for "
                     "{}, {} records added.".format(self.pair, total))
 
+    def backfill(self, months=6, end=None, max_workers=3, checkpoint_path=None, resume=True):
+        """
+        Fills any OHLC buckets missing over the last :param months
+        by requesting windows concurrently.
+        See stocklook.crypto.gdax.backfill.GdaxOHLCBackfiller
+
+        :param months: (int, default 6)
+            The number of months back to start from.
+        :param end: (datetime, default None)
+            None defaults to now.
+        :param max_workers: (int, default 3)
+            The number of threads requesting candles at once.
+        :param checkpoint_path: (str, default None)
+            The file used to resume an interrupted backfill.
+        :param resume: (bool, default True)
+            False ignores an existing checkpoint.
+        :return: (int) the number of records added.
+        """
+        from .backfill import GdaxOHLCBackfiller
+        if end is None:
+            end = now_local()
+        start = Timestamp(end) - DateOffset(months=months)
+        b = GdaxOHLCBackfiller(self,
+                               max_workers=max_workers,
+                               checkpoint_path=checkpoint_path)
+        return b.run(start, end, resume=resume)
+
     def get_time_bump(self, start, end, now_time=None, bump_start=True):
         #logger.info("Time bump - before: {} {}".format(start, end))
         if now_time is None:
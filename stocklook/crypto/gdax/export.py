@@ -0,0 +1,310 @@
+"""
+MIT License
+
+Copyright (c) 2017 Zeke Barge
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import os
+import io
+import gzip
+import json
+import time
+import logging as lg
+from sqlalchemy import and_, select, DateTime
+from stocklook.utils.database import db_read_frame
+
+logger = lg.getLogger(__name__)
+
+EXPORT_FORMATS = ('csv', 'parquet')
+
+
+def get_arrow_schema(columns):
+    """
+    Builds a pyarrow schema from SQLAlchemy columns so every
+    Parquet part has the same types even when a chunk is all NULL.
+
+    :param columns: (list) sqlalchemy.Column objects.
+    :return: (pyarrow.Schema)
+    """
+    import pyarrow as pa
+    fields = list()
+    for c in columns:
+        if isinstance(c.type, DateTime):
+            tp = pa.timestamp('us')
+        else:
+            py_type = c.type.python_type
+            if py_type == float:
+                tp = pa.float64()
+            elif py_type == bool:
+                tp = pa.bool_()
+            elif py_type == int:
+                tp = pa.int64()
+            else:
+                tp = pa.string()
+        fields.append((c.name, tp))
+    return pa.schema(fields)
+
+
+class GdaxTableExporter:
+    """
+    Exports a table to compressed CSV or Parquet in bounded memory.
+
+    Rows are read with keyset pagination on the primary key
+    (WHERE pk > last ORDER BY pk LIMIT chunksize) so each chunk is
+    an index range scan no matter how deep into the table the export is,
+    and only one chunk is held in memory at a time.
+
+    After every chunk a checkpoint (last key, rows, output size) is written
+    next to the output so an interrupted export resumes where it stopped:
+        csv: <path> is one file of gzip members (one per chunk)
+             truncated back to the checkpointed size on resume.
+        parquet: <path> is a directory of part-NNNNNN.parquet files.
+
+    Usage:
+        exp = GdaxTableExporter(engine, GdaxSQLTickerFeedEntry, 'ticks.csv.gz',
+                                products=['BTC-USD'], start=datetime(2017, 9, 1))
+        report = exp.run()
+    """
+    def __init__(self, engine, sql_table, path, fmt='csv', products=None,
+                 start=None, end=None, columns=None, chunksize=50000,
+                 compression=None, time_column='time'):
+        """
+        :param engine: (sqlalchemy.engine.Engine)
+        :param sql_table: (declarative_base object)
+        :param path: (str)
+            Output file (csv) or directory (parquet).
+        :param fmt: (str, default 'csv')
+            'csv' or 'parquet'.
+        :param products: (list, default None)
+            Only export these product_id values.
+        :param start: (datetime, default None)
+            Only export rows with :param time_column >= start.
+        :param end: (datetime, default None)
+            Only export rows with :param time_column < end.
+        :param columns: (list, default None)
+            Column names to export, None exports every column.
+        :param chunksize: (int, default 50000)
+            Rows per query/chunk written.
+        :param compression: (str, default None)
+            csv: 'gzip' or 'none', defaults to 'gzip'.
+            parquet: any pyarrow codec, defaults to 'snappy'.
+        :param time_column: (str, default 'time')
+        """
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError("fmt must be one of {}".format(EXPORT_FORMATS))
+        if compression is None:
+            compression = 'gzip' if fmt == 'csv' else 'snappy'
+
+        tbl = sql_table.__table__
+        pks = list(tbl.primary_key.columns)
+        if len(pks) != 1:
+            raise ValueError("{} needs a single column primary "
+                             "key to be exported.".format(tbl.name))
+        if products is not None and 'product_id' not in tbl.c:
+            raise ValueError("{} has no product_id column.".format(tbl.name))
+
+        self.engine = engine
+        self.table = tbl
+        self.pk = pks[0]
+        self.path = path
+        self.fmt = fmt
+        self.products = list(products) if products is not None else None
+        self.start = start
+        self.end = end
+        self.chunksize = chunksize
+        self.compression = compression
+        self.time_column = time_column
+
+        if columns is None:
+            cols = list(tbl.columns)
+        else:
+            cols = [tbl.c[c] for c in columns]
+        if self.pk not in cols:
+            # The key is needed to page through the table.
+            cols.insert(0, self.pk)
+        self.columns = cols
+
+    @property
+    def checkpoint_path(self):
+        if self.fmt == 'parquet':
+            return os.path.join(self.path, '_checkpoint.json')
+        return self.path + '.checkpoint.json'
+
+    @property
+    def params(self):
+        """
+        The export settings a checkpoint must match to be resumed.
+        """
+        return {'table': self.table.name,
+                'fmt': self.fmt,
+                'products': self.products,
+                'start': str(self.start) if self.start is not None else None,
+                'end': str(self.end) if self.end is not None else None,
+                'columns': [c.name for c in self.columns],
+                'compression': self.compression}
+
+    def get_query(self, last_key=None):
+        tc = self.table.c[self.time_column] \
+            if (self.start is not None or self.end is not None) else None
+        crit = list()
+        if self.products is not None:
+            crit.append(self.table.c.product_id.in_(self.products))
+        if self.start is not None:
+            crit.append(tc >= self.start)
+        if self.end is not None:
+            crit.append(tc < self.end)
+        if last_key is not None:
+            crit.append(self.pk > last_key)
+
+        qry = select(self.columns)
+        if crit:
+            qry = qry.where(and_(*crit))
+        return qry.order_by(self.pk).limit(self.chunksize)
+
+    def load_checkpoint(self):
+        try:
+            with open(self.checkpoint_path) as fh:
+                state = json.load(fh)
+        except (IOError, ValueError):
+            return None
+        if state.get('params', None) != self.params:
+            raise ValueError("{} was written by a different export, "
+                             "use resume=False to start over.".format(self.checkpoint_path))
+        return state
+
+    def save_checkpoint(self, state):
+        tmp = self.checkpoint_path + '.tmp'
+        with open(tmp, 'w') as fh:
+            json.dump(state, fh)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, self.checkpoint_path)
+
+    def reset(self):
+        """
+        Removes the output and checkpoint of a previous export.
+        """
+        if self.fmt == 'parquet':
+            if os.path.isdir(self.path):
+                for n in os.listdir(self.path):
+                    if n.startswith('part-') or n.startswith('_checkpoint'):
+                        os.remove(os.path.join(self.path, n))
+        else:
+            for p in (self.path, self.checkpoint_path):
+                if os.path.exists(p):
+                    os.remove(p)
+
+    def write_csv(self, df, state):
+        buf = io.StringIO()
+        df.to_csv(buf, header=state['rows'] == 0, index=False)
+        data = buf.getvalue().encode('utf-8')
+        if self.compression == 'gzip':
+            data = gzip.compress(data)
+
+        with open(self.path, 'ab') as fh:
+            fh.write(data)
+            fh.flush()
+            os.fsync(fh.fileno())
+        state['offset'] += len(data)
+        return len(data)
+
+    def write_parquet(self, df, state):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        if self._schema is None:
+            self._schema = get_arrow_schema(self.columns)
+        table = pa.Table.from_pandas(df, schema=self._schema, preserve_index=False)
+        name = 'part-{:06d}.parquet'.format(state['parts'])
+        path = os.path.join(self.path, name)
+        tmp = os.path.join(self.path, '.' + name + '.tmp')
+        pq.write_table(table, tmp, compression=self.compression)
+        os.replace(tmp, path)
+        state['parts'] += 1
+        return os.path.getsize(path)
+
+    def run(self, resume=True):
+        """
+        Exports the table.
+
+        :param resume: (bool, default True)
+            True continues from an existing checkpoint,
+            False removes previous output and starts over.
+        :return: (dict)
+            {'table', 'path', 'format', 'rows', 'chunks', 'bytes', 'seconds',
+             'rows_per_sec', 'mb_per_sec', 'resumed_rows', 'done'}
+            rows/chunks/bytes count this run only.
+        """
+        if self.fmt == 'parquet':
+            try:
+                import pyarrow
+            except ImportError:
+                raise ImportError("pyarrow package not found - install "
+                                  "using the following command:\n\tpip install pyarrow")
+            os.makedirs(self.path, exist_ok=True)
+        self._schema = None
+
+        state = self.load_checkpoint() if resume else None
+        if state is None:
+            self.reset()
+            state = {'params': self.params, 'last_key': None, 'rows': 0,
+                     'offset': 0, 'parts': 0, 'done': False}
+        elif self.fmt == 'csv' and os.path.exists(self.path):
+            # Drop anything written after the last checkpoint.
+            with open(self.path, 'ab') as fh:
+                fh.truncate(state['offset'])
+
+        resumed = state['rows']
+        rows, chunks, written = 0, 0, 0
+        t0 = time.perf_counter()
+        write = self.write_parquet if self.fmt == 'parquet' else self.write_csv
+
+        while not state['done']:
+            df = db_read_frame(self.engine, self.get_query(state['last_key']))
+            if df.empty:
+                state['done'] = True
+                self.save_checkpoint(state)
+                break
+
+            written += write(df, state)
+            last = df[self.pk.name].iloc[-1]
+            state['last_key'] = last.item() if hasattr(last, 'item') else last
+            state['rows'] += len(df)
+            state['done'] = len(df) < self.chunksize
+            self.save_checkpoint(state)
+            rows += len(df)
+            chunks += 1
+            logger.debug("Exported {} rows of {} to {}".format(
+                state['rows'], self.table.name, self.path))
+
+        seconds = time.perf_counter() - t0
+        report = {'table': self.table.name,
+                  'path': self.path,
+                  'format': self.fmt,
+                  'rows': rows,
+                  'chunks': chunks,
+                  'bytes': written,
+                  'seconds': seconds,
+                  'rows_per_sec': rows / seconds if seconds else 0.0,
+                  'mb_per_sec': written / 1048576 / seconds if seconds else 0.0,
+                  'resumed_rows': resumed,
+                  'done': state['done']}
+        logger.info("Exported {rows} rows ({bytes} bytes) of {table} in {seconds:.1f}s "
+                    "({rows_per_sec:.0f} rows/s).".format(**report))
+        return report
@@ -26,8 +26,12 @@ LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
+import os
+import json
 import pickle
+from time import time
 from bintrees import RBTree
+from stocklook.crypto.gdax.book_history import pack_book, unpack_book
 from stocklook.crypto.gdax.feeds.websocket_client import GdaxWebsocketClient
 
 
@@ -138,7 +142,25 @@ class BookSnapshot:
 
 
 class GdaxBookFeed(GdaxWebsocketClient):
-    def __init__(self, product_id='LTC-USD', log_to=None, gdax=None, auth=True):
+    """
+    Live level 3 order book for one product.
+
+    With a :param checkpoint_path the book is written to disk every
+    :param checkpoint_interval seconds and on close, and every message
+    applied since is appended to <checkpoint_path>.journal. A restart loads
+    the checkpoint and replays the journal instead of downloading and
+    rebuilding the whole level 3 book. Messages missed while the feed was down
+    are read from the stored feed when a :param db (GdaxDatabase recording the
+    full channel) is given, otherwise the book resyncs from the REST API.
+
+    .. note::
+        Every restart misses live messages, so without :param db the first
+        message after loading a checkpoint always has a sequence gap and the
+        full book is downloaded anyway. Only set :param checkpoint_path when a
+        GdaxDatabase is recording the product's full channel.
+    """
+    def __init__(self, product_id='LTC-USD', log_to=None, gdax=None, auth=True,
+                 checkpoint_path=None, checkpoint_interval=60, db=None):
 
         if gdax is None:
             from stocklook.crypto.gdax.api import Gdax
@@ -160,6 +182,11 @@ class GdaxBookFeed(GdaxWebsocketClient):
         self._key_errs = 0
         self._errs = 0
         self.message_count = 0
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_interval = checkpoint_interval
+        self.db = db
+        self._journal = None
+        self._last_checkpoint = time()
 
     @property
     def product_id(self):
@@ -187,24 +214,8 @@ class GdaxBookFeed(GdaxWebsocketClient):
             return
 
         if self._sequence == -1:
-            self._asks = RBTree()
-            self._bids = RBTree()
-            res = self._client.get_book(self.product_id, level=3)
-            for bid in res['bids']:
-                self.add({
-                    'id': bid[2],
-                    'side': 'buy',
-                    'price': float(bid[0]),
-                    'size': float(bid[1])
-                })
-            for ask in res['asks']:
-                self.add({
-                    'id': ask[2],
-                    'side': 'sell',
-                    'price': float(ask[0]),
-                    'size': float(ask[1])
-                })
-            self._sequence = res['sequence']
+            if not (self.checkpoint_path and self.load_checkpoint()):
+                self.load_rest_book()
 
         if sequence <= self._sequence:
             # ignore older messages (e.g. before order book
@@ -212,15 +223,34 @@ class GdaxBookFeed(GdaxWebsocketClient):
             return
         elif sequence > self._sequence + 1:
             print('Error: messages missing ({} - {}). '
-                  'Re-initializing websocket.'.format(sequence, self._sequence))
-            self.close()
-            self.start()
-            return
+                  'Resyncing book.'.format(sequence, self._sequence))
+            if not self.catch_up(sequence - 1):
+                self.load_rest_book()
+            if sequence <= self._sequence:
+                return
+
+        self.apply(message)
+        if self.checkpoint_path:
+            self.journal(message)
+            if time() - self._last_checkpoint >= self.checkpoint_interval:
+                self.save_checkpoint()
+
+        # bid = self.get_bid()
+        # bids = self.get_bids(bid)
+        # bid_depth = sum([b['size'] for b in bids])
+        # ask = self.get_ask()
+        # asks = self.get_asks(ask)
+        # ask_depth = sum([a['size'] for a in asks])
+        # print('bid: %f @ %f - ask: %f @ %f' % (bid_depth, bid, ask_depth, ask))
 
+    def apply(self, message):
+        """
+        Applies a full channel message to the book.
+        """
         msg_type = message['type']
         if msg_type == 'open':
             self.add(message)
-        elif msg_type == 'done' and 'price' in message:
+        elif msg_type == 'done' and message.get('price', None) is not None:
             self.remove(message)
         elif msg_type == 'match':
             self.match(message)
@@ -228,15 +258,167 @@ class GdaxBookFeed(GdaxWebsocketClient):
         elif msg_type == 'change':
             self.change(message)
 
+        self._sequence = int(message['sequence'])
+
+    def load_rest_book(self):
+        """
+        Replaces the book with the level 3 book from the REST API.
+        """
+        self._asks = RBTree()
+        self._bids = RBTree()
+        res = self._client.get_book(self.product_id, level=3)
+        for bid in res['bids']:
+            self.add({
+                'id': bid[2],
+                'side': 'buy',
+                'price': float(bid[0]),
+                'size': float(bid[1])
+            })
+        for ask in res['asks']:
+            self.add({
+                'id': ask[2],
+                'side': 'sell',
+                'price': float(ask[0]),
+                'size': float(ask[1])
+            })
+        self._sequence = res['sequence']
+        if self.checkpoint_path:
+            self.save_checkpoint()
+
+    def catch_up(self, to_sequence):
+        """
+        Applies messages after the book's sequence up to :param to_sequence
+        from the stored feed in GdaxBookFeed.db.
+
+        :return: (bool)
+            True if every sequence up to :param to_sequence was stored.
+        """
+        if self.db is None:
+            return False
+        from stocklook.crypto.gdax.book_history import GdaxBookHistory
+        hist = GdaxBookHistory(self.db, self.product_id)
+        start = self._sequence
+
+        while self._sequence < to_sequence:
+            df = hist.read_messages(self._sequence)
+            df = df.loc[df['sequence'] <= to_sequence]
+            if df.empty:
+                break
+            for msg in df.to_dict('records'):
+                msg = {k: v for k, v in msg.items() if v == v and v is not None}
+                if int(msg['sequence']) != self._sequence + 1:
+                    return False
+                self.apply(msg)
+
+        if self._sequence == to_sequence:
+            print("Caught up {} messages from the database.".format(to_sequence - start))
+            if self.checkpoint_path:
+                # The journal doesn't have these messages.
+                self.save_checkpoint()
+            return True
+        return False
+
+    def get_checkpoint_bytes(self):
+        """
+        Returns the book packed with stocklook.crypto.gdax.book_history.pack_book.
+        """
+        def orders():
+            for tree in (self._bids, self._asks):
+                for price, level in tree.items():
+                    for o in level:
+                        yield o['id'], o['side'], o['price'], o['size']
+        return pack_book(self.product_id, self._sequence, orders())
+
+    def save_checkpoint(self, path=None):
+        """
+        Writes the book to :param path (default GdaxBookFeed.checkpoint_path)
+        and starts a new journal. The file is replaced atomically so
+        a crash never leaves a partial checkpoint behind.
+        """
+        if path is None:
+            path = self.checkpoint_path
+        if self._sequence == -1 or self._bids is None:
+            return
+        data = self.get_checkpoint_bytes()
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as fh:
+            fh.write(data)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, path)
+
+        if self._journal is not None:
+            self._journal.close()
+        self._journal = open(path + '.journal', 'w')
+        self._last_checkpoint = time()
+
+    def load_checkpoint(self, path=None):
+        """
+        Loads the book from :param path (default GdaxBookFeed.checkpoint_path)
+        and replays the messages journaled after it.
+
+        :return: (bool) False if there's no usable checkpoint.
+        """
+        if path is None:
+            path = self.checkpoint_path
+        try:
+            with open(path, 'rb') as fh:
+                product_id, sequence, orders = unpack_book(fh.read())
+        except (OSError, ValueError) as e:
+            if os.path.exists(path):
+                print("Ignoring unreadable book checkpoint {}: {}".format(path, e))
+            return False
+        if product_id != self.product_id:
+            return False
+
+        bids, asks = dict(), dict()
+        for order_id, side, price, size in orders:
+            tree = bids if side == 'buy' else asks
+            o = {'id': order_id, 'side': side, 'price': price, 'size': size}
+            try:
+                tree[price].append(o)
+            except KeyError:
+                tree[price] = [o]
+        self._bids = RBTree(bids)
+        self._asks = RBTree(asks)
         self._sequence = sequence
 
-        # bid = self.get_bid()
-        # bids = self.get_bids(bid)
-        # bid_depth = sum([b['size'] for b in bids])
-        # ask = self.get_ask()
-        # asks = self.get_asks(ask)
-        # ask_depth = sum([a['size'] for a in asks])
-        # print('bid: %f @ %f - ask: %f @ %f' % (bid_depth, bid, ask_depth, ask))
+        replayed = 0
+        journal = path + '.journal'
+        if os.path.exists(journal):
+            with open(journal, 'r') as fh:
+                for line in fh:
+                    try:
+                        msg = json.loads(line)
+                    except ValueError:
+                        # Partial line from a crash.
+                        break
+                    seq = int(msg['sequence'])
+                    if seq <= self._sequence:
+                        continue
+                    elif seq > self._sequence + 1:
+                        break
+                    self.apply(msg)
+                    replayed += 1
+        print("Loaded {} book checkpoint at sequence {} "
+              "(+{} journaled messages).".format(self.product_id, sequence, replayed))
+        self._journal = open(journal, 'a')
+        return True
+
+    def journal(self, message):
+        if self._journal is None:
+            self._journal = open(self.checkpoint_path + '.journal', 'a')
+        self._journal.write(json.dumps(message, separators=(',', ':')))
+        self._journal.write('\n')
+
+    def close(self):
+        super(GdaxBookFeed, self).close()
+        # The listening thread has stopped so the book is stable.
+        if self.checkpoint_path and self._sequence != -1:
+            self.save_checkpoint()
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
 
     def on_error(self, e):
         self._sequence = -1
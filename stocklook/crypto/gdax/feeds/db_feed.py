@@ -23,6 +23,7 @@ SOFTWARE.
 """
 from time import sleep
 from stocklook.utils.timetools import now_minus
+from stocklook.utils.spool import MessageSpool
 from stocklook.crypto.gdax.feeds.db_loader import GdaxDatabaseLoader
 from stocklook.crypto.gdax.feeds.websocket_client import GdaxWebsocketClient
 from stocklook.crypto.gdax.tables import GDAX_FEED_CLASS_MAP
@@ -83,7 +84,8 @@ class GdaxDatabaseFeed(GdaxWebsocketClient):
     _dtypes = dict()
     _class_map = GDAX_FEED_CLASS_MAP
 
-    def __init__(self, gdax=None, gdax_db=None, products=None, channels=None):
+    def __init__(self, gdax=None, gdax_db=None, products=None, channels=None, spool_dir=None,
+                 tick_cache=None):
         """
 
         :param gdax: (gdax.api.Gdax)
@@ -101,6 +103,16 @@ class GdaxDatabaseFeed(GdaxWebsocketClient):
 
         :param channels (list, default ['ticker', 'full'])
             A list of websocket channels to subscribe to.
+
+        :param spool_dir: (str, default None)
+            A directory where loaders spool messages to disk while the
+            database is unavailable or lagging. Spooled messages are replayed
+            once it recovers (including after a restart).
+            None keeps messages in memory only.
+
+        :param tick_cache: (stocklook.crypto.gdax.tick_cache.GdaxTickCache, default None)
+            Ticker messages are also kept in this in-memory cache
+            of recent ticks per product.
         """
 
         if products is None:
@@ -138,6 +150,8 @@ class GdaxDatabaseFeed(GdaxWebsocketClient):
 
         self.queues = dict()
         self._loaders = dict()
+        self.spool_dir = spool_dir
+        self.tick_cache = tick_cache
 
     def on_open(self):
         """
@@ -204,9 +218,16 @@ class GdaxDatabaseFeed(GdaxWebsocketClient):
             else:
                 c = 20
 
+            spool = None
+            if self.spool_dir is not None:
+                spool = MessageSpool(self.spool_dir, prefix=cls.__tablename__)
+
             loader = GdaxDatabaseLoader(maker, q, cls,
                                         raise_on_error=True,
-                                        commit_interval=c)
+                                        commit_interval=c,
+                                        spool=spool,
+                                        writer=self.db.get_writer(),
+                                        tick_cache=self.tick_cache if channel == self.TICKER else None)
             self._loaders[channel] = loader
             loader.start()
 
@@ -231,6 +252,9 @@ class GdaxDatabaseFeed(GdaxWebsocketClient):
         for loader in loaders:
             loader.join()
 
+        if self.db is not None:
+            self.db.flush_writer()
+
     def on_message(self, msg):
         """
         Parses msg['type'] and places the message
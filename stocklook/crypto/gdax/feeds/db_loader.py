@@ -31,4 +31,15 @@ class GdaxDatabaseLoader(DatabaseLoadingThread):
                 'gdax_feed': 1000,
                 }
 
-
+    def __init__(self, *args, **kwargs):
+        """
+        :param tick_cache: (stocklook.crypto.gdax.tick_cache.GdaxTickCache, default None)
+            Ticker messages are also pushed into this cache.
+        Other arguments are passed to DatabaseLoadingThread.
+        """
+        self.tick_cache = kwargs.pop('tick_cache', None)
+        super(GdaxDatabaseLoader, self).__init__(*args, **kwargs)
+
+    def on_message(self, msg):
+        if self.tick_cache is not None:
+            self.tick_cache.add(msg)
@@ -0,0 +1,394 @@
+"""
+MIT License
+
+Copyright (c) 2017 Zeke Barge
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import os
+import time
+import uuid
+import logging as lg
+from queue import Queue, Empty
+from threading import Thread, Lock
+from pandas import DataFrame, Series, Timestamp, to_datetime, to_numeric
+from stocklook.crypto.gdax.feeds.db_feed import GdaxDatabaseFeed
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+
+except ImportError as e:
+    raise ImportError("pyarrow package not found - install "
+                      "using the following command:\n\tpip install pyarrow")
+
+logger = lg.getLogger(__name__)
+
+# Columns that only make sense inside a relational table.
+PARQUET_SKIP_COLUMNS = ('date_added', 'product_id')
+PARQUET_PARTITIONING = ds.partitioning(
+    pa.schema([('product_id', pa.string()),
+               ('date', pa.string()),
+               ('hour', pa.int8())]),
+    flavor='hive')
+
+
+def get_parquet_schema(sql_table):
+    """
+    Builds a pyarrow schema for a GDAX feed table.
+    Primary keys and bookkeeping columns are dropped, product_id
+    lives in the partition path and 'time' is always stored
+    as a UTC timestamp no matter how the SQL table types it.
+
+    :param sql_table: (declarative_base object)
+        A table from stocklook.crypto.gdax.tables.GDAX_FEED_CLASS_MAP
+
+    :return: (pyarrow.Schema)
+    """
+    fields = [('time', pa.timestamp('us', tz='UTC'))]
+    for c in sql_table.__table__.columns:
+        if c.primary_key or c.name in PARQUET_SKIP_COLUMNS \
+                or c.name == 'time':
+            continue
+        py_type = c.type.python_type
+        if py_type == float:
+            tp = pa.float64()
+        elif py_type == int:
+            tp = pa.int64()
+        elif 'date' in str(py_type).lower():
+            tp = pa.timestamp('us', tz='UTC')
+        else:
+            tp = pa.string()
+        fields.append((c.name, tp))
+    return pa.schema(fields)
+
+
+class GdaxParquetSink:
+    """
+    Buffers GDAX websocket messages per (table, product, hour)
+    into column lists and writes each batch as a Parquet file under:
+
+        root/<table>/product_id=<product>/date=<YYYY-MM-DD>/hour=<HH>/part-*.parquet
+
+    Batches are written when they reach :param batch_size rows or
+    are older than :param max_age seconds. Files are written under
+    a hidden name and renamed so readers never see partial files.
+    """
+    def __init__(self, root, batch_size=50000, max_age=300,
+                 compression='snappy'):
+        self.root = root
+        self.batch_size = batch_size
+        self.max_age = max_age
+        self.compression = compression
+        self.schemas = dict()
+        self._buffers = dict()
+        self._lock = Lock()
+
+    def get_schema(self, sql_table):
+        name = sql_table.__tablename__
+        try:
+            return self.schemas[name]
+        except KeyError:
+            schema = get_parquet_schema(sql_table)
+            self.schemas[name] = schema
+            return schema
+
+    def add(self, sql_table, msg):
+        """
+        Appends a message to the buffer for its product and hour.
+        Writes the buffer out when it reaches the batch size.
+        Messages without a time are stored (and partitioned) with the
+        time they were received.
+
+        :param sql_table: (declarative_base object)
+        :param msg: (dict)
+            A GDAX websocket message.
+        :return:
+        """
+        schema = self.get_schema(sql_table)
+        t = msg.get('time') or Timestamp.now('UTC').strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+        key = (sql_table.__tablename__,
+               msg.get('product_id', 'unknown'),
+               t[:10], int(t[11:13]))
+
+        with self._lock:
+            try:
+                buf = self._buffers[key]
+            except KeyError:
+                buf = (time.time(), {n: [] for n in schema.names})
+                self._buffers[key] = buf
+            cols = buf[1]
+            for name, values in cols.items():
+                values.append(t if name == 'time' else msg.get(name, None))
+            full = len(cols['time']) >= self.batch_size
+            if full:
+                del self._buffers[key]
+
+        if full:
+            self.write(key, cols)
+
+    def flush(self, force=False):
+        """
+        Writes buffers older than max_age (or all of them).
+        :param force: (bool, default False)
+            True writes every buffer regardless of age.
+        :return: (int) the number of files written.
+        """
+        cutoff = time.time() - self.max_age
+        with self._lock:
+            keys = [k for k, (t, _) in self._buffers.items()
+                    if force or t <= cutoff]
+            due = [(k, self._buffers.pop(k)[1]) for k in keys]
+
+        for key, cols in due:
+            self.write(key, cols)
+        return len(due)
+
+    def to_table(self, table_name, cols):
+        """
+        Converts buffered column lists into a typed pyarrow Table.
+        Unparseable values become nulls rather than failing the batch.
+        """
+        schema = self.schemas[table_name]
+        arrays = list()
+        for field in schema:
+            values = cols[field.name]
+            if pa.types.is_timestamp(field.type):
+                s = to_datetime(Series(values, dtype=object),
+                                utc=True, errors='coerce')
+            elif pa.types.is_floating(field.type):
+                s = to_numeric(Series(values, dtype=object), errors='coerce')
+            elif pa.types.is_integer(field.type):
+                s = to_numeric(Series(values, dtype=object),
+                               errors='coerce').astype('Int64')
+            else:
+                s = Series([None if v is None else str(v) for v in values],
+                           dtype=object)
+            arrays.append(pa.array(s, type=field.type, from_pandas=True))
+        return pa.Table.from_arrays(arrays, schema=schema)
+
+    def get_path(self, key):
+        table_name, product, date, hour = key
+        return os.path.join(self.root, table_name,
+                            'product_id={}'.format(product),
+                            'date={}'.format(date),
+                            'hour={:02d}'.format(hour))
+
+    def write(self, key, cols):
+        table = self.to_table(key[0], cols).sort_by('time')
+        dir_path = self.get_path(key)
+        os.makedirs(dir_path, exist_ok=True)
+        name = 'part-{}-{}.parquet'.format(
+            int(time.time() * 1000), uuid.uuid4().hex[:8])
+        tmp = os.path.join(dir_path, '.' + name)
+        pq.write_table(table, tmp, compression=self.compression)
+        os.replace(tmp, os.path.join(dir_path, name))
+        logger.debug("Wrote {} rows to {}".format(table.num_rows, dir_path))
+        return table.num_rows
+
+
+class GdaxParquetReader:
+    """
+    Reads Parquet files written by GdaxParquetSink.
+    Product, date and hour filters prune partition directories
+    and time filters are pushed down to row group statistics,
+    so only the files and row groups in range get scanned.
+    """
+    def __init__(self, root):
+        self.root = root
+
+    def tables(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(d for d in os.listdir(self.root)
+                      if os.path.isdir(os.path.join(self.root, d)))
+
+    def get_dataset(self, table_name):
+        return ds.dataset(os.path.join(self.root, table_name),
+                          format='parquet',
+                          partitioning=PARQUET_PARTITIONING)
+
+    @staticmethod
+    def get_filter(products=None, start=None, end=None):
+        expr = None
+
+        def _and(a, b):
+            return b if a is None else a & b
+
+        if products:
+            if isinstance(products, str):
+                products = [products]
+            expr = _and(expr, ds.field('product_id').isin(list(products)))
+
+        if start is not None:
+            start = Timestamp(start)
+            start = start.tz_localize('UTC') if start.tzinfo is None \
+                else start.tz_convert('UTC')
+            expr = _and(expr, ds.field('date') >= start.strftime('%Y-%m-%d'))
+            expr = _and(expr, ds.field('time') >= pa.scalar(
+                start.to_pydatetime(), type=pa.timestamp('us', tz='UTC')))
+
+        if end is not None:
+            end = Timestamp(end)
+            end = end.tz_localize('UTC') if end.tzinfo is None \
+                else end.tz_convert('UTC')
+            expr = _and(expr, ds.field('date') <= end.strftime('%Y-%m-%d'))
+            expr = _and(expr, ds.field('time') < pa.scalar(
+                end.to_pydatetime(), type=pa.timestamp('us', tz='UTC')))
+
+        return expr
+
+    def read(self, table_name, products=None, start=None,
+             end=None, columns=None):
+        """
+        Returns a DataFrame of rows from :param table_name
+        sorted by time.
+
+        :param table_name: (str)
+            gdax_ticks, gdax_feed, gdax_heartbeats, gdax_changes
+        :param products: (str, list, default None)
+            None reads all products.
+        :param start: (str, datetime, default None)
+            Inclusive lower bound on time (naive times are UTC).
+        :param end: (str, datetime, default None)
+            Exclusive upper bound on time (naive times are UTC).
+        :param columns: (list, default None)
+            Columns to read, None reads all of them.
+        :return: (pandas.DataFrame)
+        """
+        if not os.path.isdir(os.path.join(self.root, table_name)):
+            return DataFrame(columns=columns or [])
+
+        dataset = self.get_dataset(table_name)
+        if columns is not None:
+            columns = list(columns)
+            if 'time' not in columns:
+                columns.append('time')
+
+        table = dataset.to_table(
+            columns=columns,
+            filter=self.get_filter(products, start, end))
+        return table.sort_by('time').to_pandas()
+
+
+class GdaxParquetLoader(Thread):
+    """
+    Consumes GDAX websocket messages from a Queue
+    and hands them to a GdaxParquetSink. Mirrors the
+    stop signal protocol of the GdaxDatabaseLoader.
+    """
+    STOP_SIGNAL = '--stop--'
+
+    def __init__(self, sink, queue, sql_object, **kwargs):
+        self.sink = sink
+        self.queue = queue
+        self.obj = sql_object
+        self.count = 0
+        kwargs.pop('target', None)
+        kwargs.pop('args', None)
+        super(GdaxParquetLoader, self).__init__(**kwargs)
+
+    @property
+    def type(self):
+        return self.obj.__tablename__
+
+    def run(self):
+        while True:
+            try:
+                msg = self.queue.get(timeout=1)
+            except Empty:
+                self.sink.flush()
+                continue
+
+            try:
+                if isinstance(msg, str) and msg == self.STOP_SIGNAL:
+                    self.sink.flush(force=True)
+                    logger.info("Stop signal received on "
+                                "'{}'.".format(self.type))
+                    break
+                self.sink.add(self.obj, msg)
+                self.count += 1
+            except Exception as e:
+                logger.error("Error storing message on "
+                             "'{}': {}".format(self.type, e))
+            finally:
+                self.queue.task_done()
+
+
+class GdaxParquetFeed(GdaxDatabaseFeed):
+    """
+    A GdaxDatabaseFeed that stores messages as partitioned
+    Parquet files instead of relational tables. Accepts the same
+    keyword arguments as GdaxDatabaseFeed plus the ones below.
+
+    Read the data back with GdaxParquetReader(feed.root).
+    """
+    def __init__(self, root=None, batch_size=50000, max_age=300, **kwargs):
+        """
+        :param root: (str, default None)
+            Directory to write Parquet files into.
+            None defaults to DATA_DIRECTORY/gdax_parquet.
+
+        :param batch_size: (int, default 50000)
+            Rows buffered per (table, product, hour) before writing a file.
+
+        :param max_age: (int, default 300)
+            Seconds a buffer may wait before it is written regardless of size.
+        """
+        super(GdaxParquetFeed, self).__init__(**kwargs)
+        if root is None:
+            from stocklook.config import config, DATA_DIRECTORY
+            root = os.path.join(config[DATA_DIRECTORY], 'gdax_parquet')
+        self.root = root
+        self.sink = GdaxParquetSink(root, batch_size=batch_size,
+                                    max_age=max_age)
+
+    def on_open(self):
+        # No database to prepare.
+        pass
+
+    def get_loader(self, channel):
+        """
+        Retrieves or starts the GdaxParquetLoader for a channel.
+
+        :raises KeyError:
+            When a channel doesn't exist in the GdaxParquetFeed._class_map
+        """
+        try:
+            return self._loaders[channel]
+        except KeyError:
+            cls = self._class_map[channel]
+            q = self.queues.get(channel, None)
+            if q is None:
+                q = Queue()
+                self.queues[channel] = q
+            loader = GdaxParquetLoader(self.sink, q, cls, daemon=True)
+            self._loaders[channel] = loader
+            loader.start()
+            return loader
+
+    def stop_loaders(self):
+        super(GdaxParquetFeed, self).stop_loaders()
+        # Stopped threads can't be restarted so
+        # the next message spawns fresh loaders.
+        self._loaders.clear()
+
+    def get_reader(self):
+        return GdaxParquetReader(self.root)
@@ -83,7 +83,9 @@ class GdaxMarketMaker:
                  max_open_buys=6,
                  max_open_sells=12,
                  manage_existing_orders=True,
-                 aggressive=True):
+                 aggressive=True,
+                 book_checkpoint_path=None,
+                 book_db=None):
         """
         Gdax market maker bot automatically trades the spreads.
 
@@ -132,11 +134,25 @@ class GdaxMarketMaker:
         :param aggressive: (bool, default True)
             The aggressive parameter is used to determine how tight or loose to manage order prices.
             An aggressive bot trades more frequently for tighter spreads/margins.
+
+        :param book_checkpoint_path: (str, default None)
+            File the default book feed checkpoints the order book to
+            so restarts don't wait on downloading the full level 3 book.
+            Only useful together with :param book_db.
+            See stocklook.crypto.gdax.feeds.book_feed.GdaxBookFeed
+
+        :param book_db: (stocklook.crypto.gdax.db.GdaxDatabase, default None)
+            A database recording the product's full channel. A restart reads
+            the messages missed while the bot was down from it to bring
+            the checkpointed book current. Without it the first sequence
+            gap after a restart downloads the full level 3 book anyway.
         """
         if book_feed is None:
             book_feed = GdaxBookFeed(product_id=product_id,
                                      gdax=gdax,
-                                     auth=True)
+                                     auth=True,
+                                     checkpoint_path=book_checkpoint_path,
+                                     db=book_db)
         if gdax is None:
             gdax = book_feed.gdax
 
@@ -0,0 +1,223 @@
+"""
+MIT License
+
+Copyright (c) 2017 Zeke Barge
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import logging as lg
+from pandas import Timestamp
+from sqlalchemy import (MetaData, Table, DateTime, BigInteger,
+                        inspect, select, text)
+from stocklook.config import config
+from .tables import (GdaxBase,
+                     GdaxSQLQuote,
+                     GdaxSQLFeedEntry,
+                     GdaxSQLTickerFeedEntry,
+                     GdaxSQLHeartbeatFeedEntry,
+                     GdaxSQLOrderChange)
+
+logger = lg.getLogger(__name__)
+
+# Tables whose column types changed from String/Integer
+# to DateTime/BigInteger and may need rebuilding.
+GDAX_TYPED_TABLES = (GdaxSQLQuote,
+                     GdaxSQLFeedEntry,
+                     GdaxSQLTickerFeedEntry,
+                     GdaxSQLHeartbeatFeedEntry,
+                     GdaxSQLOrderChange)
+
+
+def get_type_mismatches(engine, sql_table):
+    """
+    Returns a list of column names whose type in the database
+    doesn't match the model. Integer -> BigInteger is ignored on SQLite
+    because SQLite integers are already 64-bit.
+
+    :param engine: (sqlalchemy.engine.Engine)
+    :param sql_table: (declarative_base object)
+    :return: (list)
+    """
+    insp = inspect(engine)
+    name = sql_table.__tablename__
+    if name not in insp.get_table_names():
+        return []
+
+    db_cols = {c['name']: c['type'] for c in insp.get_columns(name)}
+    sqlite = engine.dialect.name == 'sqlite'
+    mismatches = list()
+
+    for c in sql_table.__table__.columns:
+        db_type = db_cols.get(c.name, None)
+        if db_type is None:
+            continue
+        if isinstance(c.type, DateTime):
+            if not isinstance(db_type, DateTime):
+                mismatches.append(c.name)
+        elif isinstance(c.type, BigInteger) and not sqlite:
+            if not isinstance(db_type, BigInteger):
+                mismatches.append(c.name)
+
+    return mismatches
+
+
+def to_local_datetime(value):
+    """
+    Converts a legacy string time ('2017-09-02T17:05:49.250000Z')
+    into a naive local datetime the way the loaders store it.
+    Naive strings are assumed to be local already.
+    Unparseable values become None.
+    """
+    if value is None or value == '':
+        return None
+    try:
+        t = Timestamp(value)
+    except ValueError:
+        return None
+    if t is None or t != t:
+        return None
+    if t.tzinfo is not None:
+        t = t.tz_convert(config['PYTZ_TIMEZONE']).tz_localize(None)
+    return t.to_pydatetime()
+
+
+def rebuild_table(engine, sql_table, chunksize=50000):
+    """
+    Rebuilds an existing table using the current model definition:
+        1) Renames the table to <name>_old.
+        2) Creates the table (and its indexes) from the model.
+        3) Copies rows across in chunks converting DateTime columns.
+        4) Drops <name>_old.
+
+    This works the same way on SQLite (no ALTER COLUMN) and
+    MySQL/Postgres, at the cost of rewriting the table once.
+
+    :return: (int) the number of rows copied.
+    """
+    name = sql_table.__tablename__
+    old_name = '{}_old'.format(name)
+    new = sql_table.__table__
+    date_cols = [c.name for c in new.columns
+                 if isinstance(c.type, DateTime)]
+    pk = [c.name for c in new.primary_key.columns]
+    count = 0
+
+    with engine.begin() as conn:
+        # Index names are global on SQLite/Postgres so the
+        # old table's indexes must go before the new ones are made.
+        prep = conn.dialect.identifier_preparer
+        for idx in inspect(conn).get_indexes(name):
+            sql = 'DROP INDEX {}'.format(prep.quote(idx['name']))
+            if conn.dialect.name == 'mysql':
+                sql += ' ON {}'.format(prep.quote(name))
+            conn.execute(text(sql))
+        if conn.dialect.name == 'postgresql' and len(pk) == 1:
+            # The serial sequence name would collide with the new table's.
+            seq = conn.execute(text("SELECT pg_get_serial_sequence('{}', '{}')"
+                                    "".format(name, pk[0]))).scalar()
+            if seq:
+                conn.execute(text('ALTER SEQUENCE {} RENAME TO {}_{}_seq'
+                                  ''.format(seq, old_name, pk[0])))
+        conn.execute(text('ALTER TABLE {} RENAME TO {}'.format(name, old_name)))
+        new.create(bind=conn)
+
+        old = Table(old_name, MetaData(), autoload_with=conn)
+        keys = [c.name for c in new.columns if c.name in old.columns]
+        convert = [c for c in date_cols if c in keys]
+        qry = select([old.c[k] for k in keys]).order_by(*[old.c[p] for p in pk])
+        res = conn.execution_options(stream_results=True).execute(qry)
+
+        while True:
+            rows = res.fetchmany(chunksize)
+            if not rows:
+                break
+            recs = [dict(zip(keys, r)) for r in rows]
+            for r in recs:
+                for c in convert:
+                    r[c] = to_local_datetime(r[c])
+            conn.execute(new.insert(), recs)
+            count += len(recs)
+
+        old.drop(bind=conn)
+
+        if conn.dialect.name == 'postgresql' and len(pk) == 1 and count:
+            # Keep the serial sequence ahead of the copied ids.
+            conn.execute(text(
+                "SELECT setval(pg_get_serial_sequence('{0}', '{1}'), "
+                "(SELECT MAX({1}) FROM {0}))".format(name, pk[0])))
+
+    logger.info("Rebuilt {}: {} rows copied.".format(name, count))
+    return count
+
+
+def create_missing_indexes(engine, base=None):
+    """
+    Creates any index declared on the models that doesn't
+    exist yet in the database. MetaData.create_all only makes
+    indexes along with new tables so existing databases need this.
+
+    :return: (list) names of the indexes created.
+    """
+    if base is None:
+        base = GdaxBase
+    insp = inspect(engine)
+    created = list()
+
+    names = insp.get_table_names()
+
+    for table in base.metadata.sorted_tables:
+        if table.name not in names:
+            continue
+        existing = {i['name'] for i in insp.get_indexes(table.name)}
+        for idx in table.indexes:
+            if idx.name not in existing:
+                logger.info("Creating index {}".format(idx.name))
+                idx.create(bind=engine)
+                created.append(idx.name)
+
+    return created
+
+
+def migrate_gdax_database(engine, chunksize=50000, base=None):
+    """
+    Brings an existing GDAX database up to the current schema:
+    rebuilds tables with outdated column types and then
+    creates missing indexes. Safe to run repeatedly.
+
+    :param engine: (sqlalchemy.engine.Engine)
+    :param chunksize: (int, default 50000)
+        Rows copied per batch while rebuilding a table.
+    :return: (dict)
+        {'rebuilt': {table: rows_copied}, 'indexes': [index_name, ...]}
+    """
+    if base is None:
+        base = GdaxBase
+    base.metadata.create_all(bind=engine, checkfirst=True)
+    rebuilt = dict()
+
+    for sql_table in GDAX_TYPED_TABLES:
+        cols = get_type_mismatches(engine, sql_table)
+        if cols:
+            logger.info("{} has outdated columns: "
+                        "{}".format(sql_table.__tablename__, cols))
+            rebuilt[sql_table.__tablename__] = rebuild_table(
+                engine, sql_table, chunksize=chunksize)
+
+    return {'rebuilt': rebuilt,
+            'indexes': create_missing_indexes(engine, base)}
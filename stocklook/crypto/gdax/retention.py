@@ -0,0 +1,434 @@
+"""
+MIT License
+
+Copyright (c) 2017 Zeke Barge
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import os
+import gzip
+import time
+import logging as lg
+from threading import Thread, Event
+from datetime import datetime, timedelta
+from pandas import DataFrame
+from sqlalchemy import and_, select, func, text
+from stocklook.utils.database import (db_read_frame,
+                                      db_frame_to_params,
+                                      db_bulk_upsert)
+from .tables import (GdaxSQLFeedEntry,
+                     GdaxSQLTickerFeedEntry,
+                     GdaxSQLHeartbeatFeedEntry,
+                     GdaxSQLOrderChange,
+                     GdaxTickSnapshot,
+                     GdaxTradeBar)
+
+logger = lg.getLogger(__name__)
+
+
+def floor_minute(dt):
+    return dt.replace(second=0, microsecond=0)
+
+
+def compact_ticks(df):
+    """
+    Compacts gdax_ticks rows into one minute top-of-book
+    snapshots (last price/bid/ask, summed size, tick count).
+
+    :param df: (pandas.DataFrame)
+    :return: (pandas.DataFrame)
+        Columns match GdaxTickSnapshot.
+    """
+    df = df.dropna(subset=['time']).sort_values('time')
+    if df.empty:
+        return DataFrame()
+    df = df.assign(minute=df['time'].dt.floor('min'))
+    g = df.groupby(['product_id', 'minute'], sort=False)
+    out = g.agg(price=('price', 'last'),
+                best_bid=('best_bid', 'last'),
+                best_ask=('best_ask', 'last'),
+                volume=('last_size', 'sum'),
+                ticks=('price', 'size'))
+    out = out.reset_index().rename(columns={'minute': 'time'})
+    return out
+
+
+def compact_trades(df):
+    """
+    Compacts the match messages in gdax_feed rows
+    into one minute trade bars.
+
+    :param df: (pandas.DataFrame)
+    :return: (pandas.DataFrame)
+        Columns match GdaxTradeBar.
+    """
+    df = df.loc[df['type'] == 'match'].dropna(subset=['time', 'price'])
+    if df.empty:
+        return DataFrame()
+    df = df.sort_values('time')
+    df = df.assign(minute=df['time'].dt.floor('min'))
+    g = df.groupby(['product_id', 'minute'], sort=False)
+    out = g.agg(open=('price', 'first'),
+                high=('price', 'max'),
+                low=('price', 'min'),
+                close=('price', 'last'),
+                volume=('size', 'sum'),
+                trades=('price', 'size'))
+    out = out.reset_index().rename(columns={'minute': 'time'})
+    return out
+
+
+class RetentionPolicy:
+    """
+    Describes how long raw rows are kept in a feed table
+    and what happens to them once they expire.
+
+    Expired rows are processed in time windows, read in batches
+    of whole minutes:
+        1) Archived to gzipped CSV files (one per table per batch).
+        2) Compacted into :param compact_table via :param compact.
+        3) Deleted by primary key, in the same (short) transaction
+           as the batch's compacted rows are written.
+
+    Rows with a NULL time are never expired, they can't be placed
+    in a window. Delete them separately if a table collects them.
+    """
+    def __init__(self, sql_table, keep_days, compact=None,
+                 compact_table=None, archive=True, window=timedelta(minutes=30)):
+        """
+        :param sql_table: (declarative_base object)
+            The raw table, it must have a DateTime 'time' column.
+        :param keep_days: (int, float)
+            Rows with a time older than this are expired.
+        :param compact: (callable, default None)
+            compact(DataFrame) -> DataFrame of rows
+            for :param compact_table.
+        :param compact_table: (declarative_base object, default None)
+            Must have a unique (product_id, time) constraint
+            so re-compacting a window overwrites the same rows.
+        :param archive: (bool, default True)
+            False deletes expired rows without writing them to disk.
+        :param window: (datetime.timedelta, default 30 minutes)
+            Expired rows are processed this much time at a time.
+            Windows and the batches read from them are minute-aligned
+            so compacted bars are never split.
+        """
+        if compact is not None and compact_table is None:
+            raise ValueError("compact_table is required with compact.")
+        self.sql_table = sql_table
+        self.keep_days = keep_days
+        self.compact = compact
+        self.compact_table = compact_table
+        self.archive = archive
+        self.window = window
+
+    @property
+    def table(self):
+        return self.sql_table.__table__
+
+    @property
+    def name(self):
+        return self.sql_table.__tablename__
+
+    def get_cutoff(self, now=None):
+        if now is None:
+            now = datetime.now()
+        return floor_minute(now - timedelta(days=self.keep_days))
+
+
+# Raw full channel messages and ticks are compacted to one minute
+# bars/snapshots, order book changes and heartbeats are just expired.
+DEFAULT_RETENTION_POLICIES = (
+    RetentionPolicy(GdaxSQLFeedEntry, 7,
+                    compact=compact_trades, compact_table=GdaxTradeBar),
+    RetentionPolicy(GdaxSQLTickerFeedEntry, 7,
+                    compact=compact_ticks, compact_table=GdaxTickSnapshot),
+    RetentionPolicy(GdaxSQLOrderChange, 3),
+    RetentionPolicy(GdaxSQLHeartbeatFeedEntry, 1, archive=False),
+)
+
+
+def get_database_bytes(engine):
+    """
+    Returns the bytes in use by the database or None
+    when the dialect isn't supported.
+        SQLite: used pages (page_count - freelist_count) * page_size,
+            freed pages are reused before the file grows.
+        Postgres: pg_database_size, space is reclaimed by (auto)vacuum.
+        MySQL: data_length + index_length of the current schema.
+    """
+    name = engine.dialect.name
+    with engine.connect() as conn:
+        if name == 'sqlite':
+            pages = conn.execute(text('PRAGMA page_count')).scalar()
+            free = conn.execute(text('PRAGMA freelist_count')).scalar()
+            size = conn.execute(text('PRAGMA page_size')).scalar()
+            return (pages - free) * size
+        elif name == 'postgresql':
+            return conn.execute(text(
+                'SELECT pg_database_size(current_database())')).scalar()
+        elif name == 'mysql':
+            res = conn.execute(text(
+                'SELECT SUM(data_length + index_length) '
+                'FROM information_schema.tables '
+                'WHERE table_schema = DATABASE()')).scalar()
+            return int(res or 0)
+    return None
+
+
+def archive_frame(df, archive_dir, table_name, batch_start):
+    """
+    Writes the rows of one retention batch to a gzipped CSV file
+    :param archive_dir/<table_name>/<table_name>_<YYYY-MM-DD_HHMM>.csv.gz
+    named by :param batch_start, the batch's first minute. The file is
+    written to a temporary path and moved into place so archiving a batch
+    again (ie after a run was interrupted before its delete committed)
+    replaces the file rather than duplicating rows. Read a day back with
+    pandas.read_csv over the files matching <table_name>_<YYYY-MM-DD>_*.csv.gz.
+
+    :return: (int) bytes added to the archive.
+    """
+    folder = os.path.join(archive_dir, table_name)
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, '{}_{}.csv.gz'.format(
+        table_name, batch_start.strftime('%Y-%m-%d_%H%M')))
+    before = os.path.getsize(path) if os.path.exists(path) else 0
+
+    tmp = path + '.tmp'
+    with gzip.open(tmp, 'wt', newline='') as fh:
+        df.to_csv(fh, index=False)
+    os.replace(tmp, path)
+    return os.path.getsize(path) - before
+
+
+def read_batches(engine, table, start, end, batch_size):
+    """
+    Yields the rows of :param table with a time in [start, end) as
+    DataFrames of about :param batch_size rows (oldest first) cut on
+    minute boundaries. A minute holding more rows than batch_size
+    is yielded whole.
+
+    :param engine: (sqlalchemy.engine.Engine)
+    :param table: (sqlalchemy.Table)
+    :param start: (datetime.datetime)
+    :param end: (datetime.datetime)
+    :param batch_size: (int)
+    :return: (generator)
+    """
+    t = table
+    while start < end:
+        qry = select([t]).where(and_(t.c.time >= start, t.c.time < end))
+        df = db_read_frame(engine, qry.order_by(t.c.time).limit(batch_size))
+        if df.empty:
+            return
+        if len(df) < batch_size:
+            yield df
+            return
+
+        last = df['time'].iloc[-1].floor('min').to_pydatetime()
+        if last > start:
+            yield df.loc[df['time'] < last]
+            start = last
+        else:
+            nxt = last + timedelta(minutes=1)
+            yield db_read_frame(engine, select([t]).where(
+                and_(t.c.time >= last, t.c.time < nxt)))
+            start = nxt
+
+
+def apply_policy(engine, policy, archive_dir=None, now=None,
+                 batch_size=2000, throttle=0.05, stop_event=None):
+    """
+    Archives, compacts and deletes the rows of one table
+    that are older than the policy allows.
+
+    Windows are read in batches of whole minutes (see read_batches),
+    each batch's compacted rows are upserted and its raw rows deleted
+    in one short transaction, so the database is never write locked
+    for more than a batch and an interrupted run never leaves a partly
+    deleted minute to be recompacted from partial data. The upsert makes
+    recompacting a batch that didn't commit idempotent. A batch's archive
+    file is written before its transaction and replaced if it's redone.
+    Batches are followed by :param throttle seconds of sleep so loaders
+    writing to the same database aren't locked out.
+
+    :param engine: (sqlalchemy.engine.Engine)
+    :param policy: (RetentionPolicy)
+    :param archive_dir: (str, default None)
+        Required when policy.archive is True.
+    :param now: (datetime.datetime, default None)
+        Local time the cutoff is measured from, defaults to now.
+    :param batch_size: (int, default 2000)
+        Rows read, archived and deleted per transaction.
+    :param stop_event: (threading.Event, default None)
+        Stops between batches once set.
+    :return: (dict)
+        {'table', 'cutoff', 'rows_deleted', 'rows_compacted', 'archive_bytes'}
+    """
+    if policy.archive and not archive_dir:
+        raise ValueError("archive_dir is required to archive {}".format(policy.name))
+
+    t = policy.table
+    pk = list(t.primary_key.columns)[0]
+    cutoff = policy.get_cutoff(now)
+    report = {'table': policy.name, 'cutoff': cutoff, 'rows_deleted': 0,
+              'rows_compacted': 0, 'archive_bytes': 0}
+
+    def next_start(after):
+        qry = select([func.min(t.c.time)]).where(t.c.time < cutoff)
+        if after is not None:
+            qry = qry.where(t.c.time >= after)
+        with engine.connect() as conn:
+            first = conn.execute(qry).scalar()
+        return floor_minute(first) if first is not None else None
+
+    def stopped():
+        return stop_event is not None and stop_event.is_set()
+
+    start = next_start(None)
+    while start is not None and start < cutoff and not stopped():
+        end = min(start + policy.window, cutoff)
+
+        for df in read_batches(engine, t, start, end, batch_size):
+            if policy.archive:
+                batch_start = df['time'].iloc[0].floor('min').to_pydatetime()
+                report['archive_bytes'] += archive_frame(df, archive_dir,
+                                                         policy.name, batch_start)
+
+            rows = list()
+            if policy.compact is not None:
+                compacted = policy.compact(df)
+                if not compacted.empty:
+                    rows = db_frame_to_params(compacted, policy.compact_table.__table__)
+
+            # Only a minute holding more than batch_size
+            # rows takes more than one statement.
+            ids = df[pk.name].tolist()
+            deleted = 0
+            with engine.begin() as conn:
+                if rows:
+                    db_bulk_upsert(conn, policy.compact_table.__table__, rows,
+                                   ['product_id', 'time'], update=True)
+                for i in range(0, len(ids), batch_size):
+                    res = conn.execute(t.delete().where(pk.in_(ids[i:i + batch_size])))
+                    deleted += res.rowcount
+            report['rows_compacted'] += len(rows)
+            report['rows_deleted'] += deleted
+            if throttle:
+                time.sleep(throttle)
+            if stopped():
+                break
+
+        start = next_start(end)
+
+    logger.info("Retention {table}: deleted {rows_deleted} rows, "
+                "compacted {rows_compacted}, archived {archive_bytes} bytes "
+                "(cutoff {cutoff}).".format(**report))
+    return report
+
+
+class GdaxRetentionJob(Thread):
+    """
+    Background thread applying RetentionPolicy objects to
+    a GdaxDatabase every :param interval seconds.
+
+    Usage:
+        job = GdaxRetentionJob(db, archive_dir='/data/gdax_archive')
+        job.start()
+        ...
+        job.stop()
+        print(job.last_report)
+    """
+    def __init__(self, db, policies=None, archive_dir=None, interval=3600,
+                 batch_size=2000, throttle=0.05):
+        """
+        :param db: (stocklook.crypto.gdax.db.GdaxDatabase)
+        :param policies: (list, default None)
+            RetentionPolicy objects, defaults to DEFAULT_RETENTION_POLICIES.
+        :param archive_dir: (str, default None)
+            None uses <DATA_DIRECTORY>/gdax_archive.
+        :param interval: (int, default 3600)
+            Seconds between runs.
+        :param batch_size: (int, default 2000)
+            Rows read, archived and deleted per transaction.
+        :param throttle: (float, default 0.05)
+            Seconds slept after each batch.
+        """
+        Thread.__init__(self)
+        self.daemon = True
+        if archive_dir is None:
+            from stocklook.config import config, DATA_DIRECTORY
+            archive_dir = os.path.join(config[DATA_DIRECTORY], 'gdax_archive')
+        if policies is None:
+            policies = DEFAULT_RETENTION_POLICIES
+        self.db = db
+        self.policies = list(policies)
+        self.archive_dir = archive_dir
+        self.interval = interval
+        self.batch_size = batch_size
+        self.throttle = throttle
+        self.last_report = None
+        self._stop_event = Event()
+
+    def run_once(self, now=None):
+        """
+        Applies every policy once.
+        :return: (dict)
+            {'tables': [policy report, ...], 'rows_deleted', 'archive_bytes',
+             'db_bytes_before', 'db_bytes_after', 'bytes_reclaimed'}
+        """
+        engine = self.db._engine
+        before = get_database_bytes(engine)
+        tables = list()
+
+        for policy in self.policies:
+            if self._stop_event.is_set():
+                break
+            tables.append(apply_policy(engine, policy,
+                                       archive_dir=self.archive_dir,
+                                       now=now,
+                                       batch_size=self.batch_size,
+                                       throttle=self.throttle,
+                                       stop_event=self._stop_event))
+
+        after = get_database_bytes(engine)
+        reclaimed = None
+        if before is not None and after is not None:
+            reclaimed = max(before - after, 0)
+
+        self.last_report = {
+            'tables': tables,
+            'rows_deleted': sum(r['rows_deleted'] for r in tables),
+            'archive_bytes': sum(r['archive_bytes'] for r in tables),
+            'db_bytes_before': before,
+            'db_bytes_after': after,
+            'bytes_reclaimed': reclaimed,
+        }
+        return self.last_report
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error("Retention job failed: {}".format(e))
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
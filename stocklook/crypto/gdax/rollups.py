@@ -0,0 +1,251 @@
+"""
+MIT License
+
+Copyright (c) 2017 Zeke Barge
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import numpy as np
+import logging as lg
+from pandas import DataFrame
+from sqlalchemy import and_
+from stocklook.utils.database import db_bulk_upsert
+from stocklook.utils.timetools import timestamp_to_utc_int
+from .tables import (GdaxOHLC15,
+                     GdaxOHLC60,
+                     GdaxOHLC240,
+                     GdaxOHLC1D,
+                     GdaxOHLC1W)
+
+logger = lg.getLogger(__name__)
+
+# Finest to coarsest.
+GDAX_ROLLUP_TABLES = (GdaxOHLC15,
+                      GdaxOHLC60,
+                      GdaxOHLC240,
+                      GdaxOHLC1D,
+                      GdaxOHLC1W)
+
+OHLC_COLUMNS = ['time', 'open', 'high', 'low', 'close', 'volume']
+
+
+def get_buckets(times, granularity, offset=0):
+    """
+    Floors UTC times to the start of their bucket.
+    :param times: (iterable of int)
+    :return: (numpy.ndarray)
+    """
+    t = np.asarray(times, dtype=np.int64) - offset
+    return t - t % granularity + offset
+
+
+def aggregate_ohlc(df, granularity, offset=0):
+    """
+    Aggregates OHLC bars into coarser bars with
+    first open, max high, min low, last close and summed volume.
+
+    :param df: (pandas.DataFrame)
+        time (UTC int), open, high, low, close, volume columns.
+    :param granularity: (int)
+        Seconds per output bar.
+    :param offset: (int, default 0)
+        Seconds buckets are shifted from the epoch.
+    :return: (pandas.DataFrame)
+        Bars sorted by time.
+    """
+    if df.empty:
+        return DataFrame(columns=OHLC_COLUMNS)
+
+    df = df.sort_values('time', kind='mergesort')
+    keys = get_buckets(df['time'].values, granularity, offset)
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(keys)) + 1))
+    ends = np.concatenate((starts[1:], [keys.size])) - 1
+
+    def values(col):
+        return df[col].values.astype(np.float64)
+
+    return DataFrame({'time': keys[starts],
+                      'open': values('open')[starts],
+                      'high': np.fmax.reduceat(values('high'), starts),
+                      'low': np.fmin.reduceat(values('low'), starts),
+                      'close': values('close')[ends],
+                      'volume': np.add.reduceat(np.nan_to_num(values('volume')), starts)},
+                     columns=OHLC_COLUMNS)
+
+
+class GdaxOHLCRollups:
+    """
+    Maintains 15m, 1h, 4h, 1d and 1w rollup tables from the 5 minute
+    bars of a GdaxOHLCViewer. GdaxOHLCRollups.update is called with the
+    bucket times that were just written and only recomputes the coarse
+    buckets containing them, reading just the 5 minute bars inside those.
+
+    Example:
+        v = GdaxOHLCViewer('ETH-USD')
+        v.sync_ohlc()                      # rollups update as bars load
+        v.rollups.read(start, end, 60*60*2)  # 2h bars built from 1h rollups
+    """
+    def __init__(self, viewer, tables=None):
+        if tables is None:
+            tables = GDAX_ROLLUP_TABLES
+        self.viewer = viewer
+        self.tables = tables
+
+    @property
+    def db(self):
+        return self.viewer.db
+
+    def read_source(self, start, end):
+        """
+        Reads 5 minute bars between start and end (inclusive).
+        Rollups are written from bars that were just stored so
+        this reads from GdaxDatabase.engine, never a read replica.
+        """
+        return self.viewer.read_ohlc(start, end, columns=OHLC_COLUMNS,
+                                     bind=self.db.engine)
+
+    def update(self, times):
+        """
+        Recomputes every rollup bucket containing :param times.
+
+        :param times: (iterable of int)
+            UTC 5 minute bucket times that were inserted or changed.
+        :return: (int) the number of rollup rows written.
+        """
+        times = np.asarray(times, dtype=np.int64)
+        if not times.size:
+            return 0
+
+        total = 0
+        # Read the 5 minute bars covering every affected bucket once.
+        lo = int(times.min())
+        hi = int(times.max())
+
+        for table in self.tables:
+            g, off = table.GRANULARITY, table.OFFSET
+            affected = np.unique(get_buckets(times, g, off))
+            lo = min(lo, int(affected[0]))
+            hi = max(hi, int(affected[-1]) + g - 1)
+
+        src = self.read_source(lo, hi)
+        if src.empty:
+            return 0
+
+        for table in self.tables:
+            g, off = table.GRANULARITY, table.OFFSET
+            affected = np.unique(get_buckets(times, g, off))
+            keys = get_buckets(src['time'].values, g, off)
+            bars = aggregate_ohlc(src.loc[np.isin(keys, affected), :], g, off)
+            total += self.write(table, bars)
+
+        return total
+
+    def write(self, table, bars):
+        if bars.empty:
+            return 0
+        stock_id = self.viewer.stock_id
+        rows = [dict(stock_id=stock_id, time=int(t), open=o, high=h,
+                     low=l, close=c, volume=v)
+                for t, o, h, l, c, v in bars[OHLC_COLUMNS].itertuples(index=False)]
+        return db_bulk_upsert(self.db._engine, table.__table__, rows,
+                              ['stock_id', 'time'], update=True)
+
+    def rebuild(self, start=None, end=None, chunk_days=28):
+        """
+        Recomputes every rollup from stored 5 minute bars,
+        in chunks of whole weeks so no bucket is split across chunks.
+
+        :param start: (int, datetime, default None)
+            None starts at the first stored bar.
+        :param end: (int, datetime, default None)
+            None ends at the last stored bar.
+        :return: (int) the number of rollup rows written.
+        """
+        idx = self.viewer.bucket_index
+        if not len(idx):
+            return 0
+        start = int(idx.times[0]) if start is None else timestamp_to_utc_int(start)
+        end = int(idx.times[-1]) if end is None else timestamp_to_utc_int(end)
+
+        week = GdaxOHLC1W
+        step = week.GRANULARITY * max(1, chunk_days // 7)
+        lo = int(get_buckets([start], week.GRANULARITY, week.OFFSET)[0])
+        total = 0
+        while lo <= end:
+            hi = lo + step - 1
+            src = self.read_source(lo, hi)
+            for table in self.tables:
+                total += self.write(table, aggregate_ohlc(src, table.GRANULARITY,
+                                                          table.OFFSET))
+            lo += step
+        return total
+
+    def get_table(self, granularity):
+        """
+        Returns the coarsest table whose bars evenly
+        make up :param granularity, or None when only the
+        5 minute bars will do.
+        """
+        best = None
+        for table in self.tables:
+            g = table.GRANULARITY
+            if g <= granularity and granularity % g == 0:
+                if table.OFFSET and granularity != g:
+                    # Weekly bars only combine into multiples of weeks.
+                    continue
+                best = table
+        return best
+
+    def read(self, start, end, granularity, columns=None):
+        """
+        Returns bars of :param granularity seconds between start and end
+        (inclusive) read from the coarsest table that can build them.
+
+        :param start: (int, datetime)
+        :param end: (int, datetime)
+        :param granularity: (int)
+            Must be a multiple of 5 minutes.
+        :param columns: (list, default None)
+            Output columns, None returns time, open, high, low, close, volume.
+        :return: (pandas.DataFrame)
+        """
+        g5 = self.viewer.GRANULARITY
+        if granularity % g5:
+            raise ValueError("granularity must be a multiple "
+                             "of {} seconds, not {}".format(g5, granularity))
+
+        start = timestamp_to_utc_int(start)
+        end = timestamp_to_utc_int(end)
+        table = self.get_table(granularity)
+
+        if table is None:
+            df, g, off = self.read_source(start, end), g5, 0
+        else:
+            g, off = table.GRANULARITY, table.OFFSET
+            crit = and_(table.stock_id == self.viewer.stock_id,
+                        table.time >= start,
+                        table.time <= end)
+            df = self.db.read_frame(table, crit, columns=OHLC_COLUMNS,
+                                    order_by=table.time)
+
+        if granularity != g:
+            df = aggregate_ohlc(df, granularity, off)
+        if columns is not None:
+            df = df[list(columns)]
+        return df.reset_index(drop=True)
@@ -0,0 +1,155 @@
+"""
+MIT License
+
+Copyright (c) 2017 Zeke Barge
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+# Compares gdax_ticks queries against the legacy schema
+# (String time, no secondary indexes) and the current one
+# (DateTime time, (product_id, time) and (product_id, sequence) indexes)
+# using the same synthetic data.
+#
+#     python benchmark_feed_queries.py --rows 500000
+#     python benchmark_feed_queries.py --url postgresql://user:pw@localhost/scratch
+#
+# Use a scratch database: the benchmark tables are dropped and recreated.
+import time
+import random
+import argparse
+from datetime import datetime, timedelta
+from sqlalchemy import (create_engine, MetaData, Table, Column, Integer,
+                        String, Float, and_, select)
+from stocklook.crypto.gdax.tables import GdaxSQLTickerFeedEntry
+
+PRODUCTS = ['BTC-USD', 'ETH-USD', 'LTC-USD']
+START = datetime(2017, 9, 1)
+
+legacy_meta = MetaData()
+legacy_ticks = Table('bench_ticks_legacy', legacy_meta,
+                     Column('ticker_id', Integer, primary_key=True),
+                     Column('type', String(20)),
+                     Column('trade_id', Integer),
+                     Column('sequence', Integer),
+                     Column('time', String(50)),
+                     Column('product_id', String(10)),
+                     Column('price', Float),
+                     Column('side', String(10)),
+                     Column('last_size', Float),
+                     Column('best_bid', Float),
+                     Column('best_ask', Float))
+
+typed_meta = MetaData()
+typed_ticks = GdaxSQLTickerFeedEntry.__table__.tometadata(
+    typed_meta, name='bench_ticks')
+for idx in typed_ticks.indexes:
+    idx.name = idx.name.replace('gdax_ticks', 'bench_ticks')
+
+
+def make_rows(n, seed=7):
+    rnd = random.Random(seed)
+    rows = list()
+    t = START
+    price = {p: 100.0 * (i + 1) for i, p in enumerate(PRODUCTS)}
+    for i in range(n):
+        p = PRODUCTS[i % len(PRODUCTS)]
+        t += timedelta(milliseconds=rnd.randint(1, 400))
+        price[p] += rnd.uniform(-0.5, 0.5)
+        rows.append({'type': 'ticker', 'trade_id': i, 'sequence': 3000000000 + i,
+                     'time': t, 'product_id': p, 'price': price[p],
+                     'side': 'buy' if i % 2 else 'sell', 'last_size': 0.01,
+                     'best_bid': price[p] - 0.01, 'best_ask': price[p]})
+    return rows
+
+
+def load(engine, table, rows, to_str=False, chunksize=20000):
+    with engine.begin() as conn:
+        for i in range(0, len(rows), chunksize):
+            chunk = rows[i:i + chunksize]
+            if to_str:
+                chunk = [dict(r, time=r['time'].strftime('%Y-%m-%dT%H:%M:%S.%fZ'),
+                              sequence=r['sequence'] % 2147483647)
+                         for r in chunk]
+            conn.execute(table.insert(), chunk)
+
+
+def timed(engine, qry, repeat=5):
+    results = list()
+    count = 0
+    for _ in range(repeat):
+        t = time.perf_counter()
+        with engine.connect() as conn:
+            count = len(conn.execute(qry).fetchall())
+        results.append(time.perf_counter() - t)
+    results.sort()
+    return results[len(results) // 2] * 1000, count
+
+
+def run(url, n_rows):
+    engine = create_engine(url)
+    for meta in (legacy_meta, typed_meta):
+        meta.drop_all(bind=engine)
+        meta.create_all(bind=engine)
+
+    rows = make_rows(n_rows)
+    load(engine, legacy_ticks, rows, to_str=True)
+    load(engine, typed_ticks, rows)
+
+    mid = rows[len(rows) // 2]
+    lo, hi = mid['time'], mid['time'] + timedelta(minutes=10)
+    seq = mid['sequence']
+    fmt = '%Y-%m-%dT%H:%M:%S.%fZ'
+
+    cases = [
+        ('prices: product + 10 min range',
+         select([legacy_ticks]).where(and_(
+             legacy_ticks.c.product_id == 'BTC-USD',
+             legacy_ticks.c.time.between(lo.strftime(fmt), hi.strftime(fmt)))),
+         select([typed_ticks]).where(and_(
+             typed_ticks.c.product_id == 'BTC-USD',
+             typed_ticks.c.time >= lo,
+             typed_ticks.c.time <= hi))),
+        ('sequence: product + 1000 sequences',
+         select([legacy_ticks]).where(and_(
+             legacy_ticks.c.product_id == 'BTC-USD',
+             legacy_ticks.c.sequence.between(seq % 2147483647,
+                                             seq % 2147483647 + 1000))),
+         select([typed_ticks]).where(and_(
+             typed_ticks.c.product_id == 'BTC-USD',
+             typed_ticks.c.sequence.between(seq, seq + 1000)))),
+    ]
+
+    print("{} rows on {}".format(n_rows, engine.dialect.name))
+    print("{:<36} {:>12} {:>12} {:>8}".format('query', 'legacy ms', 'typed ms', 'rows'))
+    for label, legacy_qry, typed_qry in cases:
+        legacy_ms, _ = timed(engine, legacy_qry)
+        typed_ms, count = timed(engine, typed_qry)
+        print("{:<36} {:>12.2f} {:>12.2f} {:>8}".format(label, legacy_ms, typed_ms, count))
+
+    for meta in (legacy_meta, typed_meta):
+        meta.drop_all(bind=engine)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark gdax_ticks queries.')
+    parser.add_argument('--url', default='sqlite:///gdax_benchmark.sqlite3',
+                        help='SQLAlchemy URL of a scratch database.')
+    parser.add_argument('--rows', type=int, default=200000)
+    args = parser.parse_args()
+    run(args.url, args.rows)
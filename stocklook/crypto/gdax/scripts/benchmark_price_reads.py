@@ -0,0 +1,102 @@
+"""
+MIT License
+
+Copyright (c) 2017 Zeke Barge
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+# Compares the old GdaxDatabase.get_prices read path (ORM objects
+# turned into a DataFrame with getattr per column per row) against
+# the Core select path (typed columns, optional chunked streaming).
+#
+#     python benchmark_price_reads.py --rows 500000
+#     python benchmark_price_reads.py --url postgresql://user:pw@localhost/scratch
+#
+# Use a scratch database: gdax_ticks is dropped and recreated.
+import time
+import argparse
+from datetime import timedelta
+from pandas import DataFrame
+from sqlalchemy import create_engine, and_, select
+from sqlalchemy.orm import sessionmaker
+from stocklook.crypto.gdax.tables import GdaxSQLTickerFeedEntry
+from stocklook.crypto.gdax.scripts.benchmark_feed_queries import (make_rows,
+                                                                  load,
+                                                                  PRODUCTS)
+from stocklook.utils.database import db_read_frame
+
+COLUMNS = ['best_ask', 'best_bid', 'last_size', 'side',
+           'time', 'product_id', 'price']
+
+
+def read_orm(session, crit):
+    t = GdaxSQLTickerFeedEntry
+    res = session.query(t).filter(crit).all()
+    data = [(getattr(rec, c) for c in COLUMNS) for rec in res]
+    return DataFrame(data=data, columns=COLUMNS, index=range(len(data)))
+
+
+def read_core(engine, crit, chunksize=None):
+    t = GdaxSQLTickerFeedEntry.__table__
+    qry = select([t.c[c] for c in COLUMNS]).where(crit)
+    res = db_read_frame(engine, qry, chunksize=chunksize)
+    if chunksize:
+        return sum(f.index.size for f in res)
+    return res.index.size
+
+
+def timed(func, *args, **kwargs):
+    t = time.perf_counter()
+    func(*args, **kwargs)
+    return time.perf_counter() - t
+
+
+def run(url, n_rows):
+    engine = create_engine(url)
+    tbl = GdaxSQLTickerFeedEntry.__table__
+    tbl.drop(bind=engine, checkfirst=True)
+    tbl.create(bind=engine)
+    rows = make_rows(n_rows)
+    load(engine, tbl, rows)
+
+    t = GdaxSQLTickerFeedEntry
+    crit = and_(t.time >= rows[0]['time'],
+                t.time <= rows[-1]['time'] + timedelta(seconds=1),
+                t.product_id.in_(PRODUCTS))
+
+    session = sessionmaker(bind=engine)()
+    orm = timed(read_orm, session, crit)
+    session.close()
+    core = timed(read_core, engine, crit)
+    chunked = timed(read_core, engine, crit, chunksize=50000)
+
+    print("{} rows on {}".format(n_rows, engine.dialect.name))
+    print("ORM + to_frame:        {:.3f}s".format(orm))
+    print("Core select:           {:.3f}s".format(core))
+    print("Core select, chunked:  {:.3f}s".format(chunked))
+    tbl.drop(bind=engine)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark get_prices read paths.')
+    parser.add_argument('--url', default='sqlite:///gdax_benchmark.sqlite3',
+                        help='SQLAlchemy URL of a scratch database.')
+    parser.add_argument('--rows', type=int, default=200000)
+    args = parser.parse_args()
+    run(args.url, args.rows)
@@ -0,0 +1,128 @@
+"""
+MIT License
+
+Copyright (c) 2017 Zeke Barge
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+# Compares sustained gdax_ticks inserts/sec on SQLite between the default
+# engine (each loader thread commits on its own session) and the high
+# throughput profile (WAL + pragmas, one SQLiteWriter, read-only readers)
+# while reader threads query recent prices.
+#
+#     python benchmark_sqlite_writer.py --rows 100000 --loaders 3 --readers 2
+#
+# Each mode writes to a fresh database file in --dir.
+import os
+import time
+import argparse
+from queue import Queue
+from threading import Thread, Event
+from datetime import timedelta
+from sqlalchemy import create_engine, select, and_
+from sqlalchemy.orm import sessionmaker, scoped_session
+from stocklook.crypto.gdax.tables import GdaxBase, GdaxSQLTickerFeedEntry
+from stocklook.utils.database import (DatabaseLoadingThread, SQLiteWriter,
+                                      db_create_sqlite_engine)
+from stocklook.crypto.gdax.scripts.benchmark_feed_queries import make_rows, PRODUCTS
+
+
+def reader(engine, stop, stats, start):
+    t = GdaxSQLTickerFeedEntry.__table__
+    qry = select([t.c.time, t.c.price]).where(and_(
+        t.c.product_id == PRODUCTS[0],
+        t.c.time >= start, t.c.time < start + timedelta(minutes=5)))
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        with engine.connect() as conn:
+            conn.execute(qry).fetchall()
+        stats.append(time.perf_counter() - t0)
+
+
+def run_mode(path, rows, n_loaders, n_readers, high_throughput):
+    if os.path.exists(path):
+        os.remove(path)
+    if high_throughput:
+        engine = db_create_sqlite_engine(path)
+    else:
+        engine = create_engine('sqlite:///' + path)
+    GdaxBase.metadata.create_all(bind=engine, tables=[GdaxSQLTickerFeedEntry.__table__])
+    read_engine = db_create_sqlite_engine(path, read_only=True) if high_throughput else engine
+
+    writer = None
+    if high_throughput:
+        writer = SQLiteWriter(engine)
+        writer.start()
+
+    maker = scoped_session(sessionmaker(bind=engine))
+    loaders = [DatabaseLoadingThread(maker, Queue(), GdaxSQLTickerFeedEntry,
+                                     commit_interval=5, writer=writer)
+               for _ in range(n_loaders)]
+
+    stop = Event()
+    latencies = list()
+    readers = [Thread(target=reader, args=(read_engine, stop, latencies, rows[0]['time']))
+               for _ in range(n_readers)]
+
+    # Fill the queues up front so loaders run flat out.
+    for i, r in enumerate(rows):
+        msg = dict(r, time=r['time'].strftime('%Y-%m-%dT%H:%M:%S.%f'))
+        loaders[i % n_loaders].queue.put(msg)
+
+    t0 = time.perf_counter()
+    for th in readers + loaders:
+        th.start()
+    for l in loaders:
+        l.queue.put(l.STOP_SIGNAL)
+    for l in loaders:
+        l.join()
+    if writer is not None:
+        writer.flush()
+    elapsed = time.perf_counter() - t0
+    stop.set()
+    for th in readers:
+        th.join()
+    if writer is not None:
+        writer.stop()
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000 if latencies else float('nan')
+    return len(rows) / elapsed, len(latencies) / elapsed, p50
+
+
+def run(directory, n_rows, n_loaders, n_readers):
+    rows = make_rows(n_rows)
+    for r in rows:
+        r.pop('trade_id')
+    print("{} rows, {} loaders, {} readers".format(n_rows, n_loaders, n_readers))
+    print("{:<18} {:>12} {:>12} {:>14}".format('mode', 'inserts/s', 'reads/s', 'read p50 ms'))
+    for label, ht in (('default', False), ('high throughput', True)):
+        path = os.path.join(directory, 'gdax_writer_bench_{}.sqlite3'.format(int(ht)))
+        ins, reads, p50 = run_mode(path, rows, n_loaders, n_readers, ht)
+        print("{:<18} {:>12.0f} {:>12.1f} {:>14.2f}".format(label, ins, reads, p50))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark SQLite loader throughput.')
+    parser.add_argument('--dir', default='.')
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--loaders', type=int, default=3)
+    parser.add_argument('--readers', type=int, default=2)
+    args = parser.parse_args()
+    run(args.dir, args.rows, args.loaders, args.readers)
@@ -23,8 +23,8 @@ SOFTWARE.
 """
 from sqlalchemy import (String, Boolean, DateTime, Float,
                         Integer, BigInteger, Column, ForeignKey, Table, Enum,
-                        UniqueConstraint, TIMESTAMP)
-from sqlalchemy.ext.declarative import declarative_base
+                        UniqueConstraint, TIMESTAMP, Index, LargeBinary)
+from sqlalchemy.ext.declarative import declarative_base, declared_attr
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import enum
@@ -52,9 +52,12 @@ class GdaxSQLQuote(GdaxBase):
     low = Column(Float)
     close = Column(Float)
     volume = Column(Float)
-    quote_date = Column(String(50))
+    quote_date = Column(DateTime)
     date_added = Column(DateTime, default=datetime.now)
 
+    __table_args__ = (Index('ix_gdax_quotes_stock_date', 'stock_id', 'quote_date'),
+                      )
+
     def __repr__(self):
         return 'GdaxSQLQuote(open={}, high={}, low={}, ' \
                'close={}, volume={}, ' \
@@ -91,6 +94,62 @@ class GdaxOHLC5(GdaxBase):
                                       self.volume)
 
 
+class GdaxOHLCRollup:
+    """
+    Columns shared by the OHLC rollup tables.
+    Each table holds bars of GRANULARITY seconds aggregated
+    from GdaxOHLC5 (see stocklook.crypto.gdax.rollups).
+    Bucket times are UTC ints: time - OFFSET is a multiple of GRANULARITY.
+    """
+    GRANULARITY = None
+    OFFSET = 0
+
+    ohlc_id = Column(Integer, primary_key=True)
+    open = Column(Float)
+    high = Column(Float)
+    low = Column(Float)
+    close = Column(Float)
+    volume = Column(Float)
+    time = Column(Integer)
+
+    @declared_attr
+    def stock_id(cls):
+        return Column(Integer, ForeignKey('gdax_stocks.stock_id'))
+
+    @declared_attr
+    def __table_args__(cls):
+        return (UniqueConstraint('stock_id', 'time',
+                                 name='_{}_stock_id_time_unique'.format(cls.__tablename__)),
+                )
+
+
+class GdaxOHLC15(GdaxOHLCRollup, GdaxBase):
+    __tablename__ = 'gdax_ohlc15'
+    GRANULARITY = 60*15
+
+
+class GdaxOHLC60(GdaxOHLCRollup, GdaxBase):
+    __tablename__ = 'gdax_ohlc60'
+    GRANULARITY = 60*60
+
+
+class GdaxOHLC240(GdaxOHLCRollup, GdaxBase):
+    __tablename__ = 'gdax_ohlc240'
+    GRANULARITY = 60*60*4
+
+
+class GdaxOHLC1D(GdaxOHLCRollup, GdaxBase):
+    __tablename__ = 'gdax_ohlc1d'
+    GRANULARITY = 60*60*24
+
+
+class GdaxOHLC1W(GdaxOHLCRollup, GdaxBase):
+    __tablename__ = 'gdax_ohlc1w'
+    GRANULARITY = 60*60*24*7
+    # The epoch is a Thursday, weeks start on Monday.
+    OFFSET = 60*60*24*4
+
+
 class GdaxSQLOrder(GdaxBase):
     """
         {
@@ -133,6 +192,10 @@ class GdaxSQLOrder(GdaxBase):
     date_added = Column(DateTime, default=datetime.now)
     date_updated = Column(DateTime, default=datetime.now)
 
+    # Orders are looked up by their GDAX id.
+    __table_args__ = (Index('ix_gdax_orders_id', 'id'),
+                      )
+
     def __repr__(self):
         return "GdaxOrder(order_id={}, price={}, size={}, " \
                "created_at={}, filled_size={}, " \
@@ -183,7 +246,7 @@ class GdaxSQLFeedEntry(GdaxBase):
     time = Column(DateTime)
     type = Column(String(15))
     product_id = Column(String(10))
-    sequence = Column(Integer)
+    sequence = Column(BigInteger)
     order_id = Column(String(100))
     side = Column(String(10))
     remaining_size = Column(Float)
@@ -193,10 +256,14 @@ class GdaxSQLFeedEntry(GdaxBase):
     client_oid = Column(String(100))
     date_added = Column(DateTime, default=datetime.now)
 
-    trade_id = Column(Integer)
+    trade_id = Column(BigInteger)
     maker_order_id = Column(String(150))
     taker_order_id = Column(String(150))
 
+    __table_args__ = (Index('ix_gdax_feed_product_time', 'product_id', 'time'),
+                      Index('ix_gdax_feed_product_sequence', 'product_id', 'sequence'),
+                      )
+
 
 class GdaxSQLTickerFeedEntry(GdaxBase):
     """
@@ -217,9 +284,9 @@ class GdaxSQLTickerFeedEntry(GdaxBase):
 
     ticker_id = Column(Integer, primary_key=True)
     type = Column(String(20))
-    trade_id = Column(Integer)
-    sequence = Column(Integer)
-    time = Column(String(50))
+    trade_id = Column(BigInteger)
+    sequence = Column(BigInteger)
+    time = Column(DateTime)
     product_id = Column(String(10))
     price = Column(Float)
     side = Column(String(10))
@@ -227,6 +294,10 @@ class GdaxSQLTickerFeedEntry(GdaxBase):
     best_bid = Column(Float)
     best_ask = Column(Float)
 
+    __table_args__ = (Index('ix_gdax_ticks_product_time', 'product_id', 'time'),
+                      Index('ix_gdax_ticks_product_sequence', 'product_id', 'sequence'),
+                      )
+
 
 class GdaxSQLHeartbeatFeedEntry(GdaxBase):
     """
@@ -242,10 +313,13 @@ class GdaxSQLHeartbeatFeedEntry(GdaxBase):
 
     beat_id = Column(Integer, primary_key=True)
     type = Column(String(10))
-    sequence = Column(Integer)
-    last_trade_id = Column(Integer)
+    sequence = Column(BigInteger)
+    last_trade_id = Column(BigInteger)
     product_id = Column(String(10))
-    time = Column(String(50))
+    time = Column(DateTime)
+
+    __table_args__ = (Index('ix_gdax_heartbeats_product_time', 'product_id', 'time'),
+                      )
 
 
 class GdaxSQLOrderChange(GdaxBase):
@@ -257,8 +331,8 @@ class GdaxSQLOrderChange(GdaxBase):
     """
     __tablename__ = 'gdax_changes'
     change_id = Column(Integer, primary_key=True)
-    sequence = Column(Integer)
-    time = Column(String(50))
+    sequence = Column(BigInteger)
+    time = Column(DateTime)
     type = Column(String(10))
     side = Column(String(10))
     price = Column(Float)
@@ -267,6 +341,112 @@ class GdaxSQLOrderChange(GdaxBase):
     product_id = Column(String(10))
     order_id = Column(String(150))
 
+    __table_args__ = (Index('ix_gdax_changes_product_time', 'product_id', 'time'),
+                      Index('ix_gdax_changes_product_sequence', 'product_id', 'sequence'),
+                      )
+
+
+class GdaxTickSnapshot(GdaxBase):
+    """
+    One minute top-of-book snapshots compacted
+    from gdax_ticks by stocklook.crypto.gdax.retention.
+    """
+    __tablename__ = 'gdax_ticks_1m'
+
+    snapshot_id = Column(Integer, primary_key=True)
+    product_id = Column(String(10))
+    time = Column(DateTime)
+    price = Column(Float)
+    best_bid = Column(Float)
+    best_ask = Column(Float)
+    volume = Column(Float)
+    ticks = Column(Integer)
+
+    __table_args__ = (UniqueConstraint('product_id', 'time', name='_gdax_ticks_1m_product_time_unique'),
+                      )
+
+
+class GdaxTradeBar(GdaxBase):
+    """
+    One minute trade bars compacted from the match
+    messages in gdax_feed by stocklook.crypto.gdax.retention.
+    """
+    __tablename__ = 'gdax_trades_1m'
+
+    bar_id = Column(Integer, primary_key=True)
+    product_id = Column(String(10))
+    time = Column(DateTime)
+    open = Column(Float)
+    high = Column(Float)
+    low = Column(Float)
+    close = Column(Float)
+    volume = Column(Float)
+    trades = Column(Integer)
+
+    __table_args__ = (UniqueConstraint('product_id', 'time', name='_gdax_trades_1m_product_time_unique'),
+                      )
+
+
+class GdaxAuditWatermark(GdaxBase):
+    """
+    The last (sequence, row id) checked per table and product
+    by stocklook.crypto.gdax.audit.GdaxSequenceAuditor.
+    """
+    __tablename__ = 'gdax_audit_watermarks'
+
+    watermark_id = Column(Integer, primary_key=True)
+    table_name = Column(String(50))
+    product_id = Column(String(10))
+    sequence = Column(BigInteger)
+    row_id = Column(BigInteger)
+    rows_checked = Column(BigInteger)
+    date_updated = Column(DateTime, default=datetime.now)
+
+    __table_args__ = (UniqueConstraint('table_name', 'product_id', name='_gdax_audit_table_product_unique'),
+                      )
+
+
+class GdaxSequenceGap(GdaxBase):
+    """
+    An open range of missing sequences (both inclusive)
+    found by stocklook.crypto.gdax.audit.GdaxSequenceAuditor.
+    Rows are removed once the range is filled.
+    """
+    __tablename__ = 'gdax_sequence_gaps'
+
+    gap_id = Column(Integer, primary_key=True)
+    table_name = Column(String(50))
+    product_id = Column(String(10))
+    start_sequence = Column(BigInteger)
+    end_sequence = Column(BigInteger)
+    date_found = Column(DateTime, default=datetime.now)
+
+    __table_args__ = (Index('ix_gdax_sequence_gaps_table_product', 'table_name', 'product_id'),
+                      )
+
+
+class GdaxBookCheckpoint(GdaxBase):
+    """
+    A compressed level 3 order book snapshot stamped with the
+    feed sequence it's current to. Written periodically by
+    stocklook.crypto.gdax.book_history.GdaxBookHistory so the book at any time
+    can be rebuilt from the nearest checkpoint plus the feed messages after it.
+    """
+    __tablename__ = 'gdax_book_checkpoints'
+
+    checkpoint_id = Column(Integer, primary_key=True)
+    product_id = Column(String(10))
+    sequence = Column(BigInteger)
+    time = Column(DateTime)
+    orders = Column(Integer)
+    complete = Column(Boolean, default=True)
+    data = Column(LargeBinary)
+    date_added = Column(DateTime, default=datetime.now)
+
+    __table_args__ = (UniqueConstraint('product_id', 'sequence', name='_gdax_book_product_sequence_unique'),
+                      Index('ix_gdax_book_checkpoints_product_time', 'product_id', 'time'),
+                      )
+
 
 GDAX_FEED_CLASS_MAP = {'ticker': GdaxSQLTickerFeedEntry,
                        'heartbeat': GdaxSQLHeartbeatFeedEntry,
@@ -0,0 +1,71 @@
+"""
+MIT License
+
+Copyright (c) 2017 Zeke Barge
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import pytest
+from sqlalchemy import create_engine
+from stocklook.crypto.gdax.db import GdaxOHLCViewer, GdaxDatabase
+from stocklook.utils.timetools import timestamp_to_utc_int
+
+
+class FakeProduct:
+    def __init__(self, name):
+        self.name = name
+        self.currency = name.split('-')[0]
+        self.sync_interval = 60
+
+
+class FakeGdax:
+    """
+    Returns a candle for every bucket requested.
+    """
+    def __init__(self, fail_on=None, empty_on=None):
+        self.products = {'ETH-USD': FakeProduct('ETH-USD')}
+        self.calls = []
+        self.fail_on = fail_on
+        self.empty_on = empty_on
+
+    def request_candles(self, product, start, end, granularity=60):
+        if self.fail_on is not None and start == self.fail_on:
+            raise ValueError("API down")
+        self.calls.append((start, end))
+        if start == self.empty_on:
+            # No trades during the window.
+            return []
+        return [[t, 1.0, 2.0, 1.5, 1.75, 10.0]
+                for t in range(end, start - 1, -granularity)]
+
+    def get_candles(self, product, start, end, granularity=60, **kwargs):
+        return self.request_candles(product, timestamp_to_utc_int(start),
+                                    timestamp_to_utc_int(end), granularity)
+
+
+@pytest.fixture
+def gdax():
+    return FakeGdax()
+
+
+@pytest.fixture
+def viewer(tmp_path, gdax):
+    engine = create_engine('sqlite:///' + str(tmp_path / 'gdax.sqlite3'))
+    db = GdaxDatabase(gdax=gdax, engine=engine)
+    return GdaxOHLCViewer('ETH-USD', db=db)
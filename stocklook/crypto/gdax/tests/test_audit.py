@@ -0,0 +1,83 @@
+"""
+MIT License
+
+Copyright (c) 2017 Zeke Barge
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import pytest
+from stocklook.crypto.gdax.audit import GdaxSequenceAuditor, find_sequence_anomalies
+from stocklook.crypto.gdax.tables import GdaxSQLFeedEntry, GdaxSQLOrderChange
+
+
+def insert(db, product, seqs):
+    with db.engine.begin() as conn:
+        conn.execute(GdaxSQLFeedEntry.__table__.insert(),
+                     [{'product_id': product, 'sequence': s, 'type': 'open'} for s in seqs])
+
+
+def test_find_sequence_anomalies():
+    gaps, dups = find_sequence_anomalies([3, 4, 4, 8, 9], prev=1)
+    assert gaps == [(2, 2), (5, 7)]
+    assert dups.tolist() == [4]
+
+
+@pytest.mark.parametrize('use_sql', [True, False])
+def test_incremental_audit(viewer, use_sql):
+    db = viewer.db
+    insert(db, 'BTC-USD', [1, 2, 3, 6, 7, 7, 8, 9, 10])
+    insert(db, 'ETH-USD', [1, 2, 3])
+    auditor = GdaxSequenceAuditor(db, chunksize=4, use_sql=use_sql)
+
+    res = auditor.audit()
+    assert res['BTC-USD']['missing'] == [(4, 5)]
+    assert res['BTC-USD']['duplicates'] == {7: 1}
+    assert res['BTC-USD']['rows'] == 9
+    assert res['ETH-USD']['missing'] == []
+    assert auditor.get_watermark('ETH-USD')[0] == 3
+
+    # Only new rows are examined, a late row closes part of the old gap.
+    insert(db, 'BTC-USD', [11, 12, 15, 4, 15])
+    res = auditor.audit(['BTC-USD'])['BTC-USD']
+    assert res['rows'] == 4
+    assert res['from_sequence'] == 10
+    assert res['missing'] == [(13, 14)]
+    assert res['duplicates'] == {15: 1}
+    assert res['open_gaps'] == [(5, 5), (13, 14)]
+
+    assert auditor.audit(['BTC-USD'])['BTC-USD']['rows'] == 0
+
+    full = auditor.audit(['BTC-USD'], full=True)['BTC-USD']
+    assert full['rows'] == 14
+    assert full['missing'] == [(5, 5), (13, 14)]
+    assert full['duplicates'] == {7: 1, 15: 1}
+
+
+@pytest.mark.parametrize('use_sql', [True, False])
+def test_changes_fill_feed_sequences(viewer, use_sql):
+    db = viewer.db
+    insert(db, 'BTC-USD', [1, 2, 4, 5])
+    with db.engine.begin() as conn:
+        conn.execute(GdaxSQLOrderChange.__table__.insert(),
+                     [{'product_id': 'BTC-USD', 'sequence': 3, 'type': 'change'}])
+
+    res = GdaxSequenceAuditor(db, chunksize=2, use_sql=use_sql).audit()['BTC-USD']
+    assert res['missing'] == []
+    assert res['duplicates'] == {}
+    assert res['rows'] == 5
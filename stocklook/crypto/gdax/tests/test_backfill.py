@@ -0,0 +1,167 @@
+"""
+MIT License
+
+Copyright (c) 2017 Zeke Barge
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import os
+import pytest
+from stocklook.crypto.gdax.backfill import (GdaxOHLCBackfiller,
+                                            get_missing_ranges,
+                                            get_gap_ranges,
+                                            split_ranges,
+                                            subtract_ranges,
+                                            OHLCBucketIndex)
+from stocklook.utils.timetools import timestamp_to_utc_int
+
+G = 300
+START = 1500000000 - 1500000000 % G
+
+
+def test_get_missing_ranges():
+    existing = [START + G * i for i in (0, 1, 4, 5, 9)]
+    ranges = get_missing_ranges(existing, START, START + G * 10, G)
+    assert ranges == [(START + G * 2, START + G * 3),
+                      (START + G * 6, START + G * 8)]
+    assert get_missing_ranges(existing, START, START + G * 2, G) == []
+
+
+def test_get_gap_ranges():
+    existing = [START + G * i for i in (5, 1, 4, 0, 9, 9)]
+    assert get_gap_ranges(existing, G) == [(START + G * 2, START + G * 3),
+                                           (START + G * 6, START + G * 8)]
+    assert get_gap_ranges(existing, G, START - G * 2, START + G * 12) == \
+        [(START - G * 2, START - G),
+         (START + G * 2, START + G * 3),
+         (START + G * 6, START + G * 8),
+         (START + G * 10, START + G * 11)]
+    assert get_gap_ranges([], G, START, START + G * 3) == [(START, START + G * 2)]
+
+
+@pytest.mark.parametrize('use_sql', [True, False])
+def test_viewer_gap_ranges(viewer, use_sql):
+    b = GdaxOHLCBackfiller(viewer)
+    b.insert([[START + G * i, 1.0, 2.0, 1.5, 1.75, 10.0]
+              for i in (0, 1, 4, 5, 9)])
+    if use_sql and not viewer.supports_window_functions():
+        pytest.skip('sqlite without window functions')
+    assert viewer.get_gap_ranges(use_sql=use_sql) == \
+        [(START + G * 2, START + G * 3), (START + G * 6, START + G * 8)]
+    assert viewer.get_gap_ranges(START + G * 3, START + G * 11, use_sql=use_sql) == \
+        [(START + G * 3, START + G * 3), (START + G * 6, START + G * 8),
+         (START + G * 10, START + G * 10)]
+    gaps = viewer.get_time_gaps()
+    assert [[timestamp_to_utc_int(t) for t in g] for g in gaps] == \
+        [[START + G * 2, START + G * 4], [START + G * 6, START + G * 9]]
+
+
+def test_bucket_index():
+    idx = OHLCBucketIndex(G, [START + G * i for i in (4, 0, 1, 1)])
+    assert len(idx) == 3
+    assert idx.contains([START, START + G * 2, START + G * 9]).tolist() == [True, False, False]
+    assert idx.add([START + G * 2, START + G * 9, START + G * 9, START]) == 2
+    assert idx.times.tolist() == [START + G * i for i in (0, 1, 2, 4, 9)]
+    assert idx.missing_ranges() == [(START + G * 3, START + G * 3),
+                                    (START + G * 5, START + G * 8)]
+
+
+def test_slice_frame_uses_index(viewer):
+    from pandas import DataFrame
+    GdaxOHLCBackfiller(viewer).run(START, START + G * 3)
+    df = DataFrame({'time': [START + G * i for i in range(5)], 'close': 1.0})
+
+    # No queries once the index is loaded.
+    viewer.db._engine.dispose()
+    viewer.db._engine = None
+    assert viewer.slice_frame(df)['time'].tolist() == [START + G * 3, START + G * 4]
+
+
+def test_subtract_ranges():
+    ranges = [(0, G * 9), (G * 20, G * 29)]
+    assert subtract_ranges(ranges, [(G * 3, G * 4), (G * 8, G * 22)], G) == \
+        [(0, G * 2), (G * 5, G * 7), (G * 23, G * 29)]
+    assert subtract_ranges(ranges, [(0, G * 30)], G) == []
+
+
+def test_split_ranges():
+    windows = split_ranges([(START, START + G * 9)], G, 4)
+    assert windows == [(START, START + G * 3),
+                       (START + G * 4, START + G * 7),
+                       (START + G * 8, START + G * 9)]
+
+
+def test_backfill_inserts_missing_only(viewer, tmp_path):
+    cp = str(tmp_path / 'cp.json')
+    b = GdaxOHLCBackfiller(viewer, max_workers=3, checkpoint_path=cp)
+    b.MAX_BUCKETS = 50
+    end = START + G * 500
+    assert b.run(START, end) == 500
+    assert len(viewer.gdax.calls) == 10
+    assert not os.path.exists(cp)
+
+    # Nothing left to do
+    b2 = GdaxOHLCBackfiller(viewer, checkpoint_path=cp)
+    assert b2.run(START, end) == 0
+    assert len(viewer.gdax.calls) == 10
+
+
+def test_backfill_resumes_from_checkpoint(viewer, tmp_path):
+    cp = str(tmp_path / 'cp.json')
+    viewer.gdax.fail_on = START + G * 100
+    viewer.gdax.empty_on = START + G * 200
+    b = GdaxOHLCBackfiller(viewer, max_workers=2, checkpoint_path=cp)
+    b.MAX_BUCKETS = 100
+    assert b.run(START, START + G * 300) == 100
+    assert os.path.exists(cp)
+
+    # The empty window was checkpointed so only the failed one is requested.
+    viewer.gdax.fail_on = None
+    viewer.gdax.calls = []
+    b = GdaxOHLCBackfiller(viewer, checkpoint_path=cp)
+    b.MAX_BUCKETS = 100
+    assert b.run(START, START + G * 300) == 100
+    assert viewer.gdax.calls == [(START + G * 100, START + G * 199)]
+
+    # Only the empty window stays recorded and later runs skip it.
+    assert b.load_checkpoint() == set()
+    assert b._empty == [(START + G * 200, START + G * 299)]
+    viewer.gdax.calls = []
+    assert GdaxOHLCBackfiller(viewer, checkpoint_path=cp).run(START, START + G * 400) == 100
+    assert viewer.gdax.calls == [(START + G * 300, START + G * 399)]
+
+
+def test_checkpoint_reuses_overlapping_windows(viewer, tmp_path):
+    cp = str(tmp_path / 'cp.json')
+    viewer.gdax.fail_on = START + G * 100
+    b = GdaxOHLCBackfiller(viewer, max_workers=1, checkpoint_path=cp)
+    b.MAX_BUCKETS = 100
+    b.run(START, START + G * 200)
+    done = {(START, START + G * 99)}
+    assert b.load_checkpoint(START, START + G * 200) == done
+
+    # A later end (ie now) still skips the finished windows.
+    assert b.load_checkpoint(START, START + G * 300) == done
+    assert b.get_windows(START, START + G * 300) == [(START + G * 100, START + G * 199),
+                                                     (START + G * 200, START + G * 299)]
+
+    # Ranges they don't overlap or another granularity ignore them.
+    assert b.load_checkpoint(START + G * 100, START + G * 300) == set()
+    b.granularity = 60
+    assert b.load_checkpoint(START, START + G * 200) == set()
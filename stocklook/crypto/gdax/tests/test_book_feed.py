@@ -0,0 +1,102 @@
+"""
+MIT License
+
+Copyright (c) 2017 Zeke Barge
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+from stocklook.crypto.gdax.feeds.book_feed import GdaxBookFeed
+from stocklook.crypto.gdax.tables import GdaxSQLFeedEntry
+
+
+class RestBook:
+    api_key = api_secret = api_passphrase = ''
+
+    def __init__(self):
+        self.calls = 0
+
+    def get_book(self, product, level=3):
+        self.calls += 1
+        return {'sequence': 10,
+                'bids': [['99.0', '1.0', 'b1'], ['98.0', '2.0', 'b2']],
+                'asks': [['101.0', '1.5', 'a1']]}
+
+
+def feed(tmpdir, gdax, **kwargs):
+    return GdaxBookFeed('BTC-USD', gdax=gdax, auth=False,
+                        checkpoint_path=str(tmpdir.join('btc.book')), **kwargs)
+
+
+def open_msg(seq, order_id, price):
+    return {'type': 'open', 'sequence': seq, 'order_id': order_id, 'side': 'buy',
+            'price': str(price), 'remaining_size': '0.5'}
+
+
+def test_warm_restart(tmpdir):
+    gdax = RestBook()
+    f = feed(tmpdir, gdax)
+    f.on_message(open_msg(11, 'b3', 99.5))
+    f.save_checkpoint()
+    f.on_message(open_msg(12, 'b4', 97.0))
+    f.on_message({'type': 'match', 'sequence': 13, 'maker_order_id': 'a1',
+                  'side': 'sell', 'price': '101.0', 'size': '0.5'})
+    expected = f.get_current_book()
+
+    # Simulates a crash: the checkpoint plus the journal rebuild the book.
+    f._journal.flush()
+    g = feed(tmpdir, gdax)
+    g.on_message(open_msg(14, 'b5', 96.0))
+    assert gdax.calls == 1
+    book = g.get_current_book()
+    assert book['sequence'] == 14
+    assert book['asks'] == expected['asks'] == [[101.0, 1.0, 'a1']]
+    assert [b for b in book['bids'] if b[2] != 'b5'] == expected['bids']
+
+    # A gap without stored messages resyncs from the REST book.
+    g.on_message(open_msg(20, 'b6', 95.0))
+    assert gdax.calls == 2
+    assert g.get_current_book()['sequence'] == 20
+
+
+def test_catch_up_from_db(tmpdir, viewer):
+    gdax = RestBook()
+    f = feed(tmpdir, gdax)
+    f.on_message(open_msg(11, 'b3', 99.5))
+    f.close()
+
+    # Messages stored by GdaxDatabaseFeed while the book feed was down.
+    rows = [dict(open_msg(s, 'x{}'.format(s), 90 + s), product_id='BTC-USD')
+            for s in (12, 13)]
+    with viewer.db.engine.begin() as conn:
+        conn.execute(GdaxSQLFeedEntry.__table__.insert(), rows)
+
+    g = feed(tmpdir, gdax, db=viewer.db)
+    g.on_message(open_msg(14, 'b5', 96.0))
+    assert gdax.calls == 1
+    ids = {b[2] for b in g.get_current_book()['bids']}
+    assert {'b1', 'b2', 'b3', 'x12', 'x13', 'b5'} == ids
+
+
+def test_market_maker_passes_book_db(tmpdir, viewer):
+    from stocklook.crypto.gdax.market_maker import GdaxMarketMaker
+    mm = GdaxMarketMaker(product_id='BTC-USD', gdax=RestBook(),
+                         book_checkpoint_path=str(tmpdir.join('btc.book')),
+                         book_db=viewer.db)
+    assert mm.book_feed.db is viewer.db
+    assert mm.book_feed.checkpoint_path == str(tmpdir.join('btc.book'))
@@ -0,0 +1,107 @@
+"""
+MIT License
+
+Copyright (c) 2017 Zeke Barge
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import pytest
+from datetime import datetime, timedelta
+from stocklook.crypto.gdax.book_history import GdaxBookState
+from stocklook.crypto.gdax.tables import GdaxSQLFeedEntry, GdaxSQLOrderChange
+
+T0 = datetime(2017, 9, 2, 14, 0)
+
+
+def msg(seq, minutes, type, **kwargs):
+    d = {'product_id': 'BTC-USD', 'sequence': seq,
+         'time': T0 + timedelta(minutes=minutes), 'type': type}
+    d.update(kwargs)
+    return d
+
+
+def seed(db):
+    book = GdaxBookState('BTC-USD')
+    book.load_snapshot({'sequence': 10,
+                        'bids': [['99.0', '1.0', 'b1'], ['98.0', '2.0', 'b2']],
+                        'asks': [['101.0', '1.5', 'a1']]})
+    hist = db.get_book_history('BTC-USD', checkpoint_interval=timedelta(minutes=5),
+                               chunksize=2)
+    hist.save_checkpoint(book, T0)
+
+    keys = ('order_id', 'side', 'price', 'size', 'remaining_size', 'maker_order_id')
+    feed = [msg(11, 1, 'open', order_id='b3', side='buy', price=99.5, remaining_size=0.5),
+            msg(12, 2, 'match', maker_order_id='a1', side='sell', price=101.0, size=0.5),
+            msg(14, 4, 'done', order_id='b2', side='buy', price=98.0),
+            msg(15, 6, 'open', order_id='a2', side='sell', price=100.5, remaining_size=3.0),
+            msg(16, 8, 'match', maker_order_id='a1', side='sell', price=101.0, size=1.0)]
+    with db.engine.begin() as conn:
+        conn.execute(GdaxSQLFeedEntry.__table__.insert(),
+                     [dict({k: None for k in keys}, **m) for m in feed])
+        conn.execute(GdaxSQLOrderChange.__table__.insert(),
+                     [msg(13, 3, 'change', order_id='b1', side='buy', price=99.0, new_size=0.25)])
+    return hist
+
+
+def test_book_state_roundtrip():
+    book = GdaxBookState('BTC-USD', 5)
+    book.apply({'sequence': 6, 'type': 'open', 'order_id': 'x', 'side': 'buy',
+                'price': '10', 'remaining_size': '2'})
+    book.apply({'sequence': 9, 'type': 'open', 'order_id': 'y', 'side': 'buy',
+                'price': '10', 'remaining_size': '1'})
+    assert book.missing == 2
+    assert not book.apply({'sequence': 9, 'type': 'done', 'order_id': 'y'})
+
+    copy = GdaxBookState.from_bytes(book.to_bytes())
+    assert copy.sequence == 9
+    # Time priority within a price level survives serialization.
+    assert copy.get_current_book()['bids'] == [[10.0, 2.0, 'x'], [10.0, 1.0, 'y']]
+
+
+def test_book_at(viewer):
+    hist = seed(viewer.db)
+
+    book = hist.book_at(T0 + timedelta(minutes=3, seconds=30))
+    assert book.sequence == 13
+    assert book.complete
+    res = book.get_current_book()
+    assert res['bids'] == [[99.5, 0.5, 'b3'], [99.0, 0.25, 'b1'], [98.0, 2.0, 'b2']]
+    assert res['asks'] == [[101.0, 1.0, 'a1']]
+
+    book = hist.book_at(T0 + timedelta(minutes=9))
+    assert book.sequence == 16
+    assert book.replayed == 6
+    assert book.get_ask() == 100.5
+    assert [b[2] for b in book.get_current_book()['bids']] == ['b3', 'b1']
+
+
+def test_update_checkpoints(viewer):
+    hist = seed(viewer.db)
+    assert hist.update_checkpoints() == 1
+
+    # The new checkpoint (at 6 minutes) shortens the replay.
+    book = hist.book_at(T0 + timedelta(minutes=9))
+    assert book.sequence == 16
+    assert book.replayed == 1
+    # a1 was filled by the last match.
+    assert book.get_current_book()['asks'] == [[100.5, 3.0, 'a2']]
+
+    # Times before the first checkpoint can't be rebuilt.
+    with pytest.raises(LookupError):
+        hist.book_at(T0 - timedelta(minutes=1))
@@ -0,0 +1,106 @@
+"""
+MIT License
+
+Copyright (c) 2017 Zeke Barge
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import time
+from stocklook.crypto.gdax.candles import GdaxCandleCache, page_candles, GDAX_MAX_CANDLES
+
+G = 60
+END = int(time.time()) - int(time.time()) % G - G * 10
+START = END - G * 1000
+
+
+def test_page_candles(gdax):
+    g = gdax
+    rows = page_candles(lambda s, e: g.request_candles('ETH-USD', s, e, G),
+                        START, END, G)
+    assert len(g.calls) == 4
+    assert max(e - s for s, e in g.calls) == G * (GDAX_MAX_CANDLES - 1)
+    times = [r[0] for r in rows]
+    assert times == list(range(END, START - 1, -G))
+
+
+def test_cache_only_requests_new_buckets(gdax):
+    g = gdax
+    c = GdaxCandleCache(g)
+    rows = c.get('ETH-USD', START, END, G)
+    assert len(rows) == 1001
+    calls = len(g.calls)
+
+    # Inside the cached range - no requests.
+    rows = c.get('ETH-USD', START + G * 10, END - G * 10, G)
+    assert len(rows) == 981
+    assert len(g.calls) == calls
+
+    # Newer buckets - only the tail is requested.
+    rows = c.get('ETH-USD', START, END + G * 5, G)
+    assert len(rows) == 1006
+    assert g.calls[calls:] == [(END + G, END + G * 5)]
+
+    # The current bucket is still changing so it's requested again.
+    now = int(time.time())
+    c.get('ETH-USD', START, now, G)
+    calls = len(g.calls)
+    c.get('ETH-USD', START, now, G)
+    assert g.calls[calls][0] == now - now % G
+
+
+def test_cache_persists(tmp_path, gdax):
+    g = gdax
+    c = GdaxCandleCache(g, path=str(tmp_path))
+    c.get('BTC-USD', START, END - G * 20, G)
+    calls = len(g.calls)
+
+    c2 = GdaxCandleCache(g, path=str(tmp_path))
+    rows = c2.get('BTC-USD', START, END - G * 20, G)
+    assert len(rows) == 981
+    # A fully cached historical range needs no requests.
+    assert len(g.calls) == calls
+
+
+def test_cache_is_bounded(gdax):
+    g = gdax
+    c = GdaxCandleCache(g, max_size=2, max_rows=500)
+    rows = c.get('ETH-USD', START, END, G)
+    # The whole range is returned but only the newest 500 are kept.
+    assert len(rows) == 1001
+    assert len(c._data[('ETH-USD', G)]) == 500
+    calls = len(g.calls)
+    c.get('ETH-USD', END - G * 499, END, G)
+    assert len(g.calls) == calls
+    c.get('ETH-USD', END - G * 500, END, G)
+    assert g.calls[calls] == (END - G * 500, END - G * 499)
+
+    c.get('BTC-USD', START, END, G)
+    c.get('LTC-USD', START, END, G)
+    assert list(c._data) == [('BTC-USD', G), ('LTC-USD', G)]
+
+
+def test_clear_product(gdax):
+    c = GdaxCandleCache(gdax)
+    for g in (G, G * 5):
+        c.get('ETH-USD', START, END, g)
+    c.get('BTC-USD', START, END, G)
+    c.clear('ETH-USD', G * 5)
+    assert ('ETH-USD', G) in c._data
+    c.clear('ETH-USD')
+    assert list(c._data) == [('BTC-USD', G)]
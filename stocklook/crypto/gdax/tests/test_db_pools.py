@@ -0,0 +1,66 @@
+"""
+MIT License
+
+Copyright (c) 2017 Zeke Barge
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import pytest
+from datetime import timedelta
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import TimeoutError
+from stocklook.crypto.gdax.db import GdaxDatabase
+from stocklook.crypto.gdax.tests.test_db_reads import load_ticks, T0
+from stocklook.utils.database import (MeteredQueuePool, PoolMetrics,
+                                      db_create_engine)
+
+
+def test_metered_pool_waits_and_timeouts(tmp_path):
+    engine = create_engine('sqlite:///' + str(tmp_path / 'pool.sqlite3'),
+                           poolclass=MeteredQueuePool, pool_size=1,
+                           max_overflow=0, pool_timeout=0.1)
+    metrics = PoolMetrics().listen(engine.pool)
+    held = engine.connect()
+    with pytest.raises(TimeoutError):
+        engine.connect()
+    held.close()
+    with engine.connect() as conn:
+        conn.execute(text('SELECT 1'))
+
+    snap = metrics.snapshot()
+    assert snap['timeouts'] == 1
+    assert snap['waits'] == 3
+    assert snap['wait_max'] >= 0.1
+    assert snap['checkouts'] == 2
+    assert snap['peak_in_use'] == 1
+    assert snap['in_use'] == 0
+
+
+def test_read_engine_routing(tmp_path, gdax):
+    path = str(tmp_path / 'gdax.sqlite3')
+    db = GdaxDatabase(gdax=gdax, engine=db_create_engine('sqlite:///' + path),
+                      read_engine='sqlite:///' + path)
+    assert db.read_engine is not db.engine
+    load_ticks(db)
+    before = db.pool_metrics()
+    df = db.get_prices(None, T0, T0 + timedelta(seconds=9), ['BTC-USD'])
+    assert df.index.size == 5
+    after = db.pool_metrics()
+    assert after['read']['checkouts'] == before['read']['checkouts'] + 1
+    assert after['write']['checkouts'] == before['write']['checkouts']
@@ -0,0 +1,109 @@
+"""
+MIT License
+
+Copyright (c) 2017 Zeke Barge
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+from datetime import datetime, timedelta
+from stocklook.crypto.gdax.tables import GdaxSQLTickerFeedEntry, GdaxSQLQuote
+from stocklook.crypto.gdax.backfill import GdaxOHLCBackfiller
+from stocklook.crypto.gdax.tests.test_backfill import START, G
+
+T0 = datetime(2017, 9, 2, 17)
+
+
+def load_ticks(db, n=10):
+    t = GdaxSQLTickerFeedEntry.__table__
+    rows = [{'time': T0 + timedelta(seconds=i), 'price': 100.0 + i,
+             'product_id': 'BTC-USD' if i % 2 else 'ETH-USD',
+             'sequence': 3000000000 + i, 'side': 'buy', 'last_size': 0.1,
+             'best_bid': 99.0 + i, 'best_ask': 100.0 + i}
+            for i in range(n)]
+    with db._engine.begin() as conn:
+        conn.execute(t.insert(), rows)
+
+
+def test_get_prices_typed(viewer):
+    db = viewer.db
+    load_ticks(db)
+    df = db.get_prices(None, T0, T0 + timedelta(seconds=5), ['BTC-USD'])
+    assert df['price'].tolist() == [101.0, 103.0, 105.0]
+    assert df['price'].dtype == 'float64'
+    assert str(df['time'].dtype).startswith('datetime64')
+
+    session = db.get_session()
+    frames = list(db.get_prices(session, T0, T0 + timedelta(seconds=9),
+                                ['BTC-USD', 'ETH-USD'],
+                                columns=['sequence', 'price'],
+                                chunksize=4))
+    session.close()
+    assert [f.index.size for f in frames] == [4, 4, 2]
+    assert list(frames[0].columns) == ['sequence', 'price']
+    assert frames[0]['sequence'].dtype == 'int64'
+
+
+def test_aggregate_prices(viewer):
+    db = viewer.db
+    load_ticks(db, n=130)
+    df = db.aggregate_prices(T0, T0 + timedelta(minutes=5), ['BTC-USD'],
+                             freq='1min', chunksize=7)
+    assert df['time'].tolist() == [T0, T0 + timedelta(minutes=1), T0 + timedelta(minutes=2)]
+    assert df['open'].tolist() == [101.0, 161.0, 221.0]
+    assert df['close'].tolist() == [159.0, 219.0, 229.0]
+    assert df['ticks'].tolist() == [30, 30, 5]
+    assert abs(df['volume'].iloc[0] - 3.0) < 1e-9
+
+
+def test_get_quotes_by_name(viewer):
+    db = viewer.db
+    stock_id = db.get_stock_id('ETH-USD')
+    with db._engine.begin() as conn:
+        conn.execute(GdaxSQLQuote.__table__.insert(),
+                     [{'stock_id': stock_id, 'close': 1.5, 'quote_date': T0},
+                      {'stock_id': stock_id, 'close': None, 'quote_date': T0}])
+    df = db.get_quotes('ETH-USD', columns=['close', 'quote_date'])
+    assert df.index.size == 2
+    assert df['close'].isnull().tolist() == [False, True]
+
+
+def test_read_ohlc(viewer):
+    GdaxOHLCBackfiller(viewer).run(START, START + G * 9)
+    df = viewer.read_ohlc(START + G * 2, START + G * 5, columns=['time', 'close'])
+    assert df['time'].tolist() == [START + G * i for i in range(2, 6)]
+    assert sum(f.index.size for f in viewer.read_ohlc(chunksize=3)) == 9
+
+
+def test_load_df_upsert(viewer):
+    from pandas import DataFrame
+    df = DataFrame({'time': [START, START + G, START + G],
+                    'open': [1.0, 2.0, 2.0], 'high': 3.0, 'low': 0.5,
+                    'close': [1.5, 2.5, 2.5], 'volume': 10.0})
+    assert viewer.load_df(df.copy(), thread=False) == 2
+
+    df.loc[:, 'close'] = 9.0
+    viewer.load_df(df.copy(), thread=False)
+    assert viewer.read_ohlc()['close'].tolist() == [1.5, 2.5]
+
+    viewer.load_df(df.copy(), thread=False, update=True)
+    assert viewer.read_ohlc()['close'].tolist() == [9.0, 9.0]
+
+    th = viewer.load_df(df.assign(time=df['time'] + G * 2), thread=True)
+    th.join()
+    assert viewer.read_ohlc().index.size == 4
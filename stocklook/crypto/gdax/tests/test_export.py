@@ -0,0 +1,91 @@
+"""
+MIT License
+
+Copyright (c) 2017 Zeke Barge
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import gzip
+import pytest
+from datetime import timedelta
+from pandas import read_csv
+from stocklook.crypto.gdax.export import GdaxTableExporter
+from stocklook.crypto.gdax.tables import GdaxSQLTickerFeedEntry
+from stocklook.crypto.gdax.tests.test_db_reads import load_ticks, T0
+
+
+class Interrupted(Exception):
+    pass
+
+
+class FailingExporter(GdaxTableExporter):
+    """Dies after writing :param fail_after chunks."""
+    fail_after = 2
+
+    def write_csv(self, df, state):
+        if self.fail_after == 0:
+            raise Interrupted()
+        self.fail_after -= 1
+        return super(FailingExporter, self).write_csv(df, state)
+
+
+def test_csv_export_resumes(viewer, tmp_path):
+    db = viewer.db
+    load_ticks(db, n=40)
+    path = str(tmp_path / 'ticks.csv.gz')
+    kwargs = dict(products=['BTC-USD'], start=T0 + timedelta(seconds=4),
+                  columns=['time', 'price'], chunksize=3)
+
+    with pytest.raises(Interrupted):
+        FailingExporter(db.engine, GdaxSQLTickerFeedEntry, path, **kwargs).run()
+
+    # A partial chunk written after the last checkpoint is dropped on resume.
+    with open(path, 'ab') as fh:
+        fh.write(gzip.compress(b'garbage\n'))
+
+    report = GdaxTableExporter(db.engine, GdaxSQLTickerFeedEntry, path, **kwargs).run()
+    assert report['resumed_rows'] == 6
+    assert report['rows'] == 12
+    assert report['done']
+
+    with gzip.open(path, 'rt') as fh:
+        df = read_csv(fh)
+    assert list(df.columns) == ['ticker_id', 'time', 'price']
+    assert df['price'].tolist() == [100.0 + i for i in range(5, 40, 2)]
+
+    # Finished exports don't rerun, changed settings refuse to resume.
+    again = GdaxTableExporter(db.engine, GdaxSQLTickerFeedEntry, path, **kwargs).run()
+    assert again['rows'] == 0
+    with pytest.raises(ValueError):
+        GdaxTableExporter(db.engine, GdaxSQLTickerFeedEntry, path,
+                          chunksize=3, products=['ETH-USD']).run()
+
+
+def test_parquet_export(viewer, tmp_path):
+    pq = pytest.importorskip('pyarrow.parquet')
+    db = viewer.db
+    load_ticks(db, n=25)
+    path = str(tmp_path / 'ticks')
+    report = db.export(GdaxSQLTickerFeedEntry, path, fmt='parquet', chunksize=10)
+    assert report['rows'] == 25
+    assert report['chunks'] == 3
+    table = pq.read_table(path)
+    assert table.num_rows == 25
+    assert str(table.schema.field('time').type) == 'timestamp[us]'
+    assert str(table.schema.field('trade_id').type) == 'int64'
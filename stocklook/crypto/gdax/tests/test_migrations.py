@@ -0,0 +1,76 @@
+"""
+MIT License
+
+Copyright (c) 2017 Zeke Barge
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+from sqlalchemy import create_engine, inspect, select, text, DateTime
+from stocklook.crypto.gdax.tables import GdaxSQLTickerFeedEntry
+from stocklook.crypto.gdax.migrations import (migrate_gdax_database,
+                                              get_type_mismatches)
+from stocklook.utils.timetools import timestamp_to_local
+
+LEGACY_TICKS = """
+CREATE TABLE gdax_ticks (
+    ticker_id INTEGER PRIMARY KEY,
+    type VARCHAR(20),
+    trade_id INTEGER,
+    sequence INTEGER,
+    time VARCHAR(50),
+    product_id VARCHAR(10),
+    price FLOAT,
+    side VARCHAR(10),
+    last_size FLOAT,
+    best_bid FLOAT,
+    best_ask FLOAT
+)
+"""
+
+
+def test_migrate_legacy_ticks(tmpdir):
+    engine = create_engine('sqlite:///' + str(tmpdir.join('gdax.sqlite3')))
+    with engine.begin() as conn:
+        conn.execute(text(LEGACY_TICKS))
+        conn.execute(text("INSERT INTO gdax_ticks (ticker_id, sequence, time, product_id, price) "
+                          "VALUES (1, 3262786978, '2017-09-02T17:05:49.250000Z', 'BTC-USD', 4388.01), "
+                          "(2, 3262786979, 'garbage', 'BTC-USD', 4388.02)"))
+
+    assert get_type_mismatches(engine, GdaxSQLTickerFeedEntry) == ['time']
+    res = migrate_gdax_database(engine)
+    assert res['rebuilt'] == {'gdax_ticks': 2}
+
+    insp = inspect(engine)
+    cols = {c['name']: c['type'] for c in insp.get_columns('gdax_ticks')}
+    assert isinstance(cols['time'], DateTime)
+    idx = {i['name'] for i in insp.get_indexes('gdax_ticks')}
+    assert {'ix_gdax_ticks_product_time', 'ix_gdax_ticks_product_sequence'} <= idx
+    assert 'gdax_ticks_old' not in insp.get_table_names()
+
+    t = GdaxSQLTickerFeedEntry.__table__
+    with engine.connect() as conn:
+        rows = conn.execute(select([t.c.ticker_id, t.c.sequence, t.c.time])
+                            .order_by(t.c.ticker_id)).fetchall()
+    expected = timestamp_to_local('2017-09-02T17:05:49Z').replace(tzinfo=None)
+    assert rows[0][1] == 3262786978
+    assert rows[0][2].replace(microsecond=0) == expected
+    assert rows[1][2] is None
+
+    # A second run has nothing left to do.
+    assert migrate_gdax_database(engine) == {'rebuilt': {}, 'indexes': []}
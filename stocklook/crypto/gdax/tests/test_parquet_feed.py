@@ -0,0 +1,116 @@
+"""
+MIT License
+
+Copyright (c) 2017 Zeke Barge
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import os
+import pytest
+from queue import Queue
+
+pytest.importorskip('pyarrow')
+
+from stocklook.crypto.gdax.tables import GdaxSQLTickerFeedEntry
+from stocklook.crypto.gdax.feeds.parquet_feed import (GdaxParquetSink,
+                                                      GdaxParquetReader,
+                                                      GdaxParquetLoader)
+
+
+def make_tick(product, time, price, sequence):
+    return {'type': 'ticker', 'trade_id': sequence, 'sequence': sequence,
+            'time': time, 'product_id': product, 'price': str(price),
+            'side': 'buy', 'last_size': '0.01',
+            'best_bid': str(price - 0.01), 'best_ask': str(price)}
+
+
+TICKS = [make_tick('BTC-USD', '2017-09-02T17:05:49.250000Z', 4388.01, 1),
+         make_tick('BTC-USD', '2017-09-02T17:59:01.000000Z', 4390.00, 2),
+         make_tick('BTC-USD', '2017-09-02T18:00:02.000000Z', 4391.50, 3),
+         make_tick('ETH-USD', '2017-09-02T17:30:00.000000Z', 350.25, 4),
+         make_tick('ETH-USD', '2017-09-03T01:00:00.000000Z', 351.00, 5)]
+
+
+def test_sink_partitions_and_types(tmpdir):
+    root = str(tmpdir)
+    sink = GdaxParquetSink(root)
+    for t in TICKS:
+        sink.add(GdaxSQLTickerFeedEntry, t)
+
+    assert sink.flush(force=True) == 4
+    hour_dir = os.path.join(root, 'gdax_ticks', 'product_id=BTC-USD',
+                            'date=2017-09-02', 'hour=17')
+    assert len(os.listdir(hour_dir)) == 1
+
+    df = GdaxParquetReader(root).read('gdax_ticks')
+    assert len(df.index) == 5
+    assert df['price'].dtype == 'float64'
+    assert df['sequence'].tolist() == [1, 4, 2, 3, 5]
+    assert str(df['time'].dt.tz) == 'UTC'
+
+
+def test_reader_pushes_down_filters(tmpdir):
+    root = str(tmpdir)
+    sink = GdaxParquetSink(root, batch_size=2)
+    for t in TICKS:
+        sink.add(GdaxSQLTickerFeedEntry, t)
+    sink.flush(force=True)
+
+    reader = GdaxParquetReader(root)
+    df = reader.read('gdax_ticks', products='BTC-USD',
+                     start='2017-09-02 17:30:00', end='2017-09-02 18:00:02',
+                     columns=['price'])
+    assert df['price'].tolist() == [4390.00]
+    assert set(df.columns) == {'price', 'time'}
+    assert reader.read('gdax_feed').empty
+
+
+def test_loader_flushes_on_stop(tmpdir):
+    root = str(tmpdir)
+    q = Queue()
+    loader = GdaxParquetLoader(GdaxParquetSink(root), q,
+                               GdaxSQLTickerFeedEntry)
+    loader.start()
+    for t in TICKS:
+        q.put(t)
+    q.put(loader.STOP_SIGNAL)
+    q.join()
+    loader.join()
+
+    assert loader.count == 5
+    df = GdaxParquetReader(root).read('gdax_ticks', products=['ETH-USD'])
+    assert df['price'].tolist() == [350.25, 351.00]
+
+
+def test_message_without_time_stores_receive_time(tmpdir):
+    from pandas import Timestamp, Timedelta
+    root = str(tmpdir)
+    sink = GdaxParquetSink(root)
+    msg = make_tick('BTC-USD', None, 4388.01, 1)
+    del msg['time']
+    before = Timestamp.now('UTC')
+    sink.add(GdaxSQLTickerFeedEntry, msg)
+    sink.flush(force=True)
+
+    df = GdaxParquetReader(root).read('gdax_ticks', start=before - Timedelta(seconds=1))
+    assert len(df.index) == 1
+    t = df['time'].iloc[0]
+    hour_dir = os.path.join(root, 'gdax_ticks', 'product_id=BTC-USD',
+                            'date={:%Y-%m-%d}'.format(t), 'hour={}'.format(t.hour))
+    assert os.path.isdir(hour_dir)
@@ -0,0 +1,192 @@
+"""
+MIT License
+
+Copyright (c) 2017 Zeke Barge
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import gzip
+from datetime import datetime, timedelta
+from pandas import read_csv
+from sqlalchemy import create_engine, select, func, event
+from stocklook.crypto.gdax.tables import (GdaxBase,
+                                          GdaxSQLFeedEntry,
+                                          GdaxSQLTickerFeedEntry,
+                                          GdaxTradeBar,
+                                          GdaxTickSnapshot)
+from stocklook.crypto.gdax.retention import (RetentionPolicy,
+                                             GdaxRetentionJob,
+                                             apply_policy,
+                                             compact_ticks,
+                                             compact_trades)
+
+NOW = datetime(2017, 10, 10, 12, 0)
+
+
+class _DB:
+    def __init__(self, engine):
+        self._engine = engine
+
+
+def _count(engine, table, *where):
+    with engine.connect() as conn:
+        return conn.execute(select([func.count()]).select_from(table).where(*where)).scalar()
+
+
+def _setup(tmpdir):
+    engine = create_engine('sqlite:///' + str(tmpdir.join('gdax.sqlite3')))
+    GdaxBase.metadata.create_all(bind=engine)
+    start = NOW - timedelta(days=8)
+    ticks, feed = list(), list()
+    # 3 hours of expired rows and 1 hour of fresh rows, one per 20 seconds.
+    for i in range(540):
+        t = start + timedelta(seconds=20 * i)
+        ticks.append({'time': t, 'product_id': 'BTC-USD', 'price': 100.0 + i,
+                      'last_size': 0.5, 'best_bid': 99.0 + i, 'best_ask': 100.0 + i})
+        feed.append({'time': t, 'product_id': 'BTC-USD', 'price': 100.0 + i, 'size': 1.0,
+                     'type': 'match' if i % 2 else 'open'})
+    for i in range(180):
+        t = NOW - timedelta(hours=1) + timedelta(seconds=20 * i)
+        ticks.append({'time': t, 'product_id': 'BTC-USD', 'price': 1.0,
+                      'last_size': 0.5, 'best_bid': 1.0, 'best_ask': 1.0})
+        feed.append({'time': t, 'product_id': 'BTC-USD', 'price': 1.0, 'size': 1.0,
+                     'type': 'match'})
+    with engine.begin() as conn:
+        conn.execute(GdaxSQLTickerFeedEntry.__table__.insert(), ticks)
+        conn.execute(GdaxSQLFeedEntry.__table__.insert(), feed)
+    return engine
+
+
+def _archived(paths):
+    rows = 0
+    for p in paths:
+        with gzip.open(str(p), 'rt') as fh:
+            rows += len(read_csv(fh))
+    return rows
+
+
+def test_compact_frames():
+    from pandas import DataFrame, to_datetime
+    t = to_datetime(['2017-10-01 00:00:10', '2017-10-01 00:00:50', '2017-10-01 00:01:05'])
+    df = DataFrame({'time': t, 'product_id': 'BTC-USD', 'price': [1.0, 3.0, 2.0],
+                    'last_size': [1.0, 1.0, 1.0], 'best_bid': [0.9, 2.9, 1.9],
+                    'best_ask': [1.0, 3.0, 2.0], 'size': [1.0, 2.0, 3.0],
+                    'type': ['match', 'match', 'open']})
+    snaps = compact_ticks(df)
+    assert snaps['price'].tolist() == [3.0, 2.0]
+    assert snaps['ticks'].tolist() == [2, 1]
+    bars = compact_trades(df)
+    assert len(bars) == 1
+    assert bars.iloc[0][['open', 'high', 'low', 'close', 'volume']].tolist() == [1.0, 3.0, 1.0, 3.0, 3.0]
+
+
+def test_apply_policy_archives_compacts_and_deletes(tmpdir):
+    engine = _setup(tmpdir)
+    archive = str(tmpdir.join('archive'))
+    policy = RetentionPolicy(GdaxSQLTickerFeedEntry, 7, compact=compact_ticks,
+                             compact_table=GdaxTickSnapshot)
+    report = apply_policy(engine, policy, archive_dir=archive, now=NOW,
+                          batch_size=100, throttle=0)
+
+    t = GdaxSQLTickerFeedEntry.__table__
+    assert report['rows_deleted'] == 540
+    assert _count(engine, t) == 180
+    assert _count(engine, GdaxTickSnapshot.__table__) == 180
+    assert report['rows_compacted'] == 180
+
+    paths = tmpdir.join('archive', 'gdax_ticks').listdir('gdax_ticks_2017-10-02_*.csv.gz')
+    assert len(paths) == 6
+    assert report['archive_bytes'] == sum(p.size() for p in paths)
+    assert _archived(paths) == 540
+
+    # Nothing left to expire.
+    again = apply_policy(engine, policy, archive_dir=archive, now=NOW, throttle=0)
+    assert again['rows_deleted'] == 0
+
+
+def test_interrupted_batch_is_redone_whole(tmpdir):
+    engine = _setup(tmpdir)
+    archive = str(tmpdir.join('archive'))
+    policy = RetentionPolicy(GdaxSQLFeedEntry, 7, compact=compact_trades,
+                             compact_table=GdaxTradeBar)
+    deletes = []
+
+    def fail_second_delete(conn, cursor, statement, *args):
+        if statement.startswith('DELETE'):
+            deletes.append(statement)
+            if len(deletes) == 2:
+                raise KeyboardInterrupt
+
+    event.listen(engine, 'before_cursor_execute', fail_second_delete)
+    try:
+        apply_policy(engine, policy, archive_dir=archive, now=NOW,
+                     batch_size=50, throttle=0)
+    except KeyboardInterrupt:
+        pass
+    event.remove(engine, 'before_cursor_execute', fail_second_delete)
+
+    # The first batch (16 whole minutes) committed, the second batch's
+    # compaction and delete rolled back together.
+    assert _count(engine, GdaxSQLFeedEntry.__table__) == 720 - 48
+    assert _count(engine, GdaxTradeBar.__table__) == 16
+
+    report = apply_policy(engine, policy, archive_dir=archive, now=NOW, throttle=0)
+    assert report['rows_deleted'] == 540 - 48
+    bars = GdaxTradeBar.__table__
+    with engine.connect() as conn:
+        rows = conn.execute(select([bars.c.open, bars.c.close, bars.c.volume])
+                            .order_by(bars.c.time)).fetchall()
+    assert [tuple(r) for r in rows[:2]] == [(101.0, 101.0, 1.0), (103.0, 105.0, 2.0)]
+    assert sum(r[2] for r in rows) == 270
+    paths = tmpdir.join('archive', 'gdax_feed').listdir('*.csv.gz')
+    assert _archived(paths) == 540
+
+
+def test_minutes_larger_than_a_batch_are_read_whole(tmpdir):
+    engine = _setup(tmpdir)
+    t = GdaxSQLTickerFeedEntry.__table__
+    with engine.begin() as conn:
+        conn.execute(t.insert(), {'time': None, 'product_id': 'BTC-USD', 'price': 1.0})
+    policy = RetentionPolicy(GdaxSQLTickerFeedEntry, 7, compact=compact_ticks,
+                             compact_table=GdaxTickSnapshot, archive=False)
+    report = apply_policy(engine, policy, now=NOW, batch_size=2, throttle=0)
+
+    assert report['rows_deleted'] == 540
+    with engine.connect() as conn:
+        ticks = conn.execute(select([GdaxTickSnapshot.__table__.c.ticks])).fetchall()
+    assert [r[0] for r in ticks] == [3] * 180
+    # Rows without a time are never expired.
+    assert _count(engine, t, t.c.time.is_(None)) == 1
+
+
+def test_retention_job_report(tmpdir):
+    engine = _setup(tmpdir)
+    policies = [RetentionPolicy(GdaxSQLFeedEntry, 7, compact=compact_trades,
+                                compact_table=GdaxTradeBar, archive=False),
+                RetentionPolicy(GdaxSQLTickerFeedEntry, 7, archive=False)]
+    job = GdaxRetentionJob(_DB(engine), policies=policies,
+                           archive_dir=str(tmpdir), throttle=0)
+    report = job.run_once(now=NOW)
+
+    assert report['rows_deleted'] == 1080
+    assert report['archive_bytes'] == 0
+    assert report['bytes_reclaimed'] > 0
+    bars = GdaxTradeBar.__table__
+    assert _count(engine, bars) == 180
+    assert _count(engine, GdaxSQLFeedEntry.__table__) == 180
@@ -0,0 +1,132 @@
+"""
+MIT License
+
+Copyright (c) 2017 Zeke Barge
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import numpy as np
+from pandas import DataFrame
+from sqlalchemy import create_engine, select
+from stocklook.crypto.gdax.db import GdaxDatabase, GdaxOHLCViewer
+from stocklook.crypto.gdax.tables import GdaxBase, GdaxOHLC60, GdaxOHLC1W
+from stocklook.crypto.gdax.rollups import aggregate_ohlc, get_buckets
+
+G = 300
+# Monday 2017-07-10 00:00 UTC
+MONDAY = 1499644800
+
+
+def make_bars(start, n):
+    t = start + G * np.arange(n)
+    return DataFrame({'time': t, 'open': np.arange(n) + 1.0,
+                      'high': np.arange(n) + 2.0, 'low': np.arange(n) + 0.5,
+                      'close': np.arange(n) + 1.5, 'volume': 1.0})
+
+
+def test_aggregate_ohlc():
+    bars = aggregate_ohlc(make_bars(MONDAY, 24).sample(frac=1, random_state=1), 3600)
+    assert bars['time'].tolist() == [MONDAY, MONDAY + 3600]
+    assert bars['open'].tolist() == [1.0, 13.0]
+    assert bars['close'].tolist() == [12.5, 24.5]
+    assert bars['high'].tolist() == [13.0, 25.0]
+    assert bars['low'].tolist() == [0.5, 12.5]
+    assert bars['volume'].tolist() == [12.0, 12.0]
+    assert get_buckets([MONDAY + 86400 * 3], GdaxOHLC1W.GRANULARITY,
+                       GdaxOHLC1W.OFFSET).tolist() == [MONDAY]
+
+
+def test_rollups_update_incrementally(viewer):
+    r = viewer.rollups
+    viewer.load_df(make_bars(MONDAY, 24), thread=False)
+    hourly = r.read(MONDAY, MONDAY + 86400, 3600)
+    assert hourly['close'].tolist() == [12.5, 24.5]
+
+    # A late bar only touches the buckets containing it.
+    late = make_bars(MONDAY + G * 24, 1)
+    late.loc[:, 'high'] = 99.0
+    viewer.load_df(late, thread=False)
+    hourly = r.read(MONDAY, MONDAY + 86400, 3600)
+    assert hourly['high'].tolist() == [13.0, 25.0, 99.0]
+    assert r.read(MONDAY, MONDAY + 86400, 86400 * 7)['high'].tolist() == [99.0]
+
+    # 2h bars are built from the 1h table, 10m bars from 5m bars.
+    assert r.get_table(7200) is GdaxOHLC60
+    assert r.read(MONDAY, MONDAY + 86400, 7200)['volume'].tolist() == [24.0, 1.0]
+    assert r.read(MONDAY, MONDAY + 3600, 600).index.size == 7
+
+
+def test_rollups_rebuild(viewer):
+    viewer.rollups = None
+    viewer.load_df(make_bars(MONDAY, 48), thread=False)
+    from stocklook.crypto.gdax.rollups import GdaxOHLCRollups
+    r = GdaxOHLCRollups(viewer)
+    assert r.read(MONDAY, MONDAY + 86400, 3600).empty
+    assert r.rebuild() == 16 + 4 + 1 + 1 + 1
+    assert r.read(MONDAY, MONDAY + 86400, 3600)['open'].tolist() == [1.0, 13.0, 25.0, 37.0]
+
+
+def test_maintenance_reads_skip_lagging_replica(tmp_path, gdax):
+    # The replica never receives the primary's writes.
+    replica = create_engine('sqlite:///' + str(tmp_path / 'replica.sqlite3'))
+    GdaxBase.metadata.create_all(bind=replica)
+    engine = create_engine('sqlite:///' + str(tmp_path / 'gdax.sqlite3'))
+    db = GdaxDatabase(gdax=gdax, engine=engine, read_engine=replica)
+    v = GdaxOHLCViewer('ETH-USD', db=db)
+
+    v.load_df(make_bars(MONDAY, 24), thread=False)
+    hourly = v.rollups.read(MONDAY, MONDAY + 86400, 3600)
+    assert hourly.empty  # charting reads go to the replica
+    with engine.connect() as conn:
+        rows = conn.execute(select([GdaxOHLC60.close]).order_by(GdaxOHLC60.time)).fetchall()
+    assert [r[0] for r in rows] == [12.5, 24.5]
+
+    assert len(v.load_bucket_index()) == 24
+    assert v.get_gap_ranges(use_sql=True) == []
+
+
+def test_read_chart(viewer):
+    bars = make_bars(MONDAY, 12 * 24 * 3)
+    bars.loc[100, 'high'] = 5000.0
+    viewer.load_df(bars, thread=False)
+    end = MONDAY + 86400 * 3
+
+    # 3 days hold 72 hourly bars so 50 points are read from the 1h table.
+    assert viewer.get_chart_granularity(MONDAY, end, 50) == 3600
+    assert viewer.get_chart_granularity(MONDAY, end, 250) == G * 3
+    assert viewer.get_chart_granularity(MONDAY, end, 500) == G
+
+    df = viewer.read_chart(MONDAY, end, points=50)
+    assert df.index.size == 50
+    assert df['time'].iloc[0] == MONDAY
+
+    df = viewer.read_chart(MONDAY, end, points=200, method='minmax', column='high')
+    assert df.index.size <= 200
+    assert df['high'].max() == 5000.0
+
+    candles = viewer.read_chart(MONDAY, end, points=10, method='ohlc')
+    assert candles.index.size == 10
+    assert candles['high'].max() == bars['high'].max()
+    assert candles['volume'].sum() == bars['volume'].sum()
+
+    # Cached until new bars load.
+    assert viewer.read_chart(MONDAY, end, points=50) is viewer.read_chart(MONDAY, end, points=50)
+    cached = viewer.read_chart(MONDAY, end, points=50)
+    viewer.load_df(make_bars(end, 1), thread=False)
+    assert viewer.read_chart(MONDAY, end, points=50) is not cached
@@ -0,0 +1,139 @@
+"""
+MIT License
+
+Copyright (c) 2017 Zeke Barge
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import os
+import pytest
+from sqlalchemy import create_engine, select, func, text
+from sqlalchemy.exc import OperationalError
+from stocklook.crypto.gdax.db import GdaxDatabase
+from stocklook.crypto.gdax.tables import (GdaxSQLTickerFeedEntry,
+                                          GdaxSQLHeartbeatFeedEntry)
+
+
+@pytest.fixture
+def db(tmp_path, gdax):
+    engine = create_engine('sqlite:///' + str(tmp_path / 'gdax.sqlite3'))
+    db = GdaxDatabase(gdax=gdax, engine=engine, high_throughput=True)
+    yield db
+    if db._writer is not None:
+        db._writer.stop()
+
+
+def _count(engine, sql_table):
+    with engine.connect() as conn:
+        return conn.execute(select([func.count()]).select_from(sql_table.__table__)).scalar()
+
+
+def test_high_throughput_engines(db):
+    with db.engine.connect() as conn:
+        assert conn.execute(text('PRAGMA journal_mode')).scalar() == 'wal'
+        assert conn.execute(text('PRAGMA synchronous')).scalar() == 1
+    assert db.read_engine is not db.engine
+    with pytest.raises(OperationalError):
+        with db.read_engine.begin() as conn:
+            conn.execute(GdaxSQLTickerFeedEntry.__table__.insert(), {'price': 1.0})
+
+
+def test_loaders_share_one_writer(db):
+    loaders = [db.get_loading_thread(obj, commit_interval=25)
+               for obj in (GdaxSQLTickerFeedEntry, GdaxSQLHeartbeatFeedEntry)]
+    writer = db.get_writer()
+    assert all(l.writer is writer for l in loaders)
+    for l in loaders:
+        l.start()
+
+    for i in range(500):
+        loaders[0].queue.put({'type': 'ticker', 'sequence': i, 'product_id': 'BTC-USD',
+                              'price': '4388.01', 'time': '2017-09-02T17:05:49.250000Z'})
+        loaders[1].queue.put({'type': 'heartbeat', 'sequence': i, 'product_id': 'BTC-USD',
+                              'last_trade_id': i, 'time': '2017-09-02T17:05:49.250000Z'})
+    for l in loaders:
+        l.queue.put(l.STOP_SIGNAL)
+        l.join(timeout=30)
+    db.flush_writer()
+
+    assert _count(db.read_engine, GdaxSQLTickerFeedEntry) == 500
+    assert _count(db.read_engine, GdaxSQLHeartbeatFeedEntry) == 500
+    # 40 loader batches were coalesced into fewer transactions.
+    assert writer.count == 1000
+    assert writer.transactions < 40
+    df = db.get_prices(None, '2017-01-01', '2018-01-01', ['BTC-USD'])
+    assert df.index.size == 500
+
+
+def _ticker(i, **kwargs):
+    m = {'type': 'ticker', 'sequence': i, 'product_id': 'BTC-USD',
+         'price': '4388.01', 'time': '2017-09-02T17:05:49.250000Z'}
+    m.update(kwargs)
+    return m
+
+
+def test_writer_hands_back_failed_batches(db):
+    writer = db.get_writer()
+    table = GdaxSQLTickerFeedEntry.__table__
+    failed = list()
+
+    def on_error(t, rows, e):
+        failed.append(rows)
+
+    writer.submit(table, [{'price': 1.0}], on_error=on_error)
+    writer.submit(table, [{'ticker_id': 1000, 'price': 2.0}, {'ticker_id': 1000, 'price': 3.0}], on_error=on_error)
+    writer.submit(table, [{'price': 4.0}], on_error=on_error)
+    writer.flush()
+
+    assert writer.is_alive()
+    assert _count(db.engine, GdaxSQLTickerFeedEntry) == 2
+    assert writer.count == 2
+    assert writer.failed == 2
+    assert [len(rows) for rows in failed] == [2]
+
+
+def test_writer_retries_are_capped(db):
+    from sqlalchemy import MetaData, Table, Column, Integer
+    missing = Table('missing', MetaData(), Column('id', Integer, primary_key=True))
+    writer = db.get_writer()
+    writer.retry_interval = 0
+    writer.max_retries = 2
+    failed = list()
+    writer.submit(missing, [{'id': 1}], on_error=lambda t, rows, e: failed.append(e))
+    writer.flush()
+
+    assert writer.is_alive()
+    assert len(failed) == 1 and isinstance(failed[0], OperationalError)
+
+
+def test_loader_spools_batches_the_writer_fails(db, tmp_path):
+    from stocklook.utils.spool import MessageSpool
+    spool = MessageSpool(str(tmp_path / 'spool'), prefix='ticker')
+    loader = db.get_loading_thread(GdaxSQLTickerFeedEntry, commit_interval=2, spool=spool)
+    assert loader.writer is db.get_writer()
+    loader.start()
+    loader.queue.put(_ticker(1, ticker_id=7))
+    loader.queue.put(_ticker(2, ticker_id=7))
+    loader.queue.put(loader.STOP_SIGNAL)
+    loader.join(timeout=30)
+
+    assert db.get_writer().failed == 2
+    # The duplicate rows were spooled, then quarantined on replay.
+    assert not spool.segments()
+    assert [n for n in os.listdir(spool.directory) if n.endswith('.bad')]
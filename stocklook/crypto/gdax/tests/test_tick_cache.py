@@ -0,0 +1,82 @@
+"""
+MIT License
+
+Copyright (c) 2017 Zeke Barge
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import numpy as np
+from queue import Queue
+from datetime import timedelta
+from pandas import Timestamp
+from stocklook.config import config
+from stocklook.crypto.gdax.feeds.db_loader import GdaxDatabaseLoader
+from stocklook.crypto.gdax.tables import GdaxSQLTickerFeedEntry
+from stocklook.crypto.gdax.tick_cache import GdaxTickCache, TickRing
+from stocklook.crypto.gdax.tests.test_db_reads import load_ticks, T0
+
+
+def _msg(i, product='BTC-USD'):
+    t = Timestamp(T0 + timedelta(seconds=i)).tz_localize(config['PYTZ_TIMEZONE'])
+    return {'type': 'ticker', 'product_id': product, 'sequence': 3000000000 + i,
+            'time': t.tz_convert('UTC').strftime('%Y-%m-%dT%H:%M:%S.%fZ'),
+            'price': str(100.0 + i), 'last_size': '0.1', 'side': 'buy',
+            'best_bid': str(99.0 + i), 'best_ask': str(100.0 + i)}
+
+
+def test_ring_wraps_without_copies():
+    ring = TickRing(capacity=4)
+    for i in range(10):
+        ring.append(i, float(i), sequence=i)
+    assert not ring.append(5, 5.0, sequence=5)
+    last = ring.last(10)
+    assert last['price'].tolist() == [6.0, 7.0, 8.0, 9.0]
+    assert np.shares_memory(last['price'], ring.arrays['price'])
+    w = ring.window(np.datetime64(7, 'ns'), np.datetime64(9, 'ns'))
+    assert w['sequence'].tolist() == [7, 8]
+
+    c = ring.window(np.datetime64(7, 'ns'), np.datetime64(9, 'ns'), copy=True)
+    for i in range(10, 14):
+        ring.append(i, float(i), sequence=i)
+    assert w['sequence'].tolist() == [11, 12]
+    assert c['sequence'].tolist() == [7, 8]
+
+
+def test_loader_feeds_cache_and_falls_through(viewer):
+    db = viewer.db
+    # Ticks 0-9 are in the database only.
+    load_ticks(db, n=10)
+    cache = GdaxTickCache(capacity=100)
+    loader = GdaxDatabaseLoader(db._session_maker, Queue(), GdaxSQLTickerFeedEntry,
+                                commit_interval=100, tick_cache=cache)
+    for i in range(11, 20, 2):
+        loader.queue.put(_msg(i))
+    loader.queue.put({'type': 'ticker', 'product_id': 'BTC-USD', 'sequence': 1})
+    loader.load_messages()
+
+    views = cache.window('BTC-USD', start=T0 + timedelta(seconds=13))
+    assert views['price'].tolist() == [113.0, 115.0, 117.0, 119.0]
+    assert views['side'].tolist() == [1, 1, 1, 1]
+    assert cache.covers('BTC-USD', T0 + timedelta(seconds=11))
+    assert not cache.covers('BTC-USD', T0)
+
+    df = cache.get_frame('BTC-USD', T0, db=db)
+    assert df['price'].tolist() == [101.0, 103.0, 105.0, 107.0, 109.0,
+                                    111.0, 113.0, 115.0, 117.0, 119.0]
+    assert df['time'].is_monotonic_increasing
@@ -0,0 +1,278 @@
+"""
+MIT License
+
+Copyright (c) 2017 Zeke Barge
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import numpy as np
+import logging as lg
+from threading import Lock
+from pandas import DataFrame, Timestamp, concat
+from sqlalchemy import and_
+from stocklook.config import config
+from .tables import GdaxSQLTickerFeedEntry
+
+logger = lg.getLogger(__name__)
+
+# Typed columns kept for every tick.
+TICK_DTYPES = (('time', 'datetime64[ns]'),
+               ('price', 'float64'),
+               ('size', 'float64'),
+               ('side', 'int8'),
+               ('best_bid', 'float64'),
+               ('best_ask', 'float64'),
+               ('sequence', 'int64'))
+
+SIDES = {'buy': 1, 'sell': -1}
+
+
+def to_local_ns(value):
+    """
+    Converts a websocket time ('2017-09-02T17:05:49.250000Z') or a
+    datetime into naive local nanoseconds, the convention gdax_ticks.time
+    is stored in. Naive values are assumed to be local already.
+    """
+    t = Timestamp(value)
+    if t.tzinfo is not None:
+        t = t.tz_convert(config['PYTZ_TIMEZONE']).tz_localize(None)
+    return t.value
+
+
+class TickRing:
+    """
+    A fixed-size ring buffer of ticks for one product
+    stored as typed NumPy arrays.
+
+    Each column is allocated at twice the capacity and every value
+    is written at i and i + capacity, so the last n <= capacity ticks
+    are always one contiguous slice. TickRing.window returns
+    those slices as views without copying.
+
+    Views are overwritten as new ticks wrap around the buffer:
+    .copy() anything kept longer than capacity ticks.
+    """
+    def __init__(self, capacity=100000):
+        self.capacity = capacity
+        self.arrays = {name: np.zeros(capacity * 2, dtype=dt)
+                       for name, dt in TICK_DTYPES}
+        self.count = 0
+        self._next = 0
+        self._lock = Lock()
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    @property
+    def last_sequence(self):
+        if not self.count:
+            return None
+        return int(self.arrays['sequence'][self._next - 1 + self.capacity])
+
+    @property
+    def first_time(self):
+        """
+        The oldest tick time held (naive local numpy.datetime64) or None.
+        """
+        if not self.count:
+            return None
+        return self._slice(len(self))['time'][0]
+
+    def append(self, time, price, size=0.0, side=0,
+               best_bid=np.nan, best_ask=np.nan, sequence=-1):
+        """
+        Adds a tick. Ticks at or below the last sequence are
+        ignored so replayed/duplicated messages can be pushed safely.
+
+        :param time: (int) naive local nanoseconds.
+        :return: (bool) True if the tick was added.
+        """
+        with self._lock:
+            if sequence >= 0 and self.count \
+                    and sequence <= self.arrays['sequence'][self._next - 1 + self.capacity]:
+                return False
+            if self.count:
+                # Keep times sorted for searchsorted.
+                time = max(time, self.arrays['time'][self._next - 1 + self.capacity].item())
+            i = self._next
+            j = i + self.capacity
+            for name, value in (('time', time), ('price', price),
+                                ('size', size), ('side', side),
+                                ('best_bid', best_bid), ('best_ask', best_ask),
+                                ('sequence', sequence)):
+                a = self.arrays[name]
+                a[i] = value
+                a[j] = value
+            self._next = (i + 1) % self.capacity
+            self.count += 1
+        return True
+
+    def _slice(self, n):
+        end = self._next + self.capacity
+        return {name: a[end - n:end] for name, a in self.arrays.items()}
+
+    def window(self, start=None, end=None, copy=False):
+        """
+        Returns ticks with start <= time < end as zero-copy views.
+        Views are overwritten once the ring wraps around, use
+        :param copy to keep the ticks.
+
+        :param start: (datetime, numpy.datetime64, default None)
+            Naive local time, None starts at the oldest tick.
+        :param end: (datetime, numpy.datetime64, default None)
+            Naive local time, None ends after the newest tick.
+        :param copy: (bool, default False)
+            True returns copies made while the ring is locked.
+        :return: (dict)
+            {column: numpy.ndarray view}
+        """
+        with self._lock:
+            data = self._slice(len(self))
+            times = data['time']
+            lo = 0 if start is None else times.searchsorted(np.datetime64(start, 'ns'), 'left')
+            hi = len(times) if end is None else times.searchsorted(np.datetime64(end, 'ns'), 'left')
+            if copy:
+                return {name: a[lo:hi].copy() for name, a in data.items()}
+            return {name: a[lo:hi] for name, a in data.items()}
+
+    def last(self, n):
+        """
+        Returns the last :param n ticks (at most capacity) as zero-copy views.
+        :return: (dict)
+        """
+        with self._lock:
+            return self._slice(min(n, len(self)))
+
+
+class GdaxTickCache:
+    """
+    Per-product TickRing buffers holding the most recent ticker messages
+    in memory, falling through to gdax_ticks for anything older.
+
+    Usage:
+        cache = GdaxTickCache(capacity=100000)
+        feed = GdaxDatabaseFeed(tick_cache=cache, ...)
+        ...
+        views = cache.window('BTC-USD', start=now_minus(minutes=5))
+        df = cache.get_frame('BTC-USD', start, end, db=gdax_db)
+    """
+    def __init__(self, capacity=100000):
+        """
+        :param capacity: (int, default 100000)
+            Ticks kept per product.
+        """
+        self.capacity = capacity
+        self.rings = dict()
+        self._lock = Lock()
+
+    def get_ring(self, product_id):
+        try:
+            return self.rings[product_id]
+        except KeyError:
+            with self._lock:
+                ring = self.rings.get(product_id, None)
+                if ring is None:
+                    ring = TickRing(self.capacity)
+                    self.rings[product_id] = ring
+                return ring
+
+    def add(self, msg):
+        """
+        Adds a ticker websocket message. Messages without
+        a product, time or price (ie the first ticker message
+        after subscribing) are skipped.
+
+        :param msg: (dict)
+        :return: (bool) True if the tick was added.
+        """
+        product = msg.get('product_id', None)
+        t = msg.get('time', None)
+        price = msg.get('price', None)
+        if not product or not t or price is None:
+            return False
+
+        def num(key, default=np.nan):
+            v = msg.get(key, None)
+            try:
+                return float(v)
+            except (TypeError, ValueError):
+                return default
+
+        seq = msg.get('sequence', None)
+        try:
+            t = to_local_ns(t)
+            seq = int(seq) if seq is not None else -1
+        except (TypeError, ValueError):
+            return False
+
+        return self.get_ring(product).append(
+            t, num('price'), num('last_size', 0.0),
+            SIDES.get(msg.get('side', None), 0),
+            num('best_bid'), num('best_ask'), seq)
+
+    def window(self, product_id, start=None, end=None):
+        """
+        Zero-copy views of the cached ticks for a product.
+        See TickRing.window
+        """
+        return self.get_ring(product_id).window(start, end)
+
+    def covers(self, product_id, start):
+        """
+        True when the cache holds every tick since :param start.
+        """
+        first = self.get_ring(product_id).first_time
+        return first is not None and np.datetime64(start, 'ns') >= first
+
+    def get_frame(self, product_id, start, end=None, db=None):
+        """
+        Returns ticks with start <= time < end as a DataFrame.
+        The part of the range older than the cache is read from
+        gdax_ticks through :param db when given.
+
+        :param product_id: (str)
+        :param start: (datetime) naive local time.
+        :param end: (datetime, default None) naive local time.
+        :param db: (stocklook.crypto.gdax.db.GdaxDatabase, default None)
+        :return: (pandas.DataFrame)
+            time, price, size, side, best_bid, best_ask, sequence
+        """
+        ring = self.get_ring(product_id)
+        df = DataFrame(ring.window(start, end, copy=True))
+        if db is None or self.covers(product_id, start):
+            return df
+
+        # The copy holds every cached tick from its first time on, ticks
+        # evicted since it was made must not be read from the database twice.
+        t = GdaxSQLTickerFeedEntry
+        first = df['time'].iloc[0] if not df.empty else ring.first_time
+        older_end = Timestamp(first) if first is not None else end
+        if end is not None and older_end is not None:
+            older_end = min(older_end, Timestamp(end))
+        crit = [t.product_id == product_id, t.time >= start]
+        if older_end is not None:
+            crit.append(t.time < older_end)
+        old = db.read_frame(t, and_(*crit), columns=['time', 'price', 'last_size', 'side',
+                                                     'best_bid', 'best_ask', 'sequence'],
+                            order_by=t.time)
+        old = old.rename(columns={'last_size': 'size'})
+        old['side'] = old['side'].map(SIDES).fillna(0).astype('int8')
+        if df.empty:
+            return old
+        return concat([old, df], ignore_index=True)
@@ -0,0 +1,459 @@
+"""
+MIT License
+
+Copyright (c) 2017 Zeke Barge
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import numpy as np
+import logging as lg
+from time import time
+from pandas import Timestamp
+from concurrent.futures import ThreadPoolExecutor
+
+logger = lg.getLogger(__name__)
+
+# time: UTC seconds
+CANDLE_DTYPE = np.dtype([('time', 'i8'), ('open', 'f8'), ('high', 'f8'),
+                         ('low', 'f8'), ('close', 'f8'), ('volume', 'f8')])
+
+# side: 1 buy, -1 sell, 0 unknown
+TRADE_DTYPE = np.dtype([('time', 'f8'), ('price', 'f8'),
+                        ('size', 'f8'), ('side', 'i1')])
+
+
+def to_epoch(t):
+    """
+    Converts UTC ints/floats, ISO 8601 strings and
+    datetimes into float UTC seconds. Naive times are assumed UTC.
+    """
+    if t is None:
+        return np.nan
+    if isinstance(t, (int, float, np.number)):
+        return float(t)
+    try:
+        return float(t)
+    except (TypeError, ValueError):
+        pass
+    t = Timestamp(t)
+    if t.tzinfo is None:
+        t = t.tz_localize('UTC')
+    return t.timestamp()
+
+
+def to_float(x):
+    try:
+        return float(x)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def side_flag(side):
+    side = str(side).lower()
+    if side == 'buy':
+        return 1
+    if side == 'sell':
+        return -1
+    return 0
+
+
+def make_levels(rows, price_key=0, size_key=1):
+    """
+    Converts a list of book levels (lists or dicts)
+    into a float64 array shaped (n, 2) of [price, size].
+    """
+    a = np.empty((len(rows), 2), dtype=np.float64)
+    for i, r in enumerate(rows):
+        a[i, 0] = float(r[price_key])
+        a[i, 1] = float(r[size_key])
+    return a
+
+
+def make_trades(rows, time_key, price_key, size_key, side_key):
+    a = np.empty(len(rows), dtype=TRADE_DTYPE)
+    for i, r in enumerate(rows):
+        a[i] = (to_epoch(r[time_key]), float(r[price_key]),
+                float(r[size_key]), side_flag(r[side_key]))
+    a.sort(order='time')
+    return a
+
+
+class Ticker:
+    """
+    A normalized ticker. Prices are floats in
+    the quote currency, volume is 24hr base currency volume
+    and time is UTC seconds.
+    """
+    __slots__ = ('exchange', 'symbol', 'price', 'bid', 'ask', 'volume', 'time')
+
+    def __init__(self, exchange, symbol, price, bid=np.nan, ask=np.nan, volume=np.nan, time=None):
+        self.exchange = exchange
+        self.symbol = symbol
+        self.price = to_float(price)
+        self.bid = to_float(bid)
+        self.ask = to_float(ask)
+        self.volume = to_float(volume)
+        self.time = to_epoch(time) if time is not None else np.nan
+
+    @property
+    def spread(self):
+        return self.ask - self.bid
+
+    def as_dict(self):
+        return {k: getattr(self, k) for k in self.__slots__}
+
+    def __repr__(self):
+        return 'Ticker(exchange={}, symbol={}, price={}, ' \
+               'bid={}, ask={}, volume={})'.format(self.exchange, self.symbol,
+                                                   self.price, self.bid,
+                                                   self.ask, self.volume)
+
+
+class Book:
+    """
+    A normalized order book.
+    bids (best first) and asks (best first) are float64 arrays of [price, size].
+    """
+    __slots__ = ('exchange', 'symbol', 'bids', 'asks', 'time')
+
+    def __init__(self, exchange, symbol, bids, asks, time=None):
+        self.exchange = exchange
+        self.symbol = symbol
+        self.bids = bids[np.argsort(-bids[:, 0], kind='stable')] if bids.size else bids
+        self.asks = asks[np.argsort(asks[:, 0], kind='stable')] if asks.size else asks
+        self.time = time
+
+    @property
+    def best_bid(self):
+        return self.bids[0, 0] if self.bids.size else np.nan
+
+    @property
+    def best_ask(self):
+        return self.asks[0, 0] if self.asks.size else np.nan
+
+    def __repr__(self):
+        return 'Book(exchange={}, symbol={}, bid={}, ask={}, ' \
+               'levels={}/{})'.format(self.exchange, self.symbol, self.best_bid,
+                                      self.best_ask, len(self.bids), len(self.asks))
+
+
+class MarketAdapter:
+    """
+    Base class wrapping an exchange API object with normalized methods.
+    Subclasses implement get_ticker, get_book, get_trades and
+    (where the exchange supports it) get_candles.
+
+    Symbols are always given in the exchange's own format.
+    """
+    EXCHANGE = None
+
+    def __init__(self, api):
+        self.api = api
+
+    def get_ticker(self, symbol) -> Ticker:
+        raise NotImplementedError()
+
+    def get_tickers(self, symbols):
+        """
+        Returns {symbol: Ticker}.
+        Exchanges with an all-markets endpoint override this to make one call.
+        """
+        return {s: self.get_ticker(s) for s in symbols}
+
+    def get_book(self, symbol) -> Book:
+        raise NotImplementedError()
+
+    def get_trades(self, symbol):
+        """
+        Returns a TRADE_DTYPE structured array sorted oldest to newest.
+        """
+        raise NotImplementedError()
+
+    def get_candles(self, symbol, start, end, granularity):
+        """
+        Returns a CANDLE_DTYPE structured array sorted oldest to newest.
+        """
+        raise NotImplementedError("{} candles are not "
+                                  "supported.".format(self.EXCHANGE))
+
+    @staticmethod
+    def _unwrap(res):
+        """
+        Bittrex wraps results in {'success', 'message', 'result'},
+        Cryptopia returns (result, error).
+        """
+        if isinstance(res, tuple):
+            result, error = res
+            if error:
+                raise Exception(error)
+            return result
+        if isinstance(res, dict) and 'success' in res:
+            if not res['success']:
+                raise Exception(res.get('message', 'Unknown error'))
+            return res['result']
+        return res
+
+
+class GdaxMarketAdapter(MarketAdapter):
+    """
+    stocklook.crypto.gdax.api.Gdax
+    """
+    EXCHANGE = 'gdax'
+
+    def get_ticker(self, symbol):
+        t = self.api.get_ticker(symbol)
+        return Ticker(self.EXCHANGE, symbol, t['price'], t['bid'],
+                      t['ask'], t['volume'], t.get('time', None))
+
+    def get_book(self, symbol):
+        b = self.api.get_book(symbol, level=2)
+        return Book(self.EXCHANGE, symbol, make_levels(b['bids']),
+                    make_levels(b['asks']), time())
+
+    def get_trades(self, symbol):
+        return make_trades(self.api.get_trades(symbol),
+                           'time', 'price', 'size', 'side')
+
+    def get_candles(self, symbol, start, end, granularity):
+        rows = self.api.get_candles(symbol, start, end, granularity)
+        a = np.empty(len(rows), dtype=CANDLE_DTYPE)
+        for i, (t, low, high, op, close, vol) in enumerate(rows):
+            a[i] = (t, op, high, low, close, vol)
+        a.sort(order='time')
+        return a
+
+
+class PoloniexMarketAdapter(MarketAdapter):
+    """
+    stocklook.crypto.poloniex.api.Poloniex
+    """
+    EXCHANGE = 'poloniex'
+
+    def _make_ticker(self, symbol, t, now):
+        return Ticker(self.EXCHANGE, symbol, t['last'], t['highestBid'],
+                      t['lowestAsk'], t['quoteVolume'], now)
+
+    def get_ticker(self, symbol):
+        return self.get_tickers([symbol])[symbol]
+
+    def get_tickers(self, symbols):
+        # returnTicker covers every market in one call.
+        res, now = self.api.return_ticker(), time()
+        return {s: self._make_ticker(s, res[s], now) for s in symbols}
+
+    def get_book(self, symbol):
+        b = self.api.return_order_book(symbol)
+        return Book(self.EXCHANGE, symbol, make_levels(b['bids']),
+                    make_levels(b['asks']), time())
+
+    def get_trades(self, symbol):
+        return make_trades(self.api.return_market_trade_history(symbol),
+                           'date', 'rate', 'amount', 'type')
+
+    def get_candles(self, symbol, start, end, granularity):
+        from stocklook.crypto.poloniex import polo_return_chart_data
+        rows = polo_return_chart_data(symbol,
+                                      start_unix=int(to_epoch(start)),
+                                      end_unix=int(to_epoch(end)),
+                                      period_unix=granularity,
+                                      format_dates=False,
+                                      to_frame=False)
+        a = np.empty(len(rows), dtype=CANDLE_DTYPE)
+        for i, r in enumerate(rows):
+            a[i] = (r['date'], r['open'], r['high'], r['low'], r['close'], r['quoteVolume'])
+        a.sort(order='time')
+        return a
+
+
+class BittrexMarketAdapter(MarketAdapter):
+    """
+    stocklook.crypto.bittrex.api.Bittrex (v1.1)
+    """
+    EXCHANGE = 'bittrex'
+
+    def _make_ticker(self, s):
+        return Ticker(self.EXCHANGE, s['MarketName'], s['Last'], s['Bid'],
+                      s['Ask'], s['Volume'], s['TimeStamp'])
+
+    def get_ticker(self, symbol):
+        res = self._unwrap(self.api.get_marketsummary(symbol))
+        return self._make_ticker(res[0])
+
+    def get_tickers(self, symbols):
+        # getmarketsummaries covers every market in one call.
+        res = self._unwrap(self.api.get_market_summaries())
+        res = {s['MarketName']: s for s in res}
+        return {s: self._make_ticker(res[s]) for s in symbols}
+
+    def get_book(self, symbol):
+        b = self._unwrap(self.api.get_orderbook(symbol))
+        return Book(self.EXCHANGE, symbol,
+                    make_levels(b['buy'] or [], 'Rate', 'Quantity'),
+                    make_levels(b['sell'] or [], 'Rate', 'Quantity'), time())
+
+    def get_trades(self, symbol):
+        return make_trades(self._unwrap(self.api.get_market_history(symbol)),
+                           'TimeStamp', 'Price', 'Quantity', 'OrderType')
+
+
+class CryptopiaMarketAdapter(MarketAdapter):
+    """
+    stocklook.crypto.cryptopia.api.Cryptopia
+    """
+    EXCHANGE = 'cryptopia'
+
+    def get_ticker(self, symbol):
+        m = self._unwrap(self.api.get_market(symbol))
+        return Ticker(self.EXCHANGE, symbol, m['LastPrice'], m['BidPrice'],
+                      m['AskPrice'], m['Volume'], time())
+
+    def get_book(self, symbol):
+        b = self._unwrap(self.api.get_orders(symbol))
+        return Book(self.EXCHANGE, symbol,
+                    make_levels(b['Buy'] or [], 'Price', 'Volume'),
+                    make_levels(b['Sell'] or [], 'Price', 'Volume'), time())
+
+    def get_trades(self, symbol):
+        return make_trades(self._unwrap(self.api.get_history(symbol)),
+                           'Timestamp', 'Price', 'Amount', 'Type')
+
+
+class BitMEXMarketAdapter(MarketAdapter):
+    """
+    stocklook.crypto.bitmex.api.BitMEX or
+    stocklook.crypto.bitmex.ws.ws_thread.BitMEXWebsocket.
+    Data comes from the websocket so there are no candles
+    and the book only has the best bid/ask.
+    """
+    EXCHANGE = 'bitmex'
+
+    def __init__(self, api):
+        super(BitMEXMarketAdapter, self).__init__(api)
+        self.ws = getattr(api, 'ws', api)
+
+    def get_ticker(self, symbol):
+        t = self.ws.get_ticker(symbol)
+        i = self.ws.get_instrument(symbol)
+        return Ticker(self.EXCHANGE, symbol, t['last'], t['buy'], t['sell'],
+                      i.get('volume24h', None), i.get('timestamp', None))
+
+    def get_book(self, symbol):
+        i = self.ws.get_instrument(symbol)
+        bids = np.array([[i['bidPrice'], i.get('bidSize', np.nan) or np.nan]], dtype=np.float64)
+        asks = np.array([[i['askPrice'], i.get('askSize', np.nan) or np.nan]], dtype=np.float64)
+        return Book(self.EXCHANGE, symbol, bids, asks, time())
+
+    def get_trades(self, symbol):
+        rows = [r for r in self.ws.recent_trades() if r.get('symbol', symbol) == symbol]
+        return make_trades(rows, 'timestamp', 'price', 'size', 'side')
+
+
+class MarketDataClient:
+    """
+    Fans normalized requests out to several exchanges at once
+    so a call takes as long as the slowest exchange rather than
+    the sum of all of them.
+
+    Example:
+        c = MarketDataClient([GdaxMarketAdapter(Gdax()),
+                              PoloniexMarketAdapter(Poloniex())])
+        tickers, errors = c.snapshot({'gdax': ['BTC-USD', 'ETH-USD'],
+                                      'poloniex': ['USDT_BTC', 'USDT_ETH']})
+    """
+    def __init__(self, adapters, max_workers=None):
+        """
+        :param adapters: (list of MarketAdapter)
+        :param max_workers: (int, default None)
+            None uses one thread per adapter.
+        """
+        self.adapters = {a.EXCHANGE: a for a in adapters}
+        self.max_workers = max_workers or max(len(self.adapters), 1)
+
+    def get_adapter(self, exchange):
+        """
+        :return: (MarketAdapter) for :param exchange.
+        :raises ValueError: for an exchange without an adapter.
+        """
+        try:
+            return self.adapters[exchange]
+        except KeyError:
+            raise ValueError("Unsupported exchange '{}', expected one of: "
+                             "{}".format(exchange, ', '.join(sorted(self.adapters))))
+
+    def _fan_out(self, calls):
+        """
+        :param calls: {exchange: callable}
+        :return: ({exchange: result}, {exchange: Exception})
+        """
+        results, errors = dict(), dict()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {ex: pool.submit(func) for ex, func in calls.items()}
+            for ex, f in futures.items():
+                try:
+                    results[ex] = f.result()
+                except Exception as e:
+                    logger.error("{}: {}".format(ex, e))
+                    errors[ex] = e
+        return results, errors
+
+    def snapshot(self, symbols):
+        """
+        Requests tickers for every exchange concurrently.
+
+        :param symbols: (dict)
+            {exchange: [symbol, symbol]}
+        :return: (tuple)
+            ({exchange: {symbol: Ticker}}, {exchange: Exception})
+        """
+        calls = {ex: (lambda a=self.get_adapter(ex), s=list(s): a.get_tickers(s))
+                 for ex, s in symbols.items()}
+        return self._fan_out(calls)
+
+    def get_books(self, symbols):
+        """
+        :param symbols: (dict)
+            {exchange: symbol}
+        :return: (tuple)
+            ({exchange: Book}, {exchange: Exception})
+        """
+        calls = {ex: (lambda a=self.get_adapter(ex), s=s: a.get_book(s))
+                 for ex, s in symbols.items()}
+        return self._fan_out(calls)
+
+    def get_trades(self, symbols):
+        """
+        :param symbols: (dict)
+            {exchange: symbol}
+        :return: (tuple)
+            ({exchange: TRADE_DTYPE array}, {exchange: Exception})
+        """
+        calls = {ex: (lambda a=self.get_adapter(ex), s=s: a.get_trades(s))
+                 for ex, s in symbols.items()}
+        return self._fan_out(calls)
+
+    def get_candles(self, symbols, start, end, granularity):
+        """
+        :param symbols: (dict)
+            {exchange: symbol}
+        :return: (tuple)
+            ({exchange: CANDLE_DTYPE array}, {exchange: Exception})
+        """
+        calls = {ex: (lambda a=self.get_adapter(ex), s=s: a.get_candles(s, start, end, granularity))
+                 for ex, s in symbols.items()}
+        return self._fan_out(calls)
@@ -31,6 +31,7 @@ import time
 import hmac, hashlib
 import urllib.request as urllib2
 from stocklook.config import config, POLONIEX_SECRET, POLONIEX_KEY
+from stocklook.utils.api import DEFAULT_RETRY_POLICY
 from stocklook.utils.security import Credentials
 from stocklook.utils.timetools import (timestamp_from_utc,
                                        timestamp_to_utc_int as timestamp_to_utc,
@@ -120,9 +121,10 @@ def polo_return_chart_data(currency_pair,
               'end': end_unix,
               'period': str(period_unix)}
 
-    res = requests.get('https://poloniex.com/public?'
-                       'command=returnChartData',
-                       params=params).json()
+    res = DEFAULT_RETRY_POLICY.call(
+        lambda: requests.get('https://poloniex.com/public?'
+                             'command=returnChartData',
+                             params=params)).json()
 
     if hasattr(res, 'get'):
         error = res.get('error', None)
@@ -1,7 +1,54 @@
 #!/usr/bin/env python
 import numpy as np
-from numpy import array, zeros, append, sum, subtract, empty, nan
-from pandas import Series, stats, concat
+from pandas import Series, DataFrame
+
+""" analysis.py
+Technical indicators built on vectorized pandas rolling/ewm
+and NumPy array operations.
+
+Every indicator accepts a list, 1D/2D numpy array, pandas.Series or
+pandas.DataFrame. 2D inputs hold one column per symbol and are computed
+column by column in a single call. Results come back in the type of the
+(first) input: numpy arrays for lists/arrays, Series/DataFrames with
+the same index (and columns) for pandas objects.
+"""
+
+
+def _values(data):
+    """ Returns data as a 2D float array and a function
+    that wraps 2D results back into the type of data.
+    """
+    if isinstance(data, DataFrame):
+        def wrap(v):
+            return DataFrame(v, index=data.index, columns=data.columns)
+        return data.values.astype(float), wrap
+
+    if isinstance(data, Series):
+        def wrap(v):
+            return Series(v[:, 0], index=data.index, name=data.name)
+        return data.values.astype(float).reshape(-1, 1), wrap
+
+    arr = np.asarray(data, dtype=float)
+    if arr.ndim == 2:
+        return arr, lambda v: v
+    return arr.reshape(-1, 1), lambda v: v[:, 0]
+
+
+def _lag(values, span):
+    """ Returns values shifted down span rows, the first span rows are nan.
+    """
+    out = np.full(values.shape, np.nan)
+    if span < values.shape[0]:
+        out[span:] = values[:values.shape[0] - span] if span else values
+    return out
+
+
+def _ewma(span, values):
+    return DataFrame(values).ewm(span=span).mean().values
+
+
+def _rolling_mean(span, values):
+    return DataFrame(values).rolling(span).mean().values
 
 
 # ------------------------------------------------
@@ -12,24 +59,57 @@ def moving_average(span, data):
     """ Calculate n-point moving average
     :param span: Length of moving average window.
     :param data: Data to average.
-    :returns: Moving average as a numpy array.
+    :returns: Moving average.
     """
-    return np.array(stats.moments.rolling_mean(data, span))
+    values, wrap = _values(data)
+    return wrap(_rolling_mean(span, values))
 
 
 def exp_weighted_moving_average(span, data):
     """ Calculate n-point exponentially weighted moving average
     :param span: Length of moving average window.
     :param data: Data to average.
-    :returns: Exponentially weighted moving average as a numpy array.
+    :returns: Exponentially weighted moving average.
     """
-    return np.array(stats.moments.ewma(data, span=span))
+    values, wrap = _values(data)
+    return wrap(_ewma(span, values))
+
 
 def mag_diff(data, average):
-    return np.array([np.nan if (avg is None or cur is None) else (cur - avg) for cur, avg in zip(data, average)])
+    """ Calculate the difference between data and its average.
+    Missing values give nan.
+    """
+    values, wrap = _values(data)
+    avg, _ = _values(average)
+    return wrap(values - avg)
+
 
 def percent_diff(data, average):
-    return np.array([np.nan if (avg is None or avg == 0.0 or cur is None) else ((cur - avg) / (avg + 1e-1000)) for cur,avg in zip(data, average)])
+    """ Calculate the difference between data and its average
+    as a fraction of the average. Missing or zero averages give nan.
+    """
+    values, wrap = _values(data)
+    avg, _ = _values(average)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        res = (values - avg) / avg
+    res[avg == 0] = np.nan
+    return wrap(res)
+
+
+def bollinger_bands(span, data, num_std=2):
+    """ Calculate Bollinger Bands
+    The n-point moving average plus/minus num_std moving
+    standard deviations.
+    :param span: Length of moving window.
+    :param data: Data to analyze.
+    :param num_std: Number of standard deviations between the middle and outer bands.
+    :returns: (lower, middle, upper) bands.
+    """
+    values, wrap = _values(data)
+    rolling = DataFrame(values).rolling(span)
+    middle = rolling.mean().values
+    width = num_std * rolling.std().values
+    return wrap(middle - width), wrap(middle), wrap(middle + width)
 
 
 # ------------------------------------------------
@@ -40,28 +120,32 @@ def percent_diff(data, average):
 def percent_change(data):
     """ Calculate percent change in data
     :param data: Data to process
-    :returns: Percent change in data as a numpy array.
+    :returns: Percent change in data.
     """
-    return np.array(Series(data).pct_change().values)
-
+    values, wrap = _values(data)
+    prev = _lag(values, 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return wrap(values / prev - 1)
 
 
 def moving_stdev(span, data):
     """ Calculate n-point moving standard deviation.
     :param data: Data to analyze.
     :param span: Length of moving window.
-    :returns: Moving standard deviation as a numpy array.
+    :returns: Moving standard deviation.
     """
-    return np.array(stats.moments.rolling_std(data, span))
+    values, wrap = _values(data)
+    return wrap(DataFrame(values).rolling(span).std().values)
 
 
 def moving_var(span, data):
     """ Calculate n-point moving variance.
     :param data: Data to analyze.
     :param span: Length of moving window.
-    :returns: moving variance as a numpy array.
+    :returns: moving variance.
     """
-    return np.array(stats.moments.rolling_var(data, span))
+    values, wrap = _values(data)
+    return wrap(DataFrame(values).rolling(span).var().values)
 
 
 # ------------------------------------------------
@@ -75,40 +159,49 @@ def momentum(span, data):
     value *span - 1* days ago
     :param span: number of days before to use in the momentum calculation
     :param data: Raw data to analyze.
-    :returns: Momentum as a numpy array.
+    :returns: Momentum.
     """
-    momentum = np.array([100 * (cur / prev) for cur, prev in zip(data[span-1:], data)])
-    blank = np.zeros(span-1)
-    blank[:] = np.nan
-    return append(blank, momentum) #.astype(float)
+    values, wrap = _values(data)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return wrap(100 * (values / _lag(values, span - 1)))
+
 
 def rate_of_change(span, data):
     """ Calculate rate of change
+    The change from the value *span - 1* periods ago as a fraction of it.
     """
-    roc = np.array([((cur - prev) / prev) for cur, prev in zip(data[span-1:], data)])
-    blank = np.zeros(span-1)
-    blank[:] = np.nan
-    return append(blank, roc).astype(float)
+    values, wrap = _values(data)
+    prev = _lag(values, span - 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return wrap((values - prev) / prev)
+
+
+def _velocity(span, values):
+    return (values - _lag(values, span - 1)) / (span - 1)
 
 
 def velocity(span, data):
     """ Calculate velocity
+    The change from the value *span - 1* periods ago per period.
     """
-    velocity = np.array([((cur - prev) / (span - 1)) for cur, prev in zip(data[span-1:], data)])
-    blank = np.zeros(span-1)
-    blank[:] = np.nan
-    return append(blank, velocity).astype(float)
+    values, wrap = _values(data)
+    return wrap(_velocity(span, values))
 
 
 def acceleration(span, data, vel=None):
     """ Calculate acceleration
+    The velocity of the velocity.
     """
+    values, wrap = _values(data)
     if vel is None:
-        vel = velocity(span, data)
-    acceleration = np.array([((cur - prev) / (span - 1)) for cur, prev in zip(vel[span-1:], vel)])
-    blank = zeros(span-1)
-    blank[:] = nan
-    return append(blank, acceleration).astype(float)
+        vel = _velocity(span, values)
+    else:
+        vel, _ = _values(vel)
+    return wrap(_velocity(span, vel))
+
+
+def _macd(values):
+    return _ewma(12, values) - _ewma(26, values)
 
 
 def macd(data=None, fast_ewma=None, slow_ewma=None):
@@ -118,19 +211,17 @@ def macd(data=None, fast_ewma=None, slow_ewma=None):
     :param data: (optional) Data to analyze.
     :param fast_ewma: (optional) 12-day EWMA for use in MACD calculation.
     :param slow_ewma: (optional) 26-day EWMA for use in MACD calculation.
-    :returns: MACD as a numpy array.
+    :returns: MACD.
     .. note::
         Either raw data or the 12 and 26 day EWMAs must be provided, all three
         are not necessary.
     """
-  #  return exp_weighted_value_oscillator(12, 26, data, fast_ewma, slow_ewma)
-    if fast_ewma is None and slow_ewma is None:
-        if data is not None:
-            slow_ewma = exp_weighted_moving_average(26, data)
-            fast_ewma = exp_weighted_moving_average(12, data)
-        else:
-            pass
-    return subtract(fast_ewma, slow_ewma).astype(float)
+    if fast_ewma is None or slow_ewma is None:
+        values, wrap = _values(data)
+        return wrap(_macd(values))
+    fast, wrap = _values(fast_ewma)
+    slow, _ = _values(slow_ewma)
+    return wrap(fast - slow)
 
 
 def macd_signal(data=None, macd=None):
@@ -138,17 +229,16 @@ def macd_signal(data=None, macd=None):
     The MACD signal is defined as the 9-day EWMA of the MACD.
     :param data: (Optional) Raw data to analyze.
     :param macd: (Optional) MACD to use in MACD signal calculation.
-    :returns: MACD signal as a numpy array.
+    :returns: MACD signal.
     .. note::
         Either raw data or the MACD must be provided, both ar not necessary
     """
     if macd is None:
-        if data is not None:
-            macd = macd(data)
-        else:
-            pass
-        pass
-    return exp_weighted_moving_average(9, macd)
+        values, wrap = _values(data)
+        line = _macd(values)
+    else:
+        line, wrap = _values(macd)
+    return wrap(_ewma(9, line))
 
 
 def macd_hist(data=None, macd=None, macd_signal=None):
@@ -159,61 +249,72 @@ def macd_hist(data=None, macd=None, macd_signal=None):
     :param macd: (optional) MACD to use in MACD histogram calculation.
     :param macd_signal: (optional) MACD signal to use in MACD histogram
     calculation.
-    :returns: MACD histogram as a numpy array.
+    :returns: MACD histogram.
     .. note::
         Either raw data or the MACD and MACD signal must be provided, all three
         are not necessary.
     """
-    if macd is None and macd_signal is None:
-        if data is not None:
-            macd = macd(data)
-            macd_signal = macd_signal(macd=macd)
-        else:
-            pass
-    return subtract(macd, macd_signal)
-
-
-def value_oscillator(fast_ma_len=5,slow_ma_len=20, data=None, fast_ma=None, slow_ma=None):
+    if macd is None:
+        values, wrap = _values(data)
+        line = _macd(values)
+    else:
+        line, wrap = _values(macd)
+    if macd_signal is None:
+        signal = _ewma(9, line)
+    else:
+        signal, _ = _values(macd_signal)
+    return wrap(line - signal)
+
+
+def value_oscillator(fast_ma_len=5, slow_ma_len=20, data=None, fast_ma=None, slow_ma=None):
     """ Calculate value oscillator
+    The fast moving average minus the slow moving average.
     """
-    if fast_ma is None and slow_ma is None:
-        if data is not None:
-            slow_ma = moving_average(slow_ma_len, data)
-            fast_ma = moving_average(fast_ma_len, data)
-        else:
-            pass
-    return subtract(fast_ma, slow_ma).astype(float)
+    if fast_ma is None or slow_ma is None:
+        values, wrap = _values(data)
+        return wrap(_rolling_mean(fast_ma_len, values) - _rolling_mean(slow_ma_len, values))
+    fast, wrap = _values(fast_ma)
+    slow, _ = _values(slow_ma)
+    return wrap(fast - slow)
 
 
 def exp_weighted_value_oscillator(fast_ma_len=5, slow_ma_len=20, data=None, fast_ma=None, slow_ma=None):
     """ Calculate exponentially weighted value oscillator
+    The fast EWMA minus the slow EWMA.
     """
-    if fast_ma is None and slow_ma is None:
-        if data is not None:
-            slow_ma = exp_weighted_moving_average(slow_ma_len, data)
-            fast_ma = exp_weighted_moving_average(fast_ma_len, data)
-        else:
-            # Error
-            pass
-        return subtract(fast_ma, slow_ma).astype(float)
+    if fast_ma is None or slow_ma is None:
+        values, wrap = _values(data)
+        return wrap(_ewma(fast_ma_len, values) - _ewma(slow_ma_len, values))
+    fast, wrap = _values(fast_ma)
+    slow, _ = _values(slow_ma)
+    return wrap(fast - slow)
 
 
 def trix(span, data):
     """ Calculate TRIX
     TRIX is the percent change of the triple ewma'ed value
     """
-    first = (exp_weighted_moving_average(span, data))
-    second = (exp_weighted_moving_average(span, first))
-    third = (exp_weighted_moving_average(span, second))
-    trix = [((cur - prev) / prev) for cur, prev in zip(third[span-1:], third)]
-    blank = np.zeros(span - 1)
-    blank[:] = nan
-    return append(blank, trix).astype(float)
+    values, wrap = _values(data)
+    third = _ewma(span, _ewma(span, _ewma(span, values)))
+    prev = _lag(third, span - 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return wrap((third - prev) / prev)
+
 
 def chandes_momentum_oscillator(span, data):
-    blank = np.zeros(span)
-    blank[:] = nan
-    deltas = append(blank, [cur - prev for cur, prev in zip(data[span:], data)]).astype(float)
+    """ Calculate Chande Momentum Oscillator
+    100 * (sum of gains - sum of losses) / (sum of gains + sum of losses)
+    over the last span one period changes.
+    """
+    values, wrap = _values(data)
+    deltas = values - _lag(values, 1)
+    gains = DataFrame(np.where(deltas > 0, deltas, 0.0)).rolling(span).sum().values
+    losses = DataFrame(np.where(deltas < 0, -deltas, 0.0)).rolling(span).sum().values
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cmo = 100 * (gains - losses) / (gains + losses)
+    # The first change is unknown.
+    cmo[:span] = np.nan
+    return wrap(cmo)
 
 
 def relative_strength_index(span, data):
@@ -224,16 +325,33 @@ def relative_strength_index(span, data):
 
 def relative_momentum_index(span, deltaspan, data):
     """ Calculate RMI
+    RSI using the change over deltaspan periods and simple
+    span-point averages of the gains and losses.
     """
-    blank = np.zeros(deltaspan)
-    blank[:] = nan
-    deltas = append(blank, [cur - prev for cur, prev in zip(data[deltaspan:], data)]).astype(float)
-    gains = array([x if x > 0 else 0 for x in deltas]).astype(float)
-    losses = array([-x if x < 0 else 0 for x in deltas]).astype(float)
-    avg_gains = moving_average(span, gains)
-    avg_losses = moving_average(span, losses)
-    return array([100 - (100 / (1 + gain/loss))  for gain, loss in zip(avg_gains, avg_losses)]).astype(float)
-
+    values, wrap = _values(data)
+    deltas = values - _lag(values, deltaspan)
+    gains = np.where(deltas > 0, deltas, 0.0)
+    losses = np.where(deltas < 0, -deltas, 0.0)
+    avg_gains = _rolling_mean(span, gains)
+    avg_losses = _rolling_mean(span, losses)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return wrap(100 - (100 / (1 + avg_gains / avg_losses)))
+
+
+def stochastic_oscillator(span, high, low, close, smooth=3):
+    """ Calculate the Stochastic Oscillator
+    %K = 100 * (close - lowest low) / (highest high - lowest low) over span periods
+    %D = smooth-point moving average of %K
+    :returns: (%K, %D)
+    """
+    h, wrap = _values(high)
+    l, _ = _values(low)
+    c, _ = _values(close)
+    highest = DataFrame(h).rolling(span).max().values
+    lowest = DataFrame(l).rolling(span).min().values
+    with np.errstate(divide='ignore', invalid='ignore'):
+        k = 100 * (c - lowest) / (highest - lowest)
+    return wrap(k), wrap(_rolling_mean(smooth, k))
 
 
 # ------------------------------------------------
@@ -242,22 +360,22 @@ def relative_momentum_index(span, deltaspan, data):
 
 def accumulation_distribution(high, low, close, volume, prev=0):
     """ Calculate Accumulation/Distribution
+    The running total of money flow volume starting from prev.
+    """
+    h, wrap = _values(high)
+    l, _ = _values(low)
+    c, _ = _values(close)
+    v, _ = _values(volume)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        money_flow_volume = v * (((c - l) - (h - c)) / (h - l))
+    return wrap(prev + np.cumsum(money_flow_volume, axis=0))
+
+
+def chaikin_oscillator(high=None, low=None, close=None, volume=None, prev=0, adl=None):
+    """ Calculate Chaikin Oscillator
+    The 3-point EWMA minus the 10-point EWMA of the accumulation/distribution line.
     """
-    money_flow_volume = array([v *  (((c - l) - (h - c)) / (h - l)) for h, l, c, v in zip(high, low, close, volume)]).astype(float)
-    adl = zeros(len(money_flow_volume))
-    for i in range(len(money_flow_volume)):
-        adl[i] = prev + money_flow_volume[i]
-        prev = adl[i]
-    return adl.astype(float)
-
-
-def chaikin_oscillator(high=None, low=None, close=None, volume=None, prev=0,adl=None):
     if adl is None:
-        if high is not None and low is not None and close is not None and volume is not None:
-            adl = accumulation_distribution(high, low, close, volume, prev)
-            fast_ma = exp_weighted_moving_average(3, adl)
-            slow_ma = exp_weighted_moving_average(10, adl)
-        else:
-            # Error
-            pass
-        return subtract(fast_ma, slow_ma).astype(float)
+        adl = accumulation_distribution(high, low, close, volume, prev)
+    values, wrap = _values(adl)
+    return wrap(_ewma(3, values) - _ewma(10, values))
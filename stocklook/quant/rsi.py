@@ -2,10 +2,10 @@ import pandas
 import pandas as pd
 import numpy as np
 import datetime
-import matplotlib.pyplot as plt
 
 
 def rsi_test():
+    import matplotlib.pyplot as plt
     # Window length for moving average
     window_length = 14
 
@@ -52,43 +52,73 @@ def rsi_test():
     plt.show()
 
 
+def wilder_smooth(values, n, seed):
+    """
+    Wilder smoothing down the rows of a 2D array:
+        avg[0] = seed
+        avg[t] = (avg[t - 1] * (n - 1) + values[t]) / n
+
+    This is an exponential moving average with alpha = 1 / n,
+    computed by pandas' compiled ewm instead of a Python loop.
+
+    :param values: (numpy.ndarray) 2D, rows are periods.
+    :param n: (int)
+    :param seed: (numpy.ndarray) 1D starting averages, one per column.
+    :return: (numpy.ndarray) same shape as :param values, row 0 is the seed.
+    """
+    values = np.array(values, dtype=np.float64)
+    values[0] = seed
+    return pd.DataFrame(values).ewm(alpha=1.0 / n, adjust=False).mean().values
+
+
 def RSI(prices, n=14):
-    # RSI = 100 - (100 / (1 + RS))
-    # where RS = (Wilder-smoothed n-period average of gains / Wilder-smoothed n-period average of -losses)
-    # Note that losses above should be positive values
-    # Wilder-smoothing = ((previous smoothed avg * (n-1)) + current value to average) / n
-    # For the very first "previous smoothed avg" (aka the seed value), we start with a straight average.
-    # Therefore, our first RSI value will be for the n+2nd period:
-    #     0: first delta is nan
-    #     1:
-    #     ...
-    #     n: lookback period for first Wilder smoothing seed value
-    #     n+1: first RSI
-
-    # First, calculate the gain or loss from one price to the next. The first value is nan so replace with 0.
-    deltas = (prices - prices.shift(1)).fillna(0)
-
-    # Calculate the straight average seed values.
-    # The first delta is always zero, so we will use a slice of the first n deltas starting at 1,
-    # and filter only deltas > 0 to get gains and deltas < 0 to get losses
-    avg_of_gains = deltas[1:n + 1][deltas > 0].sum() / n
-    avg_of_losses = -deltas[1:n + 1][deltas < 0].sum() / n
-
-    # Set up pd.Series container for RSI values
-    rsi_series = pd.Series(0.0, deltas.index)
-
-    # Now calculate RSI using the Wilder smoothing method, starting with n+1 delta.
-    up = lambda x: x if x > 0 else 0
-    down = lambda x: -x if x < 0 else 0
-    i = n + 1
-    for d in deltas[n + 1:]:
-        avg_of_gains = ((avg_of_gains * (n - 1)) + up(d)) / n
-        avg_of_losses = ((avg_of_losses * (n - 1)) + down(d)) / n
-        if avg_of_losses != 0:
-            rs = avg_of_gains / avg_of_losses
-            rsi_series[i] = 100 - (100 / (1 + rs))
-        else:
-            rsi_series[i] = 100
-        i += 1
-
-    return rsi_series
\ No newline at end of file
+    """
+    Relative Strength Index using Wilder smoothing.
+
+    RSI = 100 - (100 / (1 + RS))
+    where RS = (Wilder-smoothed n-period average of gains / Wilder-smoothed n-period average of -losses)
+    Wilder-smoothing = ((previous smoothed avg * (n-1)) + current value to average) / n
+    For the very first "previous smoothed avg" (aka the seed value), we start with a straight average
+    of the first n deltas. Therefore, our first RSI value will be for the n+2nd period:
+        0: first delta is nan (treated as 0)
+        1:
+        ...
+        n: lookback period for first Wilder smoothing seed value
+        n+1: first RSI
+    Periods before the first RSI are 0. Missing prices count as no change and
+    periods without losses are 100.
+
+    :param prices: (pandas.Series, pandas.DataFrame, numpy.ndarray)
+        One price series, or one column per symbol.
+    :param n: (int, default 14)
+    :return: The RSI in the same shape and type as :param prices.
+    """
+    values = np.asarray(prices, dtype=np.float64)
+    one_d = values.ndim == 1
+    if one_d:
+        values = values.reshape(-1, 1)
+
+    rsi = np.zeros(values.shape)
+    if values.shape[0] > n + 1:
+        deltas = np.zeros(values.shape)
+        deltas[1:] = values[1:] - values[:-1]
+        deltas[np.isnan(deltas)] = 0
+        gains = np.where(deltas > 0, deltas, 0.0)
+        losses = np.where(deltas < 0, -deltas, 0.0)
+
+        # Seeds are straight averages of deltas 1..n, then
+        # smoothing continues from delta n + 1.
+        avg_gains = wilder_smooth(gains[n:], n, gains[1:n + 1].sum(axis=0) / n)[1:]
+        avg_losses = wilder_smooth(losses[n:], n, losses[1:n + 1].sum(axis=0) / n)[1:]
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rs = avg_gains / avg_losses
+            rsi[n + 1:] = np.where(avg_losses != 0, 100 - (100 / (1 + rs)), 100)
+
+    if one_d:
+        rsi = rsi[:, 0]
+    if isinstance(prices, pd.DataFrame):
+        return pd.DataFrame(rsi, index=prices.index, columns=prices.columns)
+    if isinstance(prices, pd.Series):
+        return pd.Series(rsi, index=prices.index, name=prices.name)
+    return rsi
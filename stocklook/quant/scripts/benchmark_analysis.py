@@ -0,0 +1,179 @@
+"""
+MIT License
+
+Copyright (c) 2017 Zeke Barge
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+# Times the stocklook.quant.analysis indicators across input sizes
+# against the list comprehension formulas they replaced, and over
+# many symbols at once.
+#
+#     python benchmark_analysis.py --sizes 1000 10000 100000 --symbols 50
+import time
+import argparse
+import numpy as np
+from numpy import array, zeros, append, nan
+from stocklook.quant import analysis
+
+
+# The previous row by row implementations (used as the reference).
+
+def legacy_mag_diff(data, average):
+    return np.array([np.nan if (avg is None or cur is None) else (cur - avg) for cur, avg in zip(data, average)])
+
+
+def legacy_percent_diff(data, average):
+    return np.array([np.nan if (avg is None or avg == 0.0 or cur is None) else ((cur - avg) / (avg + 1e-1000)) for cur,avg in zip(data, average)])
+
+
+def legacy_momentum(span, data):
+    momentum = np.array([100 * (cur / prev) for cur, prev in zip(data[span-1:], data)])
+    blank = np.zeros(span-1)
+    blank[:] = np.nan
+    return append(blank, momentum)
+
+
+def legacy_rate_of_change(span, data):
+    roc = np.array([((cur - prev) / prev) for cur, prev in zip(data[span-1:], data)])
+    blank = np.zeros(span-1)
+    blank[:] = np.nan
+    return append(blank, roc).astype(float)
+
+
+def legacy_velocity(span, data):
+    velocity = np.array([((cur - prev) / (span - 1)) for cur, prev in zip(data[span-1:], data)])
+    blank = np.zeros(span-1)
+    blank[:] = np.nan
+    return append(blank, velocity).astype(float)
+
+
+def legacy_acceleration(span, data):
+    vel = legacy_velocity(span, data)
+    acceleration = np.array([((cur - prev) / (span - 1)) for cur, prev in zip(vel[span-1:], vel)])
+    blank = zeros(span-1)
+    blank[:] = nan
+    return append(blank, acceleration).astype(float)
+
+
+def legacy_trix(span, data):
+    ewma = analysis.exp_weighted_moving_average
+    third = ewma(span, ewma(span, ewma(span, data)))
+    trix = [((cur - prev) / prev) for cur, prev in zip(third[span-1:], third)]
+    blank = np.zeros(span - 1)
+    blank[:] = nan
+    return append(blank, trix).astype(float)
+
+
+def legacy_relative_momentum_index(span, deltaspan, data):
+    blank = np.zeros(deltaspan)
+    blank[:] = nan
+    deltas = append(blank, [cur - prev for cur, prev in zip(data[deltaspan:], data)]).astype(float)
+    gains = array([x if x > 0 else 0 for x in deltas]).astype(float)
+    losses = array([-x if x < 0 else 0 for x in deltas]).astype(float)
+    avg_gains = analysis.moving_average(span, gains)
+    avg_losses = analysis.moving_average(span, losses)
+    return array([100 - (100 / (1 + gain/loss)) for gain, loss in zip(avg_gains, avg_losses)]).astype(float)
+
+
+def legacy_accumulation_distribution(high, low, close, volume, prev=0):
+    money_flow_volume = array([v * (((c - l) - (h - c)) / (h - l)) for h, l, c, v in zip(high, low, close, volume)]).astype(float)
+    adl = zeros(len(money_flow_volume))
+    for i in range(len(money_flow_volume)):
+        adl[i] = prev + money_flow_volume[i]
+        prev = adl[i]
+    return adl.astype(float)
+
+
+def make_ohlcv(n, symbols=1, seed=11):
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 0.5, (n, symbols)), axis=0)
+    high = close + rng.random((n, symbols))
+    low = close - rng.random((n, symbols))
+    volume = rng.random((n, symbols)) * 1000
+    if symbols == 1:
+        return high[:, 0], low[:, 0], close[:, 0], volume[:, 0]
+    return high, low, close, volume
+
+
+def cases(high, low, close, volume):
+    avg = analysis.moving_average(20, close)
+    return [
+        ('mag_diff', lambda: legacy_mag_diff(close, avg),
+         lambda: analysis.mag_diff(close, avg)),
+        ('percent_diff', lambda: legacy_percent_diff(close, avg),
+         lambda: analysis.percent_diff(close, avg)),
+        ('momentum', lambda: legacy_momentum(10, close),
+         lambda: analysis.momentum(10, close)),
+        ('rate_of_change', lambda: legacy_rate_of_change(10, close),
+         lambda: analysis.rate_of_change(10, close)),
+        ('velocity', lambda: legacy_velocity(10, close),
+         lambda: analysis.velocity(10, close)),
+        ('acceleration', lambda: legacy_acceleration(10, close),
+         lambda: analysis.acceleration(10, close)),
+        ('trix', lambda: legacy_trix(15, close),
+         lambda: analysis.trix(15, close)),
+        ('relative_momentum_index', lambda: legacy_relative_momentum_index(14, 3, close),
+         lambda: analysis.relative_momentum_index(14, 3, close)),
+        ('accumulation_distribution',
+         lambda: legacy_accumulation_distribution(high, low, close, volume),
+         lambda: analysis.accumulation_distribution(high, low, close, volume)),
+    ]
+
+
+def timed(func, repeat=3):
+    best = None
+    for _ in range(repeat):
+        t = time.perf_counter()
+        func()
+        secs = time.perf_counter() - t
+        best = secs if best is None else min(best, secs)
+    return best
+
+
+def run(sizes, symbols):
+    # The legacy formulas divide by zero on flat stretches.
+    np.seterr(divide='ignore', invalid='ignore')
+    print("{:<28} {:>9} {:>12} {:>12} {:>8}".format(
+        'indicator', 'rows', 'legacy ms', 'numpy ms', 'speedup'))
+    for n in sizes:
+        for label, legacy, vectorized in cases(*make_ohlcv(n)):
+            legacy_ms = timed(legacy, repeat=1) * 1000
+            numpy_ms = timed(vectorized) * 1000
+            print("{:<28} {:>9} {:>12.2f} {:>12.2f} {:>7.0f}x".format(
+                label, n, legacy_ms, numpy_ms, legacy_ms / numpy_ms))
+
+    n = max(sizes)
+    high, low, close, volume = make_ohlcv(n, symbols)
+    print("\n{} rows x {} symbols".format(n, symbols))
+    for label, func in (
+            ('moving_average', lambda: analysis.moving_average(20, close)),
+            ('bollinger_bands', lambda: analysis.bollinger_bands(20, close)),
+            ('macd_hist', lambda: analysis.macd_hist(close)),
+            ('stochastic_oscillator', lambda: analysis.stochastic_oscillator(14, high, low, close)),
+            ('relative_strength_index', lambda: analysis.relative_strength_index(14, close))):
+        print("{:<28} {:>12.2f} ms".format(label, timed(func) * 1000))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark quant.analysis indicators.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--symbols', type=int, default=50)
+    args = parser.parse_args()
+    run(args.sizes, args.symbols)
@@ -0,0 +1,93 @@
+"""
+MIT License
+
+Copyright (c) 2017 Zeke Barge
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+# Compares stocklook.quant.rsi.RSI against the Python loop it replaced
+# on random walk prices, and times RSI over many symbols at once.
+#
+#     python benchmark_rsi.py --bars 100000 --symbols 50
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from stocklook.quant.rsi import RSI
+
+
+def legacy_rsi(prices, n=14):
+    """
+    The previous loop based stocklook.quant.rsi.RSI (used as the reference).
+    """
+    deltas = (prices - prices.shift(1)).fillna(0)
+    avg_of_gains = deltas[1:n + 1][deltas > 0].sum() / n
+    avg_of_losses = -deltas[1:n + 1][deltas < 0].sum() / n
+    rsi_series = pd.Series(0.0, deltas.index)
+
+    up = lambda x: x if x > 0 else 0
+    down = lambda x: -x if x < 0 else 0
+    i = n + 1
+    for d in deltas[n + 1:]:
+        avg_of_gains = ((avg_of_gains * (n - 1)) + up(d)) / n
+        avg_of_losses = ((avg_of_losses * (n - 1)) + down(d)) / n
+        if avg_of_losses != 0:
+            rs = avg_of_gains / avg_of_losses
+            rsi_series.iloc[i] = 100 - (100 / (1 + rs))
+        else:
+            rsi_series.iloc[i] = 100
+        i += 1
+
+    return rsi_series
+
+
+def random_walk(bars, symbols=1, seed=7):
+    rng = np.random.default_rng(seed)
+    return 100 + np.cumsum(rng.normal(0, 0.5, (bars, symbols)), axis=0)
+
+
+def timed(func, *args, repeat=3):
+    results = list()
+    res = None
+    for _ in range(repeat):
+        t = time.perf_counter()
+        res = func(*args)
+        results.append(time.perf_counter() - t)
+    return min(results), res
+
+
+def run(bars, symbols):
+    prices = pd.Series(random_walk(bars)[:, 0])
+    legacy_secs, expected = timed(legacy_rsi, prices, repeat=1)
+    secs, res = timed(RSI, prices)
+    err = np.abs(expected.values - res.values).max()
+    print("{} bars: loop {:.3f}s, vectorized {:.4f}s ({:.0f}x), "
+          "max abs diff {:.2e}".format(bars, legacy_secs, secs, legacy_secs / secs, err))
+
+    frame = pd.DataFrame(random_walk(bars, symbols))
+    secs, _ = timed(RSI, frame)
+    print("{} bars x {} symbols: vectorized {:.3f}s".format(bars, symbols, secs))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark RSI.')
+    parser.add_argument('--bars', type=int, default=100000)
+    parser.add_argument('--symbols', type=int, default=50)
+    args = parser.parse_args()
+    run(args.bars, args.symbols)
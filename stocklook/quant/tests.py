@@ -1,5 +1,7 @@
 import numpy as np
+import pandas as pd
 import stocklook.quant.analysis as analysis
+from stocklook.quant.scripts import benchmark_analysis as legacy
 
 """ tests.py
 Unit tests for quant module
@@ -177,6 +179,85 @@ def test_relative_momentum_index():
     result = analysis.relative_momentum_index(4,2, sin_signal)
 
 
+def test_legacy_regression():
+    """ [quant.analysis] Test vectorized indicators against the original formulas
+    """
+    high, low, close, volume = legacy.make_ohlcv(500)
+    close[40] = np.nan
+    avg = analysis.moving_average(20, close)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for label, old, new in legacy.cases(high, low, close, volume):
+            np.testing.assert_array_almost_equal(new(), old(), err_msg=label)
+        np.testing.assert_array_almost_equal(
+            analysis.relative_momentum_index(4, 2, sin_signal),
+            legacy.legacy_relative_momentum_index(4, 2, sin_signal))
+        np.testing.assert_array_almost_equal(
+            analysis.percent_diff(lin_ramp, zeros_array),
+            legacy.legacy_percent_diff(lin_ramp, zeros_array))
+    np.testing.assert_array_almost_equal(analysis.mag_diff(close, avg),
+                                         legacy.legacy_mag_diff(close, avg))
+
+
+def test_2d_and_pandas_inputs():
+    """ [quant.analysis] Test 2D arrays, Series and DataFrames
+    """
+    high, low, close, volume = legacy.make_ohlcv(300, 3)
+    frame = pd.DataFrame(close, columns=['A', 'B', 'C'],
+                         index=pd.date_range('2017-01-01', periods=300))
+    for func in (lambda d: analysis.moving_average(5, d),
+                 lambda d: analysis.exp_weighted_moving_average(5, d),
+                 lambda d: analysis.momentum(4, d),
+                 lambda d: analysis.trix(4, d),
+                 lambda d: analysis.macd_hist(d),
+                 lambda d: analysis.relative_strength_index(14, d)):
+        res_2d = func(close)
+        res_frame = func(frame)
+        assert res_2d.shape == close.shape
+        assert list(res_frame.columns) == ['A', 'B', 'C']
+        assert res_frame.index.equals(frame.index)
+        res_series = func(frame['B'])
+        assert res_series.index.equals(frame.index)
+        for i, c in enumerate(frame.columns):
+            np.testing.assert_array_almost_equal(res_2d[:, i], func(close[:, i]))
+            np.testing.assert_array_almost_equal(res_frame[c].values, res_2d[:, i])
+
+
+def test_macd_from_parts():
+    """ [quant.analysis] Test MACD signal/histogram from data or precomputed lines
+    """
+    line = analysis.macd(exp_ramp)
+    signal = analysis.macd_signal(exp_ramp)
+    np.testing.assert_array_almost_equal(signal, analysis.macd_signal(macd=line))
+    np.testing.assert_array_almost_equal(analysis.macd_hist(exp_ramp), line - signal)
+    np.testing.assert_array_almost_equal(analysis.macd_hist(macd=line, macd_signal=signal),
+                                         line - signal)
+
+
+def test_bollinger_bands():
+    """ [quant.analysis] Test Bollinger Bands
+    """
+    lower, middle, upper = analysis.bollinger_bands(4, exp_ramp)
+    np.testing.assert_array_almost_equal(middle, analysis.moving_average(4, exp_ramp))
+    np.testing.assert_array_almost_equal(upper - middle, 2 * analysis.moving_stdev(4, exp_ramp))
+    np.testing.assert_array_almost_equal(middle - lower, upper - middle)
+
+
+def test_stochastic_oscillator():
+    """ [quant.analysis] Test Stochastic Oscillator
+    """
+    k, d = analysis.stochastic_oscillator(3, lin_ramp + 1, lin_ramp - 1, lin_ramp, smooth=2)
+    np.testing.assert_array_almost_equal(k, [np.nan, np.nan] + [75.0] * 8)
+    np.testing.assert_array_almost_equal(d, [np.nan, np.nan, np.nan] + [75.0] * 7)
+
+
+def test_chandes_momentum_oscillator():
+    """ [quant.analysis] Test Chande Momentum Oscillator
+    """
+    result = analysis.chandes_momentum_oscillator(3, np.array([1., 2., 1., 3., 4., 4.]))
+    np.testing.assert_array_almost_equal(result, [np.nan, np.nan, np.nan,
+                                                  100 * 2 / 4, 100 * 2 / 4, 100.0])
+
+
 if  __name__ == '__main__':
     test_zero_length_moving_average()
     test_unit_length_exp_weighted_moving_average()
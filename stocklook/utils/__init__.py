@@ -1,17 +1,22 @@
 import time
+from threading import Lock
 
 
 def rate_limited(maxPerSecond):
     minInterval = 1.0 / float(maxPerSecond)
     def decorate(func):
         lastTimeCalled = [0.0]
+        lock = Lock()
         def rateLimitedFunction(*args,**kargs):
-            elapsed = time.clock() - lastTimeCalled[0]
-            leftToWait = minInterval - elapsed
-            if leftToWait>0:
-                time.sleep(leftToWait)
-            ret = func(*args,**kargs)
-            lastTimeCalled[0] = time.clock()
-            return ret
+            # Calls from all threads share the same budget:
+            # each caller reserves the next start time under the lock
+            # so requests can still overlap once they've started.
+            with lock:
+                elapsed = time.monotonic() - lastTimeCalled[0]
+                leftToWait = minInterval - elapsed
+                if leftToWait>0:
+                    time.sleep(leftToWait)
+                lastTimeCalled[0] = time.monotonic()
+            return func(*args,**kargs)
         return rateLimitedFunction
-    return decorate
\ No newline at end of file
+    return decorate
@@ -0,0 +1,339 @@
+"""
+MIT License
+
+Copyright (c) 2017 Zeke Barge
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import os
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
+from pandas import DataFrame, concat
+
+AGG_FUNCS = ('sum', 'count', 'min', 'max', 'mean', 'first', 'last')
+ROW_KEY = '__row'
+
+
+def ohlc_aggs(column, prefix=''):
+    """
+    Returns named aggregations for open/high/low/close of a column.
+
+        aggs = dict(ohlc_aggs('price'), volume=('last_size', 'sum'))
+    """
+    return {prefix + 'open': (column, 'first'),
+            prefix + 'high': (column, 'max'),
+            prefix + 'low': (column, 'min'),
+            prefix + 'close': (column, 'last')}
+
+
+def iter_parquet_chunks(path, columns=None, filter=None, batch_size=100000):
+    """
+    Yields DataFrames from a Parquet file or directory
+    (ie the GdaxParquetFeed or GdaxTableExporter output).
+
+    :param path: (str)
+    :param columns: (list, default None)
+    :param filter: (pyarrow.dataset.Expression, default None)
+    :param batch_size: (int, default 100000)
+    """
+    try:
+        import pyarrow.dataset as ds
+    except ImportError:
+        raise ImportError("pyarrow package not found - install "
+                          "using the following command:\n\tpip install pyarrow")
+    dataset = ds.dataset(path, format='parquet', partitioning='hive')
+    for batch in dataset.to_batches(columns=columns, filter=filter,
+                                    batch_size=batch_size):
+        if batch.num_rows:
+            yield batch.to_pandas()
+
+
+def _partial(agg, df, offset):
+    # Module level so ProcessPoolExecutor can pickle it.
+    return agg.partial(df, offset)
+
+
+class ChunkedAggregator:
+    """
+    Group-by/resample aggregation over DataFrame chunks
+    (SQL reads with chunksize, Parquet batches, ...) using
+    memory bounded by the number of groups rather than rows.
+
+    Each chunk is reduced to a partial aggregate (sum, count, min, max,
+    first and last per group) and partials are merged as they arrive.
+    mean is finished from the merged sum and count. first/last follow
+    :param order_by or, without it, the order rows were read in, and
+    skip nulls like GroupBy.first/last and resample().ohlc(). Chunks
+    can be reduced on several processes since partials merge in any order.
+
+    Usage:
+        agg = ChunkedAggregator(dict(ohlc_aggs('price'), volume=('last_size', 'sum')),
+                                by='product_id', freq='5min', time_column='time')
+        df = agg.run(db.get_prices(None, start, end, products, chunksize=100000))
+    """
+    def __init__(self, aggs, by=None, freq=None, time_column='time',
+                 order_by=None, max_workers=None, merge_every=16):
+        """
+        :param aggs: (dict)
+            {output_column: (input_column, func)}, func being one of
+            sum, count, min, max, mean, first, last.
+        :param by: (str, list, default None)
+            Column(s) to group by.
+        :param freq: (str, default None)
+            Also groups by :param time_column floored to
+            this pandas frequency (ie '1min', '1h', '1D').
+        :param time_column: (str, default 'time')
+        :param order_by: (str, list, default None)
+            Columns deciding first/last, None uses the read order.
+        :param max_workers: (int, default None)
+            Processes reducing chunks in parallel,
+            None or 1 reduces them in the calling thread.
+        :param merge_every: (int, default 16)
+            Partials held before merging them into the running result.
+        """
+        for out, (col, func) in aggs.items():
+            if func not in AGG_FUNCS:
+                raise ValueError("Unsupported aggregation {} for {}, expected "
+                                 "one of {}".format(func, out, AGG_FUNCS))
+        if by is None:
+            by = []
+        elif isinstance(by, str):
+            by = [by]
+        if isinstance(order_by, str):
+            order_by = [order_by]
+
+        self.aggs = aggs
+        self.by = list(by)
+        self.freq = freq
+        self.time_column = time_column
+        self.order_by = list(order_by) if order_by else [ROW_KEY]
+        self.max_workers = max_workers
+        self.merge_every = merge_every
+
+    @property
+    def keys(self):
+        return self.by + ([self.time_column] if self.freq else [])
+
+    def partial(self, df, offset=0):
+        """
+        Reduces one chunk to a partial aggregate indexed by ChunkedAggregator.keys.
+
+        :param df: (pandas.DataFrame)
+        :param offset: (int, default 0)
+            Rows read before this chunk, orders first/last without :param order_by.
+        :return: (pandas.DataFrame)
+        """
+        df = df.copy()
+        if self.freq:
+            df[self.time_column] = df[self.time_column].dt.floor(self.freq)
+        if self.order_by == [ROW_KEY]:
+            df[ROW_KEY] = range(offset, offset + len(df.index))
+        keys = self.keys
+        if keys:
+            df = df.dropna(subset=keys)
+        grouper = keys if keys else (lambda i: 0)
+
+        res = DataFrame()
+        g = df.groupby(grouper, sort=False)
+        for out, (col, func) in self.aggs.items():
+            if func in ('sum', 'mean'):
+                res[out + '__sum'] = g[col].sum(min_count=1)
+            if func in ('count', 'mean'):
+                res[out + '__count'] = g[col].count()
+            if func in ('min', 'max'):
+                res[out + '__' + func] = getattr(g[col], func)()
+
+        ordered = None
+        for out, (col, func) in self.aggs.items():
+            if func not in ('first', 'last'):
+                continue
+            if ordered is None:
+                ordered = df.sort_values(self.order_by, kind='stable', na_position='first')
+            # Like GroupBy.first/last nulls are skipped.
+            rows = ordered.dropna(subset=[col])
+            rows = rows.groupby(keys if keys else (lambda i: 0), sort=False)\
+                .nth(0 if func == 'first' else -1)
+            rows = rows.set_index(keys) if keys else rows.set_axis([0] * len(rows.index))
+            for c in self.order_by:
+                res[self._order_column(out, func, c)] = rows[c]
+            res[out + '__' + func] = rows[col]
+        return res
+
+    @staticmethod
+    def _order_column(out, func, column):
+        return '__{}_{}_{}'.format(out, func, column)
+
+    def merge(self, partials):
+        """
+        Merges partial aggregates into one partial aggregate.
+        """
+        partials = [p for p in partials if p is not None and len(p.index)]
+        if not partials:
+            return None
+        if len(partials) == 1:
+            return partials[0]
+        df = concat(partials)
+        keys = self.keys
+        index_names = list(df.index.names) if keys else None
+        if keys:
+            df = df.reset_index()
+            grouper = index_names
+        else:
+            df = df.reset_index(drop=True)
+            grouper = lambda i: 0
+        g = df.groupby(grouper, sort=False)
+
+        res = DataFrame()
+        for c in df.columns:
+            if c.endswith('__sum') or c.endswith('__count'):
+                res[c] = g[c].sum(min_count=1)
+            elif c.endswith('__min'):
+                res[c] = g[c].min()
+            elif c.endswith('__max'):
+                res[c] = g[c].max()
+
+        for out, (col, func) in self.aggs.items():
+            if func not in ('first', 'last'):
+                continue
+            value = out + '__' + func
+            order = [self._order_column(out, func, c) for c in self.order_by]
+            # Groups whose chunks had no value for this column are left out
+            # so a null never wins over a value from another chunk.
+            ordered = df.dropna(subset=[value])\
+                .sort_values(order, kind='stable', na_position='first')
+            rows = ordered.groupby(grouper, sort=False).nth(0 if func == 'first' else -1)
+            rows = rows.set_index(index_names) if keys else rows.set_axis([0] * len(rows.index))
+            for c in order + [value]:
+                res[c] = rows[c]
+        return res
+
+    def finalize(self, partial):
+        """
+        Turns a partial aggregate into the output columns.
+        :return: (pandas.DataFrame) sorted by ChunkedAggregator.keys.
+        """
+        keys = self.keys
+        if partial is None:
+            return DataFrame(columns=keys + list(self.aggs.keys()))
+        out = DataFrame(index=partial.index)
+        for name, (col, func) in self.aggs.items():
+            if func == 'mean':
+                out[name] = partial[name + '__sum'] / partial[name + '__count']
+            else:
+                out[name] = partial['{}__{}'.format(name, func)]
+            if func == 'count':
+                out[name] = out[name].astype('int64')
+        if not keys:
+            return out.reset_index(drop=True)
+        return out.sort_index().reset_index()
+
+    def run(self, chunks):
+        """
+        Aggregates an iterable of DataFrames.
+        :return: (pandas.DataFrame)
+        """
+        state, pending = None, list()
+        offset = 0
+
+        def push(p):
+            nonlocal state
+            pending.append(p)
+            if len(pending) >= self.merge_every:
+                state = self.merge([state] + pending)
+                del pending[:]
+
+        if self.max_workers is None or self.max_workers <= 1:
+            for df in chunks:
+                push(self.partial(df, offset))
+                offset += len(df.index)
+        else:
+            # Bounds chunks in flight so memory doesn't grow with the input.
+            chunks = iter(chunks)
+            with ProcessPoolExecutor(self.max_workers) as pool:
+                while True:
+                    batch = list(islice(chunks, self.max_workers * 2))
+                    if not batch:
+                        break
+                    futures = list()
+                    for df in batch:
+                        futures.append(pool.submit(_partial, self, df, offset))
+                        offset += len(df.index)
+                    del batch
+                    for f in futures:
+                        push(f.result())
+
+        return self.finalize(self.merge([state] + pending))
+
+
+def last_rows(chunks, by, order_by, keep='last'):
+    """
+    Returns the last (or first) row of each group across DataFrame
+    chunks, holding one row per group between chunks.
+    Missing :param order_by values sort first.
+
+    :param chunks: (iterable) of pandas.DataFrame
+    :param by: (str, list)
+    :param order_by: (str, list)
+    :param keep: (str, default 'last')
+    :return: (pandas.DataFrame)
+    """
+    state = None
+    for df in chunks:
+        if state is not None:
+            df = concat([state, df], ignore_index=True)
+        state = df.sort_values(order_by, kind='stable', na_position='first')\
+                  .drop_duplicates(by, keep=keep)
+    if state is not None:
+        state = state.reset_index(drop=True)
+    return state
+
+
+def iter_rolling(chunks, columns, window, func='mean', by=None, min_periods=None):
+    """
+    Yields a rolling window aggregate (over rows) of each chunk, carrying
+    the last window - 1 rows of each group into the next chunk so results
+    match running the window over the whole input at once.
+
+    :param chunks: (iterable) of pandas.DataFrame, ordered within each group.
+    :param columns: (list)
+    :param window: (int)
+    :param func: (str, default 'mean') a pandas Rolling method name.
+    :param by: (str, list, default None)
+    :param min_periods: (int, default None)
+    :return: (generator) of DataFrames with the chunk's index.
+    """
+    carry = None
+    for df in chunks:
+        n = len(df.index)
+        if carry is not None:
+            data = concat([carry, df], ignore_index=True)
+        else:
+            data = df.reset_index(drop=True)
+        if by:
+            rolled = data.groupby(by, sort=False)[columns]\
+                .rolling(window, min_periods=min_periods)
+            res = getattr(rolled, func)().reset_index(level=list(range(len(
+                [by] if isinstance(by, str) else by))), drop=True).sort_index()
+            carry = data.groupby(by, sort=False).tail(window - 1)
+        else:
+            res = getattr(data[columns].rolling(window, min_periods=min_periods), func)()
+            carry = data.tail(window - 1)
+        res = res.iloc[len(data.index) - n:]
+        res.index = df.index
+        yield res
@@ -1,49 +1,239 @@
+import json
+import random
 import requests
-from time import sleep
+import time
+from collections import deque
+from threading import Lock
+import logging as lg
+logger = lg.getLogger(__name__)
 
 
 class APIError(Exception):
     pass
 
 
-def call_api(url, method='get', _api_exception_cls=None, **kwargs):
+class RetryPolicy:
+    """
+    Bounded retry rules shared by the exchange clients.
+
+    Retries stop after RetryPolicy.max_attempts or once the next
+    attempt would start past RetryPolicy.deadline seconds from the first.
+    Delays grow exponentially with full jitter so clients recovering
+    from the same outage don't retry in lock step.
+
+    Non-idempotent requests (POST/PUT) are only retried
+    when their payload carries a client order id, because the exchange
+    can use it to reject a duplicate order.
+
+    Example:
+        policy = RetryPolicy(max_attempts=3, deadline=10)
+        res = policy.call(lambda: requests.get(url), method='get')
+    """
+    IDEMPOTENT_METHODS = ('get', 'head', 'options', 'delete')
+    CLIENT_ID_KEYS = ('client_oid', 'clOrdID')
+    RETRY_STATUS_CODES = (429, 502, 503, 504)
+    RETRY_ERROR_STRINGS = ('11001', 'unreachable host', '504')
+
+    def __init__(self, max_attempts=5, deadline=30, base_delay=0.5, max_delay=8, jitter=True):
+        """
+        :param max_attempts: (int, default 5)
+            The total number of attempts including the first.
+
+        :param deadline: (int, float, default 30)
+            The number of seconds after the first attempt
+            that no new attempts will be started.
+
+        :param base_delay: (int, float, default 0.5)
+            The delay in seconds before the first retry,
+            doubled on each following retry.
+
+        :param max_delay: (int, float, default 8)
+            The maximum delay in seconds between attempts.
+
+        :param jitter: (bool, default True)
+            True sleeps a random amount between zero and the backoff delay.
+        """
+        self.max_attempts = max_attempts
+        self.deadline = deadline
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.calls = 0
+        self.attempts = 0
+        self.retries = 0
+        self.failures = 0
+        self.latencies = deque(maxlen=1000)
+        self._lock = Lock()
+
+    def has_client_id(self, payload):
+        """
+        Returns True when a request payload (dict, list of dicts
+        or JSON string) contains a client order id for every order.
+        """
+        if isinstance(payload, (str, bytes)):
+            try:
+                payload = json.loads(payload)
+            except ValueError:
+                return False
+
+        if isinstance(payload, dict) and 'orders' in payload:
+            payload = payload['orders']
+
+        if isinstance(payload, dict):
+            return any(payload.get(k, None) for k in self.CLIENT_ID_KEYS)
+
+        if isinstance(payload, (list, tuple)) and payload:
+            return all(self.has_client_id(p) for p in payload)
+
+        return False
+
+    def allows_retry(self, method, payload=None):
+        if str(method).lower() in self.IDEMPOTENT_METHODS:
+            return True
+        return self.has_client_id(payload)
+
+    def get_delay(self, attempt):
+        """
+        Returns the number of seconds to wait after :param attempt failed.
+        """
+        delay = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        return delay
+
+    def next_delay(self, attempt, started):
+        """
+        Returns the number of seconds to wait before
+        another attempt or None when no attempts remain.
+        """
+        if attempt >= self.max_attempts:
+            return None
+
+        delay = self.get_delay(attempt)
+        if time.time() + delay - started > self.deadline:
+            return None
+
+        return delay
+
+    def is_retryable_error(self, e):
+        if isinstance(e, (requests.exceptions.Timeout,
+                          requests.exceptions.ConnectionError)):
+            return True
+
+        e = str(e)
+        return any(s in e for s in self.RETRY_ERROR_STRINGS) \
+               or ('forcibly' in e and 'existing' in e)
+
+    def is_retryable_response(self, res):
+        return getattr(res, 'status_code', None) in self.RETRY_STATUS_CODES
+
+    def call(self, func, method='get', payload=None):
+        """
+        Calls func() until it succeeds or the policy runs out of attempts.
+        Responses with a RetryPolicy.RETRY_STATUS_CODES status code
+        are retried and the last one is returned if attempts run out.
+
+        :param func: (callable)
+            Takes no arguments and makes the request.
+        :param method: (str, default 'get')
+            The HTTP verb used by func().
+        :param payload: (dict, list, str, default None)
+            The request body, checked for a client order id
+            when the method is not idempotent.
+        :return: The return value of func()
+        """
+        can_retry = self.allows_retry(method, payload)
+        started = time.time()
+        attempt = 0
+
+        while True:
+            attempt += 1
+            try:
+                res = func()
+            except Exception as e:
+                delay = self.next_delay(attempt, started) if can_retry else None
+                if delay is None or not self.is_retryable_error(e):
+                    self.record(attempt, started, failed=True)
+                    raise
+                logger.warning("Attempt {}/{} {} failed ({}), retrying "
+                               "in {:.2f}s.".format(attempt, self.max_attempts,
+                                                    method, e, delay))
+            else:
+                delay = None
+                if can_retry and self.is_retryable_response(res):
+                    delay = self.next_delay(attempt, started)
+                if delay is None:
+                    self.record(attempt, started, failed=self.is_retryable_response(res))
+                    return res
+                logger.warning("Attempt {}/{} {} got status {}, retrying "
+                               "in {:.2f}s.".format(attempt, self.max_attempts,
+                                                    method, res.status_code, delay))
+            time.sleep(delay)
+
+    def record(self, attempts, started, failed=False):
+        with self._lock:
+            self.calls += 1
+            self.attempts += attempts
+            self.retries += attempts - 1
+            if failed:
+                self.failures += 1
+            self.latencies.append(time.time() - started)
+
+    def stats(self):
+        """
+        Returns a dictionary of retry and latency metrics.
+        Latencies (seconds) cover all attempts of the last 1000 calls.
+        """
+        with self._lock:
+            lat = sorted(self.latencies)
+
+        def pct(p):
+            if not lat:
+                return 0.0
+            return lat[min(len(lat) - 1, int(len(lat) * p))]
+
+        return dict(calls=self.calls,
+                    attempts=self.attempts,
+                    retries=self.retries,
+                    failures=self.failures,
+                    latency_p50=pct(0.5),
+                    latency_p95=pct(0.95),
+                    latency_max=lat[-1] if lat else 0.0)
+
+
+DEFAULT_RETRY_POLICY = RetryPolicy()
+
+
+def call_api(url, method='get', _api_exception_cls=None, _retry_policy=None, **kwargs):
     """
     This method is rate limited to ~3 calls per second max.
     It should handle ALL communication with the Gdax API.
     :param url:
     :param method: ('get', 'delete', 'post')
+    :param _retry_policy: (RetryPolicy, default DEFAULT_RETRY_POLICY)
     :param kwargs:
     :return:
     """
-    try:
-        if method == 'get':
-            res = requests.get(url, **kwargs)
-        elif method == 'delete':
-            res = requests.delete(url, **kwargs)
-        elif method == 'post':
-            res = requests.post(url, **kwargs)
-        else:
-            raise NotImplementedError("Method '{}' not available "
-                                      "for calling API.".format(method))
-    except Exception as e:
-        e = str(e)
-        retry = '11001' in e \
-                or 'unreachable host' in e \
-                or ('forcibly' in e
-                    and 'existing' in e)\
-                or '504' in e
+    if method == 'get':
+        func = requests.get
+    elif method == 'delete':
+        func = requests.delete
+    elif method == 'post':
+        func = requests.post
+    else:
+        raise NotImplementedError("Method '{}' not available "
+                                  "for calling API.".format(method))
 
-        if retry:
-            sleep(1)
-            return call_api(url, method=method, **kwargs)
+    if _retry_policy is None:
+        _retry_policy = DEFAULT_RETRY_POLICY
 
-        raise
+    payload = kwargs.get('json', kwargs.get('data', None))
+    res = _retry_policy.call(lambda: func(url, **kwargs),
+                             method=method,
+                             payload=payload)
 
     if res.status_code != 200:
 
-        if res.status_code == 504:
-            return call_api(url, method=method, **kwargs)
-
         try:
             res_json = res.json()
         except (ValueError, AttributeError):
@@ -59,5 +249,3 @@ def call_api(url, method='get', _api_exception_cls=None, **kwargs):
         raise _api_exception_cls(msg)
 
     return res
-
-
@@ -0,0 +1,219 @@
+"""
+MIT License
+
+Copyright (c) 2017 Zeke Barge
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import time
+from collections import OrderedDict
+from threading import Lock, Event
+import logging as lg
+logger = lg.getLogger(__name__)
+
+
+class _PendingCall:
+    """
+    Holds the result of an in-flight call so that
+    concurrent callers asking for the same key can
+    wait on it rather than making their own request.
+    """
+    __slots__ = ('event', 'value', 'error')
+
+    def __init__(self):
+        self.event = Event()
+        self.value = None
+        self.error = None
+
+
+class ResponseCache:
+    """
+    A thread-safe in-memory cache for idempotent API responses.
+
+    Entries expire based on a time-to-live looked up by endpoint name,
+    the least recently used entries are evicted once max_size is reached,
+    and concurrent callers requesting the same key share a single call.
+
+    Example:
+        cache = ResponseCache(ttl_map={'ticker': 2})
+        data = cache.get_or_call('ticker', ('BTC-USD',), lambda: api.get_ticker('BTC-USD'))
+    """
+    DEFAULT_TTL = 5
+
+    def __init__(self, ttl_map=None, max_size=1024, default_ttl=None):
+        """
+        :param ttl_map: (dict, default None)
+            {endpoint_name: seconds} - the number of seconds
+            responses from each endpoint are considered fresh.
+
+        :param max_size: (int, default 1024)
+            The maximum number of entries held before the
+            least recently used entries are evicted.
+
+        :param default_ttl: (int, float, default ResponseCache.DEFAULT_TTL)
+            The number of seconds used for endpoints
+            missing from :param ttl_map.
+        """
+        if ttl_map is None:
+            ttl_map = dict()
+        if default_ttl is None:
+            default_ttl = self.DEFAULT_TTL
+
+        self.ttl_map = ttl_map
+        self.max_size = max_size
+        self.default_ttl = default_ttl
+        self._data = OrderedDict()  # (endpoint, key): (expire_time, value)
+        self._pending = dict()      # (endpoint, key): _PendingCall
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get_ttl(self, endpoint):
+        return self.ttl_map.get(endpoint, self.default_ttl)
+
+    def get(self, endpoint, key, default=None):
+        """
+        Returns a fresh cached value or :param default
+        if the entry is missing or expired.
+        Counted in ResponseCache.hits/misses like get_or_call.
+        """
+        k = (endpoint, key)
+        with self._lock:
+            entry = self._data.get(k, None)
+            if entry is not None:
+                expires, value = entry
+                if expires > time.time():
+                    self._data.move_to_end(k)
+                    self.hits += 1
+                    return value
+                del self._data[k]
+            self.misses += 1
+        return default
+
+    def set(self, endpoint, key, value, ttl=None):
+        """
+        Stores a value for :param ttl seconds
+        (defaults to the endpoint's ttl), evicting the least
+        recently used entries if ResponseCache.max_size is exceeded.
+        """
+        if ttl is None:
+            ttl = self.get_ttl(endpoint)
+        k = (endpoint, key)
+        with self._lock:
+            self._data[k] = (time.time() + ttl, value)
+            self._data.move_to_end(k)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_call(self, endpoint, key, func, ttl=None, cacheable=None):
+        """
+        Returns the cached value for (endpoint, key) if fresh.
+        Otherwise calls func() once, caching and returning the result.
+        Callers arriving while func() is running wait for that
+        result instead of calling func() themselves.
+
+        :param endpoint: (str)
+            The endpoint name used to look up the ttl.
+        :param key: (hashable)
+            Identifies the request parameters for the endpoint.
+        :param func: (callable)
+            Takes no arguments and returns the value to be cached.
+        :param ttl: (int, float, default None)
+            Overrides the endpoint's ttl for this entry.
+        :param cacheable: (callable, default None)
+            cacheable(value) returning False returns the value without
+            caching it (ie error responses). None caches every value.
+        :return:
+        """
+        k = (endpoint, key)
+        with self._lock:
+            entry = self._data.get(k, None)
+            if entry is not None and entry[0] > time.time():
+                self._data.move_to_end(k)
+                self.hits += 1
+                return entry[1]
+
+            pending = self._pending.get(k, None)
+            owner = pending is None
+            if owner:
+                pending = _PendingCall()
+                self._pending[k] = pending
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not owner:
+            pending.event.wait()
+            if pending.error is not None:
+                raise pending.error
+            return pending.value
+
+        try:
+            pending.value = func()
+        except Exception as e:
+            pending.error = e
+            raise
+        else:
+            if cacheable is None or cacheable(pending.value):
+                self.set(endpoint, key, pending.value, ttl=ttl)
+        finally:
+            with self._lock:
+                self._pending.pop(k, None)
+            pending.event.set()
+
+        return pending.value
+
+    def invalidate(self, endpoint=None, key=None):
+        """
+        Removes cached entries.
+        No arguments clears everything, :param endpoint alone
+        clears all keys for that endpoint.
+        """
+        with self._lock:
+            if endpoint is None:
+                self._data.clear()
+            elif key is not None:
+                self._data.pop((endpoint, key), None)
+            else:
+                for k in [k for k in self._data if k[0] == endpoint]:
+                    del self._data[k]
+
+    def stats(self):
+        """
+        Returns a dictionary of hit/miss metrics.
+        """
+        with self._lock:
+            calls = self.hits + self.misses + self.coalesced
+            return dict(hits=self.hits,
+                        misses=self.misses,
+                        coalesced=self.coalesced,
+                        evictions=self.evictions,
+                        size=len(self._data),
+                        hit_rate=round((self.hits + self.coalesced) / calls, 4) if calls else 0.0)
+
+
+# Public market data is the same for every caller
+# so API objects share this cache by default.
+GLOBAL_RESPONSE_CACHE = ResponseCache(max_size=2048)
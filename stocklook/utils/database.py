@@ -22,15 +22,26 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 import os
-from threading import Thread
-from sqlalchemy import create_engine
+import time
+from threading import Thread, Lock
+from sqlalchemy import create_engine, select, and_, event
+from sqlalchemy.exc import (OperationalError, InterfaceError, DisconnectionError,
+                            TimeoutError as PoolTimeoutError)
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from stocklook.utils.timetools import timestamp_to_local
-from queue import Empty
+from queue import Queue, Empty
+import numpy as np
+from pandas import DataFrame, to_datetime
 import logging as lg
 logger = lg.getLogger(__name__)
 
+# Errors meaning the database is down/unreachable/locked
+# rather than something being wrong with the data.
+DB_UNAVAILABLE_ERRORS = (OperationalError, InterfaceError, DisconnectionError)
+
 PY_TYPE_TO_SQL_ALCHEMY_LABEL_MAP = {
     str: "String(255)",
     bool: 'Boolean',
@@ -145,6 +156,669 @@ def db_map_dict_to_alchemy_object(d, sql_object, dtype_items=None, raise_on_erro
     return obj
 
 
+def db_supports_window_functions(engine):
+    """
+    True when the database can run LEAD() OVER (...):
+    SQLite 3.25+, MySQL 8+, MariaDB 10.2+ and Postgres.
+
+    :param engine: (sqlalchemy.engine.Engine)
+    :return: (bool)
+    """
+    dialect = engine.dialect
+    version = dialect.server_version_info or ()
+    name = dialect.name
+    if name == 'postgresql':
+        return True
+    if name == 'sqlite':
+        return version >= (3, 25)
+    if name == 'mysql':
+        if getattr(dialect, 'is_mariadb', False):
+            return version >= (10, 2)
+        return version >= (8, 0)
+    return False
+
+
+def db_map_dict_to_row(d, table, dtype_items=None, raise_on_error=False):
+    """
+    Converts a dictionary object into an insert parameter
+    dictionary for :param table: the same way db_map_dict_to_alchemy_object
+    does, without building an ORM object.
+
+    :param d: (dict)
+    :param table: (sqlalchemy.Table)
+    :param dtype_items:
+    :param raise_on_error:
+    :return: (dict)
+    """
+    if dtype_items is not None:
+        for c, tp in dtype_items:
+            try:
+                d[c] = tp(d[c])
+            except KeyError:
+                pass
+            except (ValueError, TypeError):
+                d[c] = None
+
+    cols = table.columns
+    row = dict()
+    for k, v in d.items():
+        if k in cols:
+            row[k] = v
+        elif raise_on_error:
+            raise KeyError("SQL table {} missing: {}".format(table.name, k))
+
+    return row
+
+
+def db_frame_from_rows(rows, columns):
+    """
+    Builds a DataFrame from result rows one typed column at a time
+    using the SQLAlchemy column types instead of letting pandas
+    infer dtypes object by object.
+
+    :param rows: (list)
+        Result rows (tuples) in the same order as :param columns.
+    :param columns: (list)
+        SQLAlchemy Column/ColumnElement objects.
+    :return: (pandas.DataFrame)
+    """
+    names = [c.name for c in columns]
+    if not rows:
+        return DataFrame(columns=names)
+
+    values = list(zip(*rows))
+    data = dict()
+
+    for c, name, col in zip(columns, names, values):
+        try:
+            py_type = c.type.python_type
+        except NotImplementedError:
+            py_type = None
+
+        if py_type == float:
+            data[name] = np.array(col, dtype=np.float64)
+        elif py_type == int:
+            try:
+                data[name] = np.array(col, dtype=np.int64)
+            except TypeError:
+                # NULLs present
+                data[name] = np.array(col, dtype=np.float64)
+        elif 'date' in str(py_type).lower():
+            data[name] = to_datetime(list(col), errors='coerce')
+        else:
+            data[name] = np.array(col, dtype=object)
+
+    return DataFrame(data, columns=names)
+
+
+def db_iter_frames(bind, query, chunksize=50000):
+    """
+    Executes a Core select streaming results (server-side cursor
+    where the driver supports it) and yields typed DataFrames of
+    up to :param chunksize rows.
+
+    :param bind: (Engine, Connection)
+    :param query: (sqlalchemy.sql.Select)
+    :param chunksize: (int, default 50000)
+    :return: (generator)
+    """
+    columns = list(query.selected_columns) \
+        if hasattr(query, 'selected_columns') else list(query.columns)
+
+    close = isinstance(bind, Engine)
+    conn = bind.connect() if close else bind
+
+    try:
+        res = conn.execution_options(stream_results=True).execute(query)
+        while True:
+            rows = res.fetchmany(chunksize)
+            if not rows:
+                break
+            yield db_frame_from_rows(rows, columns)
+    finally:
+        if close:
+            conn.close()
+
+
+def db_read_frame(bind, query, chunksize=None):
+    """
+    Reads a Core select into a typed DataFrame.
+
+    :param bind: (Engine, Connection)
+    :param query: (sqlalchemy.sql.Select)
+    :param chunksize: (int, default None)
+        None returns a single DataFrame,
+        otherwise an iterator of DataFrames is returned.
+    :return: (pandas.DataFrame, generator)
+    """
+    if chunksize:
+        return db_iter_frames(bind, query, chunksize=chunksize)
+
+    columns = list(query.selected_columns) \
+        if hasattr(query, 'selected_columns') else list(query.columns)
+
+    if isinstance(bind, Engine):
+        with bind.connect() as conn:
+            rows = conn.execute(query).fetchall()
+    else:
+        rows = bind.execute(query).fetchall()
+
+    return db_frame_from_rows(rows, columns)
+
+
+def db_frame_to_params(df, table):
+    """
+    Converts a DataFrame into a list of insert parameter
+    dictionaries holding only the table's columns.
+    Values are pulled column by column and NaN/NaT become None.
+
+    :param df: (pandas.DataFrame)
+    :param table: (sqlalchemy.Table)
+    :return: (list)
+    """
+    cols = [c.name for c in table.columns if c.name in df.columns]
+    frame = df[cols]
+    frame = frame.astype(object).where(frame.notnull(), None)
+    values = [frame[c].tolist() for c in cols]
+    return [dict(zip(cols, row)) for row in zip(*values)]
+
+
+def db_bulk_upsert(bind, table, rows, index_elements,
+                   update=False, chunksize=5000):
+    """
+    Inserts rows in chunks within one transaction letting
+    the database resolve unique conflicts on :param index_elements:
+        SQLite/Postgres: INSERT ... ON CONFLICT DO NOTHING/UPDATE
+        MySQL: INSERT IGNORE/INSERT ... ON DUPLICATE KEY UPDATE
+    Other dialects get a plain INSERT.
+
+    :param bind: (Engine, Connection)
+    :param table: (sqlalchemy.Table)
+    :param rows: (list)
+        Parameter dictionaries (see db_frame_to_params).
+    :param index_elements: (list)
+        Column names of the unique constraint rows conflict on.
+    :param update: (bool, default False)
+        True overwrites the other columns of conflicting rows,
+        False keeps the stored row.
+    :param chunksize: (int, default 5000)
+    :return: (int)
+        The number of rows the database reports as inserted/updated.
+    """
+    if not rows:
+        return 0
+
+    name = bind.dialect.name
+    cols = [c for c in rows[0].keys() if c not in index_elements]
+
+    if name in ('sqlite', 'postgresql'):
+        if name == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(table)
+        if update and cols:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=index_elements,
+                set_={c: stmt.excluded[c] for c in cols})
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=index_elements)
+
+    elif name == 'mysql':
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(table)
+        if update and cols:
+            stmt = stmt.on_duplicate_key_update(
+                {c: stmt.inserted[c] for c in cols})
+        else:
+            stmt = stmt.prefix_with('IGNORE')
+
+    else:
+        stmt = table.insert()
+
+    def execute(conn):
+        count = 0
+        for i in range(0, len(rows), chunksize):
+            res = conn.execute(stmt, rows[i:i + chunksize])
+            if res.rowcount and res.rowcount > 0:
+                count += res.rowcount
+        return count
+
+    if isinstance(bind, Engine):
+        with bind.begin() as conn:
+            return execute(conn)
+    return execute(bind)
+
+
+class PoolMetrics:
+    """
+    Connection pool counters collected from pool events.
+    Checkout wait times are only recorded for MeteredQueuePool pools.
+
+    Usage:
+        engine = db_create_engine(url)
+        ...
+        engine.pool.metrics.snapshot()
+    """
+    def __init__(self, pool=None):
+        self._lock = Lock()
+        self.pool = pool
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidated = 0
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.waits = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.timeouts = 0
+
+    def on_connect(self, dbapi_conn, record):
+        with self._lock:
+            self.connects += 1
+
+    def on_checkout(self, dbapi_conn, record, proxy):
+        with self._lock:
+            self.checkouts += 1
+            self.in_use += 1
+            if self.in_use > self.peak_in_use:
+                self.peak_in_use = self.in_use
+
+    def on_checkin(self, dbapi_conn, record):
+        with self._lock:
+            self.checkins += 1
+            self.in_use = max(self.in_use - 1, 0)
+
+    def on_invalidate(self, dbapi_conn, record, exception):
+        with self._lock:
+            self.invalidated += 1
+
+    def add_wait(self, seconds, timed_out=False):
+        with self._lock:
+            self.waits += 1
+            self.wait_total += seconds
+            if seconds > self.wait_max:
+                self.wait_max = seconds
+            if timed_out:
+                self.timeouts += 1
+
+    def listen(self, pool):
+        """
+        Registers the counters on :param pool: events.
+        """
+        self.pool = pool
+        event.listen(pool, 'connect', self.on_connect)
+        event.listen(pool, 'checkout', self.on_checkout)
+        event.listen(pool, 'checkin', self.on_checkin)
+        event.listen(pool, 'invalidate', self.on_invalidate)
+        pool.metrics = self
+        return self
+
+    def snapshot(self):
+        """
+        :return: (dict)
+            Counters plus wait_avg and the pool's current status.
+        """
+        with self._lock:
+            d = {'connects': self.connects,
+                 'checkouts': self.checkouts,
+                 'checkins': self.checkins,
+                 'invalidated': self.invalidated,
+                 'in_use': self.in_use,
+                 'peak_in_use': self.peak_in_use,
+                 'waits': self.waits,
+                 'wait_total': self.wait_total,
+                 'wait_max': self.wait_max,
+                 'wait_avg': self.wait_total / self.waits if self.waits else 0.0,
+                 'timeouts': self.timeouts}
+        if self.pool is not None:
+            d['status'] = self.pool.status()
+        return d
+
+
+class MeteredQueuePool(QueuePool):
+    """
+    A QueuePool recording how long each checkout
+    waited for a connection in its PoolMetrics.
+    """
+    metrics = None
+
+    def _do_get(self):
+        start = time.perf_counter()
+        timed_out = False
+        try:
+            return super(MeteredQueuePool, self)._do_get()
+        except PoolTimeoutError:
+            timed_out = True
+            raise
+        finally:
+            if self.metrics is not None:
+                self.metrics.add_wait(time.perf_counter() - start, timed_out)
+
+    def recreate(self):
+        pool = super(MeteredQueuePool, self).recreate()
+        if self.metrics is not None:
+            self.metrics.listen(pool)
+        return pool
+
+
+# Defaults for MySQL/Postgres engines made by db_create_engine.
+# pool_pre_ping replaces connections the server dropped and
+# pool_recycle retires them before MySQL's wait_timeout does.
+DEFAULT_POOL_KWARGS = {'pool_size': 10,
+                       'max_overflow': 10,
+                       'pool_timeout': 30,
+                       'pool_recycle': 3600,
+                       'pool_pre_ping': True}
+
+
+def db_create_engine(url, pool_kwargs=None, **kwargs):
+    """
+    Creates an engine with a metered, tuned connection pool.
+    SQLite engines keep SQLAlchemy's default pool (only pool_pre_ping
+    and pool_recycle apply) and get event counters without wait times.
+
+    :param url: (str, sqlalchemy.engine.url.URL)
+    :param pool_kwargs: (dict, default None)
+        Overrides DEFAULT_POOL_KWARGS (pool_size, max_overflow,
+        pool_timeout, pool_recycle, pool_pre_ping).
+    :param kwargs: passed to sqlalchemy.create_engine
+    :return: (sqlalchemy.engine.Engine)
+        PoolMetrics are at engine.pool.metrics
+    """
+    opts = DEFAULT_POOL_KWARGS.copy()
+    if pool_kwargs:
+        opts.update(pool_kwargs)
+
+    if str(url).startswith('sqlite'):
+        opts = {k: v for k, v in opts.items()
+                if k in ('pool_recycle', 'pool_pre_ping')}
+    else:
+        opts['poolclass'] = MeteredQueuePool
+
+    opts.update(kwargs)
+    engine = create_engine(url, **opts)
+    PoolMetrics().listen(engine.pool)
+    return engine
+
+
+def db_pool_metrics(engine):
+    """
+    Returns the PoolMetrics of :param engine:,
+    attaching event counters first if it has none.
+    :return: (PoolMetrics)
+    """
+    metrics = getattr(engine.pool, 'metrics', None)
+    if metrics is None:
+        metrics = PoolMetrics().listen(engine.pool)
+    return metrics
+
+
+# Applied to every connection of a high throughput SQLite engine.
+# WAL lets readers run alongside the writer, synchronous=NORMAL only
+# fsyncs at checkpoints (safe in WAL mode), a 64MB page cache and
+# 256MB of memory mapped I/O cut read syscalls, busy_timeout waits
+# on locks instead of failing with "database is locked" right away.
+SQLITE_HIGH_THROUGHPUT_PRAGMAS = (('journal_mode', 'WAL'),
+                                  ('synchronous', 'NORMAL'),
+                                  ('cache_size', -65536),
+                                  ('mmap_size', 268435456),
+                                  ('temp_store', 'MEMORY'),
+                                  ('busy_timeout', 5000))
+
+# Read-only connections can't change the journal mode.
+SQLITE_READ_PRAGMAS = (('cache_size', -65536),
+                       ('mmap_size', 268435456),
+                       ('temp_store', 'MEMORY'),
+                       ('busy_timeout', 5000),
+                       ('query_only', 1))
+
+
+def db_is_sqlite_file(engine):
+    """
+    :param engine: (sqlalchemy.engine.Engine)
+    :return: (bool) True when the engine is a file backed SQLite
+        database, the only kind a separate read-only engine or
+        SQLiteWriter connection sees the same data on.
+    """
+    return engine.dialect.name == 'sqlite' \
+        and engine.url.database not in (None, '', ':memory:')
+
+
+def db_set_sqlite_pragmas(engine, pragmas=None):
+    """
+    Registers a connect event on :param engine: issuing
+    PRAGMA statements on every new DBAPI connection.
+
+    :param engine: (sqlalchemy.engine.Engine)
+    :param pragmas: (iterable, default SQLITE_HIGH_THROUGHPUT_PRAGMAS)
+        (name, value) pairs.
+    :return: (sqlalchemy.engine.Engine)
+    """
+    if pragmas is None:
+        pragmas = SQLITE_HIGH_THROUGHPUT_PRAGMAS
+    pragmas = list(pragmas)
+
+    def on_connect(dbapi_conn, record):
+        cursor = dbapi_conn.cursor()
+        for name, value in pragmas:
+            cursor.execute('PRAGMA {}={}'.format(name, value))
+        cursor.close()
+
+    event.listen(engine, 'connect', on_connect)
+    return engine
+
+
+def db_create_sqlite_engine(path, pragmas=None, read_only=False, **kwargs):
+    """
+    Creates a SQLite engine tuned for high throughput.
+
+    :param path: (str)
+        A file path or a sqlite:/// URL.
+    :param pragmas: (iterable, default None)
+        (name, value) pairs, defaults to SQLITE_HIGH_THROUGHPUT_PRAGMAS
+        or SQLITE_READ_PRAGMAS when :param read_only: is True.
+    :param read_only: (bool, default False)
+        Opens the file with mode=ro so connections can never take the write lock.
+    :param kwargs: passed to sqlalchemy.create_engine
+    :return: (sqlalchemy.engine.Engine)
+    """
+    pfx = 'sqlite:///'
+    path = path.replace("\\", "/")
+    if path.startswith(pfx):
+        path = path[len(pfx):]
+
+    if read_only:
+        url = '{}file:{}?mode=ro&uri=true'.format(pfx, path)
+        if pragmas is None:
+            pragmas = SQLITE_READ_PRAGMAS
+    else:
+        url = pfx + path
+
+    engine = create_engine(url, **kwargs)
+    return db_set_sqlite_pragmas(engine, pragmas)
+
+
+class SQLiteWriter(Thread):
+    """
+    A single writer thread for SQLite databases.
+
+    SQLite allows one writer at a time so loader threads committing
+    on their own connections spend most of their time waiting on
+    (or failing with) "database is locked". Loaders submit rows to
+    the writer instead and it coalesces everything received within
+    :param max_delay: seconds (or :param max_batch: rows) into one
+    transaction on one connection.
+
+    Usage:
+        writer = SQLiteWriter(engine)
+        writer.start()
+        writer.submit(table, [{'price': 1.0, ...}, ...])
+        writer.flush()  # Blocks until everything submitted is committed.
+        writer.stop()
+    """
+    STOP_SIGNAL = '--stop--'
+
+    def __init__(self, engine, max_batch=5000, max_delay=0.5, retry_interval=1,
+                 max_retries=5, **kwargs):
+        """
+        :param engine: (sqlalchemy.engine.Engine)
+        :param max_batch: (int, default 5000)
+            Rows committed per transaction at most.
+        :param max_delay: (float, default 0.5)
+            Seconds rows wait for more rows before being committed.
+        :param retry_interval: (float, default 1)
+            Seconds between attempts when the database is unavailable.
+        :param max_retries: (int, default 5)
+            Attempts after the first before a batch is given up on
+            while the database stays unavailable (or locked).
+        """
+        kwargs.setdefault('daemon', True)
+        super(SQLiteWriter, self).__init__(**kwargs)
+        self.engine = engine
+        self.queue = Queue()
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.retry_interval = retry_interval
+        self.max_retries = max_retries
+        self.count = 0
+        self.failed = 0
+        self.transactions = 0
+
+    def submit(self, table, rows, on_error=None):
+        """
+        :param table: (sqlalchemy.Table)
+        :param rows: (list) insert parameter dictionaries.
+        :param on_error: (callable, default None)
+            on_error(table, rows, exception) is called on the writer thread
+            when the rows can't be written so the caller can keep them
+            (ie spool them). None logs and drops them.
+        """
+        if rows:
+            self.queue.put((table, rows, on_error))
+
+    def flush(self):
+        self.queue.join()
+
+    def stop(self):
+        self.queue.put(self.STOP_SIGNAL)
+        self.join()
+
+    @staticmethod
+    def _insert(conn, items):
+        # Rows are grouped by their keys so column defaults
+        # still apply to columns a message doesn't have.
+        with conn.begin():
+            for table, rows, _ in items:
+                groups = dict()
+                for r in rows:
+                    groups.setdefault(tuple(r.keys()), []).append(r)
+                for group in groups.values():
+                    conn.execute(table.insert(), group)
+
+    def _try_insert(self, conn, items):
+        """
+        Inserts items in one transaction, retrying up to
+        SQLiteWriter.max_retries times while the database is unavailable.
+        :return: (Exception) the error or None when committed.
+        """
+        attempt = 0
+        while True:
+            try:
+                self._insert(conn, items)
+                return None
+            except DB_UNAVAILABLE_ERRORS as e:
+                attempt += 1
+                if attempt > self.max_retries:
+                    return e
+                logger.warning("SQLiteWriter retrying in {}s ({}/{}): "
+                               "{}".format(self.retry_interval, attempt,
+                                           self.max_retries, e))
+                time.sleep(self.retry_interval)
+            except Exception as e:
+                return e
+
+    def fail(self, item, e):
+        table, rows, on_error = item
+        self.failed += len(rows)
+        if on_error is None:
+            logger.error("SQLiteWriter dropped {} rows for '{}': "
+                         "{}".format(len(rows), table.name, e))
+            return
+        try:
+            on_error(table, rows, e)
+        except Exception as err:
+            logger.error("SQLiteWriter error handler failed for '{}': "
+                         "{}".format(table.name, err))
+
+    def write(self, conn, items):
+        """
+        Inserts :param items: ([(table, rows, on_error), ...]) in one transaction.
+        When that fails for a reason other than the database being
+        unavailable each item is written on its own so only the
+        items that can't be written are handed back to SQLiteWriter.fail.
+        """
+        e = self._try_insert(conn, items)
+        if e is None:
+            self.count += sum(len(i[1]) for i in items)
+            self.transactions += 1
+            return
+
+        if isinstance(e, DB_UNAVAILABLE_ERRORS) or len(items) == 1:
+            for item in items:
+                self.fail(item, e)
+            return
+
+        for item in items:
+            err = self._try_insert(conn, [item])
+            if err is None:
+                self.count += len(item[1])
+                self.transactions += 1
+            else:
+                self.fail(item, err)
+
+    def run(self):
+        conn = self.engine.connect()
+        pending = list()
+        n = 0
+        first_at = None
+        stop = False
+
+        try:
+            while not stop:
+                timeout = 1
+                if first_at is not None:
+                    timeout = max(first_at + self.max_delay - time.time(), 0.001)
+                try:
+                    item = self.queue.get(timeout=timeout)
+                except Empty:
+                    item = None
+
+                if isinstance(item, str) and item == self.STOP_SIGNAL:
+                    stop = True
+                    self.queue.task_done()
+                elif item is not None:
+                    pending.append(item)
+                    n += len(item[1])
+                    if first_at is None:
+                        first_at = time.time()
+
+                if pending and (stop or n >= self.max_batch
+                                or time.time() >= first_at + self.max_delay):
+                    try:
+                        self.write(conn, pending)
+                    except Exception as e:
+                        logger.error("SQLiteWriter failed writing "
+                                     "{} rows: {}".format(n, e))
+                    finally:
+                        for _ in range(len(pending)):
+                            self.queue.task_done()
+                    pending, n, first_at = list(), 0, None
+        finally:
+            conn.close()
+
+
 class DatabaseLoadingThread(Thread):
     """
     A thread class that handles the loading of dict objects
@@ -165,7 +839,33 @@ class DatabaseLoadingThread(Thread):
                  sql_object,
                  raise_on_error=True,
                  commit_interval=10,
+                 spool=None,
+                 retry_interval=5,
+                 max_commit_lag=10,
+                 writer=None,
                  **kwargs):
+        """
+        :param threadsafe_session_maker: (sqlalchemy.orm.sessionmaker)
+        :param queue: (queue.Queue)
+        :param sql_object: (declarative_base object)
+        :param raise_on_error: (bool, default True)
+        :param commit_interval: (int, default 10)
+            Messages added per commit.
+        :param spool: (stocklook.utils.spool.MessageSpool, default None)
+            When given, batches that fail to commit (or arrive while
+            the database is lagging) are written to the spool instead of
+            being lost and replayed in order once the database recovers.
+        :param retry_interval: (int, default 5)
+            Seconds between attempts to replay the spool.
+        :param max_commit_lag: (int, default 10)
+            A commit taking longer than this many seconds switches
+            the loader to spooling until the spool has been replayed.
+        :param writer: (SQLiteWriter, default None)
+            When given, batches are handed to the writer thread
+            instead of being committed on this thread's session.
+            With a spool, batches the writer gives up on are spooled
+            and the loader commits through the spool until it's replayed.
+        """
         self.session_maker = threadsafe_session_maker
         self.queue = queue
         self.obj = sql_object
@@ -174,6 +874,13 @@ class DatabaseLoadingThread(Thread):
         self.count = 0
         self.raise_on_error = raise_on_error
         self.commit_interval = commit_interval
+        self.spool = spool
+        self.retry_interval = retry_interval
+        self.max_commit_lag = max_commit_lag
+        self.writer = writer
+        self._spooling = spool is not None and len(spool) > 0
+        self._retry_at = 0
+        self._failed = Queue()
         self._setup()
         self.stop = False
 
@@ -232,12 +939,38 @@ class DatabaseLoadingThread(Thread):
             dtype_items=self.dtype_items,
             raise_on_error=self.raise_on_error)
 
+    def on_message(self, msg):
+        """
+        Called with each message taken from the queue before
+        it's loaded. Subclasses can override to tap the stream.
+        :param msg: (dict)
+        :return:
+        """
+        pass
+
+    def get_row(self, d):
+        """
+        Converts a dictionary object into an
+        insert parameter dictionary for the table.
+        :param d:
+        :return:
+        """
+        return db_map_dict_to_row(
+            d, self.obj.__table__,
+            dtype_items=self.dtype_items,
+            raise_on_error=self.raise_on_error)
+
     def run(self):
         while True:
             msg = self.load_messages()
             if isinstance(msg, str) and msg == self.STOP_SIGNAL:
                 logger.info("Stop signal received on "
                             "'{}'.".format(self.type))
+                if self.writer is not None and self.spool is not None:
+                    self.writer.flush()
+                    self.spool_failed()
+                if self._spooling:
+                    self.replay_spool(force=True)
                 break
 
     def load_messages(self):
@@ -251,11 +984,14 @@ class DatabaseLoadingThread(Thread):
         """
         session = self.get_session()
         msg = None
+        batch = list()
+        got = 0
 
         while True:
             try:
 
                 msg = self.queue.get(timeout=1)
+                got += 1
                 if not hasattr(msg, 'items'):
                     if msg == self.STOP_SIGNAL:
                         break
@@ -271,30 +1007,220 @@ class DatabaseLoadingThread(Thread):
                             logger.error(err_msg)
                             continue
 
-                rec = self.get_sql_record(msg)
-                
-                session.add(rec)
+                batch.append(msg)
+                self.on_message(msg)
+                if self.writer is None and not self._spooling:
+                    rec = self.get_sql_record(msg)
+                    session.add(rec)
                 self.count += 1
                 done = self.count % self.commit_interval == 0
                 if done: break
             except Empty:
                 break
 
-        session.commit()
-        session.close()
+        try:
+            self.commit(session, batch)
+        finally:
+            for _ in range(got):
+                self.queue.task_done()
 
         return msg
 
+    def commit(self, session, batch):
+        """
+        Commits the session. With a spool configured a failed or
+        lagging commit spools :param batch: rather than raising and
+        later batches go straight to the spool until it's replayed.
+
+        :param session: (sqlalchemy.orm.Session)
+        :param batch: (list) the raw messages added to the session.
+        :return:
+        """
+        if self.writer is not None and self.spool is not None:
+            self.spool_failed()
+
+        if self.writer is not None and not self._spooling:
+            session.close()
+            on_error = None
+            if self.spool is not None:
+                batch = list(batch)
+
+                def on_error(table, rows, e):
+                    self.on_writer_error(batch, e)
+            self.writer.submit(self.obj.__table__,
+                               [self.get_row(dict(m)) for m in batch],
+                               on_error=on_error)
+            return
+
+        if self.spool is None:
+            session.commit()
+            session.close()
+            return
+
+        if self._spooling:
+            session.close()
+            if batch:
+                self.spool.append(batch)
+            self.replay_spool()
+            return
+
+        start = time.time()
+        try:
+            session.commit()
+        except DB_UNAVAILABLE_ERRORS as e:
+            session.rollback()
+            logger.error("Commit failed on '{}', spooling {} messages: "
+                         "{}".format(self.type, len(batch), e))
+            self.spool.append(batch)
+            self._spooling = True
+            self._retry_at = time.time() + self.retry_interval
+        else:
+            if time.time() - start > self.max_commit_lag:
+                logger.warning("Commit lagging on '{}', spooling "
+                               "until caught up.".format(self.type))
+                self._spooling = True
+                self._retry_at = time.time() + self.retry_interval
+        finally:
+            session.close()
+
+    def on_writer_error(self, batch, e):
+        """
+        Called on the SQLiteWriter thread with a batch it couldn't write.
+        The batch is queued for this thread to spool with
+        DatabaseLoadingThread.spool_failed.
+        """
+        logger.error("Writer failed on '{}', spooling {} messages: "
+                     "{}".format(self.type, len(batch), e))
+        self._failed.put(batch)
+
+    def spool_failed(self):
+        """
+        Spools the batches the writer gave up on. Later batches
+        go to the spool (bypassing the writer) until it's replayed.
+        :return: (int) the number of batches spooled.
+        """
+        n = 0
+        while True:
+            try:
+                batch = self._failed.get_nowait()
+            except Empty:
+                break
+            self.spool.append(batch)
+            n += 1
+        if n:
+            self._spooling = True
+            self._retry_at = time.time() + self.retry_interval
+        return n
+
+    def get_stored_keys(self, session, messages):
+        """
+        Returns the (product_id, sequence) pairs of :param messages
+        already stored in the table so a replay can skip them.
+        Tables without both columns return an empty set.
+        :return: (set)
+        """
+        cols = self.obj.__table__.columns
+        if 'sequence' not in cols or 'product_id' not in cols:
+            return set()
+
+        by_product = dict()
+        for m in messages:
+            seq = m.get('sequence', None)
+            if seq is not None:
+                by_product.setdefault(m.get('product_id', None), []).append(int(seq))
+
+        stored = set()
+        for product, seqs in by_product.items():
+            qry = select([cols.sequence]).where(and_(
+                cols.product_id == product,
+                cols.sequence.between(min(seqs), max(seqs))))
+            stored.update((product, r[0]) for r in session.execute(qry))
+        return stored
+
+    def replay_spool(self, force=False):
+        """
+        Loads spooled segments oldest first, one transaction
+        per segment, removing each once committed. Messages whose
+        (product_id, sequence) is already stored are skipped so a
+        segment is never loaded twice.
+
+        A segment failing for any reason other than the database being
+        unavailable (ie an IntegrityError or DataError from a malformed row)
+        is quarantined with MessageSpool.quarantine and the replay moves on,
+        so one bad segment can't keep the loader spooling forever.
+
+        :param force: (bool, default False)
+            True ignores DatabaseLoadingThread.retry_interval.
+        :return: (int) the number of messages loaded.
+        """
+        if self.spool is None or (not force and time.time() < self._retry_at):
+            return 0
+
+        count = 0
+        for path in self.spool.segments():
+            messages = self.spool.read(path)
+            session = self.get_session()
+            added = 0
+            try:
+                stored = self.get_stored_keys(session, messages)
+                for m in messages:
+                    seq = m.get('sequence', None)
+                    if seq is not None and (m.get('product_id', None), int(seq)) in stored:
+                        continue
+                    session.add(self.get_sql_record(m))
+                    added += 1
+                session.commit()
+            except DB_UNAVAILABLE_ERRORS as e:
+                session.rollback()
+                logger.warning("Replaying spool on '{}' failed, retrying in "
+                               "{}s: {}".format(self.type, self.retry_interval, e))
+                self._retry_at = time.time() + self.retry_interval
+                return count
+            except Exception as e:
+                session.rollback()
+                bad = self.spool.quarantine(path)
+                logger.error("Quarantined spool segment {} on '{}', it can't be "
+                             "loaded: {}".format(bad, self.type, e))
+                continue
+            finally:
+                session.close()
+            self.spool.remove(path)
+            count += added
+
+        logger.info("Replayed {} spooled messages on '{}'.".format(count, self.type))
+        self._spooling = False
+        return count
+
 
 class AlchemyDatabase:
     """
     Base class for databases holds the
     engine, sessionmaker, and declarative base.
     """
-    def __init__(self, engine=None, session_maker=None, base=None):
+    def __init__(self, engine=None, session_maker=None, base=None, high_throughput=False):
+        """
+        :param engine: (sqlalchemy.engine.Engine, default None)
+        :param session_maker: (sqlalchemy.orm.sessionmaker, default None)
+        :param base: (declarative_base, default None)
+        :param high_throughput: (bool, default False)
+            True opens the default SQLite database with WAL and
+            SQLITE_HIGH_THROUGHPUT_PRAGMAS, reads go through
+            read-only connections (see AlchemyDatabase.read_engine)
+            and writes can go through a single SQLiteWriter
+            (see AlchemyDatabase.get_writer).
+        """
         self._engine = engine
         self._session_maker = session_maker
         self._declarative_base = base
+        self._read_engine = None
+        self._writer = None
+        self.high_throughput = high_throughput
+
+    @property
+    def db_path(self):
+        from stocklook.config import config, DATA_DIRECTORY
+        db_name = '{}.sqlite3'.format(self.__class__.__name__.lower())
+        return os.path.join(config[DATA_DIRECTORY], db_name)
 
     @property
     def engine(self):
@@ -304,15 +1230,43 @@ class AlchemyDatabase:
         :return:
         """
         if self._engine is None:
-            from stocklook.config import config, DATA_DIRECTORY
-            db_name = '{}.sqlite3'.format(self.__class__.__name__.lower())
-            db_path = 'sqlite:///' + os.path.join(
-                config[DATA_DIRECTORY], db_name)
-            self._engine = create_engine(db_path)
+            if self.high_throughput:
+                self._engine = db_create_sqlite_engine(self.db_path)
+            else:
+                self._engine = create_engine('sqlite:///' + self.db_path)
             if self._declarative_base is not None:
                 self._declarative_base.metadata.create_all(bind=self._engine)
         return self._engine
 
+    @property
+    def read_engine(self):
+        """
+        An engine for read-only queries. In high throughput
+        mode it's a separate read-only SQLite engine so reads
+        never contend with the writer, otherwise AlchemyDatabase.engine.
+        :return:
+        """
+        if self._read_engine is None:
+            engine = self.engine
+            if self.high_throughput and db_is_sqlite_file(engine):
+                self._read_engine = db_create_sqlite_engine(
+                    engine.url.database, read_only=True)
+            else:
+                self._read_engine = engine
+        return self._read_engine
+
+    def get_writer(self):
+        """
+        Returns the (started) SQLiteWriter shared by all loaders
+        in high throughput mode on a SQLite file, otherwise None.
+        :return:
+        """
+        if self._writer is None and self.high_throughput \
+                and db_is_sqlite_file(self.engine):
+            self._writer = SQLiteWriter(self.engine)
+            self._writer.start()
+        return self._writer
+
     @property
     def meta(self):
         return self._declarative_base.metadata
@@ -0,0 +1,162 @@
+"""
+MIT License
+
+Copyright (c) 2017 Zeke Barge
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import numpy as np
+from pandas import DataFrame
+
+
+def bucket_edges(n, buckets):
+    """
+    Returns the start index of :param buckets equal
+    sized buckets over :param n points.
+    """
+    return np.linspace(0, n, buckets + 1).astype(np.int64)[:-1]
+
+
+def lttb(x, y, points):
+    """
+    Largest-Triangle-Three-Buckets downsampling: keeps the first and last
+    points and from each bucket in between the point forming the largest
+    triangle with the point kept from the previous bucket and the average
+    of the next bucket. Keeps the visual shape of a line chart
+    (peaks/troughs) with a fixed number of points.
+
+    Each bucket depends on the previous selection so buckets are walked
+    in order, but the work inside a bucket is vectorized and the total
+    cost is linear in the input size.
+
+    :param x: (array-like) increasing numeric values (ie UTC int times).
+    :param y: (array-like)
+    :param points: (int) number of points to return (>= 3).
+    :return: (numpy.ndarray) indexes of the selected points.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = x.size
+    if points >= n or points < 3:
+        return np.arange(n)
+
+    # Buckets for everything between the first and last point.
+    edges = np.linspace(1, n - 1, points - 1).astype(np.int64)
+    sums_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1)
+    sums_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1)
+    counts = np.diff(edges)
+    avg_x = np.append(sums_x / counts, x[-1])
+    avg_y = np.append(sums_y / counts, y[-1])
+
+    selected = np.empty(points, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(points - 2):
+        lo, hi = edges[i], edges[i + 1]
+        bx, by = x[lo:hi], y[lo:hi]
+        # Twice the triangle area, the constant factor doesn't change argmax.
+        area = np.abs((x[a] - avg_x[i + 1]) * (by - y[a])
+                      - (x[a] - bx) * (avg_y[i + 1] - y[a]))
+        a = lo + int(np.nanargmax(area)) if not np.all(np.isnan(area)) else lo
+        selected[i + 1] = a
+    return selected
+
+
+def minmax(y, points):
+    """
+    Min/max per bucket downsampling: keeps the lowest and highest point of
+    each of points / 2 buckets (in their original order) so no extreme
+    is lost. Fully vectorized.
+
+    :param y: (array-like)
+    :param points: (int) maximum number of points to return.
+    :return: (numpy.ndarray) sorted indexes of the selected points.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    n = y.size
+    if points >= n:
+        return np.arange(n)
+
+    buckets = max(points // 2, 1)
+    starts = bucket_edges(n, buckets)
+    bucket = np.repeat(np.arange(buckets), np.diff(np.append(starts, n)))
+    # Sorting by (bucket, value) puts each bucket's min first and max last.
+    filled = np.where(np.isnan(y), np.inf, y)
+    order = np.lexsort((filled, bucket))
+    ends = np.append(starts[1:], n) - 1
+    lows = order[starts]
+    filled = np.where(np.isnan(y), -np.inf, y)
+    order = np.lexsort((filled, bucket))
+    highs = order[ends]
+    return np.unique(np.concatenate((lows, highs)))
+
+
+def downsample_frame(df, points, x='time', y='close', method='lttb'):
+    """
+    Returns the rows of :param df selected by lttb or minmax.
+
+    :param df: (pandas.DataFrame) sorted by :param x.
+    :param points: (int)
+    :param x: (str, default 'time') numeric or datetime column.
+    :param y: (str, default 'close')
+    :param method: (str, default 'lttb') 'lttb' or 'minmax'
+    :return: (pandas.DataFrame)
+    """
+    if len(df.index) <= points:
+        return df
+    if method == 'lttb':
+        xs = df[x].values
+        if np.issubdtype(xs.dtype, np.datetime64):
+            xs = xs.astype('datetime64[ns]').astype(np.int64)
+        idx = lttb(xs, df[y].values, points)
+    elif method == 'minmax':
+        idx = minmax(df[y].values, points)
+    else:
+        raise ValueError("method must be 'lttb' or 'minmax', not {}".format(method))
+    return df.iloc[idx]
+
+
+def bucket_ohlc(df, points, columns=('open', 'high', 'low', 'close', 'volume')):
+    """
+    Combines consecutive OHLC rows into at most :param points
+    bars (first open, max high, min low, last close, summed volume),
+    the candlestick equivalent of minmax. The first row of each
+    bucket labels the bar.
+
+    :param df: (pandas.DataFrame) sorted by time.
+    :param points: (int)
+    :param columns: (tuple) open, high, low, close and (optional) volume column names.
+    :return: (pandas.DataFrame)
+    """
+    n = len(df.index)
+    if n <= points:
+        return df
+    starts = bucket_edges(n, points)
+    ends = np.append(starts[1:], n) - 1
+    o, h, l, c = columns[:4]
+    res = df.iloc[starts].copy()
+    res[o] = df[o].values[starts]
+    res[h] = np.fmax.reduceat(df[h].values.astype(np.float64), starts)
+    res[l] = np.fmin.reduceat(df[l].values.astype(np.float64), starts)
+    res[c] = df[c].values[ends]
+    if len(columns) > 4 and columns[4] in df.columns:
+        res[columns[4]] = np.add.reduceat(np.nan_to_num(
+            df[columns[4]].values.astype(np.float64)), starts)
+    return res
@@ -0,0 +1,129 @@
+"""
+MIT License
+
+Copyright (c) 2017 Zeke Barge
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import os
+import re
+import json
+import logging as lg
+logger = lg.getLogger(__name__)
+
+
+class MessageSpool:
+    """
+    An append-only, segmented on-disk queue of dict messages.
+
+    Messages are written as JSON lines to numbered segment files
+    (<prefix>_00000001.jsonl, <prefix>_00000002.jsonl, ...) and each
+    append is fsync'd before returning so a spooled batch survives
+    the process dying. Segments are read back oldest first and
+    removed once their messages are safely stored elsewhere
+    (or quarantined when they can never be).
+
+    Usage:
+        spool = MessageSpool('/data/spool', prefix='gdax_ticks')
+        spool.append([{'sequence': 1, ...}, ...])
+        for path in spool.segments():
+            store(spool.read(path))
+            spool.remove(path)
+    """
+    def __init__(self, directory, prefix='spool', max_segment_bytes=8 * 1024 * 1024):
+        """
+        :param directory: (str)
+            Created if it doesn't exist.
+        :param prefix: (str, default 'spool')
+            Segment file name prefix, use one per table
+            when spools share a directory.
+        :param max_segment_bytes: (int, default 8MB)
+            A new segment is started once the current one reaches this size.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.prefix = prefix
+        self.max_segment_bytes = max_segment_bytes
+        self._pattern = re.compile(r'^{}_(\d+)\.jsonl$'.format(re.escape(prefix)))
+        nums = [self._number(p) for p in self.segments()]
+        self._current = max(nums) if nums else 0
+
+    def __len__(self):
+        return len(self.segments())
+
+    def _number(self, path):
+        return int(self._pattern.match(os.path.basename(path)).group(1))
+
+    def _segment_path(self, number):
+        return os.path.join(self.directory, '{}_{:08d}.jsonl'.format(self.prefix, number))
+
+    def segments(self):
+        """
+        :return: (list) segment paths, oldest first.
+        """
+        names = [n for n in os.listdir(self.directory) if self._pattern.match(n)]
+        paths = [os.path.join(self.directory, n) for n in names]
+        return sorted(paths, key=self._number)
+
+    def append(self, messages):
+        """
+        Appends messages to the current segment and fsyncs it.
+        :param messages: (list) JSON serializable dictionaries.
+        :return: (str) the segment path written to.
+        """
+        path = self._segment_path(self._current)
+        if not self._current or not os.path.exists(path) \
+                or os.path.getsize(path) >= self.max_segment_bytes:
+            self._current += 1
+            path = self._segment_path(self._current)
+
+        lines = ''.join(json.dumps(m, default=str) + '\n' for m in messages)
+        with open(path, 'a') as fh:
+            fh.write(lines)
+            fh.flush()
+            os.fsync(fh.fileno())
+        return path
+
+    def read(self, path):
+        """
+        Reads the messages in a segment. A truncated last line
+        (the process died mid-write) is skipped.
+        :return: (list)
+        """
+        messages = list()
+        with open(path) as fh:
+            for line in fh:
+                try:
+                    messages.append(json.loads(line))
+                except ValueError:
+                    logger.warning("Skipped unreadable spool line in {}".format(path))
+        return messages
+
+    def remove(self, path):
+        os.remove(path)
+
+    def quarantine(self, path):
+        """
+        Renames a segment that can't be loaded to <segment>.bad
+        so it's kept for inspection but no longer replayed.
+        :return: (str) the new path.
+        """
+        bad = path + '.bad'
+        os.replace(path, bad)
+        return bad
@@ -47,27 +47,25 @@ def timestamp_to_local(dt):
         - datetime.datetime
         - pandas.Timestamp
         - date or datetime string coercible by pandas.Timestamp algos
-            -
-    :return:
+            - naive values are assumed to be UTC.
+    :return: (datetime.datetime)
+        Microseconds are kept except for numeric input
+        which is treated as whole UTC seconds.
     """
     try:
         return localize_utc_int(dt)
-    except:
-        if not dt:
+    except (TypeError, ValueError):
+        if dt is None or (isinstance(dt, str) and not dt):
             return None
 
-        if isinstance(dt, str):
-            # convert a string-ish object to a
-            # pandas.Timestamp (way smarter than datetime)
-            utc_dt = Timestamp(dt)
-
-        # Get rid of existing timezones
-        dt = de_localize_datetime(dt)
-
-        if hasattr(dt, 'utctimetuple'):
-            dt = timegm(dt.utctimetuple())
-
-    return localize_utc_int(dt)
+    # pandas.Timestamp parses ISO strings (way smarter than datetime)
+    # and keeps the microseconds that GDAX message times carry.
+    ts = Timestamp(dt)
+    if isnull(ts):
+        return None
+    if ts.tzinfo is None:
+        ts = ts.tz_localize(pytz.utc)
+    return ts.tz_convert(timezone(config[TZ])).to_pydatetime()
 
 
 def localize_utc_int(utc_int):
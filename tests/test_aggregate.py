@@ -0,0 +1,96 @@
+"""
+MIT License
+
+Copyright (c) 2017 Zeke Barge
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from stocklook.utils.aggregate import (ChunkedAggregator, ohlc_aggs,
+                                       iter_rolling, last_rows)
+
+
+@pytest.fixture
+def ticks():
+    rng = np.random.default_rng(3)
+    n = 5000
+    df = pd.DataFrame({'time': pd.date_range('2017-09-01', periods=n, freq='7s'),
+                       'product_id': rng.choice(['BTC-USD', 'ETH-USD', 'LTC-USD'], n),
+                       'price': rng.normal(100, 1, n),
+                       'size': rng.random(n)})
+    df.loc[rng.random(n) < 0.06, 'price'] = np.nan
+    df.loc[0, 'price'] = np.nan
+    return df
+
+
+def chunk(df, size=333):
+    return [df.iloc[i:i + size] for i in range(0, len(df.index), size)]
+
+
+def expected_bars(df):
+    d = df.copy()
+    d['time'] = d['time'].dt.floor('1h')
+    g = d.groupby(['product_id', 'time'])
+    res = g.agg(high=('price', 'max'), low=('price', 'min'), volume=('size', 'sum'),
+                n=('size', 'count'), avg=('price', 'mean')).reset_index()
+    # GroupBy.first/last skip nulls.
+    res['open'] = g['price'].first().values
+    res['close'] = g['price'].last().values
+    return res
+
+
+@pytest.mark.parametrize('max_workers', [None, 2])
+def test_chunked_bars_match_pandas(ticks, max_workers):
+    aggs = dict(ohlc_aggs('price'), volume=('size', 'sum'),
+                n=('size', 'count'), avg=('price', 'mean'))
+    agg = ChunkedAggregator(aggs, by='product_id', freq='1h',
+                            max_workers=max_workers, merge_every=3)
+    res = agg.run(chunk(ticks))
+    exp = expected_bars(ticks)
+
+    assert res[['product_id', 'time']].equals(exp[['product_id', 'time']])
+    for c in ('open', 'high', 'low', 'close', 'volume', 'n', 'avg'):
+        assert np.allclose(res[c], exp[c], equal_nan=True), c
+    # The first price of the first bar is missing so the next one opens it.
+    assert not res['open'].isnull().any()
+    assert not res['close'].isnull().any()
+
+
+def test_first_last_order_by(ticks):
+    shuffled = ticks.sample(frac=1, random_state=1)
+    agg = ChunkedAggregator({'first': ('price', 'first'), 'last': ('price', 'last'),
+                             'start': ('time', 'min')}, order_by='time')
+    res = agg.run(chunk(shuffled))
+    assert res['start'].iloc[0] == ticks['time'].iloc[0]
+    prices = ticks['price'].dropna()
+    assert res['first'].iloc[0] == prices.iloc[0]
+    assert res['last'].iloc[0] == prices.iloc[-1]
+
+
+def test_rolling_and_last_rows(ticks):
+    res = pd.concat(iter_rolling(chunk(ticks), ['price'], 20, by='product_id'))
+    exp = ticks.groupby('product_id')['price'].rolling(20).mean()\
+               .reset_index(level=0, drop=True).sort_index()
+    assert np.allclose(res['price'], exp, equal_nan=True)
+
+    last = last_rows(chunk(ticks.sample(frac=1, random_state=2)), 'product_id', 'time')
+    exp = ticks.drop_duplicates('product_id', keep='last')
+    assert sorted(last['time']) == sorted(exp['time'])
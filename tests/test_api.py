@@ -0,0 +1,84 @@
+import requests
+from stocklook.utils.api import RetryPolicy, call_api, APIError
+import pytest
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.url = 'http://test'
+
+    def json(self):
+        return {}
+
+
+def make_func(results):
+    calls = []
+
+    def func():
+        calls.append(1)
+        r = results[len(calls) - 1]
+        if isinstance(r, Exception):
+            raise r
+        return r
+    return func, calls
+
+
+def test_retry_until_success():
+    p = RetryPolicy(max_attempts=4, base_delay=0.001, max_delay=0.001)
+    func, calls = make_func([requests.exceptions.ConnectionError('down'),
+                             FakeResponse(504),
+                             FakeResponse(200)])
+    res = p.call(func, method='get')
+    assert res.status_code == 200
+    assert len(calls) == 3
+    stats = p.stats()
+    assert stats['retries'] == 2
+    assert stats['failures'] == 0
+
+
+def test_max_attempts():
+    p = RetryPolicy(max_attempts=3, base_delay=0.001, max_delay=0.001)
+    func, calls = make_func([requests.exceptions.Timeout()] * 5)
+    with pytest.raises(requests.exceptions.Timeout):
+        p.call(func)
+    assert len(calls) == 3
+    assert p.stats()['failures'] == 1
+
+
+def test_deadline():
+    p = RetryPolicy(max_attempts=10, deadline=0.05, base_delay=0.03, max_delay=0.03, jitter=False)
+    func, calls = make_func([FakeResponse(503)] * 10)
+    res = p.call(func)
+    assert res.status_code == 503
+    assert len(calls) == 2
+
+
+def test_no_post_retry_without_client_id():
+    p = RetryPolicy(base_delay=0.001, max_delay=0.001)
+    func, calls = make_func([requests.exceptions.ConnectionError('down')] * 5)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        p.call(func, method='post', payload={'price': 1})
+    assert len(calls) == 1
+
+    assert p.allows_retry('post', {'client_oid': 'abc'})
+    assert p.allows_retry('POST', '{"clOrdID": "abc"}')
+    assert p.allows_retry('post', {'orders': [{'clOrdID': 'a'}, {'clOrdID': 'b'}]})
+    assert not p.allows_retry('post', {'orders': [{'clOrdID': 'a'}, {}]})
+
+
+def test_non_retryable_error_raises():
+    p = RetryPolicy(base_delay=0.001)
+    func, calls = make_func([ValueError('bad')] * 3)
+    with pytest.raises(ValueError):
+        p.call(func)
+    assert len(calls) == 1
+
+
+def test_call_api_raises_after_retries(monkeypatch):
+    p = RetryPolicy(max_attempts=2, base_delay=0.001, max_delay=0.001)
+    func, calls = make_func([FakeResponse(504)] * 3)
+    monkeypatch.setattr(requests, 'get', lambda url, **kwargs: func())
+    with pytest.raises(APIError):
+        call_api('http://test', _retry_policy=p)
+    assert len(calls) == 2
@@ -0,0 +1,97 @@
+from threading import Thread
+from time import sleep
+from stocklook.utils.cache import ResponseCache
+import pytest
+
+
+def test_ttl_expiry():
+    c = ResponseCache(ttl_map={'ticker': 0.05})
+    calls = []
+
+    def func():
+        calls.append(1)
+        return len(calls)
+
+    assert c.get_or_call('ticker', 'BTC-USD', func) == 1
+    assert c.get_or_call('ticker', 'BTC-USD', func) == 1
+    sleep(0.06)
+    assert c.get_or_call('ticker', 'BTC-USD', func) == 2
+    stats = c.stats()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 2
+
+
+def test_lru_eviction():
+    c = ResponseCache(max_size=2, default_ttl=60)
+    c.set('stats', 'a', 1)
+    c.set('stats', 'b', 2)
+    c.get('stats', 'a')
+    c.set('stats', 'c', 3)
+    assert c.get('stats', 'b') is None
+    assert c.get('stats', 'a') == 1
+    assert c.get('stats', 'c') == 3
+    stats = c.stats()
+    assert stats['evictions'] == 1
+    assert stats['hits'] == 3
+    assert stats['misses'] == 1
+
+
+def test_request_coalescing():
+    c = ResponseCache(default_ttl=60)
+    calls = []
+    results = []
+
+    def slow():
+        calls.append(1)
+        sleep(0.1)
+        return 'book'
+
+    threads = [Thread(target=lambda: results.append(c.get_or_call('book', 'ETH-USD', slow)))
+               for _ in range(5)]
+    [t.start() for t in threads]
+    [t.join() for t in threads]
+
+    assert len(calls) == 1
+    assert results == ['book'] * 5
+    assert c.stats()['coalesced'] == 4
+
+
+def test_errors_not_cached():
+    c = ResponseCache(default_ttl=60)
+
+    def fail():
+        raise ValueError('boom')
+
+    with pytest.raises(ValueError):
+        c.get_or_call('candles', 'x', fail)
+    assert c.get_or_call('candles', 'x', lambda: 5) == 5
+
+
+def test_uncacheable_values_not_cached():
+    c = ResponseCache(default_ttl=60)
+    error = {'message': 'Rate limit exceeded'}
+    is_ok = lambda r: 'message' not in r
+    assert c.get_or_call('ticker', 'x', lambda: error, cacheable=is_ok) == error
+    assert c.get_or_call('ticker', 'x', lambda: {'price': 1}, cacheable=is_ok) == {'price': 1}
+    assert c.get_or_call('ticker', 'x', lambda: {'price': 2}, cacheable=is_ok) == {'price': 1}
+
+
+def test_gdax_get_cached_returns_copies(monkeypatch):
+    from stocklook.crypto.gdax.api import Gdax
+    responses = [{'message': 'NotFound'}, {'price': '1.0'}]
+
+    class _Response:
+        def __init__(self, data):
+            self.data = data
+
+        def json(self):
+            return self.data
+
+    g = Gdax(key='x', secret='x', passphrase='x', cache=ResponseCache(default_ttl=60))
+    monkeypatch.setattr(g, 'get', lambda *args, **kwargs: _Response(responses.pop(0)))
+
+    assert g.get_cached('ticker', 'products/BTC-USD/ticker') == {'message': 'NotFound'}
+    res = g.get_cached('ticker', 'products/BTC-USD/ticker')
+    res['price'] = 'changed'
+    assert g.get_cached('ticker', 'products/BTC-USD/ticker') == {'price': '1.0'}
+    assert not responses
@@ -0,0 +1,82 @@
+"""
+MIT License
+
+Copyright (c) 2017 Zeke Barge
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import numpy as np
+from pandas import DataFrame
+from stocklook.utils.downsample import lttb, minmax, bucket_ohlc, downsample_frame
+
+
+def reference_lttb(x, y, points):
+    # Straightforward per-bucket implementation of the published algorithm.
+    n = len(x)
+    every = (n - 2) / (points - 2)
+    a, out = 0, [0]
+    for i in range(points - 2):
+        s = int(np.floor((i + 1) * every)) + 1
+        e = min(int(np.floor((i + 2) * every)) + 1, n)
+        avg_x, avg_y = x[s:e].mean(), y[s:e].mean()
+        lo = int(np.floor(i * every)) + 1
+        hi = int(np.floor((i + 1) * every)) + 1
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a])
+                      - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(area.argmax())
+        out.append(a)
+    out.append(n - 1)
+    return np.array(out)
+
+
+def test_lttb_matches_reference():
+    rng = np.random.default_rng(5)
+    y = np.cumsum(rng.normal(size=20000))
+    x = np.arange(y.size) * 60
+    idx = lttb(x, y, 500)
+    assert idx.size == 500
+    assert np.array_equal(idx, reference_lttb(x, y, 500))
+    assert np.array_equal(lttb(x[:10], y[:10], 500), np.arange(10))
+
+
+def test_minmax_keeps_extremes():
+    rng = np.random.default_rng(6)
+    y = rng.normal(size=10001)
+    y[17] = np.nan
+    idx = minmax(y, 100)
+    assert idx.size <= 100
+    assert np.all(np.diff(idx) > 0)
+    assert np.nanargmax(y) in idx and np.nanargmin(y) in idx
+
+
+def test_downsample_frames():
+    n = 1000
+    df = DataFrame({'time': np.arange(n), 'open': np.arange(n) + 1.0,
+                    'high': np.arange(n) + 2.0, 'low': np.arange(n) + 0.5,
+                    'close': np.arange(n) + 1.5, 'volume': 1.0})
+    bars = bucket_ohlc(df, 10)
+    assert bars['time'].tolist() == list(range(0, n, 100))
+    assert bars['open'].iloc[1] == 101.0
+    assert bars['high'].iloc[1] == 201.0
+    assert bars['low'].iloc[1] == 100.5
+    assert bars['close'].iloc[1] == 200.5
+    assert bars['volume'].tolist() == [100.0] * 10
+
+    assert downsample_frame(df, 50)['time'].iloc[-1] == n - 1
+    assert downsample_frame(df, 2000) is df
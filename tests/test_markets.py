@@ -0,0 +1,87 @@
+from time import sleep, time
+import pytest
+from stocklook.crypto.markets import (MarketDataClient,
+                                      GdaxMarketAdapter,
+                                      PoloniexMarketAdapter,
+                                      BittrexMarketAdapter,
+                                      CryptopiaMarketAdapter,
+                                      CANDLE_DTYPE)
+
+
+class FakeGdax:
+    def get_ticker(self, product):
+        sleep(0.2)
+        return {"trade_id": 4729088, "price": "333.99", "size": "0.193",
+                "bid": "333.98", "ask": "333.99", "volume": "5957.11914015",
+                "time": "2015-11-14T20:46:03.511254Z"}
+
+    def get_book(self, product, level=2):
+        return {"sequence": "3",
+                "bids": [["333.97", "1.5", 1], ["333.98", "2", 3]],
+                "asks": [["334.00", "0.5", 1]]}
+
+    def get_candles(self, product, start, end, granularity):
+        return [[1500000300, 1.0, 3.0, 2.0, 2.5, 10.0],
+                [1500000000, 0.5, 2.0, 1.0, 2.0, 5.0]]
+
+
+class FakePoloniex:
+    def return_ticker(self):
+        sleep(0.2)
+        return {'USDT_BTC': {'last': 4000.0, 'highestBid': 3999.0,
+                             'lowestAsk': 4001.0, 'quoteVolume': 100.0}}
+
+
+class FakeBittrex:
+    def get_market_summaries(self):
+        sleep(0.2)
+        return {'success': True, 'message': '',
+                'result': [{'MarketName': 'BTC-LTC', 'Last': 0.01, 'Bid': 0.0099,
+                            'Ask': 0.0101, 'Volume': 5000.0,
+                            'TimeStamp': '2017-08-31T01:29:50.427'}]}
+
+
+class FakeCryptopia:
+    def get_market(self, market):
+        return None, 'Market not found'
+
+
+def test_snapshot_normalizes_and_runs_concurrently():
+    c = MarketDataClient([GdaxMarketAdapter(FakeGdax()),
+                          PoloniexMarketAdapter(FakePoloniex()),
+                          BittrexMarketAdapter(FakeBittrex()),
+                          CryptopiaMarketAdapter(FakeCryptopia())])
+    t = time()
+    tickers, errors = c.snapshot({'gdax': ['BTC-USD'],
+                                  'poloniex': ['USDT_BTC'],
+                                  'bittrex': ['BTC-LTC'],
+                                  'cryptopia': ['DOT_BTC']})
+    assert time() - t < 0.5
+
+    g = tickers['gdax']['BTC-USD']
+    assert g.price == 333.99
+    assert round(g.spread, 2) == 0.01
+    assert g.time == 1447533963.511254
+    assert tickers['poloniex']['USDT_BTC'].bid == 3999.0
+    assert tickers['bittrex']['BTC-LTC'].volume == 5000.0
+    assert 'Market not found' in str(errors['cryptopia'])
+
+
+def test_book_and_candles():
+    a = GdaxMarketAdapter(FakeGdax())
+    b = a.get_book('BTC-USD')
+    assert b.best_bid == 333.98
+    assert b.best_ask == 334.0
+    assert b.bids.shape == (2, 2)
+
+    candles = a.get_candles('BTC-USD', 1500000000, 1500000300, 300)
+    assert candles.dtype == CANDLE_DTYPE
+    assert candles['time'].tolist() == [1500000000, 1500000300]
+    assert candles['open'].tolist() == [1.0, 2.0]
+
+
+def test_unknown_exchange_names_supported_ones():
+    c = MarketDataClient([GdaxMarketAdapter(FakeGdax()),
+                          PoloniexMarketAdapter(FakePoloniex())])
+    with pytest.raises(ValueError, match='gdax, poloniex'):
+        c.snapshot({'kraken': ['XBTUSD']})
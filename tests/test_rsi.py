@@ -0,0 +1,61 @@
+"""
+MIT License
+
+Copyright (c) 2017 Zeke Barge
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from stocklook.quant.rsi import RSI
+from stocklook.quant.scripts.benchmark_rsi import legacy_rsi, random_walk
+
+
+@pytest.mark.parametrize('n', [2, 6, 14])
+def test_rsi_matches_loop(n):
+    prices = pd.Series(random_walk(2000)[:, 0],
+                       index=pd.RangeIndex(2000))
+    prices.iloc[50] = np.nan
+    expected = legacy_rsi(prices, n)
+    res = RSI(prices, n)
+    assert isinstance(res, pd.Series)
+    assert res.index.equals(prices.index)
+    assert np.allclose(res.values, expected.values, rtol=0, atol=1e-9)
+    assert (res.iloc[:n + 1] == 0).all()
+
+
+def test_rsi_flat_and_short():
+    flat = pd.Series([5.0] * 30)
+    assert np.array_equal(RSI(flat).values, legacy_rsi(flat).values)
+    assert RSI(flat).iloc[-1] == 100
+    assert RSI(np.arange(10.0), 14).tolist() == [0.0] * 10
+
+
+def test_rsi_2d():
+    prices = random_walk(500, 4)
+    frame = pd.DataFrame(prices, columns=['A', 'B', 'C', 'D'])
+    res = RSI(frame)
+    assert list(res.columns) == ['A', 'B', 'C', 'D']
+    arr = RSI(prices)
+    assert isinstance(arr, np.ndarray) and arr.shape == prices.shape
+    for i, c in enumerate(frame.columns):
+        expected = legacy_rsi(frame[c]).values
+        assert np.allclose(res[c].values, expected, atol=1e-9)
+        assert np.allclose(arr[:, i], expected, atol=1e-9)
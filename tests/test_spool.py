@@ -0,0 +1,145 @@
+"""
+MIT License
+
+Copyright (c) 2017 Zeke Barge
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import sqlite3
+from queue import Queue
+from sqlalchemy import create_engine, select, func
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+from stocklook.crypto.gdax.tables import GdaxBase, GdaxSQLTickerFeedEntry
+from stocklook.utils.database import DatabaseLoadingThread
+from stocklook.utils.spool import MessageSpool
+
+
+class FlakyDatabase:
+    """A SQLite file that refuses connections while down is True."""
+    def __init__(self, path):
+        self.path = path
+        self.down = False
+        self.engine = create_engine('sqlite://', creator=self.connect, poolclass=NullPool)
+        GdaxBase.metadata.create_all(bind=self.engine,
+                                     tables=[GdaxSQLTickerFeedEntry.__table__])
+
+    def connect(self):
+        if self.down:
+            raise sqlite3.OperationalError('unable to open database file')
+        return sqlite3.connect(self.path)
+
+    def count(self):
+        with self.engine.connect() as conn:
+            return conn.execute(select([func.count()]).select_from(
+                GdaxSQLTickerFeedEntry.__table__)).scalar()
+
+
+def _ticks(start, n):
+    return [{'type': 'ticker', 'sequence': start + i, 'product_id': 'BTC-USD',
+             'price': '4388.01', 'time': '2017-09-02T17:05:49.250000Z'}
+            for i in range(n)]
+
+
+def test_spool_segments(tmpdir):
+    spool = MessageSpool(str(tmpdir), prefix='gdax_ticks', max_segment_bytes=200)
+    spool.append(_ticks(1, 2))
+    spool.append(_ticks(3, 2))
+    paths = spool.segments()
+    assert len(paths) == 2
+    with open(paths[-1], 'a') as fh:
+        fh.write('{"truncated": ')
+    assert [m['sequence'] for m in spool.read(paths[-1])] == [3, 4]
+
+    # A new spool on the same directory continues the numbering.
+    again = MessageSpool(str(tmpdir), prefix='gdax_ticks', max_segment_bytes=200)
+    assert again.append(_ticks(5, 1)).endswith('gdax_ticks_00000003.jsonl')
+
+
+def test_loader_spools_through_outage(tmpdir):
+    db = FlakyDatabase(str(tmpdir.join('gdax.sqlite3')))
+    spool = MessageSpool(str(tmpdir.join('spool')), prefix='gdax_ticks')
+    q = Queue()
+    loader = DatabaseLoadingThread(sessionmaker(bind=db.engine), q,
+                                   GdaxSQLTickerFeedEntry, commit_interval=5,
+                                   spool=spool, retry_interval=0)
+    for m in _ticks(1, 5):
+        q.put(m)
+    loader.load_messages()
+    assert db.count() == 5
+
+    db.down = True
+    for m in _ticks(6, 10):
+        q.put(m)
+    loader.load_messages()
+    loader.load_messages()
+    assert len(spool) == 1
+    assert len(spool.read(spool.segments()[0])) == 10
+
+    db.down = False
+    for m in _ticks(16, 5):
+        q.put(m)
+    loader.load_messages()
+    assert db.count() == 20
+    assert len(spool) == 0
+
+    # Replaying messages that were already stored doesn't duplicate them.
+    spool.append(_ticks(11, 10))
+    assert loader.replay_spool(force=True) == 0
+    assert db.count() == 20
+
+
+def test_loader_thread_replays_on_stop(tmpdir):
+    db = FlakyDatabase(str(tmpdir.join('gdax.sqlite3')))
+    spool = MessageSpool(str(tmpdir.join('spool')), prefix='gdax_ticks')
+    spool.append(_ticks(1, 3))
+    q = Queue()
+    loader = DatabaseLoadingThread(sessionmaker(bind=db.engine), q,
+                                   GdaxSQLTickerFeedEntry, spool=spool)
+    loader.start()
+    for m in _ticks(4, 3):
+        q.put(m)
+    q.put(loader.STOP_SIGNAL)
+    q.join()
+    loader.join(timeout=10)
+    assert not loader.is_alive()
+    assert db.count() == 6
+    assert len(spool) == 0
+
+
+def test_replay_quarantines_bad_segment(tmpdir):
+    db = FlakyDatabase(str(tmpdir.join('gdax.sqlite3')))
+    spool = MessageSpool(str(tmpdir.join('spool')), prefix='gdax_ticks', max_segment_bytes=1)
+    spool.append(_ticks(1, 2))
+    # Two rows with the same primary key can never be inserted.
+    bad = _ticks(3, 2)
+    for m in bad:
+        m['ticker_id'] = 100
+    spool.append(bad)
+    spool.append(_ticks(5, 2))
+    assert len(spool) == 3
+
+    loader = DatabaseLoadingThread(sessionmaker(bind=db.engine), Queue(),
+                                   GdaxSQLTickerFeedEntry, spool=spool, retry_interval=0)
+    assert loader._spooling
+    assert loader.replay_spool(force=True) == 4
+    assert db.count() == 4
+    assert len(spool) == 0
+    assert not loader._spooling
+    assert tmpdir.join('spool', 'gdax_ticks_00000002.jsonl.bad').check()
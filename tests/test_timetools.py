@@ -43,4 +43,11 @@ def test_time_tuples():
     dt3 = timestamp_to_local(dt)
     dt4 = timegm(dt3.utctimetuple())
     assert dt == dt2
-    assert dt == dt4
\ No newline at end of file
+    assert dt == dt4
+
+
+def test_iso_strings_keep_microseconds():
+    dt = timestamp_to_local('2017-09-02T17:05:49.250000Z')
+    assert dt.microsecond == 250000
+    assert dt == timestamp_to_local(datetime(2017, 9, 2, 17, 5, 49, 250000))
+    assert timestamp_to_local('1504371949.25').microsecond == 0